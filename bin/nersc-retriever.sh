@@ -7,10 +7,14 @@ export CLIENT_SECRET=${CLIENT_SECRET:="$(<keycloak-client-secret)"}
 export COMPONENT_NAME=${COMPONENT_NAME:="$(hostname)-nersc-retriever"}
 export DEST_SITE=${DEST_SITE:="WIPAC"}
 export HPSS_AVAIL_PATH=${HPSS_AVAIL_PATH:="/usr/bin/hpss_avail.py"}
+export HPSS_AVAIL_TTL_SECONDS=${HPSS_AVAIL_TTL_SECONDS:="60"}
+export HSI_PATH=${HSI_PATH:="/usr/bin/hsi"}
+export HSI_TIMEOUT_SECONDS=${HSI_TIMEOUT_SECONDS:="21600"}
 export INPUT_STATUS=${INPUT_STATUS:="located"}
 export LOG_LEVEL=${LOG_LEVEL:="DEBUG"}
 export LTA_AUTH_OPENID_URL=${LTA_AUTH_OPENID_URL:="https://keycloak.icecube.wisc.edu/auth/realms/IceCube"}
 export LTA_REST_URL=${LTA_REST_URL:="https://lta.icecube.aq:443"}
+export MAX_COUNT=${MAX_COUNT:="5"}
 # export OTEL_EXPORTER_OTLP_ENDPOINT=${OTEL_EXPORTER_OTLP_ENDPOINT:="https://telemetry.dev.icecube.aq/v1/traces"}
 export OUTPUT_STATUS=${OUTPUT_STATUS:="staged"}
 export PROMETHEUS_METRICS_PORT=${PROMETHEUS_METRICS_PORT:="8080"}
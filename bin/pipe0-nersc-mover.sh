@@ -6,6 +6,9 @@ export CLIENT_SECRET=${CLIENT_SECRET:="$(<keycloak-client-secret)"}
 export COMPONENT_NAME=${COMPONENT_NAME:="$(hostname)-pipe0-nersc-mover"}
 export DEST_SITE=${DEST_SITE:="NERSC"}
 export HPSS_AVAIL_PATH=${HPSS_AVAIL_PATH:="/usr/bin/hpss_avail.py"}
+export HPSS_AVAIL_TTL_SECONDS=${HPSS_AVAIL_TTL_SECONDS:="60"}
+export HSI_PATH=${HSI_PATH:="/usr/bin/hsi"}
+export HSI_TIMEOUT_SECONDS=${HSI_TIMEOUT_SECONDS:="21600"}
 export INPUT_STATUS=${INPUT_STATUS:="taping"}
 export LOG_LEVEL=${LOG_LEVEL:="DEBUG"}
 export LTA_AUTH_OPENID_URL=${LTA_AUTH_OPENID_URL:="https://keycloak.icecube.wisc.edu/auth/realms/IceCube"}
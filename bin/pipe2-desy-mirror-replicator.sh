@@ -8,12 +8,15 @@ export COMPONENT_NAME=${COMPONENT_NAME:="$(hostname)-desy-mirror-replicator"}
 export DEST_BASE_PATH=${DEST_BASE_PATH:="/pnfs/ifh.de/acs/icecube/archive"}
 export DEST_SITE=${DEST_SITE:="DESY"}
 export DEST_URL=${DEST_URL:="https://globe-door.ifh.de:2880"}
+export DIR_CACHE_TTL_SECONDS=${DIR_CACHE_TTL_SECONDS:="600"}
 export INPUT_PATH=${INPUT_PATH:="/data/user/jadelta/ltatemp/bundler_todesy"}
 export INPUT_STATUS=${INPUT_STATUS:="staged"}
 export LOG_LEVEL=${LOG_LEVEL:="DEBUG"}
 export LTA_AUTH_OPENID_URL=${LTA_AUTH_OPENID_URL:="https://keycloak.icecube.wisc.edu/auth/realms/IceCube"}
 export LTA_REST_URL=${LTA_REST_URL:="https://lta.icecube.aq:443"}
 export MAX_PARALLEL=${MAX_PARALLEL:="100"}
+export MAX_SEND_BYTES_PER_SECOND=${MAX_SEND_BYTES_PER_SECOND:="0"}
+export MAX_SEND_BYTES_PER_SECOND_FILE=${MAX_SEND_BYTES_PER_SECOND_FILE:="max-send-bytes-per-second"}
 # export OTEL_EXPORTER_OTLP_ENDPOINT=${OTEL_EXPORTER_OTLP_ENDPOINT:="https://telemetry.dev.icecube.aq/v1/traces"}
 export OUTPUT_STATUS=${OUTPUT_STATUS:="transferring"}
 export PROMETHEUS_METRICS_PORT=${PROMETHEUS_METRICS_PORT:="8080"}
@@ -2,13 +2,22 @@
 
 from __future__ import absolute_import, division, print_function
 
-# exports
-from . import transfer, globus_replicator
+import importlib
+from typing import Any
 
+# exports; imported on first use, so that `import lta.<module>` only pays for what it uses
 __all__ = [
     "transfer",
     "globus_replicator",
 ]
 
+
+def __getattr__(name: str) -> Any:
+    """Import the exported subpackages and modules on first use."""
+    if name in __all__:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 # NOTE: `__version__` is not defined because this package is built using 'setuptools-scm' --
 #   use `importlib.metadata.version(...)` if you need to access version info at runtime.
@@ -0,0 +1,2 @@
+# __init__.py
+"""The subcommands of lta_cmd, each imported only when it runs."""
@@ -0,0 +1,125 @@
+# bundle.py
+"""The 'bundle' subcommands of lta_cmd."""
+
+# fmt:off
+
+from datetime import datetime, timedelta
+
+from lta.cmd.common import as_datetime, display_time, EXIT_OK, ExitCode, Namespace, print_dict_as_pretty_json
+from lta.cmd.lta_db import _get_bundle_rows, _get_bundles
+from lta.utils import now
+
+
+async def bundle_ls(args: Namespace) -> ExitCode:
+    """List all of the Bundle objects in the LTA DB."""
+    if args.json or not args.show_status:
+        response = await args.di["lta_rc"].request("GET", "/Bundles")
+    if args.json:
+        print_dict_as_pretty_json(response)
+    elif args.show_status:
+        bundles = await _get_bundle_rows(args.di["lta_rc"], ["status"])
+        print(f"total {len(bundles)}")
+        for bundle in bundles:
+            print(f"Bundle {bundle['uuid']} {bundle['status']}")
+    else:
+        results = response["results"]
+        print(f"total {len(results)}")
+        for uuid in results:
+            print(f"Bundle {uuid}")
+    return EXIT_OK
+
+
+async def bundle_overdue(args: Namespace) -> ExitCode:
+    """List of the problematic Bundle objects in the LTA DB."""
+    # calculate our cutoff time for bundles not making progress
+    cutoff_time = datetime.utcnow() - timedelta(days=args.days)
+    # query the LTA DB to get the status of the bundles to check
+    rows = await _get_bundle_rows(args.di["lta_rc"], ["status", "update_timestamp"])
+    # check each bundle, and then get the whole of the problematic ones
+    problem_uuids = []
+    for row in rows:
+        if row["status"] == "quarantined":
+            problem_uuids.append(row["uuid"])
+        elif as_datetime(row["update_timestamp"]) < cutoff_time:
+            problem_uuids.append(row["uuid"])
+    problem_bundles = await _get_bundles(args.di["lta_rc"], problem_uuids)
+    # report the list of miscreants to the user
+    if args.json:
+        print_dict_as_pretty_json({"bundles": problem_bundles})
+    else:
+        for bundle in problem_bundles:
+            print(f"Bundle {bundle['uuid']}")
+            print(f"    Status: {bundle['status']} ({display_time(bundle['update_timestamp'])})")
+            print(f"    Claimed: {bundle['claimed']}")
+            if bundle['claimed']:
+                print(f"        Claimant: {bundle['claimant']} ({display_time(bundle['claim_timestamp'])})")
+    return EXIT_OK
+
+
+async def bundle_priority_reset(args: Namespace) -> ExitCode:
+    """List all of the Bundle objects in the LTA DB."""
+    rows = await _get_bundle_rows(args.di["lta_rc"], ["create_timestamp"])
+    for row in rows:
+        patch_body = {
+            "update_timestamp": now(),
+            "work_priority_timestamp": row["create_timestamp"],
+        }
+        await args.di["lta_rc"].request("PATCH", f"/Bundles/{row['uuid']}", patch_body)
+    return EXIT_OK
+
+
+async def bundle_status(args: Namespace) -> ExitCode:
+    """Query the status of a Bundle in the LTA DB."""
+    response = await args.di["lta_rc"].request("GET", f"/Bundles/{args.uuid}")
+    if args.json or args.extract_print:
+        print_dict_as_pretty_json(
+            response,
+            extract_print_fields=args.extract_print,
+        )
+    else:
+        # display information about the core fields
+        print(f"Bundle {args.uuid}")
+        print(f"    Priority: {display_time(response['work_priority_timestamp'])}")
+        print(f"    Status: {response['status']} ({display_time(response['update_timestamp'])})")
+        if response['status'] == "quarantined":
+            print(f"        Reason: {response['reason']}")
+        print(f"    Claimed: {response['claimed']}")
+        if response['claimed']:
+            print(f"        Claimant: {response['claimant']} ({display_time(response['claim_timestamp'])})")
+        print(f"    TransferRequest: {response['request']}")
+        print(f"    Source: {response['source']} -> Dest: {response['dest']}")
+        print(f"    Path: {response['path']}")
+        if 'files' in response:
+            print(f"    Files: {len(response['files'])}")
+        else:
+            print("    Files: Not Listed")
+        # display additional information if available
+        if 'bundle_path' in response:
+            print(f"    Bundle File: {response['bundle_path']}")
+        if 'size' in response:
+            print(f"    Size: {response['size']}")
+        if 'checksum' in response:
+            print("    Checksum")
+            print(f"        adler32: {response['checksum']['adler32']}")
+            print(f"        sha512:  {response['checksum']['sha512']}")
+        # display the contents of the bundle, if requested
+        if args.contents:
+            print("    Contents: Not Listed")
+    return EXIT_OK
+
+
+async def bundle_update_status(args: Namespace) -> ExitCode:
+    """Update the status of a Bundle in the LTA DB."""
+    right_now = now()
+    patch_body = {}
+    patch_body["status"] = args.new_status
+    patch_body["reason"] = ""
+    patch_body["update_timestamp"] = right_now
+    if args.clear_transfer_reference:
+        patch_body["transfer_reference"] = "re-globus"
+    if not args.keep_claim:
+        patch_body["claimed"] = False
+    if not args.keep_priority:
+        patch_body["work_priority_timestamp"] = right_now
+    await args.di["lta_rc"].request("PATCH", f"/Bundles/{args.uuid}", patch_body)
+    return EXIT_OK
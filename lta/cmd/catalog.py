@@ -0,0 +1,367 @@
+# catalog.py
+"""The 'catalog' subcommands of lta_cmd."""
+
+# fmt:off
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import sys
+from time import monotonic
+from typing import Any, Callable, Dict, List, Optional
+import urllib.parse
+
+from rest_tools.client import RestClient
+
+from lta.cmd.common import _enumerate_path, EXIT_ERROR, EXIT_OK, ExitCode, Namespace, print_catalog_record_as_line, print_dict_as_pretty_json
+from lta.crypto import sha512sum
+
+# how many File Catalog records to ask for in each page of a query
+CATALOG_PAGE_SIZE = 1000
+
+# how often to report the progress of a long-running command
+PROGRESS_INTERVAL_SECONDS = 5.0
+
+
+async def _catalog_get(rc: RestClient, path: str) -> Optional[Any]:
+    """Get the File Catalog record (if any) of the provided path."""
+    query_dict = {
+        "locations.site": {
+            "$eq": "WIPAC"
+        },
+        "locations.path": {
+            "$eq": path
+        },
+        # this is probably OK; finding a single file catalog record by complete path
+        "logical_name": {
+            "$eq": path
+        },
+    }
+    query_json = json.dumps(query_dict)
+    fc_response = await rc.request('GET', f'/api/files?query={query_json}&limit=1')
+    num_files = len(fc_response["files"])
+    if num_files < 1:
+        return None
+    catalog_file = fc_response["files"][0]
+    return await rc.request('GET', f'/api/files/{catalog_file["uuid"]}')
+
+
+async def _catalog_list(rc: RestClient,
+                        path: str,
+                        keys: List[str],
+                        on_page: Optional[Callable[[int], None]] = None) -> List[Dict[str, Any]]:
+    """Get the File Catalog records of the files at WIPAC below the provided path, a page at a time."""
+    query_dict = {
+        "locations.site": {
+            "$eq": "WIPAC"
+        },
+        "locations.path": {
+            "$regex": f"^{path}"
+        },
+    }
+    query_json = json.dumps(query_dict)
+    catalog_files: List[Dict[str, Any]] = []
+    start = 0
+    while True:
+        fc_response = await rc.request('GET', f'/api/files?query={query_json}&keys={"|".join(keys)}&start={start}&limit={CATALOG_PAGE_SIZE}')
+        catalog_files.extend(fc_response["files"])
+        if on_page:
+            on_page(len(catalog_files))
+        # if this page wasn't full, it was the last one
+        if len(fc_response["files"]) < CATALOG_PAGE_SIZE:
+            return catalog_files
+        start = start + CATALOG_PAGE_SIZE
+
+
+async def _sha512sums(paths: List[str],
+                      workers: Optional[int] = None,
+                      on_file: Optional[Callable[[int], None]] = None) -> Dict[str, str]:
+    """Compute the SHA512 hash of each of the provided files, on a pool of worker processes."""
+    loop = asyncio.get_running_loop()
+    checksums: Dict[str, str] = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        async def hash_file(path: str) -> None:
+            checksums[path] = await loop.run_in_executor(pool, sha512sum, path)
+            if on_file:
+                on_file(len(checksums))
+        await asyncio.gather(*[hash_file(path) for path in paths])
+    return checksums
+
+
+def _is_nersc_bundle_record(d: Dict[str, Any]) -> bool:
+    """Determine if the provided catalog record is a bundle at NERSC."""
+    # if we didn't get a record, this is not a bundle at NERSC
+    if not d:
+        return False
+    # if the record doesn't contain locations, this is not a bundle at NERSC
+    if "locations" not in d:
+        return False
+    # for each location
+    all_good = False
+    for location in d["locations"]:
+        # if the location record doesn't have the appropriate keys, skip it
+        if "site" not in location:
+            continue
+        if "hpss" not in location:
+            continue
+        if "online" not in location:
+            continue
+        # if this isn't a NERSC location, skip it
+        if location["site"] != "NERSC":
+            continue
+        # if this isn't on hpss, skip it
+        if not location["hpss"]:
+            continue
+        # if this record is online, skip it
+        if location["online"]:
+            continue
+        # winner, winner, chicken dinner!
+        all_good = True
+    # tell the caller what we think about the record
+    return all_good
+
+# -----------------------------------------------------------------------------
+
+
+class _CheckProgress:
+    """Tell the user (on stderr) how far along catalog_check is, now and then."""
+
+    def __init__(self, args: Namespace, disk_files: int) -> None:
+        self.enabled = args.progress
+        self.checksums = args.checksums
+        self.disk_files = disk_files
+        self.hashed = 0
+        self.records = 0
+        self.reported = monotonic()
+
+    def on_file(self, count: int) -> None:
+        self.hashed = count
+        self.report()
+
+    def on_page(self, count: int) -> None:
+        self.records = count
+        self.report()
+
+    def report(self, force: bool = False) -> None:
+        if not self.enabled:
+            return
+        right_now = monotonic()
+        if force or (right_now - self.reported >= PROGRESS_INTERVAL_SECONDS):
+            self.reported = right_now
+            hashed = f"{self.hashed}/{self.disk_files} files hashed; " if self.checksums else ""
+            print(f"{hashed}{self.records} catalog records", file=sys.stderr)
+
+
+def _check_disk_files(args: Namespace,
+                      disk_files: List[str],
+                      catalog_records: Dict[str, Any],
+                      checksums: Dict[str, str]) -> tuple[List[str], List[Dict[str, Any]]]:
+    """Find the files on disk that are missing from the catalog, or don't match their catalog record."""
+    catalog_missing = []
+    mismatch = []
+    for disk_file in disk_files:
+        catalog_record = catalog_records.get(disk_file)
+        if not catalog_record:
+            if not args.json:
+                print(f"Missing from the File Catalog: {disk_file}")
+            catalog_missing.append(disk_file)
+            continue
+        # check the record for discrepancies
+        size = os.path.getsize(disk_file)
+        checksum = checksums.get(disk_file)
+        catalog_checksum = catalog_record.get("checksum", {}).get("sha512")
+        if (catalog_record["file_size"] != size) or (args.checksums and catalog_checksum != checksum):
+            if not args.json:
+                print(f"Mismatch between Catalog and Disk: {disk_file}")
+            mismatch.append({
+                "path": disk_file,
+                "uuid": catalog_record["uuid"],
+                "catalog_size": catalog_record["file_size"],
+                "disk_size": size,
+                "catalog_sha512": catalog_checksum,
+                "disk_sha512": checksum,
+            })
+    return catalog_missing, mismatch
+
+
+async def catalog_check(args: Namespace) -> ExitCode:
+    """Check the files on disk vs. the file catalog and vice versa."""
+    # enumerate all of the files on disk to be checked
+    disk_files = sorted(_enumerate_path(args.path))
+    progress = _CheckProgress(args, len(disk_files))
+
+    # page through the catalog while we compute checksums on the worker processes
+    keys = ["checksum", "file_size", "logical_name", "uuid"]
+    catalog_task = asyncio.create_task(_catalog_list(args.di["fc_rc"], args.path, keys, progress.on_page))
+    checksums = {}
+    try:
+        if args.checksums:
+            checksums = await _sha512sums(disk_files, args.workers, progress.on_file)
+    finally:
+        catalog_files = await catalog_task
+    progress.report(force=True)
+    catalog_records = {catalog_file["logical_name"]: catalog_file for catalog_file in catalog_files}
+
+    # for all of the files we want to check
+    catalog_missing, mismatch = _check_disk_files(args, disk_files, catalog_records, checksums)
+
+    # the catalog files that aren't on the disk
+    disk_missing = sorted(catalog_records.keys() - set(disk_files))
+    if not args.json:
+        for logical_name in disk_missing:
+            print(f"Missing from the Disk: {logical_name}")
+
+    # display the results to the caller
+    results_dict = {
+        "path": args.path,
+        "checksums": args.checksums,
+        "disk_files": len(disk_files),
+        "catalog_files": len(catalog_records),
+        "catalog_missing": catalog_missing,
+        "disk_missing": disk_missing,
+        "mismatch": mismatch,
+    }
+    if args.json:
+        print_dict_as_pretty_json(results_dict)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(results_dict, f, indent=4, sort_keys=True)
+
+    # return the appropriate exit code based on what we found
+    if catalog_missing or disk_missing or mismatch:
+        return EXIT_ERROR
+    return EXIT_OK
+
+
+async def catalog_query(args: Namespace) -> ExitCode:
+    """Run a freeform query against the File Catalog."""
+    # URL encode the provided query string if requested
+    query = args.query
+    if args.url_encode:
+        query = urllib.parse.quote_plus(query)
+
+    # print out the query string if we're debugging
+    if args.debug:
+        print(f"Using query string: {query}\n\nURL: /api/files?query={query}")
+
+    # run the query
+    fc_response = await args.di["fc_rc"].request('GET', f'/api/files?query={query}')
+
+    # display the results to the caller
+    if args.json:
+        print_dict_as_pretty_json(fc_response)
+    else:
+        print(fc_response)
+
+    # return the appropriate exit code based on what we found
+    return EXIT_OK
+
+
+async def catalog_display(args: Namespace) -> ExitCode:
+    """Display a record from the File Catalog."""
+    # if the user specified a path
+    if args.path:
+        # ask the file catalog to retrieve the record of the file
+        catalog_record = await _catalog_get(args.di["fc_rc"], args.path)
+
+    # if the user specified a uuid
+    if args.uuid:
+        try:
+            catalog_record = await args.di["fc_rc"].request("GET", f"/api/files/{args.uuid}")
+        except Exception:
+            catalog_record = None
+
+    # display the record to the caller
+    if catalog_record:
+        print_dict_as_pretty_json(catalog_record)
+    else:
+        print_dict_as_pretty_json({})
+
+    return EXIT_OK
+
+
+async def catalog_path(args: Namespace) -> ExitCode:
+    """Display records by path from the File Catalog."""
+    # if the user didn't specify a path
+    if not args.path:
+        print("Missing path")
+        return EXIT_ERROR
+
+    # if the user specified a site
+    site = "WIPAC"
+    if args.site:
+        site = args.site
+
+    # ask the file catalog about the records
+    query_dict = {
+        "locations.site": {
+            "$eq": site,
+        },
+        "locations.path": {
+            "$regex": f"^{args.path}"
+        },
+        # this isn't going to work; searching 'logical_name' by regular expression
+        # "logical_name": {
+        #     "$regex": f"^{args.path}"
+        # }
+    }
+
+    # if the user asked us to also query the logical_name field
+    if args.logical_name:
+        query_dict["logical_name"] = {
+            "$regex": f"^{args.path}"
+        }
+
+    query_json = json.dumps(query_dict)
+    fc_response = await args.di["fc_rc"].request('GET', f'/api/files?query={query_json}')
+    for catalog_file in fc_response["files"]:
+        print(catalog_file)
+
+    return EXIT_OK
+
+
+async def catalog_stats(args: Namespace) -> ExitCode:
+    """Query for the bundles archived at NERSC."""
+    exit_code = EXIT_OK
+
+    # we want files at NERSC that are not contained within archives
+    query_dict = {
+        # this isn't going to work; searching 'logical_name' by regular expression
+        # "logical_name": {
+        #     "$regex": "^/home/projects/icecube"
+        # },
+        "locations.site": {
+            "$eq": "NERSC"
+        },
+        "locations.path": {
+            "$regex": "^/home/projects/icecube"
+        },
+    }
+    query_json = json.dumps(query_dict)
+    keys = "create_date|file_size|locations|logical_name|meta_modify_date|uuid"
+    start = 0
+    limit = 500
+    finished = False
+
+    # until we're done querying the File Catalog
+    while not finished:
+        # ask it for another {limit} file records to check
+        fc_response = await args.di["fc_rc"].request('GET', f'/api/files?query={query_json}&keys={keys}&start={start}&limit={limit}')
+        # for each record we got back
+        for catalog_file in fc_response["files"]:
+            # if it's an LTA bundle at NERSC
+            if _is_nersc_bundle_record(catalog_file):
+                # display the record
+                print_catalog_record_as_line(catalog_file)
+
+        # if we got {limit} file records to check
+        if len(fc_response["files"]) == limit:
+            # then update our indexes to check the next bunch
+            start = start + limit
+        else:
+            # otherwise, this was the last bunch, we're done
+            finished = True
+
+    # return the appropriate exit code based on what we found
+    return exit_code
@@ -0,0 +1,129 @@
+# common.py
+"""Constants and helpers shared by the lta_cmd subcommands."""
+
+# fmt:off
+
+import argparse
+from datetime import datetime
+import json
+import os
+from time import mktime, strptime
+from typing import Any, Dict, List, Optional, Tuple
+
+Namespace = argparse.Namespace
+
+ExitCode = int
+EXIT_OK = 0
+EXIT_ERROR = 1
+
+KILOBYTE = 1024
+MEGABYTE = KILOBYTE * KILOBYTE
+GIGABYTE = MEGABYTE * KILOBYTE
+# MINIMUM_REQUEST_SIZE = 100 * GIGABYTE
+MINIMUM_REQUEST_SIZE = 75 * 1000**3
+
+# the most requests to have in flight to the LTA DB at once, when we can't ask for everything in one go
+MAX_CONCURRENT_REQUESTS = 16
+
+PATH_PREFIX_ALLOW_LIST = [
+    "/data/ana",
+    "/data/exp",
+    "/data/sim",
+]
+
+
+# -----------------------------------------------------------------------------
+
+
+def as_datetime(s: str) -> datetime:
+    """Convert a timestamp string into a datetime object."""
+    # if Python 3.7+
+    # return datetime.fromisoformat(s)
+
+    # before Python 3.7
+    st = strptime(s, "%Y-%m-%dT%H:%M:%S")
+    return datetime.fromtimestamp(mktime(st))
+
+
+def display_time(s: Optional[str]) -> str:
+    """Make a timestamp string look nice."""
+    if s:
+        return s.replace("T", " ")
+    return "Unknown"
+
+
+def normalize_path(path: str) -> str:
+    """Validate and normalize the provided request path."""
+    path = os.path.normpath(path)
+    for prefix in PATH_PREFIX_ALLOW_LIST:
+        if path.startswith(prefix):
+            return path
+    raise ValueError(f"{path} does not begin with a prefix on the allow-list prefix")
+
+
+def print_catalog_record_as_line(d: Dict[str, Any]) -> None:
+    """Print the provided File Catalog record as a stat line."""
+    date = d["meta_modify_date"][:19]
+    if "create_date" in d:
+        date = d["create_date"].replace("T", " ")
+    size = d["file_size"]
+    uuid = d["uuid"]
+    logical_name = d["logical_name"]
+    print(f"{date} | {size} | {uuid} | {logical_name}")
+
+
+# fmt:on
+
+
+def print_dict_as_pretty_json(
+    d: Dict[str, Any],
+    *,
+    extract_print_fields: list[str] | None = None,
+) -> None:
+    """Print the provided Dict as pretty-print JSON.
+
+    If 'extract_print_fields' is given, those fields are printed separately.
+    """
+
+    def _print_dict(_out: Dict[str, Any]):
+        print(json.dumps(_out, indent=4, sort_keys=True))
+
+    _print_dict(d)
+
+    if not extract_print_fields:
+        return
+
+    # now, let's see if there are any multiline fields to print separately...
+    for key in sorted(extract_print_fields):
+        if key not in d:
+            continue
+        print()
+        print(f"<<< FIELD: {key} >>>")
+        if isinstance(d[key], str):
+            print(d[key].rstrip("\n"))
+        else:
+            _print_dict(d[key])
+
+
+# fmt:off
+
+
+def _enumerate_path(path: str) -> List[str]:
+    """Recursively walk the file system to enumerate files at provided path."""
+    # enumerate all of the files on disk to be checked
+    disk_files = []
+    for root, dirs, files in os.walk(path):
+        disk_files.extend([os.path.join(root, file) for file in files])
+    return disk_files
+
+
+def _get_files_and_size(path: str) -> Tuple[List[str], int]:
+    """Recursively walk and add the files of files in the file system."""
+    # enumerate all of the files on disk to be checked
+    disk_files = _enumerate_path(path)
+    # for all of the files we want to check
+    size = 0
+    for disk_file in disk_files:
+        # determine the size of the file
+        size += os.path.getsize(disk_file)
+    return (disk_files, size)
@@ -0,0 +1,16 @@
+# config.py
+"""The 'display-config' subcommand of lta_cmd."""
+
+# fmt:off
+
+from lta.cmd.common import EXIT_OK, ExitCode, Namespace, print_dict_as_pretty_json
+
+
+async def display_config(args: Namespace) -> ExitCode:
+    """Display the configuration provided to the application."""
+    if args.json:
+        print_dict_as_pretty_json(args.di["config"])
+    else:
+        for key in args.di["config"]:
+            print(f"{key}:\t\t{args.di['config'][key]}")
+    return EXIT_OK
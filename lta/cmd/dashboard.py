@@ -0,0 +1,128 @@
+# dashboard.py
+"""The 'dashboard' subcommand of lta_cmd."""
+
+# fmt:off
+
+from typing import Dict, List, Optional, Tuple
+
+import colorama
+
+from lta.cmd.common import EXIT_ERROR, EXIT_OK, ExitCode, Namespace
+from lta.cmd.lta_db import _get_dashboard
+
+Fore = colorama.Fore
+Style = colorama.Style
+
+
+def _get_status_index(status_list: List[str],
+                      status: str,
+                      module_map: Optional[Dict[str, str]] = None,
+                      claimant: Optional[str] = None) -> Tuple[int, bool]:
+    """Find where on the status list we are (-1 if we can't tell), and if this is an error state."""
+    if status in status_list:
+        return status_list.index(status), False
+    # okay, where on the status list should we be?
+    status_index = -1
+    if module_map and claimant:
+        for key in module_map.keys():
+            if key in claimant:
+                status_index = status_list.index(module_map[key])
+    return status_index, True
+
+
+def _get_progress(list_len: int, status_index: int, error_state: bool) -> str:
+    """Render how far along the status list we are."""
+    # if we've got no idea where we go on the status list
+    if status_index < 0:
+        return Fore.RED + ("?" * list_len)
+    # or if we've reached the final status
+    if (list_len - status_index) == 1:
+        return Fore.GREEN + ("#" * list_len)
+    # otherwise we need to render something in progress
+    sb = Fore.GREEN + ("#" * status_index)
+    if error_state:
+        sb += Fore.RED + "X"
+    else:
+        sb += Fore.YELLOW + ">"
+    sb += Fore.BLUE + ("_" * (list_len - status_index - 1))
+    return sb
+
+
+def _get_status_bar(status_list: List[str],
+                    status: str,
+                    module_map: Optional[Dict[str, str]] = None,
+                    claimant: Optional[str] = None) -> str:
+    """Create a colorful status bar."""
+    # what is the widest status we'll see?
+    status_width = max([len(status)] + [len(listed) for listed in status_list])
+    # where on the status list are we?
+    status_index, error_state = _get_status_index(status_list, status, module_map, claimant)
+    # build the status bar
+    sb = Style.NORMAL + Fore.WHITE + "[" + Style.BRIGHT
+    sb += _get_progress(len(status_list), status_index, error_state)
+    sb += Style.NORMAL + Fore.WHITE + "]:" + Style.BRIGHT
+    sb += Fore.RED if error_state else Fore.CYAN
+    sb += f"{status:<{status_width}} "
+    # return the status bar to the caller
+    return sb
+
+
+async def dashboard(args: Namespace) -> ExitCode:
+    """Display a Dashboard of on-going transfers."""
+    # define the list of TransferRequest statuses
+    REQUEST_STATUS = [
+        "unclaimed",
+        "processing",
+        "completed",
+    ]
+    # define the list of Bundle statuses
+    BUNDLE_STATUS = [
+        "specified",
+        "created",
+        "staged",
+        "transfer-submitted",
+        "transferring",
+        "taping",
+        "verifying",
+        "completed",
+        "source-deleted",
+        "deleted",
+        "finished",
+    ]
+    # define a mapping between LTA module and Bundle status
+    MODULE_MAP = {
+        "bundler": "specified",
+        "rate-limiter": "created",
+        "replicator": "staged",
+        "globus-tracker": "transfer-submitted",
+        "site-move-verifier": "transferring",
+        "nersc-mover": "taping",
+        "nersc-verifier": "verifying",
+        "deleter": "completed",
+        "transfer-request-finisher": "deleted",
+    }
+    # get the requests in the system, and the status of their bundles
+    requests = await _get_dashboard(args.di["lta_rc"], args.active_only, args.limit, args.uuid)
+    # now let's make a colorful dashboard display
+    try:
+        # Fore: BLACK, RED, GREEN, YELLOW, BLUE, MAGENTA, CYAN, WHITE, RESET.
+        # Back: BLACK, RED, GREEN, YELLOW, BLUE, MAGENTA, CYAN, WHITE, RESET.
+        # Style: DIM, NORMAL, BRIGHT, RESET_ALL.
+        colorama.init(autoreset=True)
+        # for each transfer request
+        for request in requests:
+            sb = _get_status_bar(REQUEST_STATUS, request["status"])
+            print(Style.BRIGHT + Fore.CYAN + "Request " + Fore.YELLOW + f"{request['uuid']} " + sb + Fore.YELLOW + f"{request['path']}")
+            # for each bundle in the request
+            for bundle in request["bundles"]:
+                sb = _get_status_bar(BUNDLE_STATUS, bundle["status"], MODULE_MAP, bundle["claimant"])
+                print(Style.BRIGHT + Fore.CYAN + "      Bundle " + Fore.YELLOW + f"{bundle['uuid']} " + sb)
+            # blank line between requests
+            print("")
+    except Exception as e:
+        print(f"Error while rendering dashboard: {e}")
+        colorama.deinit()
+        return EXIT_ERROR
+    # tell the caller we rendered the dashboard successfully
+    colorama.deinit()
+    return EXIT_OK
@@ -0,0 +1,138 @@
+# lta_db.py
+"""Queries of the LTA DB shared by the lta_cmd subcommands."""
+
+# fmt:off
+
+import asyncio
+from operator import itemgetter
+import os
+from typing import Any, cast, Dict, List, Optional
+import urllib.parse
+
+from requests.exceptions import HTTPError
+from rest_tools.client import RestClient
+
+from lta.cmd.common import MAX_CONCURRENT_REQUESTS
+
+
+async def _get_bundles_status(rc: RestClient,
+                              bundle_uuids: List[str],
+                              semaphore: Optional[asyncio.Semaphore] = None) -> List[Dict[str, Any]]:
+    """Get the status of the provided Bundles, a few at a time."""
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+    async def get_bundle(uuid: str) -> Dict[str, Any]:
+        async with semaphore:
+            response = await rc.request('GET', f"/Bundles/{uuid}")
+        KEYS = ['claim_timestamp', 'claimant', 'claimed', 'create_timestamp', 'path', 'request', 'status', 'type', 'update_timestamp', 'uuid']
+        bundle = {}
+        for k in KEYS:
+            if k in response:
+                bundle[k] = response[k]
+        return bundle
+
+    return list(await asyncio.gather(*[get_bundle(uuid) for uuid in bundle_uuids]))
+
+
+async def _get_bundle_rows(rc: RestClient, fields: List[str]) -> List[Dict[str, Any]]:
+    """Get the provided fields (and the uuid) of every Bundle in the LTA DB."""
+    response = await rc.request("GET", f"/Bundles?fields={','.join(fields)}")
+    rows = response["results"]
+    if rows and isinstance(rows[0], str):
+        # an older LTA DB ignores fields and lists the UUIDs; fetch the rows ourselves
+        rows = await _get_bundles(rc, rows)
+    return cast(List[Dict[str, Any]], rows)
+
+
+async def _get_bundles(rc: RestClient, bundle_uuids: List[str]) -> List[Dict[str, Any]]:
+    """Get the Bundles (without their files) with the provided UUIDs."""
+    if not bundle_uuids:
+        return []
+    try:
+        response = await rc.request("POST", "/Bundles/actions/bulk_get", {"bundles": bundle_uuids})
+        return cast(List[Dict[str, Any]], response["bundles"])
+    except HTTPError as e:
+        if e.response is None or e.response.status_code != 404:
+            raise
+    # an older LTA DB without bulk_get; ask for them one at a time, a few at once
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+    async def get_bundle(uuid: str) -> Dict[str, Any]:
+        async with semaphore:
+            return cast(Dict[str, Any], await rc.request("GET", f"/Bundles/{uuid}?contents=0"))
+
+    return list(await asyncio.gather(*[get_bundle(uuid) for uuid in bundle_uuids]))
+
+
+async def _get_dashboard(rc: RestClient, active_only: bool, limit: Optional[int], uuid: Optional[str]) -> List[Dict[str, Any]]:
+    """Get the TransferRequests (oldest first) for the dashboard, each with the status of its Bundles."""
+    params = {"active_only": str(active_only).lower()}
+    if limit is not None:
+        params["limit"] = str(limit)
+    if uuid:
+        params["uuid"] = uuid
+    try:
+        response = await rc.request("GET", f"/Dashboard?{urllib.parse.urlencode(params)}")
+        return cast(List[Dict[str, Any]], response["results"])
+    except HTTPError as e:
+        if e.response is None or e.response.status_code != 404:
+            raise
+    # an older LTA DB without GET /Dashboard; gather it ourselves
+    return await _gather_dashboard(rc, active_only, limit, uuid)
+
+
+async def _gather_dashboard(rc: RestClient, active_only: bool, limit: Optional[int], uuid: Optional[str]) -> List[Dict[str, Any]]:
+    """Gather the dashboard from the TransferRequests and Bundles of the LTA DB, a few requests at a time."""
+    response = await rc.request("GET", "/TransferRequests")
+    requests = []
+    for result in response["results"]:
+        if uuid:
+            if result['uuid'] == uuid:
+                requests.append(result)
+        elif not active_only:
+            requests.append(result)
+        elif result["status"] != "finished":
+            requests.append(result)
+    # sort the list by create time
+    requests = sorted(requests, key=itemgetter('create_timestamp'))
+    # limit the size of the list if necessary
+    requests = requests[:limit]
+    num_requests = len(requests)
+    req_width = len(f"{num_requests}")
+    request_count = 0
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+    async def get_request_bundles(request: Dict[str, Any]) -> None:
+        nonlocal request_count
+        # obtain the bundles associated with the request
+        async with semaphore:
+            res2 = await rc.request("GET", f"/Bundles?request={request['uuid']}")
+        bundles = await _get_bundles_status(rc, res2["results"], semaphore)
+        # sort the bundles by create time
+        request["bundles"] = sorted(bundles, key=itemgetter('create_timestamp'))
+        request_count += 1
+        print(f"{request_count:>{req_width}}/{num_requests:>{req_width}}", end="\r")
+
+    await asyncio.gather(*[get_request_bundles(request) for request in requests])
+    return requests
+
+
+async def _get_overlapping_requests(rc: RestClient, path: str) -> List[Dict[str, Any]]:
+    """Get the active TransferRequests whose paths are, are above, or are below the provided path."""
+    try:
+        response = await rc.request("POST", "/TransferRequests/actions/check_overlap", {"path": path})
+        return cast(List[Dict[str, Any]], response["overlaps"])
+    except HTTPError as e:
+        if e.response is None or e.response.status_code != 404:
+            raise
+    # an older LTA DB without check_overlap; check every TransferRequest ourselves
+    response = await rc.request("GET", "/TransferRequests")
+    overlaps = []
+    for request in response["results"]:
+        old_path = os.path.normpath(request["path"])
+        if request["status"] in ["completed", "finished"]:
+            continue
+        if (old_path == path) or path.startswith(f"{old_path.rstrip('/')}/") or old_path.startswith(f"{path.rstrip('/')}/"):
+            overlaps.append(request)
+    return overlaps
@@ -0,0 +1,58 @@
+# metadata.py
+"""The 'metadata' subcommands of lta_cmd."""
+
+# fmt:off
+
+from typing import Any, Dict, List
+
+from lta.cmd.common import EXIT_ERROR, EXIT_OK, ExitCode, Namespace, print_dict_as_pretty_json
+
+
+async def metadata_ls(args: Namespace) -> ExitCode:
+    """List Metadata records in the LTA DB."""
+    if not args.uuid and not args.bundle:
+        print("metadata ls: must supply --uuid UUID or --bundle UUID to identify records to list")
+        return EXIT_ERROR
+    if args.bundle:
+        obj: Dict[str, List[Any]] = {"metadata": []}
+        done = False
+        skip = 0
+        while not done:
+            result = await args.di["lta_rc"].request("GET", f"/Metadata?bundle_uuid={args.bundle}&skip={skip}")
+            num_results = len(result["results"])
+            skip = skip + num_results
+            done = (num_results == 0)
+            if args.json:
+                obj["metadata"].extend(result["results"])
+            else:
+                for record in result["results"]:
+                    print(f"uuid:{record['uuid']} bundle:{record['bundle_uuid']} fc:{record['file_catalog_uuid']}")
+        if args.json:
+            print_dict_as_pretty_json(obj)
+        return EXIT_OK
+    if args.uuid:
+        response = await args.di["lta_rc"].request("GET", f"/Metadata/{args.uuid}")
+        if args.json:
+            print_dict_as_pretty_json(response)
+        else:
+            print(f"uuid:              {response['uuid']}")
+            print(f"bundle_uuid:       {response['bundle_uuid']}")
+            print(f"file_catalog_uuid: {response['file_catalog_uuid']}")
+    return EXIT_OK
+
+
+async def metadata_rm(args: Namespace) -> ExitCode:
+    """Remove Metadata records from the LTA DB."""
+    if not args.uuid and not args.bundle:
+        print("metadata rm: must supply --uuid UUID or --bundle UUID to identify records to remove")
+        return EXIT_ERROR
+    if args.bundle:
+        await args.di["lta_rc"].request("DELETE", f"/Metadata?bundle_uuid={args.bundle}")
+        if args.verbose:
+            print(f"removed Metadata records for Bundle {args.bundle}")
+        return EXIT_OK
+    if args.uuid:
+        await args.di["lta_rc"].request("DELETE", f"/Metadata/{args.uuid}")
+        if args.verbose:
+            print(f"removed Metadata record {args.uuid}")
+    return EXIT_OK
@@ -0,0 +1,177 @@
+# request.py
+"""The 'request' subcommands of lta_cmd."""
+
+# fmt:off
+
+from typing import Any, Dict
+
+import hurry.filesize  # type: ignore
+
+from lta.cmd.common import _get_files_and_size, display_time, EXIT_ERROR, EXIT_OK, ExitCode, MINIMUM_REQUEST_SIZE, Namespace, normalize_path, print_dict_as_pretty_json
+from lta.cmd.lta_db import _get_bundles_status, _get_overlapping_requests
+from lta.utils import now
+
+
+async def request_estimate(args: Namespace) -> ExitCode:
+    """Estimate the count and size of a new TransferRequest."""
+    files_and_size = _get_files_and_size(args.path)
+    disk_files = files_and_size[0]
+    size = files_and_size[1]
+    # build the result dictionary
+    result = {
+        "path": args.path,
+        "count": len(disk_files),
+        "size": size,
+    }
+    # for all of the files we want to check
+    if args.json:
+        print_dict_as_pretty_json(result)
+    else:
+        print(f"TransferRequest for {args.path}")
+        print(f"{size:,} bytes ({hurry.filesize.size(size)}) in {len(disk_files):,} files.")
+    return EXIT_OK
+
+
+async def request_ls(args: Namespace) -> ExitCode:
+    """List all of the TransferRequest objects in the LTA DB."""
+    response = await args.di["lta_rc"].request("GET", "/TransferRequests")
+    if args.json:
+        print_dict_as_pretty_json(response)
+    else:
+        results = response["results"]
+        print(f"total {len(results)}")
+        for request in results:
+            print(f"{display_time(request['create_timestamp'])} TransferRequest {request['uuid']} {request['source']} -> {request['dest']} {request['path']}")
+    return EXIT_OK
+
+
+async def request_new(args: Namespace) -> ExitCode:
+    """Create a new TransferRequest and add it to the LTA DB."""
+    # determine how big the transfer request is going to be
+    files_and_size = _get_files_and_size(args.path)
+    disk_files = files_and_size[0]
+    size = files_and_size[1]
+    # get some stuff
+    source = args.source
+    dest = args.dest
+    path = normalize_path(args.path)
+    # if the request contains nothing at all, don't try to archive it
+    if ((size == 0) or (len(disk_files) == 0)) and (args.force is False):
+        raise Exception(f"TransferRequest for {path}\n{size:,} bytes ({hurry.filesize.size(size)}) in {len(disk_files):,} files.\nWill NOT attempt to archive 0 bytes.")
+    # if it doesn't meet our minimize size requirement
+    if size < MINIMUM_REQUEST_SIZE:
+        # and the operator has not forced the issue
+        if not args.force:
+            # raise an Exception to prevent the command from creating a too small request
+            raise Exception(f"TransferRequest for {path}\n{size:,} bytes ({hurry.filesize.size(size)}) in {len(disk_files):,} files.\nMinimum required size: {MINIMUM_REQUEST_SIZE:,} bytes.")
+    # check to see if we've already got an active TransferRequest on, above, or below that path
+    if not args.force:
+        for request in await _get_overlapping_requests(args.di["lta_rc"], path):
+            # raise an Exception to prevent the command from creating an overlapping request
+            raise Exception(f"TransferRequest for {path}\nOverlaps TransferRequest {request['uuid']}\n    Status: {request['status']}\n    Path: {request['path']}")
+    # construct the TransferRequest body
+    request_body: Dict[str, Any] = {
+        "source": source,
+        "dest": dest,
+        "path": path,
+    }
+    # the LTA DB rejects overlapping requests, unless the operator has forced the issue
+    if args.force:
+        request_body["allow_overlap"] = True
+    response = await args.di["lta_rc"].request("POST", "/TransferRequests", request_body)
+    uuid = response["TransferRequest"]
+    tr = await args.di["lta_rc"].request("GET", f"/TransferRequests/{uuid}")
+    if args.json:
+        print_dict_as_pretty_json(tr)
+    else:
+        display_id = tr["uuid"]
+        create_time = tr["create_timestamp"].replace("T", " ")
+        print(f"{display_id}  {create_time} {path} {source} -> {dest}")
+    return EXIT_OK
+
+
+async def request_priority_reset(args: Namespace) -> ExitCode:
+    """Reset the work priority timestamp for every TransferRequest."""
+    # find every transfer request and set work_priority_timestamp to create_timestamp
+    response = await args.di["lta_rc"].request("GET", "/TransferRequests")
+    results = response["results"]
+    for request in results:
+        uuid = request["uuid"]
+        patch_body = {
+            "update_timestamp": now(),
+            "work_priority_timestamp": request["create_timestamp"],
+        }
+        await args.di["lta_rc"].request("PATCH", f"/TransferRequests/{uuid}", patch_body)
+    return EXIT_OK
+
+
+async def request_rm(args: Namespace) -> ExitCode:
+    """Remove a TransferRequest from the LTA DB."""
+    response = await args.di["lta_rc"].request("GET", f"/TransferRequests/{args.uuid}")
+    path = response["path"]
+    if args.confirm != path:
+        print(f"request rm: cannot remove TransferRequest {args.uuid}: path is not --confirm {args.confirm}")
+        return EXIT_ERROR
+    await args.di["lta_rc"].request("DELETE", f"/TransferRequests/{args.uuid}")
+    if args.verbose:
+        print(f"removed TransferRequest {args.uuid}")
+    res3 = await args.di["lta_rc"].request("GET", f"/Bundles?request={args.uuid}")
+    bundles = await _get_bundles_status(args.di["lta_rc"], res3["results"])
+    for bundle in bundles:
+        await args.di["lta_rc"].request("DELETE", f"/Bundles/{bundle['uuid']}")
+        if args.verbose:
+            print(f"removed Bundle {bundle['uuid']}")
+        await args.di["lta_rc"].request("DELETE", f"/Metadata?bundle_uuid={bundle['uuid']}")
+        if args.verbose:
+            print(f"removed Metadata records for Bundle {bundle['uuid']}")
+    return EXIT_OK
+
+
+async def request_status(args: Namespace) -> ExitCode:
+    """Query the status of a TransferRequest in the LTA DB."""
+    response = await args.di["lta_rc"].request("GET", f"/TransferRequests/{args.uuid}")
+    res2 = await args.di["lta_rc"].request("GET", f"/Bundles?request={args.uuid}")
+    response["bundles"] = await _get_bundles_status(args.di["lta_rc"], res2["results"])
+    if args.json or args.extract_print:
+        print_dict_as_pretty_json(
+            response,
+            extract_print_fields=args.extract_print,
+        )
+    else:
+        # display information about the core fields
+        print(f"TransferRequest {args.uuid}")
+        print(f"    Priority: {display_time(response['work_priority_timestamp'])}")
+        print(f"    Status: {response['status']} ({display_time(response['update_timestamp'])})")
+        if response['status'] == "quarantined":
+            print(f"        Reason: {response['reason']}")
+        print(f"    Claimed: {response['claimed']}")
+        if response['claimed']:
+            print(f"        Claimant: {response['claimant']} ({display_time(response['claim_timestamp'])})")
+        print(f"    Source: {response['source']} -> Dest: {response['dest']}")
+        print(f"    Path: {response['path']}")
+        print(f"    Bundles: {len(response['bundles'])}")
+        # display the contents of the transfer request, if requested
+        if args.contents:
+            print("    Contents:")
+            for bundle in response["bundles"]:
+                print(f"        Bundle {bundle['uuid']}")
+                print(f"            Status: {bundle['status']} ({display_time(bundle['update_timestamp'])})")
+                print(f"            Claimed: {bundle['claimed']}")
+                if bundle['claimed']:
+                    print(f"                Claimant: {bundle['claimant']} ({display_time(bundle['claim_timestamp'])})")
+                print(f"            Files: {bundle['file_count']}")
+    return EXIT_OK
+
+
+async def request_update_status(args: Namespace) -> ExitCode:
+    """Update the status of a TransferRequest in the LTA DB."""
+    right_now = now()
+    patch_body = {}
+    patch_body["status"] = args.new_status
+    patch_body["update_timestamp"] = right_now
+    if not args.keep_claim:
+        patch_body["claimed"] = False
+    if not args.keep_priority:
+        patch_body["work_priority_timestamp"] = right_now
+    await args.di["lta_rc"].request("PATCH", f"/TransferRequests/{args.uuid}", patch_body)
+    return EXIT_OK
@@ -0,0 +1,191 @@
+# snapshot.py
+"""The 'snapshot' subcommands of lta_cmd, and the read-only LTA DB they create."""
+
+# fmt:off
+
+import json
+import os
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from requests import Response
+from requests.exceptions import HTTPError
+
+from lta.cmd.common import EXIT_OK, ExitCode, Namespace
+from lta.cmd.lta_db import _get_bundles
+from lta.utils import now
+
+# how many Bundles to ask the LTA DB for (and write to the snapshot) at a time
+SNAPSHOT_BATCH_SIZE = 1000
+
+# the fields of each Bundle that GET /Dashboard returns
+SNAPSHOT_DASHBOARD_FIELDS = ["claim_timestamp", "claimant", "claimed", "create_timestamp", "path",
+                             "request", "status", "type", "update_timestamp", "uuid"]
+
+# the most parameters to put in one SQL query; older SQLite allows 999
+SNAPSHOT_MAX_PARAMETERS = 900
+
+SNAPSHOT_SCHEMA = """
+CREATE TABLE snapshot (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE bundles (uuid TEXT PRIMARY KEY, request TEXT, status TEXT, create_timestamp TEXT, doc TEXT NOT NULL);
+CREATE INDEX bundles_request ON bundles (request, create_timestamp);
+CREATE INDEX bundles_status ON bundles (status);
+CREATE TABLE transfer_requests (uuid TEXT PRIMARY KEY, status TEXT, create_timestamp TEXT, doc TEXT NOT NULL);
+CREATE INDEX transfer_requests_create_timestamp ON transfer_requests (create_timestamp);
+"""
+
+
+def _not_found(path: str) -> HTTPError:
+    """Create the error that RestClient raises when the LTA DB answers 404."""
+    response = Response()
+    response.status_code = 404
+    response.reason = "not found"
+    return HTTPError(f"404 Client Error: not found for url: {path}", response=response)
+
+
+def _project(doc: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    """Keep only the provided fields (and the uuid) of the document."""
+    if fields is None:
+        return doc
+    return {key: value for key, value in doc.items() if (key == "uuid") or (key in fields)}
+
+
+class SnapshotClient:
+    """
+    SnapshotClient answers the read-only requests of lta_cmd from a snapshot.
+
+    It stands in for the RestClient of the LTA DB, so the subcommands don't
+    need to know where their answers come from. It answers the routes that
+    the read-only subcommands use, and refuses to change anything.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Open the snapshot file, read-only."""
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"snapshot {path} does not exist")
+        self.db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+    def close(self) -> None:
+        """Close the snapshot file."""
+        self.db.close()
+
+    async def request(self, method: str, path: str, args: Optional[Dict[str, Any]] = None) -> Any:
+        """Answer a request to the LTA DB from the snapshot."""
+        url = urlsplit(path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        route = url.path.strip("/").split("/")
+        if method == "GET":
+            if route == ["Bundles"]:
+                return self._get_bundles(query)
+            if (len(route) == 2) and (route[0] == "Bundles"):
+                return self._get_one("bundles", route[1], path)
+            if route == ["Dashboard"]:
+                return self._get_dashboard(query)
+            if route == ["TransferRequests"]:
+                return {"results": [json.loads(doc) for (doc,) in self.db.execute("SELECT doc FROM transfer_requests")]}
+            if (len(route) == 2) and (route[0] == "TransferRequests"):
+                return self._get_one("transfer_requests", route[1], path)
+        if (method == "POST") and (route == ["Bundles", "actions", "bulk_get"]):
+            bundles = [_project(doc, (args or {}).get("fields")) for doc in self._bundles_by_uuid((args or {}).get("bundles", []))]
+            return {"bundles": bundles, "count": len(bundles)}
+        if method != "GET":
+            raise Exception(f"{method} {path}: the snapshot is read-only")
+        raise _not_found(path)
+
+    def _bundles_by_uuid(self, uuids: List[str]) -> Iterable[Dict[str, Any]]:
+        for i in range(0, len(uuids), SNAPSHOT_MAX_PARAMETERS):
+            chunk = uuids[i:i + SNAPSHOT_MAX_PARAMETERS]
+            sql = f"SELECT doc FROM bundles WHERE uuid IN ({','.join('?' * len(chunk))})"
+            for (doc,) in self.db.execute(sql, chunk):
+                yield json.loads(doc)
+
+    def _get_bundles(self, query: Dict[str, str]) -> Dict[str, Any]:
+        sql = "SELECT doc FROM bundles WHERE 1=1"
+        params: List[str] = []
+        for column in ["request", "status"]:
+            if column in query:
+                sql += f" AND {column} = ?"
+                params.append(query[column])
+        docs = [json.loads(doc) for (doc,) in self.db.execute(sql, params)]
+        if "location" in query:
+            docs = [doc for doc in docs if doc.get("source", "").startswith(query["location"])]
+        if "verified" in query:
+            verified = query["verified"].lower() in ["1", "on", "t", "true", "y", "yes"]
+            docs = [doc for doc in docs if doc.get("verified") == verified]
+        if "fields" in query:
+            fields = query["fields"].split(",")
+            return {"results": [_project(doc, fields) for doc in docs]}
+        return {"results": [doc["uuid"] for doc in docs]}
+
+    def _get_dashboard(self, query: Dict[str, str]) -> Dict[str, Any]:
+        sql = "SELECT doc FROM transfer_requests"
+        params: List[str] = []
+        if query.get("uuid"):
+            sql += " WHERE uuid = ?"
+            params.append(query["uuid"])
+        elif query.get("active_only", "false").lower() in ["1", "on", "t", "true", "y", "yes"]:
+            sql += " WHERE status != 'finished'"
+        sql += " ORDER BY create_timestamp"
+        if query.get("limit"):
+            sql += " LIMIT ?"
+            params.append(query["limit"])
+        requests = [json.loads(doc) for (doc,) in self.db.execute(sql, params)]
+        for request in requests:
+            rows = self.db.execute("SELECT doc FROM bundles WHERE request = ? ORDER BY create_timestamp", (request["uuid"],))
+            request["bundles"] = [_project(json.loads(doc), SNAPSHOT_DASHBOARD_FIELDS) for (doc,) in rows]
+        return {"results": requests}
+
+    def _get_one(self, table: str, uuid: str, path: str) -> Dict[str, Any]:
+        row = self.db.execute(f"SELECT doc FROM {table} WHERE uuid = ?", (uuid,)).fetchone()
+        if row is None:
+            raise _not_found(path)
+        return json.loads(row[0])
+
+
+def _insert(db: sqlite3.Connection, table: str, docs: List[Dict[str, Any]]) -> None:
+    """Write the provided documents to the snapshot."""
+    if not docs:
+        return
+    rows: List[Tuple[Any, ...]] = []
+    for doc in docs:
+        if table == "bundles":
+            rows.append((doc["uuid"], doc.get("request"), doc.get("status"), doc.get("create_timestamp"), json.dumps(doc)))
+        else:
+            rows.append((doc["uuid"], doc.get("status"), doc.get("create_timestamp"), json.dumps(doc)))
+    placeholders = ",".join("?" * len(rows[0]))
+    with db:
+        db.executemany(f"INSERT OR REPLACE INTO {table} VALUES ({placeholders})", rows)
+
+
+async def snapshot_export(args: Namespace) -> ExitCode:
+    """Export the Bundles and TransferRequests of the LTA DB to a snapshot file."""
+    rc = args.di["lta_rc"]
+    # write to a temporary file, so a failed export doesn't clobber a good snapshot
+    temp_path = f"{args.output}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    db = sqlite3.connect(temp_path)
+    try:
+        with db:
+            db.executescript(SNAPSHOT_SCHEMA)
+            db.executemany("INSERT INTO snapshot VALUES (?, ?)", [
+                ("create_timestamp", now()),
+                ("lta_rest_url", str(args.di["config"].get("LTA_REST_URL"))),
+            ])
+        response = await rc.request("GET", "/TransferRequests")
+        requests = response["results"]
+        _insert(db, "transfer_requests", requests)
+        # fetch the Bundles a batch at a time, writing each batch as it arrives
+        response = await rc.request("GET", "/Bundles")
+        uuids = response["results"]
+        for i in range(0, len(uuids), SNAPSHOT_BATCH_SIZE):
+            _insert(db, "bundles", await _get_bundles(rc, uuids[i:i + SNAPSHOT_BATCH_SIZE]))
+    except BaseException:
+        db.close()
+        os.remove(temp_path)
+        raise
+    db.close()
+    os.replace(temp_path, args.output)
+    print(f"Exported {len(requests)} TransferRequests and {len(uuids)} Bundles to {args.output}")
+    return EXIT_OK
@@ -0,0 +1,126 @@
+# command.py
+"""Module to run external commands without blocking the event loop."""
+
+# fmt:off
+
+import asyncio
+from asyncio.subprocess import PIPE, Process
+from logging import Logger
+import os
+from subprocess import CompletedProcess
+import time
+from typing import Callable, List, Optional
+
+from prometheus_client import Counter, Histogram
+
+from .utils import CommandTimeoutException
+
+# the longest line of output we are willing to read from a command
+STREAM_LIMIT = 1024 * 1024
+# how long to wait for a killed command to exit, so it doesn't linger as a zombie
+REAP_TIMEOUT_SECONDS = 5
+
+LineCallback = Callable[[str], None]
+
+# Prometheus metrics
+# -- make module-level so these are shared within this process (else, dups overwrite)
+
+PROMETHEUS_COMMAND_DURATION = Histogram(
+    "lta_command_duration_seconds",
+    "LTA component: time taken by an external command (hsi, myquota, ...)",
+    labelnames=("command", "returncode"),
+    buckets=[0.1, 0.5, 1, 5, 10, 30, 60, 300, 600, 1800, 3600, 7200, 14400, 28800],
+)
+
+PROMETHEUS_COMMAND_EXITS_TOTAL = Counter(
+    "lta_command_exits_total",
+    "LTA component: count of external commands by exit code ('timeout' if killed at its deadline)",
+    labelnames=("command", "returncode"),
+)
+
+
+def _observe(command: str, returncode: str, start: float) -> None:
+    """Record the duration and exit code of a command."""
+    PROMETHEUS_COMMAND_DURATION.labels(command=command, returncode=returncode).observe(time.monotonic() - start)
+    PROMETHEUS_COMMAND_EXITS_TOTAL.labels(command=command, returncode=returncode).inc()
+
+
+def _kill(process: Process) -> None:
+    """Kill the process, if it is still running."""
+    if process.returncode is None:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+
+
+async def _reap(process: Process, logger: Logger) -> None:
+    """Kill the process, if it is still running, and wait for it to exit."""
+    _kill(process)
+    try:
+        # shielded, so a caller that is cancelled again doesn't leave the process unreaped
+        await asyncio.wait_for(asyncio.shield(process.wait()), REAP_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logger.warning(f"Process {process.pid} did not exit within {REAP_TIMEOUT_SECONDS} seconds of being killed")
+
+
+async def _read_lines(stream: Optional[asyncio.StreamReader], on_line: LineCallback) -> None:
+    """Hand each line of the stream to the callback, as it is produced."""
+    if stream is None:
+        return
+    while True:
+        line = await stream.readline()
+        if not line:
+            break
+        on_line(line.decode("utf-8", errors="replace").rstrip("\n"))
+
+
+async def run_command(
+    args: List[str],
+    logger: Logger,
+    timeout: Optional[float] = None,
+    on_line: Optional[LineCallback] = None,
+) -> CompletedProcess:
+    """
+    Run the provided command and return a CompletedProcess, like subprocess.run.
+
+    If on_line is provided, it is called with each line of stdout as the
+    command produces it, and stdout is not kept in memory. Otherwise the
+    stdout of the command is returned in the CompletedProcess. The stderr
+    of the command is always returned.
+
+    If the command does not finish within timeout seconds, it is killed and
+    CommandTimeoutException is raised. If the caller is cancelled while the
+    command is running, the command is killed.
+    """
+    command = os.path.basename(args[0])
+    stdout: List[str] = []
+    stderr: List[str] = []
+    logger.debug(f"Running command: {args}")
+    start = time.monotonic()
+    process = await asyncio.create_subprocess_exec(*args, stdout=PIPE, stderr=PIPE, limit=STREAM_LIMIT)
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(
+                _read_lines(process.stdout, on_line if on_line else stdout.append),
+                _read_lines(process.stderr, stderr.append),
+                process.wait(),
+            ),
+            timeout,
+        )
+    except asyncio.TimeoutError:
+        await _reap(process, logger)
+        _observe(command, "timeout", start)
+        raise CommandTimeoutException(args, timeout, logger)
+    finally:
+        # if we were cancelled (or anything else went wrong), don't leave the command running
+        await _reap(process, logger)
+    returncode = process.returncode if process.returncode is not None else -1
+    _observe(command, str(returncode), start)
+    logger.debug(f"Command {args} returncode: {returncode} ({time.monotonic() - start:.3f} seconds)")
+    return CompletedProcess(
+        args,
+        returncode,
+        "".join(f"{line}\n" for line in stdout).encode("utf-8"),
+        "".join(f"{line}\n" for line in stderr).encode("utf-8"),
+    )
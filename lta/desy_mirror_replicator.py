@@ -28,10 +28,16 @@ EXPECTED_CONFIG.update({
     "DEST_URL": None,
     # path of the archival root at DESY; '/pnfs/ifh.de/acs/icecube/archive'
     "DEST_BASE_PATH": None,
+    # how long to remember that a directory exists at DESY; 0 to always ask
+    "DIR_CACHE_TTL_SECONDS": "600",
     # local source directory for the bundles; '/data/user/jadelta/ltatemp/bundler_todesy'
     "INPUT_PATH": None,
     # number of parallel operations to allow on the WebDAV server
     "MAX_PARALLEL": "100",
+    # upload bandwidth shared by all of the uploads of this component, in bytes per second; 0 for no limit
+    "MAX_SEND_BYTES_PER_SECOND": "0",
+    # file that may hold a new value for MAX_SEND_BYTES_PER_SECOND, checked before each upload
+    "MAX_SEND_BYTES_PER_SECOND_FILE": "max-send-bytes-per-second",
 })
 
 # logging
@@ -64,6 +70,9 @@ class DesyMirrorReplicator(Component):
         self.dest_base_path = config["DEST_BASE_PATH"]
         self.dest_url = config["DEST_URL"]
         self.input_path = config["INPUT_PATH"]
+        self.max_send_bytes_per_second_file = config["MAX_SEND_BYTES_PER_SECOND_FILE"]
+        # one Sync for the life of the component, so connections to DESY are reused
+        self.sync: Optional[Sync] = None
 
     def _do_status(self) -> dict[str, Any]:
         """DesyMirrorReplicator has no additional status to contribute."""
@@ -118,11 +127,13 @@ class DesyMirrorReplicator(Component):
         basename = os.path.basename(bundle["bundle_path"])
         stupid_python_path = os.path.sep.join([data_warehouse_path, basename])
         dest_path = os.path.normpath(stupid_python_path)
-        # create Sync to transfer to DESY
-        sync = Sync(self.config)
+        # create Sync to transfer to DESY (the first time through)
+        if self.sync is None:
+            self.sync = Sync(self.config)
+        self._update_bandwidth_limit(self.sync)
         try:
             LOG.info(f"Replicating {bundle_path} -> {dest_path}")
-            await sync.put_path(bundle_path, dest_path, int(self.work_timeout_seconds))
+            checksum_sha512 = await self.sync.put_path(bundle_path, dest_path, int(self.work_timeout_seconds))
         except Exception as e:
             self.logger.error(f'DESY Sync raised an Exception: {e}')
             raise e
@@ -137,10 +148,28 @@ class DesyMirrorReplicator(Component):
             "update_timestamp": now(),
             "claimed": False,
             "transfer_reference": "desy-mirror-replicator",
+            "transfer_checksum": {
+                "sha512": checksum_sha512,
+                "service": "desy-webdav",
+            },
         }
         self.logger.info(f"PATCH /Bundles/{bundle_id} - '{patch_body}'")
         await lta_rc.request('PATCH', f'/Bundles/{bundle_id}', patch_body)
 
+    def _update_bandwidth_limit(self, sync: Sync) -> None:
+        """Apply the bandwidth limit from MAX_SEND_BYTES_PER_SECOND_FILE, if there is one."""
+        try:
+            with open(self.max_send_bytes_per_second_file) as f:
+                rate = float(f.read().strip())
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            self.logger.warning(f"Unable to read the bandwidth limit from {self.max_send_bytes_per_second_file}: {e}")
+            return
+        if rate != sync.bandwidth.rate:
+            self.logger.info(f"Changing the bandwidth limit from {sync.bandwidth.rate} to {rate} bytes per second")
+            sync.bandwidth.set_rate(rate)
+
 
 async def main(desy_mirror_replicator: DesyMirrorReplicator) -> None:
     """Execute the work loop of the DesyMirrorReplicator component."""
@@ -6,7 +6,7 @@ import logging
 import sys
 import uuid
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 import globus_sdk
 from prometheus_client import start_http_server
@@ -17,7 +17,7 @@ from .component import COMMON_CONFIG, Component, work_loop, PrometheusResultTrac
 from .utils import now, quarantine_now
 from .lta_tools import from_environment
 from .lta_types import BundleType
-from .transfer.globus import GlobusTransfer
+from .transfer.globus import GlobusTransfer, GlobusTransferFailedException
 
 # fmt:off
 
@@ -27,7 +27,11 @@ LOG = logging.getLogger(__name__)
 
 EXPECTED_CONFIG = COMMON_CONFIG.copy()
 EXPECTED_CONFIG.update({
+    # maximum number of bundles to replicate in a single Globus transfer task
+    "MAX_COUNT": "10",
     "USE_FULL_BUNDLE_PATH": "FALSE",
+    # FALSE: don't wait for the transfer; the GlobusTracker advances the bundle when it finishes
+    "WAIT_FOR_TRANSFER": "TRUE",
     "WORK_RETRIES": "3",
     "WORK_TIMEOUT_SECONDS": "30",
     "GLOBUS_REPLICATOR_DEST_DIRPATH": None,  # required
@@ -56,6 +60,24 @@ class TransferReferenceToolkit:
             return None
 
 
+def get_bundle_checksum(bundle: BundleType) -> Optional[str]:
+    """Get the SHA512 checksum of the bundle, computed when it was created."""
+    return bundle.get("checksum", {}).get("sha512")
+
+
+def globus_checksum_updates(bundle: BundleType, dest_path: Path, verified: set[str]) -> Dict[str, Any]:
+    """Record the checksum of the bundle, if Globus verified it at the destination."""
+    checksum = get_bundle_checksum(bundle)
+    if (not checksum) or (str(dest_path) not in verified):
+        return {}
+    return {
+        "transfer_checksum": {
+            "sha512": checksum,
+            "service": "globus",
+        },
+    }
+
+
 class GlobusReplicator(Component):
     """
     GlobusReplicator is a Long Term Archive component.
@@ -66,8 +88,14 @@ class GlobusReplicator(Component):
     to the destination(s), (i.e.: DESY, NERSC DTN).
 
     It uses the LTA DB to find completed bundles that need to be replicated.
-    It issues a Globus transfer command. It updates the Bundle and the
-    corresponding TransferRequest in the LTA DB with a 'transferring' status.
+    It claims up to MAX_COUNT bundles and issues a single Globus transfer
+    command for all of them. It updates each Bundle and the corresponding
+    TransferRequest in the LTA DB with a 'transferring' status; only the
+    Bundles that Globus failed to transfer are quarantined.
+
+    If WAIT_FOR_TRANSFER is FALSE, it releases the Bundles as soon as the
+    transfer is submitted (i.e.: with a 'transfer-submitted' status), and
+    leaves waiting for the transfer to the GlobusTracker.
     """
 
     def __init__(self, config: Dict[str, str], logger: Logger) -> None:
@@ -78,7 +106,9 @@ class GlobusReplicator(Component):
         logger - The object the replicator should use for logging.
         """
         super().__init__("replicator", config, logger)
+        self.max_count = int(config["MAX_COUNT"])
         self.use_full_bundle_path = strtobool(config["USE_FULL_BUNDLE_PATH"])
+        self.wait_for_transfer = strtobool(config["WAIT_FOR_TRANSFER"])
         self.work_retries = int(config["WORK_RETRIES"])
         self.work_timeout_seconds = float(config["WORK_TIMEOUT_SECONDS"])
         self.globus_replicator_dest_dirpath = Path(config["GLOBUS_REPLICATOR_DEST_DIRPATH"])
@@ -99,35 +129,79 @@ class GlobusReplicator(Component):
         lta_rc: RestClient,
         prom_tracker: PrometheusResultTracker,
     ) -> bool:
-        """Claim a bundle and perform work on it -- see super for return value meanings."""
-        # 1. Ask the LTA DB for the next Bundle to be transferred
-        self.logger.info("Asking the LTA DB for a Bundle to transfer.")
-        pop_body = {
-            "claimant": f"{self.name}-{self.instance_uuid}"
-        }
-        response = await lta_rc.request('POST', f'/Bundles/actions/pop?source={self.source_site}&dest={self.dest_site}&status={self.input_status}', pop_body)
-        self.logger.info(f"LTA DB responded with: {response}")
-        bundle = response["bundle"]
-        if not bundle:
+        """Claim a batch of bundles and perform work on them -- see super for return value meanings."""
+        # 1. Ask the LTA DB for the next Bundles to be transferred
+        bundles = await self._claim_bundles(lta_rc)
+        if not bundles:
             self.logger.info("LTA DB did not provide a Bundle to transfer. Going on vacation.")
             return False
 
-        # process the Bundle that we were given
+        # process the Bundles that we were given
         try:
-            await self._replicate_bundle_to_destination_site(lta_rc, bundle)
-            prom_tracker.record_success()
-            return True
+            if len(bundles) == 1:
+                await self._replicate_bundle_to_destination_site(lta_rc, bundles[0])
+                outcomes: Dict[str, Optional[Exception]] = {bundles[0]["uuid"]: None}
+            else:
+                outcomes = await self._replicate_bundles_to_destination_site(lta_rc, bundles)
         except Exception as e:
+            for bundle in bundles:
+                prom_tracker.record_failure()
+                await quarantine_now(
+                    lta_rc,
+                    bundle,
+                    e,
+                    self.name,
+                    self.instance_uuid,
+                    self.logger,
+                )
+            raise e
+        # 2. Quarantine only the Bundles that failed to transfer
+        await self._report_outcomes(lta_rc, prom_tracker, bundles, outcomes)
+        return True
+
+    async def _claim_bundles(self, lta_rc: RestClient) -> List[BundleType]:
+        """Ask the LTA DB for up to max_count Bundles to transfer."""
+        self.logger.info(f"Asking the LTA DB for up to {self.max_count} Bundles to transfer.")
+        pop_body = {
+            "claimant": f"{self.name}-{self.instance_uuid}"
+        }
+        bundles: List[BundleType] = []
+        while len(bundles) < self.max_count:
+            response = await lta_rc.request('POST', f'/Bundles/actions/pop?source={self.source_site}&dest={self.dest_site}&status={self.input_status}', pop_body)
+            self.logger.info(f"LTA DB responded with: {response}")
+            bundle = response["bundle"]
+            if not bundle:
+                break
+            bundles.append(bundle)
+        return bundles
+
+    async def _report_outcomes(
+        self,
+        lta_rc: RestClient,
+        prom_tracker: PrometheusResultTracker,
+        bundles: List[BundleType],
+        outcomes: Dict[str, Optional[Exception]],
+    ) -> None:
+        """Count each Bundle of the batch as a success, or quarantine it, according to its outcome."""
+        failures: List[Exception] = []
+        for bundle in bundles:
+            error = outcomes[bundle["uuid"]]
+            if error is None:
+                prom_tracker.record_success()
+                continue
             prom_tracker.record_failure()
             await quarantine_now(
                 lta_rc,
                 bundle,
-                e,
+                error,
                 self.name,
                 self.instance_uuid,
                 self.logger,
             )
-            raise e
+            failures.append(error)
+        # if nothing in the batch could be transferred, stop and let an operator take a look
+        if failures and len(failures) == len(bundles):
+            raise failures[0]
 
     def _extract_paths(self, bundle: BundleType) -> tuple[Path, Path]:
         """Get the source and destination paths for the supplied bundle."""
@@ -150,6 +224,100 @@ class GlobusReplicator(Component):
         self.logger.info(f"PATCH /Bundles/{bundle_id} - '{patch_body}'")
         await lta_rc.request('PATCH', f'/Bundles/{bundle_id}', patch_body)
 
+    async def _replicate_bundles_to_destination_site(
+        self,
+        lta_rc: RestClient,
+        bundles: List[BundleType],
+    ) -> Dict[str, Optional[Exception]]:
+        """
+        Replicate the supplied bundles with a single Globus transfer task.
+
+        Return a dictionary mapping the uuid of each bundle to None, if it
+        was transferred and advanced, or the Exception describing why it
+        was not.
+        """
+        # get our ducks in a row
+        paths = {bundle["uuid"]: self._extract_paths(bundle) for bundle in bundles}
+        checksums = {}
+        for bundle in bundles:
+            if checksum := get_bundle_checksum(bundle):
+                checksums[paths[bundle["uuid"]][0]] = checksum
+
+        # Transfer the bundles
+        self.logger.info(f'Sending {len(bundles)} bundles in one transfer')
+        try:
+            task_id = await self.globus_transfer.transfer_files(items=list(paths.values()), checksums=checksums)
+        # ERROR -> globus possibly caught an inflight duplicate transfer
+        except globus_sdk.TransferAPIError as e:
+            if "A transfer with identical paths has not yet completed" in str(e):
+                # we can't tell which of the bundles is the duplicate, so fall back
+                # to one transfer per bundle; each can recover its own transfer_reference
+                self.logger.warning("OK: globus caught inflight duplicate; transferring bundles one at a time")
+                return await self._replicate_bundles_one_at_a_time(lta_rc, bundles)
+            raise
+        self.logger.info(f'Initiated transfer {task_id=} of {len(bundles)} bundles')
+
+        # record task_id in the LTA DB
+        for bundle in bundles:
+            _, dest_path = paths[bundle["uuid"]]
+            await self._patch_bundle(
+                lta_rc,
+                bundle["uuid"],
+                {
+                    "transfer_dest_path": str(dest_path),
+                    "final_dest_location": {  # in nersc pipelines: this is overwritten by nersc-verifier
+                        "path": str(dest_path),
+                    },
+                    "update_timestamp": now(),
+                    "transfer_reference": TransferReferenceToolkit.to_transfer_reference(task_id),
+                }
+            )
+
+        # Wait for transfer to finish, and find out what happened to each bundle
+        dest_paths = [dest_path for _, dest_path in paths.values()]
+        if self.wait_for_transfer:
+            results = await self.globus_transfer.wait_for_transfers_to_finish(task_id, dest_paths)
+            verified = await self.globus_transfer.get_verified_paths(task_id, dest_paths)
+        else:
+            # the GlobusTracker will find out, when the transfer is finished
+            results = {str(dest_path): None for dest_path in dest_paths}
+            verified = set()
+        outcomes: Dict[str, Optional[Exception]] = {}
+        for bundle in bundles:
+            _, dest_path = paths[bundle["uuid"]]
+            error = results.get(str(dest_path), GlobusTransferFailedException(f"Globus did not report on {dest_path}: {task_id=}"))
+            outcomes[bundle["uuid"]] = error
+            if error:
+                continue
+            # Unclaim and Advance -- update the Bundle in the LTA DB
+            await self._patch_bundle(
+                lta_rc,
+                bundle["uuid"],
+                {
+                    "status": self.output_status,
+                    "reason": "",
+                    "update_timestamp": now(),
+                    "claimed": False,
+                    **globus_checksum_updates(bundle, dest_path, verified),
+                }
+            )
+        return outcomes
+
+    async def _replicate_bundles_one_at_a_time(
+        self,
+        lta_rc: RestClient,
+        bundles: List[BundleType],
+    ) -> Dict[str, Optional[Exception]]:
+        """Replicate the supplied bundles with one Globus transfer task each."""
+        outcomes: Dict[str, Optional[Exception]] = {}
+        for bundle in bundles:
+            try:
+                await self._replicate_bundle_to_destination_site(lta_rc, bundle)
+                outcomes[bundle["uuid"]] = None
+            except Exception as e:
+                outcomes[bundle["uuid"]] = e
+        return outcomes
+
     async def _replicate_bundle_to_destination_site(self, lta_rc: RestClient, bundle: BundleType) -> None:
         """Replicate the supplied bundle using the configured transfer service."""
         # get our ducks in a row
@@ -157,7 +325,7 @@ class GlobusReplicator(Component):
         source_path, dest_path = self._extract_paths(bundle)
         inflight_dup_origin_task_id = None
         task_id: uuid.UUID | str | None = None
-        extra_updates = {}
+        extra_updates: Dict[str, Any] = {}
 
         # Transfer the bundle
         self.logger.info(f'Sending {source_path} to {dest_path}')
@@ -165,6 +333,7 @@ class GlobusReplicator(Component):
             task_id = await self.globus_transfer.transfer_file(
                 source_path=source_path,
                 dest_path=dest_path,
+                checksum=get_bundle_checksum(bundle),
             )
             self.logger.info(f'Initiated transfer {source_path} to {dest_path}')
         # ERROR -> globus possibly caught this inflight duplicate transfer
@@ -193,10 +362,14 @@ class GlobusReplicator(Component):
             )
 
         # Wait for transfer to finish
-        if task_id:
-            await self.globus_transfer.wait_for_transfer_to_finish(task_id)
-        elif inflight_dup_origin_task_id:
-            await self.globus_transfer.wait_for_transfer_to_finish(inflight_dup_origin_task_id)
+        wait_task_id = task_id or inflight_dup_origin_task_id
+        if not self.wait_for_transfer:
+            # the GlobusTracker will wait for it, and advance the bundle when it is finished
+            self.logger.info("OK: leaving transfer for the tracker")
+        elif wait_task_id:
+            await self.globus_transfer.wait_for_transfer_to_finish(wait_task_id)
+            verified = await self.globus_transfer.get_verified_paths(wait_task_id, [dest_path])
+            extra_updates = globus_checksum_updates(bundle, dest_path, verified)
         else:
             # Since we cannot track the bundle transfer, reset 'work_priority_timestamp'.
             #    This way, the Site Move Verifier component will check this bundle
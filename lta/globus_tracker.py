@@ -0,0 +1,236 @@
+# globus_tracker.py
+"""Module to implement the GlobusTracker component of the Long Term Archive."""
+
+import asyncio
+import logging
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from prometheus_client import start_http_server
+from rest_tools.client import RestClient
+
+from .component import COMMON_CONFIG, Component, work_loop, PrometheusResultTracker
+from .globus_replicator import globus_checksum_updates, TransferReferenceToolkit
+from .utils import now, quarantine_now
+from .lta_tools import from_environment
+from .lta_types import BundleType
+from .transfer.globus import GlobusTransfer, GlobusTransferFailedException
+
+# fmt:off
+
+Logger = logging.Logger
+
+LOG = logging.getLogger(__name__)
+
+EXPECTED_CONFIG = COMMON_CONFIG.copy()
+EXPECTED_CONFIG.update({
+    # maximum number of bundles to check on in a single round of polling
+    "MAX_COUNT": "500",
+    "WORK_RETRIES": "3",
+    "WORK_TIMEOUT_SECONDS": "30",
+})
+
+
+# the fields of each Bundle that the tracker needs to check on its transfer
+TRACKER_FIELDS = "uuid,type,status,claimed,work_priority_timestamp,checksum,transfer_reference,transfer_dest_path"
+
+
+class GlobusTracker(Component):
+    """
+    GlobusTracker is a Long Term Archive component.
+
+    A GlobusTracker waits on the Globus transfers submitted by a
+    GlobusReplicator that does not wait for them (WAIT_FOR_TRANSFER=FALSE).
+    This way, a single process can keep track of hundreds of transfers.
+
+    It uses the LTA DB to find bundles that have a 'transfer-submitted'
+    status. It looks at up to MAX_COUNT of them, the ones whose transfers
+    it checked on least recently first, and asks Globus about all of their
+    transfers at once. The Bundles whose transfers have finished are
+    updated in the LTA DB to have a 'transferring' status with a single
+    request, or quarantined if Globus failed to transfer them. The Bundles
+    whose transfers are still in flight are not written to at all.
+    """
+
+    def __init__(self, config: Dict[str, str], logger: Logger) -> None:
+        """
+        Create a GlobusTracker component.
+
+        config - A dictionary of required configuration values.
+        logger - The object the tracker should use for logging.
+        """
+        super().__init__("globus_tracker", config, logger)
+        self.max_count = int(config["MAX_COUNT"])
+        self.work_retries = int(config["WORK_RETRIES"])
+        self.work_timeout_seconds = float(config["WORK_TIMEOUT_SECONDS"])
+
+        self.globus_transfer = GlobusTransfer()
+        # the round of polling in which each transfer was last checked on
+        self.last_polled: Dict[str, int] = {}
+        self.polls = 0
+
+    def _do_status(self) -> Dict[str, Any]:
+        """GlobusTracker has no additional status to contribute."""
+        return {}
+
+    def _expected_config(self) -> Dict[str, Optional[str]]:
+        """GlobusTracker provides our expected configuration dictionary."""
+        return EXPECTED_CONFIG
+
+    async def _do_work_claim(
+        self,
+        lta_rc: RestClient,
+        prom_tracker: PrometheusResultTracker,
+    ) -> bool:
+        """Check on a batch of transfers and settle the bundles they carried -- see super for return value meanings."""
+        # 1. Ask the LTA DB which Bundles have transfers to check on
+        bundles = await self._find_bundles(lta_rc)
+        if not bundles:
+            self.logger.info("LTA DB did not provide a Bundle to check on. Going on vacation.")
+            return False
+
+        # 2. Group the Bundles by the transfer that is carrying them
+        tasks: Dict[str, List[BundleType]] = {}
+        updates: Dict[str, Dict[str, Any]] = {}
+        for bundle in bundles:
+            task_id = TransferReferenceToolkit.to_task_id(bundle)
+            if task_id:
+                tasks.setdefault(task_id, []).append(bundle)
+                continue
+            # Since we cannot track the bundle transfer, reset 'work_priority_timestamp'.
+            #    This way, the Site Move Verifier component will check this bundle
+            #    relatively later than it would if we normally just advanced it.
+            self.logger.info(f"OK: cannot track transfer of Bundle {bundle['uuid']}, assuming it finished")
+            updates[bundle["uuid"]] = self._advance_update({"work_priority_timestamp": now()})
+            prom_tracker.record_success()
+        finished = len(updates)
+
+        # 3. Ask Globus about all of the transfers at once
+        self.polls += 1
+        statuses = await self.globus_transfer.get_task_statuses(list(tasks))
+        for task_id, task_bundles in tasks.items():
+            self.last_polled[task_id] = self.polls
+            status = statuses.get(task_id)
+            match status:
+                case "SUCCEEDED":
+                    task_error = None
+                case "FAILED" | "INACTIVE":
+                    task_error = GlobusTransferFailedException(f"Globus transfer failed ({status=}): {task_id=}")
+                case _:
+                    if status is None:
+                        self.logger.warning(f"Globus did not report on transfer {task_id=} — checking again later...")
+                    # still in flight; leave its Bundles alone and check on it again later
+                    continue
+            # 4. Decide the fate of each Bundle of a finished transfer
+            finished += await self._settle_task(lta_rc, prom_tracker, task_id, task_bundles, task_error, updates)
+
+        # 5. Advance the Bundles that finished transferring, all at once
+        await self._advance_bundles(lta_rc, updates)
+
+        # if every transfer is still in flight, wait a while before checking again
+        self.logger.info(f"{finished} of {len(bundles)} Bundles have finished transferring.")
+        return finished > 0
+
+    async def _find_bundles(self, lta_rc: RestClient) -> List[BundleType]:
+        """Ask the LTA DB for up to max_count unclaimed Bundles whose transfers need checking on."""
+        self.logger.info(f"Asking the LTA DB for up to {self.max_count} Bundles with transfers to check on.")
+        response = await lta_rc.request('GET', f'/Bundles?source={self.source_site}&dest={self.dest_site}&status={self.input_status}&fields={TRACKER_FIELDS}')
+        bundles: List[BundleType] = [bundle for bundle in response["results"] if not bundle.get("claimed")]
+        # forget about the transfers that nobody is waiting on anymore
+        task_ids = {TransferReferenceToolkit.to_task_id(bundle) for bundle in bundles}
+        self.last_polled = {task_id: poll for task_id, poll in self.last_polled.items() if task_id in task_ids}
+        # check on the transfers that we haven't looked at for the longest time first
+        bundles.sort(key=lambda bundle: (
+            self.last_polled.get(TransferReferenceToolkit.to_task_id(bundle) or "", 0),
+            bundle.get("work_priority_timestamp", ""),
+        ))
+        self.logger.info(f"LTA DB provided {len(bundles)} Bundles to check on.")
+        return bundles[:self.max_count]
+
+    async def _settle_task(
+        self,
+        lta_rc: RestClient,
+        prom_tracker: PrometheusResultTracker,
+        task_id: str,
+        task_bundles: List[BundleType],
+        task_error: Optional[GlobusTransferFailedException],
+        updates: Dict[str, Dict[str, Any]],
+    ) -> int:
+        """Quarantine the Bundles of a finished transfer that failed, and add the rest to the updates; return how many were settled."""
+        dest_paths = [Path(bundle["transfer_dest_path"]) for bundle in task_bundles if bundle.get("transfer_dest_path")]
+        results = await self.globus_transfer.get_item_results(task_id, dest_paths, task_error)
+        verified = await self.globus_transfer.get_verified_paths(task_id, dest_paths)
+        for bundle in task_bundles:
+            dest_path = Path(bundle.get("transfer_dest_path", ""))
+            error = results.get(str(dest_path), task_error)
+            if error is None:
+                updates[bundle["uuid"]] = self._advance_update(globus_checksum_updates(bundle, dest_path, verified))
+                prom_tracker.record_success()
+                continue
+            prom_tracker.record_failure()
+            await quarantine_now(
+                lta_rc,
+                bundle,
+                error,
+                self.name,
+                self.instance_uuid,
+                self.logger,
+            )
+        return len(task_bundles)
+
+    def _advance_update(self, extra_updates: Dict[str, Any]) -> Dict[str, Any]:
+        """Create the update that advances a Bundle to the output status."""
+        return {
+            "status": self.output_status,
+            "reason": "",
+            "update_timestamp": now(),
+            **extra_updates,
+        }
+
+    async def _advance_bundles(self, lta_rc: RestClient, updates: Dict[str, Dict[str, Any]]) -> None:
+        """Advance the Bundles in the LTA DB, unless somebody else got to them first."""
+        if not updates:
+            return
+        body = {
+            "updates": updates,
+            "if_status": self.input_status,
+        }
+        self.logger.info(f"POST /Bundles/actions/bulk_update - advancing {len(updates)} Bundles to {self.output_status}")
+        response = await lta_rc.request('POST', '/Bundles/actions/bulk_update', body)
+        skipped = len(updates) - response["count"]
+        if skipped:
+            self.logger.warning(f"{skipped} Bundles were claimed or moved on by somebody else; left them alone.")
+
+
+async def main(globus_tracker: GlobusTracker) -> None:
+    """Execute the work loop of the GlobusTracker component."""
+    LOG.info("Starting asynchronous code")
+    await work_loop(globus_tracker)
+    LOG.info("Ending asynchronous code")
+
+
+def main_sync() -> None:
+    """Configure a GlobusTracker component from the environment and set it running."""
+    # obtain our configuration from the environment
+    config = from_environment(EXPECTED_CONFIG)
+    # configure logging for the application
+    log_level = getattr(logging, config["LOG_LEVEL"].upper())
+    logging.basicConfig(
+        format="{asctime} [{threadName}] {levelname:5} ({filename}:{lineno}) - {message}",
+        level=log_level,
+        stream=sys.stdout,
+        style="{",
+    )
+    # create our GlobusTracker service
+    LOG.info("Starting synchronous code")
+    globus_tracker = GlobusTracker(config, LOG)
+    # let's get to work
+    metrics_port = int(config["PROMETHEUS_METRICS_PORT"])
+    start_http_server(metrics_port)
+    asyncio.run(main(globus_tracker))
+    LOG.info("Ending synchronous code")
+
+
+if __name__ == "__main__":
+    main_sync()
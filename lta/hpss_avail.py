@@ -0,0 +1,114 @@
+# hpss_avail.py
+"""Module to keep track of the availability of HPSS at NERSC."""
+
+# fmt:off
+
+import asyncio
+from logging import Logger
+import random
+import time
+from typing import Dict, List, Optional
+
+from prometheus_client import Gauge
+
+from .command import run_command
+from .utils import CommandTimeoutException
+
+# while HPSS is down, wait this long before probing it again; doubling on each failure
+BACKOFF_MIN_SECONDS = 10.0
+BACKOFF_MAX_SECONDS = 600.0
+# spread out the probes of many processes by this fraction of the backoff
+BACKOFF_JITTER = 0.2
+# kill hpss_avail if it takes longer than this
+PROBE_TIMEOUT_SECONDS = 60.0
+
+# Prometheus metrics
+# -- make module-level so these are shared within this process (else, dups overwrite)
+
+PROMETHEUS_HPSS_AVAILABLE = Gauge(
+    "hpss_available",
+    "1 if the last probe found the HPSS archive available, else 0",
+)
+
+# the monitors shared by all of the components in this process, by hpss_avail path
+_MONITORS: Dict[str, "HpssAvailMonitor"] = {}
+
+
+class HpssAvailMonitor:
+    """
+    HpssAvailMonitor keeps track of the availability of HPSS.
+
+    Instead of running 'hpss_avail archive' before every claim, components
+    ask the monitor, which probes HPSS in the background. While HPSS is
+    available, the probe is repeated every ttl_seconds. While HPSS is down,
+    it is repeated with an exponential backoff, with jitter so that many
+    processes do not all probe at the same moment.
+
+    Use get_hpss_avail_monitor to share one monitor among all of the
+    components in a process.
+    """
+
+    def __init__(self, hpss_avail_path: str, ttl_seconds: float, logger: Logger) -> None:
+        """Create a monitor that probes with the provided hpss_avail executable."""
+        self.args: List[str] = [hpss_avail_path, "archive"]
+        self.ttl_seconds = ttl_seconds
+        self.logger = logger
+        self.available: Optional[bool] = None
+        self.checked = 0.0
+        self.failures = 0
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    async def is_available(self) -> bool:
+        """Return True if HPSS was available the last time it was probed."""
+        loop = asyncio.get_running_loop()
+        if (self._task is None) or self._task.done() or (self._task.get_loop() is not loop):
+            # if what we know is missing or out of date, find out now
+            if (self.available is None) or (time.monotonic() - self.checked > self.ttl_seconds):
+                await self.probe()
+            self._task = loop.create_task(self._watch())
+        return bool(self.available)
+
+    async def probe(self) -> bool:
+        """Run hpss_avail to determine if HPSS is available."""
+        try:
+            completed_process = await run_command(self.args, self.logger, timeout=PROBE_TIMEOUT_SECONDS)
+            available = completed_process.returncode == 0
+            if not available:
+                self.logger.error(f"HPSS system not available (returncode: {completed_process.returncode})")
+        except (CommandTimeoutException, OSError) as e:
+            self.logger.error(f"HPSS system not available ({e})")
+            available = False
+        self.available = available
+        self.checked = time.monotonic()
+        self.failures = 0 if available else self.failures + 1
+        PROMETHEUS_HPSS_AVAILABLE.set(1 if available else 0)
+        return available
+
+    def next_delay(self) -> float:
+        """Return the number of seconds to wait before the next probe."""
+        if self.available:
+            return self.ttl_seconds
+        backoff = min(BACKOFF_MAX_SECONDS, BACKOFF_MIN_SECONDS * (2 ** max(0, self.failures - 1)))
+        return backoff * random.uniform(1 - BACKOFF_JITTER, 1 + BACKOFF_JITTER)
+
+    def stop(self) -> None:
+        """Stop probing in the background."""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _watch(self) -> None:
+        """Probe HPSS in the background."""
+        while True:
+            await asyncio.sleep(self.next_delay())
+            await self.probe()
+
+
+def get_hpss_avail_monitor(hpss_avail_path: str, ttl_seconds: float, logger: Logger) -> HpssAvailMonitor:
+    """Return the monitor for the provided hpss_avail executable that is shared within this process."""
+    if hpss_avail_path not in _MONITORS:
+        _MONITORS[hpss_avail_path] = HpssAvailMonitor(hpss_avail_path, ttl_seconds, logger)
+    monitor = _MONITORS[hpss_avail_path]
+    # if components disagree, probe as often as the most demanding one wants
+    monitor.ttl_seconds = min(monitor.ttl_seconds, ttl_seconds)
+    return monitor
@@ -0,0 +1,128 @@
+# hsi.py
+"""Module to run batches of commands against HPSS in a single HSI session."""
+
+# fmt:off
+
+from logging import Logger
+import re
+from subprocess import CompletedProcess
+from tempfile import NamedTemporaryFile
+from typing import Dict, List, Optional, Tuple
+
+from .command import run_command
+from .lta_types import BundleType
+
+# 1693e9d0273e3a2995b917c0e72e6bd2f40ea677f3613b6d57eaa14bd3a285c73e8db8b6e556b886c3929afe324bcc718711f2faddfeb43c3e030d9afe697873 sha512 /home/projects/icecube/data/exp/IceCube/2018/unbiased/PFDST/1230/50145c5c-01e1-4727-a9a1-324e5af09a29.zip [hsi]
+HASHLIST_LINE = re.compile(r"^(?P<checksum>[0-9a-fA-F]+) sha512 (?P<path>\S+)")
+# /home/projects/icecube/data/exp/IceCube/2018/unbiased/PFDST/1230/50145c5c-01e1-4727-a9a1-324e5af09a29.zip: (sha512) OK
+HASHVERIFY_LINE = re.compile(r"^(?P<path>\S+): \((?P<type>[^)]+)\) (?P<result>.*)$")
+# get  '/global/cfs/cdirs/icecube/rse/50145c5c-01e1-4727-a9a1-324e5af09a29.zip' : '/home/projects/icecube/data/exp/IceCube/2018/unbiased/PFDST/1230/50145c5c-01e1-4727-a9a1-324e5af09a29.zip' (2019/09/25 15:33:47 109192514585 bytes, 250132.4 KBS )
+GET_LINE = re.compile(r"^get\s+'(?P<local>[^']+)'\s*:\s*'(?P<hpss>[^']+)'.*?(?P<size>\d+) bytes")
+# FILE	/home/projects/icecube/data/exp/IceCube/2018/unbiased/PFDST/1230/50145c5c-01e1-4727-a9a1-324e5af09a29.zip	109192514585	109192514585	3729+0	EA871300	5	0	1	09/25/2019	15:33:47	09/25/2019	15:33:47
+LS_P_LINE = re.compile(r"^FILE\t(?P<path>[^\t]+)\t\d+\t\d+\t(?P<position>\d+)\+\d+\t(?P<volume>[^\t]+)")
+
+
+def tape_order(bundle: BundleType) -> Tuple[bool, str, int]:
+    """Sort Bundles by tape volume and position; Bundles with no known tape location go last."""
+    if "tape" not in bundle:
+        return (True, "", 0)
+    return (False, bundle["tape"]["volume"], bundle["tape"]["position"])
+
+
+class HsiSessionResult:
+    """
+    The parsed output of a batched HSI session.
+
+    Lines of output are parsed as they arrive (see parse_line), so the output
+    of a large session is never held in memory; only the lines that were not
+    recognized, which include the error messages, are kept.
+    """
+
+    def __init__(self, completed_process: Optional[CompletedProcess] = None) -> None:
+        """Parse the output of the provided HSI session, if any."""
+        self.completed_process: CompletedProcess = CompletedProcess([], 0)
+        self.returncode = 0
+        self.lines: List[str] = []
+        self.hashlist: Dict[str, str] = {}
+        self.hashverify: Dict[str, str] = {}
+        self.tape: Dict[str, Tuple[str, int]] = {}
+        self.gets: Dict[str, int] = {}
+        if completed_process:
+            self.finish(completed_process)
+
+    def parse_line(self, line: str) -> None:
+        """Parse a line of output from the HSI session."""
+        hashlist_match = HASHLIST_LINE.match(line)
+        if hashlist_match:
+            self.hashlist[hashlist_match["path"]] = hashlist_match["checksum"]
+            return
+        hashverify_match = HASHVERIFY_LINE.match(line)
+        if hashverify_match:
+            self.hashverify[hashverify_match["path"]] = f"({hashverify_match['type']}) {hashverify_match['result']}"
+            return
+        ls_match = LS_P_LINE.match(line)
+        if ls_match:
+            self.tape[ls_match["path"]] = (ls_match["volume"], int(ls_match["position"]))
+            return
+        get_match = GET_LINE.match(line)
+        if get_match:
+            self.gets[get_match["local"]] = int(get_match["size"])
+            return
+        self.lines.append(line)
+
+    def finish(self, completed_process: CompletedProcess) -> None:
+        """Parse any output captured by the finished HSI session, and record how it ended."""
+        for output in [completed_process.stdout, completed_process.stderr]:
+            if output:
+                for line in output.decode("utf-8").splitlines():
+                    self.parse_line(line)
+        self.returncode = completed_process.returncode
+        # keep the lines we didn't recognize; they explain what went wrong
+        self.completed_process = CompletedProcess(
+            completed_process.args,
+            completed_process.returncode,
+            "\n".join(self.lines).encode("utf-8"),
+            b"",
+        )
+
+    def errors_for(self, *paths: str) -> List[str]:
+        """Return the lines of output that report a problem with any of the provided paths."""
+        return [line for line in self.lines if any(path in line for path in paths)]
+
+
+class HsiSession:
+    """
+    HsiSession is a batch of HSI commands run with a single login to HPSS.
+
+    Every invocation of hsi costs a login to HPSS, and NERSC limits the
+    number of concurrent hsi jobs. Instead of running one hsi process per
+    command, the commands for a batch of bundles are written to a command
+    file and run with 'hsi -P in <file>'. The caller inspects the returned
+    HsiSessionResult to determine the outcome for each bundle.
+    """
+
+    def __init__(self, hsi_path: str, logger: Logger, timeout: Optional[float] = None) -> None:
+        """Create an empty HSI session using the provided hsi executable and deadline (seconds)."""
+        self.hsi_path = hsi_path
+        self.logger = logger
+        self.timeout = timeout
+        self.commands: List[str] = []
+
+    def add(self, *args: str) -> None:
+        """Add a command to the session."""
+        self.commands.append(" ".join(args))
+
+    async def run(self) -> HsiSessionResult:
+        """Run all of the commands of the session with a single hsi process."""
+        with NamedTemporaryFile(mode="w", prefix="lta-hsi-", suffix=".cmd") as cmd_file:
+            cmd_file.write("\n".join(self.commands) + "\n")
+            cmd_file.flush()
+            #     -P     -> ("popen" flag) all output is written to stdout in "quiet" mode
+            #     in     -> read commands from the provided local file
+            args = [self.hsi_path, "-P", "in", cmd_file.name]
+            self.logger.info(f"Running {len(self.commands)} commands in one HSI session: {args}")
+            result = HsiSessionResult()
+            completed_process = await run_command(args, self.logger, timeout=self.timeout, on_line=result.parse_line)
+        self.logger.info(f"HSI session returncode: {completed_process.returncode}")
+        result.finish(completed_process)
+        return result
@@ -6,15 +6,17 @@
 import asyncio
 import logging
 import os
-from subprocess import PIPE, run
 import sys
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from prometheus_client import start_http_server
 from rest_tools.client import RestClient
 
-from .utils import HSICommandFailedException
+from .utils import HSIBatchItemFailedException, HSICommandFailedException, \
+    InvalidChecksumException
 from .component import COMMON_CONFIG, Component, work_loop, PrometheusResultTracker
+from .hpss_avail import get_hpss_avail_monitor
+from .hsi import HsiSession
 from .utils import now, quarantine_now
 from .lta_tools import from_environment
 from .lta_types import BundleType
@@ -26,6 +28,12 @@ LOG = logging.getLogger(__name__)
 EXPECTED_CONFIG = COMMON_CONFIG.copy()
 EXPECTED_CONFIG.update({
     "HPSS_AVAIL_PATH": "/usr/bin/hpss_avail.py",
+    # seconds to trust the last probe of HPSS availability
+    "HPSS_AVAIL_TTL_SECONDS": "60",
+    "HSI_PATH": "/usr/bin/hsi",
+    # seconds an HSI session may run before it is killed
+    "HSI_TIMEOUT_SECONDS": "21600",
+    # maximum number of bundles to tape in a single HSI session
     "MAX_COUNT": None,
     "RSE_BASE_PATH": None,
     "TAPE_BASE_PATH": None,
@@ -44,9 +52,11 @@ class NerscMover(Component):
 
     See: https://docs.nersc.gov/filesystems/archive/
 
-    It uses the LTA DB to find bundles that have a 'taping' status. After
-    issuing the HPSS command, the Bundle is updated in the LTA DB to have a
-    'verifying' status.
+    It uses the LTA DB to find bundles that have a 'taping' status. It claims
+    up to MAX_COUNT bundles and writes them to tape with a single HSI session,
+    to avoid paying for an HPSS login per command. After the HSI session, each
+    Bundle that made it to tape is updated in the LTA DB to have a 'verifying'
+    status; only the Bundles that failed are quarantined.
 
     The HSI commands used to interact with the HPSS tape system are documented
     online.
@@ -62,7 +72,13 @@ class NerscMover(Component):
         logger - The object the nersc_mover should use for logging.
         """
         super(NerscMover, self).__init__("nersc_mover", config, logger)
-        self.hpss_avail_path = config["HPSS_AVAIL_PATH"]
+        self.hpss_avail_monitor = get_hpss_avail_monitor(
+            config["HPSS_AVAIL_PATH"],
+            float(config["HPSS_AVAIL_TTL_SECONDS"]),
+            self.logger,
+        )
+        self.hsi_path = config["HSI_PATH"]
+        self.hsi_timeout_seconds = float(config["HSI_TIMEOUT_SECONDS"])
         self.max_count = int(config["MAX_COUNT"])
         self.rse_base_path = config["RSE_BASE_PATH"]
         self.tape_base_path = config["TAPE_BASE_PATH"]
@@ -82,72 +98,157 @@ class NerscMover(Component):
         lta_rc: RestClient,
         prom_tracker: PrometheusResultTracker,
     ) -> bool:
-        """Claim a bundle and perform work on it -- see super for return value meanings."""
+        """Claim a batch of bundles and perform work on them -- see super for return value meanings."""
         # 0. Do some pre-flight checks to ensure that we can do work
         # if the HPSS system is not available
-        args = [self.hpss_avail_path, "archive"]
-        completed_process = run(args, stdout=PIPE, stderr=PIPE)
-        if completed_process.returncode != 0:
+        if not await self.hpss_avail_monitor.is_available():
             # prevent this instance from claiming any work
-            self.logger.error(f"Unable to do work; HPSS system not available (returncode: {completed_process.returncode})")
+            self.logger.error("Unable to do work; HPSS system not available")
             return False
-        # 1. Ask the LTA DB for the next Bundle to be taped
-        self.logger.info("Asking the LTA DB for a Bundle to tape at NERSC with HPSS.")
-        pop_body = {
-            "claimant": f"{self.name}-{self.instance_uuid}"
-        }
-        response = await lta_rc.request('POST', f'/Bundles/actions/pop?source={self.source_site}&dest={self.dest_site}&status={self.input_status}', pop_body)
-        self.logger.info(f"LTA DB responded with: {response}")
-        bundle = response["bundle"]
-        if not bundle:
+        # 1. Ask the LTA DB for the next Bundles to be taped
+        bundles = await self._claim_bundles(lta_rc)
+        if not bundles:
             self.logger.info("LTA DB did not provide a Bundle to tape at NERSC with HPSS. Going on vacation.")
             return False
-        # process the Bundle that we were given
+        # process the Bundles that we were given
         try:
-            await self._write_bundle_to_hpss(lta_rc, bundle)
-            prom_tracker.record_success()
-            return True
+            outcomes = await self._write_bundles_to_hpss(bundles)
         except Exception as e:
+            for bundle in bundles:
+                prom_tracker.record_failure()
+                await quarantine_now(
+                    lta_rc,
+                    bundle,
+                    e,
+                    self.name,
+                    self.instance_uuid,
+                    self.logger,
+                )
+            raise e
+        # 2. Report the outcome for each Bundle to the LTA DB
+        await self._report_outcomes(lta_rc, prom_tracker, bundles, outcomes)
+        return True
+
+    async def _claim_bundles(self, lta_rc: RestClient) -> List[BundleType]:
+        """Ask the LTA DB for up to max_count Bundles to tape."""
+        self.logger.info(f"Asking the LTA DB for up to {self.max_count} Bundles to tape at NERSC with HPSS.")
+        pop_body = {
+            "claimant": f"{self.name}-{self.instance_uuid}"
+        }
+        bundles: List[BundleType] = []
+        while len(bundles) < self.max_count:
+            response = await lta_rc.request('POST', f'/Bundles/actions/pop?source={self.source_site}&dest={self.dest_site}&status={self.input_status}', pop_body)
+            self.logger.info(f"LTA DB responded with: {response}")
+            bundle = response["bundle"]
+            if not bundle:
+                break
+            bundles.append(bundle)
+        return bundles
+
+    async def _report_outcomes(
+        self,
+        lta_rc: RestClient,
+        prom_tracker: PrometheusResultTracker,
+        bundles: List[BundleType],
+        outcomes: Dict[str, Optional[Exception]],
+    ) -> None:
+        """Advance, quarantine, or unclaim each Bundle of the batch, according to its outcome."""
+        failures: List[Exception] = []
+        for bundle in bundles:
+            bundle_id = bundle["uuid"]
+            if bundle_id not in outcomes:
+                await self._unclaim_bundle(lta_rc, bundle)
+                continue
+            error = outcomes[bundle_id]
+            if error is None:
+                await self._update_bundle_in_lta_db(lta_rc, bundle)
+                prom_tracker.record_success()
+                continue
             prom_tracker.record_failure()
             await quarantine_now(
                 lta_rc,
                 bundle,
-                e,
+                error,
                 self.name,
                 self.instance_uuid,
                 self.logger,
             )
-            raise e
+            failures.append(error)
+        # if nothing in the batch could be taped, stop and let an operator take a look
+        if failures and len(failures) == len(outcomes):
+            raise failures[0]
 
-    async def _write_bundle_to_hpss(self, lta_rc: RestClient, bundle: BundleType) -> None:
-        """Replicate the supplied bundle using the configured transfer service."""
-        bundle_id = bundle["uuid"]
-        # determine the name and path of the bundle
-        basename = os.path.basename(bundle["bundle_path"])
-        data_warehouse_path = bundle["path"]
-        # determine the input path that contains the bundle
-        stupid_python_path = os.path.sep.join([self.rse_base_path, basename])
-        input_path = os.path.normpath(stupid_python_path)
-        # determine the output path where it should be stored on hpss
-        stupid_python_path = os.path.sep.join([self.tape_base_path, data_warehouse_path, basename])
-        hpss_path = os.path.normpath(stupid_python_path)
-
-        # run an hsi command to create the destination directory
+    async def _write_bundles_to_hpss(self, bundles: List[BundleType]) -> Dict[str, Optional[Exception]]:
+        """
+        Write the supplied bundles to HPSS with a single HSI session.
+
+        Return a dictionary mapping the uuid of each bundle that HSI reported
+        on to None (taped successfully) or the Exception describing its
+        failure. Bundles missing from the dictionary were not attempted.
+        """
+        session = HsiSession(self.hsi_path, self.logger, self.hsi_timeout_seconds)
+        paths: Dict[str, Tuple[str, str]] = {}
+        for bundle in bundles:
+            # determine the name and path of the bundle
+            basename = os.path.basename(bundle["bundle_path"])
+            data_warehouse_path = bundle["path"]
+            # determine the input path that contains the bundle
+            stupid_python_path = os.path.sep.join([self.rse_base_path, basename])
+            input_path = os.path.normpath(stupid_python_path)
+            # determine the output path where it should be stored on hpss
+            stupid_python_path = os.path.sep.join([self.tape_base_path, data_warehouse_path, basename])
+            hpss_path = os.path.normpath(stupid_python_path)
+            paths[bundle["uuid"]] = (input_path, hpss_path)
+
+        # create the destination directories
         #     mkdir     -> create a directory to store the bundle on tape
         #     -p        -> create any intermediate (parent) directories as necessary
-        hpss_base = os.path.dirname(hpss_path)
-        args = ["/usr/bin/hsi", "mkdir", "-p", hpss_base]
-        self._execute_hsi_command(args)
+        for hpss_base in sorted({os.path.dirname(hpss_path) for _, hpss_path in paths.values()}):
+            session.add("mkdir", "-p", hpss_base)
 
-        # run an hsi command to put the file on tape
+        # put the files on tape
         #     put       -> write the source path to the hpss system at the dest path
         #     -c on     -> turn on the calculation of checksums by the hpss system
         #     -H sha512 -> specify that the SHA512 algorithm be used to calculate the checksum
         #     :         -> HPSS ... ¯\_(ツ)_/¯
-        args = ["/usr/bin/hsi", "put", "-c", "on", "-H", "sha512", input_path, ":", hpss_path]
-        self._execute_hsi_command(args)
+        for input_path, hpss_path in paths.values():
+            session.add("put", "-c", "on", "-H", "sha512", input_path, ":", hpss_path)
+
+        # list the checksums that HPSS calculated; this tells us which puts succeeded
+        #     hashlist  -> List checksum hash for HPSS file(s)
+        for _, hpss_path in paths.values():
+            session.add("hashlist", hpss_path)
+
+        result = await session.run()
+        outcomes: Dict[str, Optional[Exception]] = {}
+        for bundle in bundles:
+            bundle_id = bundle["uuid"]
+            input_path, hpss_path = paths[bundle_id]
+            if hpss_path in result.hashlist:
+                if result.hashlist[hpss_path] != bundle["checksum"]["sha512"]:
+                    outcomes[bundle_id] = InvalidChecksumException(
+                        bundle["checksum"]["sha512"],
+                        result.hashlist[hpss_path],
+                        self.logger,
+                    )
+                else:
+                    outcomes[bundle_id] = None
+                continue
+            errors = result.errors_for(input_path, hpss_path)
+            if errors:
+                outcomes[bundle_id] = HSIBatchItemFailedException(
+                    "tape bundle to HPSS", hpss_path, errors, self.logger
+                )
+        # if HSI failed without telling us about any of the bundles
+        if (not outcomes) and (result.returncode != 0):
+            raise HSICommandFailedException(
+                "tape bundles to HPSS", result.completed_process, self.logger
+            )
+        return outcomes
 
-        # update the Bundle in the LTA DB
+    async def _update_bundle_in_lta_db(self, lta_rc: RestClient, bundle: BundleType) -> None:
+        """Update the LTA DB to indicate the Bundle is on tape."""
+        bundle_id = bundle["uuid"]
         patch_body = {
             "status": self.output_status,
             "reason": "",
@@ -157,13 +258,16 @@ class NerscMover(Component):
         self.logger.info(f"PATCH /Bundles/{bundle_id} - '{patch_body}'")
         await lta_rc.request('PATCH', f'/Bundles/{bundle_id}', patch_body)
 
-    def _execute_hsi_command(self, args: List[str]) -> None:
-        completed_process = run(args, stdout=PIPE, stderr=PIPE)
-        # if our command failed
-        if completed_process.returncode != 0:
-            raise HSICommandFailedException(
-                "tape bundle to HPSS", completed_process, self.logger
-            )
+    async def _unclaim_bundle(self, lta_rc: RestClient, bundle: BundleType) -> None:
+        """Return a Bundle that HSI did not get to back to the LTA DB."""
+        bundle_id = bundle["uuid"]
+        self.logger.info(f"HSI session did not report on Bundle {bundle_id}; will unclaim it.")
+        patch_body = {
+            "claimed": False,
+            "update_timestamp": now(),
+        }
+        self.logger.info(f"PATCH /Bundles/{bundle_id} - '{patch_body}'")
+        await lta_rc.request('PATCH', f'/Bundles/{bundle_id}', patch_body)
 
 
 async def main(nersc_mover: NerscMover) -> None:
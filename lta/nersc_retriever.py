@@ -6,15 +6,16 @@
 import asyncio
 import logging
 import os
-from subprocess import PIPE, run
 import sys
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from prometheus_client import start_http_server
 from rest_tools.client import RestClient
 
-from .utils import HSICommandFailedException
+from .utils import HSIBatchItemFailedException, HSICommandFailedException
 from .component import COMMON_CONFIG, Component, work_loop, PrometheusResultTracker
+from .hpss_avail import get_hpss_avail_monitor
+from .hsi import HsiSession, tape_order
 from .utils import now, quarantine_now
 from .lta_tools import from_environment
 from .lta_types import BundleType
@@ -23,9 +24,19 @@ Logger = logging.Logger
 
 LOG = logging.getLogger(__name__)
 
+# the fields of the pending Bundles of a request that are needed to plan its recall
+RECALL_FIELDS = "uuid,path,bundle_path,tape"
+
 EXPECTED_CONFIG = COMMON_CONFIG.copy()
 EXPECTED_CONFIG.update({
     "HPSS_AVAIL_PATH": "/usr/bin/hpss_avail.py",
+    # seconds to trust the last probe of HPSS availability
+    "HPSS_AVAIL_TTL_SECONDS": "60",
+    "HSI_PATH": "/usr/bin/hsi",
+    # seconds an HSI session may run before it is killed
+    "HSI_TIMEOUT_SECONDS": "21600",
+    # maximum number of bundles to copy from tape in a single HSI session
+    "MAX_COUNT": "5",
     "RSE_BASE_PATH": None,
     "TAPE_BASE_PATH": None,
     "WORK_RETRIES": "3",
@@ -43,9 +54,19 @@ class NerscRetriever(Component):
 
     See: https://docs.nersc.gov/filesystems/archive/
 
-    It uses the LTA DB to find bundles that have a 'specified' status. After
-    issuing the HPSS command, the Bundle is updated in the LTA DB to have a
-    'staged' status.
+    It uses the LTA DB to find bundles that have a 'specified' status. It
+    claims up to MAX_COUNT bundles and copies them from tape with a single HSI
+    session. After the HSI session, each Bundle that was copied is updated in
+    the LTA DB to have a 'staged' status; only the Bundles that failed are
+    quarantined.
+
+    Recalling the bundles of a request in the order the LTA DB hands them out
+    makes HPSS mount and unmount the same cartridges over and over. So the
+    first time it claims a bundle of a request, the NerscRetriever asks HPSS
+    ('ls -P') for the tape volume and position of every pending bundle of the
+    request, and records them in the LTA DB. The bundle it claims first picks
+    the tape volume; each batch then consists of the MAX_COUNT pending
+    bundles nearest the front of that volume, read front to back.
 
     The HSI commands used to interact with the HPSS tape system are documented
     online.
@@ -61,7 +82,14 @@ class NerscRetriever(Component):
         logger - The object the nersc_retriever should use for logging.
         """
         super(NerscRetriever, self).__init__("nersc_retriever", config, logger)
-        self.hpss_avail_path = config["HPSS_AVAIL_PATH"]
+        self.hpss_avail_monitor = get_hpss_avail_monitor(
+            config["HPSS_AVAIL_PATH"],
+            float(config["HPSS_AVAIL_TTL_SECONDS"]),
+            self.logger,
+        )
+        self.hsi_path = config["HSI_PATH"]
+        self.hsi_timeout_seconds = float(config["HSI_TIMEOUT_SECONDS"])
+        self.max_count = int(config["MAX_COUNT"])
         self.rse_base_path = config["RSE_BASE_PATH"]
         self.tape_base_path = config["TAPE_BASE_PATH"]
         self.work_retries = int(config["WORK_RETRIES"])
@@ -80,64 +108,215 @@ class NerscRetriever(Component):
         lta_rc: RestClient,
         prom_tracker: PrometheusResultTracker,
     ) -> bool:
-        """Claim a bundle and perform work on it -- see super for return value meanings."""
+        """Claim a batch of bundles and perform work on them -- see super for return value meanings."""
         # 0. Do some pre-flight checks to ensure that we can do work
         # if the HPSS system is not available
-        args = [self.hpss_avail_path, "archive"]
-        completed_process = run(args, stdout=PIPE, stderr=PIPE)
-        if completed_process.returncode != 0:
+        if not await self.hpss_avail_monitor.is_available():
             # prevent this instance from claiming any work
-            self.logger.error(f"Unable to do work; HPSS system not available (returncode: {completed_process.returncode})")
+            self.logger.error("Unable to do work; HPSS system not available")
             return False
-        # 1. Ask the LTA DB for the next Bundle to be taped
-        self.logger.info("Asking the LTA DB for a Bundle copy from tape at NERSC with HPSS.")
+        # 1. Ask the LTA DB for the next Bundles to be copied from tape
+        bundles = await self._claim_bundles(lta_rc)
+        if not bundles:
+            self.logger.info("LTA DB did not provide a Bundle to copy from tape at NERSC with HPSS. Going on vacation.")
+            return False
+        # process the Bundles that we were given
+        try:
+            outcomes = await self._read_bundles_from_hpss(bundles)
+        except Exception as e:
+            for bundle in bundles:
+                prom_tracker.record_failure()
+                await quarantine_now(
+                    lta_rc,
+                    bundle,
+                    e,
+                    self.name,
+                    self.instance_uuid,
+                    self.logger,
+                )
+            raise e
+        # 2. Report the outcome for each Bundle to the LTA DB
+        await self._report_outcomes(lta_rc, prom_tracker, bundles, outcomes)
+        return True
+
+    async def _claim_bundles(self, lta_rc: RestClient) -> List[BundleType]:
+        """Claim a Bundle, and the Bundles that follow it on the same tape volume, in tape order."""
+        self.logger.info(f"Asking the LTA DB for up to {self.max_count} Bundles to copy from tape at NERSC with HPSS.")
         pop_body = {
             "claimant": f"{self.name}-{self.instance_uuid}"
         }
-        response = await lta_rc.request('POST', f'/Bundles/actions/pop?source={self.source_site}&dest={self.dest_site}&status={self.input_status}', pop_body)
+        pop_url = f'/Bundles/actions/pop?source={self.source_site}&dest={self.dest_site}&status={self.input_status}'
+        response = await lta_rc.request('POST', pop_url, pop_body)
         self.logger.info(f"LTA DB responded with: {response}")
         bundle = response["bundle"]
         if not bundle:
-            self.logger.info("LTA DB did not provide a Bundle to copy from tape at NERSC with HPSS. Going on vacation.")
-            return False
-        # process the Bundle that we were given
-        try:
-            await self._read_bundle_from_hpss(lta_rc, bundle)
-            prom_tracker.record_success()
-            return True
-        except Exception as e:
+            return []
+        # if we don't know where the bundle is on tape, plan the recall of its request
+        if "tape" not in bundle:
+            await self._plan_recall(lta_rc, bundle)
+        if "tape" not in bundle:
+            return [bundle]
+        # the bundle picks the tape volume; the batch is the front of what is left on it
+        pop_url = f'{pop_url}&tape_volume={bundle["tape"]["volume"]}'
+        bundles: List[BundleType] = [bundle]
+        for _ in range(self.max_count):
+            response = await lta_rc.request('POST', pop_url, pop_body)
+            self.logger.info(f"LTA DB responded with: {response}")
+            if not response["bundle"]:
+                break
+            bundles.append(response["bundle"])
+        # read the batch from tape front to back
+        bundles.sort(key=tape_order)
+        # if the first bundle is further along the tape, it waits for the next batch
+        for extra in bundles[self.max_count:]:
+            self.logger.info(f"Bundle {extra['uuid']} is further along tape {extra['tape']['volume']}; will unclaim it.")
+            await self._unclaim_bundle(lta_rc, extra)
+        return bundles[:self.max_count]
+
+    async def _report_outcomes(
+        self,
+        lta_rc: RestClient,
+        prom_tracker: PrometheusResultTracker,
+        bundles: List[BundleType],
+        outcomes: Dict[str, Optional[Exception]],
+    ) -> None:
+        """Advance, quarantine, or unclaim each Bundle of the batch, according to its outcome."""
+        failures: List[Exception] = []
+        for bundle in bundles:
+            bundle_id = bundle["uuid"]
+            if bundle_id not in outcomes:
+                self.logger.info(f"HSI session did not report on Bundle {bundle_id}; will unclaim it.")
+                await self._unclaim_bundle(lta_rc, bundle)
+                continue
+            error = outcomes[bundle_id]
+            if error is None:
+                await self._update_bundle_in_lta_db(lta_rc, bundle)
+                prom_tracker.record_success()
+                continue
             prom_tracker.record_failure()
             await quarantine_now(
                 lta_rc,
                 bundle,
-                e,
+                error,
                 self.name,
                 self.instance_uuid,
                 self.logger,
             )
-            raise e
+            failures.append(error)
+        # if nothing in the batch could be copied, stop and let an operator take a look
+        if failures and len(failures) == len(outcomes):
+            raise failures[0]
 
-    async def _read_bundle_from_hpss(self, lta_rc: RestClient, bundle: BundleType) -> None:
-        """Send a command to HPSS to retrieve the supplied bundle from tape."""
-        bundle_id = bundle["uuid"]
-        # determine the name and path of the bundle
-        basename = os.path.basename(bundle["bundle_path"])
+    async def _plan_recall(self, lta_rc: RestClient, bundle: BundleType) -> None:
+        """Record the tape volume and position of the pending Bundles of the Bundle's request."""
+        # find the Bundles of the request that are waiting to be copied from tape
+        bundles: List[BundleType] = [bundle]
+        request_uuid = bundle.get("request")
+        if request_uuid:
+            response = await lta_rc.request('GET', f'/Bundles?request={request_uuid}&status={self.input_status}&fields={RECALL_FIELDS}')
+            bundles.extend(pending for pending in response["results"] if (pending["uuid"] != bundle["uuid"]) and ("tape" not in pending))
+        self.logger.info(f"Planning the recall of {len(bundles)} Bundles of request {request_uuid} from tape.")
+        # ask HPSS where each of them lives on tape
+        #     ls -P     -> list the tape volume and position of the file
+        session = HsiSession(self.hsi_path, self.logger, self.hsi_timeout_seconds)
+        for pending in bundles:
+            session.add("ls", "-P", self._get_hpss_path(pending))
+        result = await session.run()
+        # record what HPSS told us in the LTA DB
+        right_now = now()
+        updates: Dict[str, Dict[str, Any]] = {}
+        for pending in bundles:
+            hpss_path = self._get_hpss_path(pending)
+            if hpss_path not in result.tape:
+                self.logger.warning(f"HPSS did not report the tape location of Bundle {pending['uuid']} ({hpss_path}): {result.errors_for(hpss_path)}")
+                continue
+            volume, position = result.tape[hpss_path]
+            pending["tape"] = {
+                "volume": volume,
+                "position": position,
+            }
+            updates[pending["uuid"]] = {
+                "tape": pending["tape"],
+                "update_timestamp": right_now,
+            }
+        if updates:
+            self.logger.info(f"POST /Bundles/actions/bulk_update - tape locations of {len(updates)} Bundles")
+            await lta_rc.request('POST', '/Bundles/actions/bulk_update', {"updates": updates})
+
+    def _get_hpss_path(self, bundle: BundleType) -> str:
+        """Determine the path where the bundle is stored on HPSS."""
         data_warehouse_path = bundle["path"]
-        # determine the input path where it should be stored on hpss
+        basename = os.path.basename(bundle["bundle_path"])
         stupid_python_path = os.path.sep.join([self.tape_base_path, data_warehouse_path, basename])
-        hpss_path = os.path.normpath(stupid_python_path)
-        # determine the output path where we stage the bundle for transfer
-        stupid_python_path = os.path.sep.join([self.rse_base_path, basename])
-        output_path = os.path.normpath(stupid_python_path)
+        return os.path.normpath(stupid_python_path)
+
+    async def _read_bundles_from_hpss(self, bundles: List[BundleType]) -> Dict[str, Optional[Exception]]:
+        """
+        Retrieve the supplied bundles from tape with a single HSI session.
+
+        Return a dictionary mapping the uuid of each bundle that HSI reported
+        on to None (copied successfully) or the Exception describing its
+        failure. Bundles missing from the dictionary were not attempted.
+
+        A bundle only counts as copied if HSI reported the 'get' of it and
+        the copy has the size of the bundle. Any file at the output path is
+        removed first, so a partial copy from an earlier attempt can't pass
+        for a good one.
+        """
+        session = HsiSession(self.hsi_path, self.logger, self.hsi_timeout_seconds)
+        paths: Dict[str, Tuple[str, str]] = {}
+        for bundle in bundles:
+            # determine the input path where it is stored on hpss
+            hpss_path = self._get_hpss_path(bundle)
+            # determine the output path where we stage the bundle for transfer
+            basename = os.path.basename(bundle["bundle_path"])
+            stupid_python_path = os.path.sep.join([self.rse_base_path, basename])
+            output_path = os.path.normpath(stupid_python_path)
+            paths[bundle["uuid"]] = (hpss_path, output_path)
+            # a file left behind by an earlier attempt may be incomplete
+            if os.path.exists(output_path):
+                self.logger.info(f"Removing {output_path} left behind by an earlier attempt")
+                os.remove(output_path)
 
-        # run an hsi command to get the file from tape
+        # get the files from tape
         #     get       -> read the source path from the hpss system to the dest path
         #     -c on     -> turn on the verification of checksums by the hpss system
         #     :         -> HPSS ... ¯\_(ツ)_/¯
-        args = ["/usr/bin/hsi", "get", "-c", "on", output_path, ":", hpss_path]
-        self._execute_hsi_command(args)
+        for hpss_path, output_path in paths.values():
+            session.add("get", "-c", "on", output_path, ":", hpss_path)
+
+        result = await session.run()
+        outcomes: Dict[str, Optional[Exception]] = {}
+        for bundle in bundles:
+            bundle_id = bundle["uuid"]
+            hpss_path, output_path = paths[bundle_id]
+            errors = result.errors_for(hpss_path, output_path)
+            if errors:
+                outcomes[bundle_id] = HSIBatchItemFailedException(
+                    "read bundle from HPSS", hpss_path, errors, self.logger
+                )
+            elif output_path in result.gets:
+                # HSI says it copied the file; make sure it copied all of it
+                outcomes[bundle_id] = self._check_staged_size(bundle, hpss_path, output_path)
+        # if HSI failed without telling us about any of the bundles
+        if (not outcomes) and (result.returncode != 0):
+            raise HSICommandFailedException(
+                "read bundles from HPSS", result.completed_process, self.logger
+            )
+        return outcomes
+
+    def _check_staged_size(self, bundle: BundleType, hpss_path: str, output_path: str) -> Optional[Exception]:
+        """Determine if the Bundle copied from tape has the size it should have."""
+        size = os.path.getsize(output_path) if os.path.isfile(output_path) else None
+        if size == bundle["size"]:
+            return None
+        return HSIBatchItemFailedException(
+            "read bundle from HPSS", hpss_path, [f"{output_path} has {size} bytes; expected {bundle['size']} bytes"], self.logger
+        )
 
-        # update the Bundle in the LTA DB
+    async def _update_bundle_in_lta_db(self, lta_rc: RestClient, bundle: BundleType) -> None:
+        """Update the LTA DB to indicate the Bundle is staged on disk."""
+        bundle_id = bundle["uuid"]
         patch_body = {
             "status": self.output_status,
             "reason": "",
@@ -147,13 +326,15 @@ class NerscRetriever(Component):
         self.logger.info(f"PATCH /Bundles/{bundle_id} - '{patch_body}'")
         await lta_rc.request('PATCH', f'/Bundles/{bundle_id}', patch_body)
 
-    def _execute_hsi_command(self, args: List[str]) -> None:
-        completed_process = run(args, stdout=PIPE, stderr=PIPE)
-        # if our command failed
-        if completed_process.returncode != 0:
-            raise HSICommandFailedException(
-                "read bundle from HPSS", completed_process, self.logger
-            )
+    async def _unclaim_bundle(self, lta_rc: RestClient, bundle: BundleType) -> None:
+        """Return a Bundle to the LTA DB, to be copied from tape later."""
+        bundle_id = bundle["uuid"]
+        patch_body = {
+            "claimed": False,
+            "update_timestamp": now(),
+        }
+        self.logger.info(f"PATCH /Bundles/{bundle_id} - '{patch_body}'")
+        await lta_rc.request('PATCH', f'/Bundles/{bundle_id}', patch_body)
 
 
 async def main(nersc_retriever: NerscRetriever) -> None:
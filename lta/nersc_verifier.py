@@ -7,16 +7,17 @@ import asyncio
 import logging
 import os
 from pathlib import Path
-from subprocess import PIPE, run
 import sys
-from typing import Any, Dict, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
 
 from prometheus_client import start_http_server
 from rest_tools.client import RestClient
 
-from .utils import HSICommandFailedException, InvalidChecksumException, \
-    log_completed_process_outputs
+from .utils import HSIBatchItemFailedException, HSICommandFailedException, \
+    InvalidChecksumException
 from .component import COMMON_CONFIG, Component, work_loop, PrometheusResultTracker
+from .hpss_avail import get_hpss_avail_monitor
+from .hsi import HsiSession, tape_order
 from .utils import now, quarantine_now
 from .lta_tools import from_environment
 from .lta_types import BundleType
@@ -27,7 +28,16 @@ LOG = logging.getLogger(__name__)
 
 EXPECTED_CONFIG = COMMON_CONFIG.copy()
 EXPECTED_CONFIG.update({
+    # maximum number of HSI sessions re-reading bundles (hashverify) at once
+    "HASHVERIFY_CONCURRENCY": "2",
     "HPSS_AVAIL_PATH": "/usr/bin/hpss_avail.py",
+    # seconds to trust the last probe of HPSS availability
+    "HPSS_AVAIL_TTL_SECONDS": "60",
+    "HSI_PATH": "/usr/bin/hsi",
+    # seconds an HSI session may run before it is killed
+    "HSI_TIMEOUT_SECONDS": "21600",
+    # maximum number of bundles to verify in a single batch
+    "MAX_COUNT": "5",
     "TAPE_BASE_PATH": None,
     "WORK_RETRIES": "3",
     "WORK_TIMEOUT_SECONDS": "30",
@@ -35,6 +45,8 @@ EXPECTED_CONFIG.update({
 
 QUARANTINE_THEN_KEEP_WORKING = [InvalidChecksumException]
 
+OutcomeCallback = Callable[[BundleType, Optional[Exception]], Awaitable[None]]
+
 
 class NerscVerifier(Component):
     """
@@ -46,9 +58,14 @@ class NerscVerifier(Component):
 
     See: https://docs.nersc.gov/filesystems/archive/
 
-    It uses the LTA DB to find bundles that have a 'verifying' status. After
-    issuing the HPSS command, the Bundle is updated in the LTA DB to have a
-    'completed' status.
+    It uses the LTA DB to find bundles that have a 'verifying' status. It
+    claims up to MAX_COUNT bundles and checks the checksums HPSS has on
+    record for all of them (hashlist) with a single HSI session. HPSS then
+    re-reads the bundles to verify them (hashverify), with one HSI session
+    per tape volume reading the bundles in tape order, and up to
+    HASHVERIFY_CONCURRENCY sessions at once. As soon as a Bundle is
+    verified, it is updated in the LTA DB to have a 'completed' status;
+    only the Bundles that failed are quarantined.
 
     The HSI commands used to interact with the HPSS tape system are documented
     online.
@@ -64,7 +81,15 @@ class NerscVerifier(Component):
         logger - The object the nersc_verifier should use for logging.
         """
         super(NerscVerifier, self).__init__("nersc_verifier", config, logger)
-        self.hpss_avail_path = config["HPSS_AVAIL_PATH"]
+        self.hashverify_concurrency = int(config["HASHVERIFY_CONCURRENCY"])
+        self.hpss_avail_monitor = get_hpss_avail_monitor(
+            config["HPSS_AVAIL_PATH"],
+            float(config["HPSS_AVAIL_TTL_SECONDS"]),
+            self.logger,
+        )
+        self.hsi_path = config["HSI_PATH"]
+        self.hsi_timeout_seconds = float(config["HSI_TIMEOUT_SECONDS"])
+        self.max_count = int(config["MAX_COUNT"])
         self.tape_base_path = config["TAPE_BASE_PATH"]
         self.work_retries = int(config["WORK_RETRIES"])
         self.work_timeout_seconds = float(config["WORK_TIMEOUT_SECONDS"])
@@ -82,46 +107,104 @@ class NerscVerifier(Component):
         lta_rc: RestClient,
         prom_tracker: PrometheusResultTracker,
     ) -> bool:
-        """Claim a bundle and perform work on it -- see super for return value meanings."""
+        """Claim a batch of bundles and perform work on them -- see super for return value meanings."""
         # 0. Do some pre-flight checks to ensure that we can do work
         # if the HPSS system is not available
-        args = [self.hpss_avail_path, "archive"]
-        completed_process = run(args, stdout=PIPE, stderr=PIPE)
-        if completed_process.returncode != 0:
+        if not await self.hpss_avail_monitor.is_available():
             # prevent this instance from claiming any work
-            self.logger.error(f"Unable to do work; HPSS system not available (returncode: {completed_process.returncode})")
+            self.logger.error("Unable to do work; HPSS system not available")
             return False
-        # 1. Ask the LTA DB for the next Bundle to be verified
-        self.logger.info("Asking the LTA DB for a Bundle to verify at NERSC with HPSS.")
-        pop_body = {
-            "claimant": f"{self.name}-{self.instance_uuid}"
-        }
-        response = await lta_rc.request('POST', f'/Bundles/actions/pop?source={self.source_site}&dest={self.dest_site}&status={self.input_status}', pop_body)
-        self.logger.info(f"LTA DB responded with: {response}")
-        bundle = response["bundle"]
-        if not bundle:
+        # 1. Ask the LTA DB for the next Bundles to be verified
+        bundles = await self._claim_bundles(lta_rc)
+        if not bundles:
             self.logger.info("LTA DB did not provide a Bundle to verify at NERSC with HPSS. Going on vacation.")
             return False
 
-        # process the Bundle that we were given
+        # process the Bundles that we were given, reporting on each one as soon as we can
+        failures: List[Exception] = []
+        reported: Set[str] = set()
+
+        async def report(bundle: BundleType, error: Optional[Exception]) -> None:
+            reported.add(bundle["uuid"])
+            if error is not None:
+                failures.append(error)
+            await self._report_outcome(lta_rc, prom_tracker, bundle, error)
+
         try:
-            hpss_path = self._verify_bundle_in_hpss(bundle)
-            await self._update_bundle_in_lta_db(lta_rc, bundle, hpss_path)
-            prom_tracker.record_success()
-            return True
+            outcomes = await self._verify_bundles_in_hpss(bundles, report)
         except Exception as e:
-            prom_tracker.record_failure()
-            await quarantine_now(
-                lta_rc,
-                bundle,
-                e,
-                self.name,
-                self.instance_uuid,
-                self.logger,
-            )
-            if type(e) in QUARANTINE_THEN_KEEP_WORKING:
-                return True
+            # 2. If the batch broke down, the Bundles we haven't reported on failed with it
+            for bundle in bundles:
+                if bundle["uuid"] not in reported:
+                    await self._report_outcome(lta_rc, prom_tracker, bundle, e)
             raise e
+        await self._settle_batch(lta_rc, bundles, outcomes, reported, report)
+        # if nothing in the batch could be verified, stop and let an operator take a look
+        if failures and len(failures) == len(outcomes):
+            self._raise_unless_keep_working(failures)
+        return True
+
+    async def _claim_bundles(self, lta_rc: RestClient) -> List[BundleType]:
+        """Ask the LTA DB for up to max_count Bundles to verify."""
+        self.logger.info(f"Asking the LTA DB for up to {self.max_count} Bundles to verify at NERSC with HPSS.")
+        pop_body = {
+            "claimant": f"{self.name}-{self.instance_uuid}"
+        }
+        bundles: List[BundleType] = []
+        while len(bundles) < self.max_count:
+            response = await lta_rc.request('POST', f'/Bundles/actions/pop?source={self.source_site}&dest={self.dest_site}&status={self.input_status}', pop_body)
+            self.logger.info(f"LTA DB responded with: {response}")
+            bundle = response["bundle"]
+            if not bundle:
+                break
+            bundles.append(bundle)
+        return bundles
+
+    async def _settle_batch(
+        self,
+        lta_rc: RestClient,
+        bundles: List[BundleType],
+        outcomes: Dict[str, Optional[Exception]],
+        reported: Set[str],
+        report: OutcomeCallback,
+    ) -> None:
+        """Report on the Bundles that haven't been reported on yet, and unclaim the ones HSI did not get to."""
+        for bundle in bundles:
+            # 3. Report on any Bundles that we haven't already
+            if bundle["uuid"] in outcomes:
+                if bundle["uuid"] not in reported:
+                    await report(bundle, outcomes[bundle["uuid"]])
+            # 4. Return the Bundles that HSI did not get to
+            else:
+                await self._unclaim_bundle(lta_rc, bundle)
+
+    async def _report_outcome(
+        self,
+        lta_rc: RestClient,
+        prom_tracker: PrometheusResultTracker,
+        bundle: BundleType,
+        error: Optional[Exception],
+    ) -> None:
+        """Advance the Bundle if it was verified, otherwise quarantine it."""
+        if error is None:
+            await self._update_bundle_in_lta_db(lta_rc, bundle, Path(self._get_hpss_path(bundle)))
+            prom_tracker.record_success()
+            return
+        prom_tracker.record_failure()
+        await quarantine_now(
+            lta_rc,
+            bundle,
+            error,
+            self.name,
+            self.instance_uuid,
+            self.logger,
+        )
+
+    def _raise_unless_keep_working(self, failures: List[Exception]) -> None:
+        """Raise the first failure that should stop this component from working."""
+        for error in failures:
+            if type(error) not in QUARANTINE_THEN_KEEP_WORKING:
+                raise error
 
     async def _update_bundle_in_lta_db(
             self,
@@ -147,82 +230,199 @@ class NerscVerifier(Component):
         # the morning sun has vanquished the horrible night
         return True
 
-    def _verify_bundle_in_hpss(self, bundle: BundleType) -> Path:
-        """Verify the checksum of the bundle in HPSS."""
-        # determine the path where it is stored on hpss
+    async def _unclaim_bundle(self, lta_rc: RestClient, bundle: BundleType) -> None:
+        """Return a Bundle that HSI did not get to back to the LTA DB."""
+        bundle_uuid = bundle["uuid"]
+        self.logger.info(f"HSI session did not report on Bundle {bundle_uuid}; will unclaim it.")
+        patch_body = {
+            "claimed": False,
+            "update_timestamp": now(),
+        }
+        self.logger.info(f"PATCH /Bundles/{bundle_uuid} - '{patch_body}'")
+        await lta_rc.request('PATCH', f'/Bundles/{bundle_uuid}', patch_body)
+
+    def _get_hpss_path(self, bundle: BundleType) -> str:
+        """Determine the path where the bundle is stored on HPSS."""
         data_warehouse_path = bundle["path"]
         basename = os.path.basename(bundle["bundle_path"])
         stupid_python_path = os.path.sep.join([self.tape_base_path, data_warehouse_path, basename])
-        hpss_path = os.path.normpath(stupid_python_path)
+        return os.path.normpath(stupid_python_path)
+
+    async def _verify_bundles_in_hpss(
+        self,
+        bundles: List[BundleType],
+        on_outcome: Optional[OutcomeCallback] = None,
+    ) -> Dict[str, Optional[Exception]]:
+        """
+        Verify the checksums of the supplied bundles in HPSS.
+
+        The checksums of all of the bundles are listed (hashlist) with a single
+        HSI session. The bundles that pass are then verified (hashverify) with
+        one HSI session per tape volume, up to HASHVERIFY_CONCURRENCY at once.
+        If provided, on_outcome is awaited with each bundle and its outcome as
+        soon as that outcome is known.
+
+        Return a dictionary mapping the uuid of each bundle that HSI reported
+        on to None (verified) or the Exception describing its failure.
+        Bundles missing from the dictionary were not attempted.
+        """
+        outcomes: Dict[str, Optional[Exception]] = {}
+
+        async def report(bundle: BundleType, outcome: Optional[Exception]) -> None:
+            outcomes[bundle["uuid"]] = outcome
+            if on_outcome:
+                await on_outcome(bundle, outcome)
 
         # "What checksum do you have in your metadata?"
-        # run an hsi command to retrieve the stored checksum of the archive (does not perform checksum calculation)
-        #     -P            -> ("popen" flag) - specifies that HSI is being run via popen (as a child process).
-        #                      All messages (listable output,error message) are written to stdout.
-        #                      HSI may not be used to pipe output to stdout if this flag is specified
-        #                      It also results in setting "quiet" (no extraneous messages) mode,
-        #                      disabling verbose response messages, and disabling interactive file transfer messages
+        hashlist_outcomes, volumes = await self._hashlist_bundles_in_hpss(bundles)
+        for bundle in bundles:
+            if bundle["uuid"] in hashlist_outcomes:
+                await report(bundle, hashlist_outcomes[bundle["uuid"]])
+
+        # "Please read the bytes from tape, compute the checksum, and compare it to what you have in metadata."
+        await self._hashverify_volumes(volumes, report)
+        return outcomes
+
+    async def _hashverify_volumes(self, volumes: List[List[BundleType]], report: OutcomeCallback) -> None:
+        """Verify each tape volume of bundles in HPSS, up to HASHVERIFY_CONCURRENCY at once."""
+        semaphore = asyncio.Semaphore(self.hashverify_concurrency)
+
+        async def hashverify(volume: List[BundleType]) -> Tuple[List[BundleType], Any]:
+            async with semaphore:
+                try:
+                    return (volume, await self._hashverify_bundles_in_hpss(volume))
+                except Exception as e:
+                    return (volume, e)
+
+        tasks = [asyncio.create_task(hashverify(volume)) for volume in volumes]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                volume, volume_outcomes = await next_done
+                # if the whole session failed, so did every bundle in it
+                if isinstance(volume_outcomes, Exception):
+                    volume_outcomes = {bundle["uuid"]: volume_outcomes for bundle in volume}
+                for bundle in volume:
+                    if bundle["uuid"] in volume_outcomes:
+                        await report(bundle, volume_outcomes[bundle["uuid"]])
+        finally:
+            # if we're leaving early, don't leave HSI sessions running
+            for task in tasks:
+                task.cancel()
+
+    async def _hashlist_bundles_in_hpss(
+        self,
+        bundles: List[BundleType],
+    ) -> Tuple[Dict[str, Exception], List[List[BundleType]]]:
+        """
+        Check the checksums that HPSS has on record for the supplied bundles.
+
+        Return a dictionary mapping the uuid of each bundle that failed to
+        the Exception describing its failure, and the bundles that passed,
+        grouped by tape volume and sorted by tape position.
+        """
+        session = HsiSession(self.hsi_path, self.logger, self.hsi_timeout_seconds)
+        hpss_paths = {bundle["uuid"]: self._get_hpss_path(bundle) for bundle in bundles}
+
+        # retrieve the stored checksum of each archive (does not perform checksum calculation)
         #     hashlist      -> List checksum hash for HPSS file(s)
-        args = ["/usr/bin/hsi", "-P", "hashlist", hpss_path]
-        completed_process = run(args, stdout=PIPE, stderr=PIPE)
-        # if our command failed
-        if completed_process.returncode != 0:
+        #     ls -P         -> list the tape volume and position of the file
+        for hpss_path in hpss_paths.values():
+            session.add("hashlist", hpss_path)
+            session.add("ls", "-P", hpss_path)
+
+        result = await session.run()
+        failures: Dict[str, Exception] = {}
+        passed: List[BundleType] = []
+        for bundle in bundles:
+            bundle_uuid = bundle["uuid"]
+            hpss_path = hpss_paths[bundle_uuid]
+
+            # now, check that the checksum value retrieval was ok
+            # 1693e9d0273e3a2995b917c0e72e6bd2f40ea677f3613b6d57eaa14bd3a285c73e8db8b6e556b886c3929afe324bcc718711f2faddfeb43c3e030d9afe697873 sha512 /home/projects/icecube/data/exp/IceCube/2018/unbiased/PFDST/1230/50145c5c-01e1-4727-a9a1-324e5af09a29.zip [hsi]
+            if hpss_path not in result.hashlist:
+                errors = result.errors_for(hpss_path)
+                if errors:
+                    failures[bundle_uuid] = HSIBatchItemFailedException(
+                        "list checksum in HPSS (hashlist)", hpss_path, errors, self.logger
+                    )
+                continue
+            # now we'll compare the bundle's checksum
+            cached_checksum_sha512 = result.hashlist[hpss_path]
+            if bundle["checksum"]["sha512"] != cached_checksum_sha512:
+                failures[bundle_uuid] = InvalidChecksumException(
+                    bundle['checksum']['sha512'],
+                    cached_checksum_sha512,
+                    self.logger,
+                )
+                continue
+            # remember where it is on tape, so we can read it in order
+            if hpss_path in result.tape:
+                volume, position = result.tape[hpss_path]
+                bundle = {**bundle, "tape": {"volume": volume, "position": position}}
+            passed.append(bundle)
+
+        # if HSI failed without telling us about any of the bundles
+        if (not failures) and (not passed) and (result.returncode != 0):
             raise HSICommandFailedException(
-                "list checksum in HPSS (hashlist)", completed_process, self.logger
+                "verify bundles in HPSS", result.completed_process, self.logger
             )
 
-        # now, check that the checksum value retrieval was ok
-        # 1693e9d0273e3a2995b917c0e72e6bd2f40ea677f3613b6d57eaa14bd3a285c73e8db8b6e556b886c3929afe324bcc718711f2faddfeb43c3e030d9afe697873 sha512 /home/projects/icecube/data/exp/IceCube/2018/unbiased/PFDST/1230/50145c5c-01e1-4727-a9a1-324e5af09a29.zip [hsi]
-        result = completed_process.stdout.decode("utf-8")
-        lines = result.split("\n")
-        cols = lines[0].split(" ")
-        cached_checksum_sha512 = cols[0]
-        # now we'll compare the bundle's checksum
-        if bundle["checksum"]["sha512"] != cached_checksum_sha512:
-            log_completed_process_outputs(
-                completed_process, "list checksum in HPSS (hashlist)", self.logger)
-            raise InvalidChecksumException(
-                bundle['checksum']['sha512'],
-                cached_checksum_sha512,
-                self.logger,
-            )
+        # group the bundles by tape volume, in tape order
+        volumes: Dict[str, List[BundleType]] = {}
+        for bundle in sorted(passed, key=tape_order):
+            volumes.setdefault(tape_order(bundle)[1], []).append(bundle)
+        return (failures, list(volumes.values()))
 
-        # "Please read the bytes from tape, compute the checksum, and compare it to what you have in metadata."
-        # run an hsi command to re-calculate the checksum of the archive and *compare against* the stored value
-        #     -P            -> ("popen" flag) - specifies that HSI is being run via popen (as a child process).
-        #                      All messages (listable output,error message) are written to stdout.
-        #                      HSI may not be used to pipe output to stdout if this flag is specified
-        #                      It also results in setting "quiet" (no extraneous messages) mode,
-        #                      disabling verbose response messages, and disabling interactive file transfer messages
+    async def _hashverify_bundles_in_hpss(self, bundles: List[BundleType]) -> Dict[str, Optional[Exception]]:
+        """
+        Verify the supplied bundles against their stored checksums with a single HSI session.
+
+        Return a dictionary mapping the uuid of each bundle that HSI reported
+        on to None (verified) or the Exception describing its failure.
+        Bundles missing from the dictionary were not attempted.
+        """
+        session = HsiSession(self.hsi_path, self.logger, self.hsi_timeout_seconds)
+        hpss_paths = {bundle["uuid"]: self._get_hpss_path(bundle) for bundle in bundles}
+
+        # re-calculate the checksum of each archive and *compare against* the stored value
         #     hashverify    -> Verify checksum hash for existing HPSS file(s)
         #     -A            -> enable auto-scheduling of retrievals
-        args = ["/usr/bin/hsi", "-P", "hashverify", "-A", hpss_path]
-        completed_process = run(args, stdout=PIPE, stderr=PIPE)
-        # if our command failed
-        if completed_process.returncode != 0:
+        for hpss_path in hpss_paths.values():
+            session.add("hashverify", "-A", hpss_path)
+
+        result = await session.run()
+        outcomes: Dict[str, Optional[Exception]] = {}
+        for bundle in bundles:
+            bundle_uuid = bundle["uuid"]
+            hpss_path = hpss_paths[bundle_uuid]
+
+            # now, check that the stored checksum value is consistent with the actual value
+            # /home/projects/icecube/data/exp/IceCube/2018/unbiased/PFDST/1230/50145c5c-01e1-4727-a9a1-324e5af09a29.zip: (sha512) OK
+            if hpss_path not in result.hashverify:
+                errors = result.errors_for(hpss_path)
+                if errors:
+                    outcomes[bundle_uuid] = HSIBatchItemFailedException(
+                        "verify bundle in HPSS (hashverify)", hpss_path, errors, self.logger
+                    )
+                continue
+            checksum_result = result.hashverify[hpss_path]
+            if checksum_result != "(sha512) OK":
+                self.logger.info(f"EXPECTED: {hpss_path}: (sha512) OK -- ({checksum_result=})")
+                outcomes[bundle_uuid] = InvalidChecksumException(
+                    bundle['checksum']['sha512'],
+                    "[unknown but confirmed as different by hashverify]",
+                    self.logger,
+                )
+                continue
+
+            outcomes[bundle_uuid] = None
+
+        # if HSI failed without telling us about any of the bundles
+        if (not outcomes) and (result.returncode != 0):
             raise HSICommandFailedException(
-                "verify bundle in HPSS (hashverify)", completed_process, self.logger
+                "verify bundles in HPSS (hashverify)", result.completed_process, self.logger
             )
-
-        # now, check that the stored checksum value is consistent with the actual value
-        # /home/projects/icecube/data/exp/IceCube/2018/unbiased/PFDST/1230/50145c5c-01e1-4727-a9a1-324e5af09a29.zip: (sha512) OK
-        result = completed_process.stdout.decode("utf-8")
-        lines = result.split("\n")
-        cols = lines[0].split(" ")
-        checksum_type = cols[1]
-        checksum_result = cols[2]
-        # now we'll compare the bundle's checksum
-        if (checksum_type != '(sha512)') or (checksum_result != 'OK'):
-            self.logger.info(f"EXPECTED: {hpss_path}: (sha512) OK -- ({checksum_type=} {checksum_result=})")
-            log_completed_process_outputs(
-                completed_process, "verify bundle checksum in HPSS (hashverify)", self.logger)
-            raise InvalidChecksumException(
-                bundle['checksum']['sha512'],
-                "[unknown but confirmed as different by hashverify]",
-                self.logger,
-            )
-
-        return Path(hpss_path)
+        return outcomes
 
 
 async def main(nersc_verifier: NerscVerifier) -> None:
@@ -4,11 +4,13 @@
 # fmt:off
 
 import asyncio
+from datetime import datetime
 import logging
 import os
 import shutil
 import sys
-from typing import Any, Dict, List, Optional, Tuple
+import time
+from typing import Any, cast, Dict, List, Optional, Tuple
 
 from prometheus_client import start_http_server
 from rest_tools.client import RestClient
@@ -27,6 +29,8 @@ EXPECTED_CONFIG.update({
     "INPUT_PATH": None,
     "OUTPUT_PATH": None,
     "OUTPUT_QUOTA": None,
+    "OUTPUT_RECONCILE_SECONDS": "300",
+    "ADMISSION_WINDOW_SECONDS": "86400",
     "WORK_RETRIES": "3",
     "WORK_TIMEOUT_SECONDS": "30",
 })
@@ -41,6 +45,18 @@ class RateLimiter(Component):
     the files in the output directory exceed the configured output quota, the
     bundle archive will not be moved. This component limits the rate of bundles
     that are "in-flight" to the destination site at any given time.
+
+    The size of the output directory is tracked with a ledger that grows as
+    bundles are moved in. Downstream components delete bundles from the output
+    directory, so the ledger is periodically reconciled with the file system.
+    Other replicas may stage bundles into the same output directory, so the
+    ledger is also reconciled before the quota is filled, and again at the
+    start of the next work cycle.
+
+    Bundles are admitted in FIFO order until the quota is full. When the next
+    Bundle in line does not fit, the remaining quota is filled with the oldest
+    Bundles that do fit. Once the Bundle at the front of the line has waited
+    longer than the admission window, the quota is held for it instead.
     """
 
     def __init__(self, config: Dict[str, str], logger: Logger) -> None:
@@ -54,8 +70,21 @@ class RateLimiter(Component):
         self.input_path = config["INPUT_PATH"]
         self.output_path = config["OUTPUT_PATH"]
         self.output_quota = int(config["OUTPUT_QUOTA"])
+        self.output_reconcile_seconds = float(config["OUTPUT_RECONCILE_SECONDS"])
+        self.admission_window_seconds = float(config["ADMISSION_WINDOW_SECONDS"])
         self.work_retries = int(config["WORK_RETRIES"])
         self.work_timeout_seconds = float(config["WORK_TIMEOUT_SECONDS"])
+        # ledger of bytes in the output directory; None until first measured
+        self.output_ledger: Optional[int] = None
+        self.output_ledger_timestamp = 0.0
+        self.prom_output_ledger = self.prometheus.gauge(
+            "lta_rate_limiter_output_ledger_bytes",
+            "LTA rate limiter: bytes in the output directory according to the ledger",
+        )
+        self.prom_output_ledger_drift = self.prometheus.gauge(
+            "lta_rate_limiter_output_ledger_drift_bytes",
+            "LTA rate limiter: ledger minus measured bytes at the last reconciliation",
+        )
 
     def _do_status(self) -> Dict[str, Any]:
         """Contribute no additional status."""
@@ -94,6 +123,65 @@ class RateLimiter(Component):
         self.logger.info(f"Found {len(disk_files)} entries ({size} bytes) in {path}")
         return (disk_files, size)
 
+    def _get_output_size(self) -> int:
+        """Obtain the size of the output directory, reconciling the ledger if it is stale."""
+        elapsed = time.monotonic() - self.output_ledger_timestamp
+        if (self.output_ledger is None) or (elapsed >= self.output_reconcile_seconds):
+            self._reconcile_output_ledger()
+        return cast(int, self.output_ledger)
+
+    def _reconcile_output_ledger(self) -> None:
+        """Measure the output directory and reset the ledger to match."""
+        measured_size = self._get_files_and_size(self.output_path)[1]
+        if self.output_ledger is not None:
+            # files deleted downstream make the ledger run high
+            drift = self.output_ledger - measured_size
+            self.logger.info(f"Output ledger of {self.output_ledger} bytes drifted {drift} bytes from measured {measured_size} bytes.")
+            self.prom_output_ledger_drift.set(drift)
+        self.output_ledger = measured_size
+        self.output_ledger_timestamp = time.monotonic()
+        self.prom_output_ledger.set(measured_size)
+
+    def _expire_output_ledger(self) -> None:
+        """Make the next look at the output directory measure it again."""
+        self.output_ledger_timestamp = 0.0
+
+    def _add_to_output_ledger(self, size: int) -> None:
+        """Record bytes that have been moved into the output directory."""
+        self.output_ledger = (self.output_ledger or 0) + size
+        self.prom_output_ledger.set(self.output_ledger)
+
+    def _is_past_admission_window(self, bundle: BundleType) -> bool:
+        """Determine if the Bundle has waited in the input status longer than the admission window.
+
+        The wait is measured from 'status_timestamp', which the LTA DB sets
+        whenever the status of a Bundle changes. Neither 'create_timestamp'
+        (the Bundle may have spent days upstream) nor 'update_timestamp'
+        (every claim bumps it) says when the Bundle arrived here, but a
+        Bundle that entered its status before the LTA DB recorded
+        'status_timestamp' has only those; it falls back on the later one.
+        """
+        for field in ["status_timestamp", "update_timestamp", "create_timestamp"]:
+            if field in bundle:
+                break
+        else:
+            return False
+        arrived = datetime.fromisoformat(bundle[field])
+        waited = datetime.fromisoformat(now()) - arrived
+        return waited.total_seconds() > self.admission_window_seconds
+
+    async def _pop_bundle(self, lta_rc: RestClient, max_size: Optional[int] = None) -> Optional[BundleType]:
+        """Ask the LTA DB for the next Bundle to be staged, optionally no larger than max_size bytes."""
+        pop_body = {
+            "claimant": f"{self.name}-{self.instance_uuid}"
+        }
+        pop_url = f'/Bundles/actions/pop?source={self.source_site}&dest={self.dest_site}&status={self.input_status}'
+        if max_size is not None:
+            pop_url = f'{pop_url}&max_size={max_size}'
+        response = await lta_rc.request('POST', pop_url, pop_body)
+        self.logger.info(f"LTA DB responded with: {response}")
+        return cast(Optional[BundleType], response["bundle"])
+
     async def _do_work_claim(
         self,
         lta_rc: RestClient,
@@ -102,21 +190,17 @@ class RateLimiter(Component):
         """Claim a bundle and perform work on it -- see super for return value meanings."""
         # 1. Ask the LTA DB for the next Bundle to be staged
         self.logger.info("Asking the LTA DB for a Bundle to stage.")
-        pop_body = {
-            "claimant": f"{self.name}-{self.instance_uuid}"
-        }
-        response = await lta_rc.request('POST', f'/Bundles/actions/pop?source={self.source_site}&dest={self.dest_site}&status={self.input_status}', pop_body)
-        self.logger.info(f"LTA DB responded with: {response}")
-        bundle = response["bundle"]
+        bundle = await self._pop_bundle(lta_rc)
         if not bundle:
             self.logger.info("LTA DB did not provide a Bundle to stage. Going on vacation.")
+            self._expire_output_ledger()
             return False
         # process the Bundle that we were given
         try:
-            await self._stage_bundle(lta_rc, bundle)
-            prom_tracker.record_success()
-            # even if we are successful, take a break between each bundle
-            return False
+            if await self._stage_bundle(lta_rc, bundle):
+                prom_tracker.record_success()
+                # keep going until the output directory is full
+                return True
         except Exception as e:
             prom_tracker.record_failure()
             await quarantine_now(
@@ -128,12 +212,53 @@ class RateLimiter(Component):
                 self.logger,
             )
             raise e
+        # 2. The Bundle at the front of the line doesn't fit; use the rest of the quota
+        if self._is_past_admission_window(bundle):
+            self.logger.info(f"Bundle {bundle['uuid']} has waited longer than {self.admission_window_seconds} seconds; holding the output quota for it.")
+        else:
+            try:
+                count = await self._fill_output_quota(lta_rc)
+            except Exception:
+                prom_tracker.record_failure()
+                raise
+            if count:
+                prom_tracker.record_success()
+        # other replicas keep staging Bundles while this one pauses
+        self._expire_output_ledger()
+        return False
+
+    async def _fill_output_quota(self, lta_rc: RestClient) -> int:
+        """Stage the oldest Bundles that fit in the remaining output quota."""
+        # other replicas may have staged Bundles since we last looked
+        self._reconcile_output_ledger()
+        count = 0
+        while (remaining := self.output_quota - self._get_output_size()) > 0:
+            self.logger.info(f"Asking the LTA DB for a Bundle of at most {remaining} bytes to stage.")
+            bundle = await self._pop_bundle(lta_rc, max_size=remaining)
+            if not bundle:
+                break
+            try:
+                if not await self._stage_bundle(lta_rc, bundle):
+                    break
+            except Exception as e:
+                await quarantine_now(
+                    lta_rc,
+                    bundle,
+                    e,
+                    self.name,
+                    self.instance_uuid,
+                    self.logger,
+                )
+                raise e
+            count += 1
+        self.logger.info(f"Staged {count} Bundles to fill the output quota.")
+        return count
 
     async def _stage_bundle(self, lta_rc: RestClient, bundle: BundleType) -> bool:
         """Stage the Bundle to the output directory for transfer."""
         bundle_id = bundle["uuid"]
         # measure output directory size, our bundle's size, and the quota
-        output_size = self._get_files_and_size(self.output_path)[1]
+        output_size = self._get_output_size()
         bundle_size = bundle["size"]
         total_size = output_size + bundle_size
         # if we would exceed our destination quota
@@ -154,6 +279,7 @@ class RateLimiter(Component):
         dst_path = os.path.join(self.output_path, bundle_name)
         self.logger.info(f"Moving Bundle {src_path} -> {dst_path}")
         shutil.move(src_path, dst_path)
+        self._add_to_output_ledger(bundle_size)
         # update the Bundle in the LTA DB
         self.logger.info("Bundle has been staged to the output directory.")
         patch_body = {
@@ -168,14 +294,16 @@ class RateLimiter(Component):
         return True
 
     async def _unclaim_bundle(self, lta_rc: RestClient, bundle: BundleType) -> bool:
-        """Return the Bundle to the LTA DB, unclaim it for processing at a later date."""
+        """Return the Bundle to the LTA DB, unclaim it for processing at a later date.
+
+        The Bundle keeps its work_priority_timestamp, so it stays at the front
+        of the line while smaller Bundles are used to fill the output quota.
+        """
         self.logger.info("Bundle is not ready to be staged; will unclaim it.")
         bundle_id = bundle["uuid"]
-        right_now = now()
         patch_body: Dict[str, Any] = {
             "claimed": False,
-            "update_timestamp": right_now,
-            "work_priority_timestamp": right_now,
+            "update_timestamp": now(),
         }
         self.logger.info(f"PATCH /Bundles/{bundle_id} - '{patch_body}'")
         await lta_rc.request('PATCH', f'/Bundles/{bundle_id}', patch_body)
@@ -5,20 +5,25 @@ Run with `python -m lta.rest_server`.
 """
 
 import asyncio
+from contextlib import asynccontextmanager
 import time
 import logging
 import os
+import posixpath
+import re
 import sys
-from typing import Any, cast, List, Optional, Tuple, Union
+from typing import Any, AsyncIterator, cast, List, Optional, Tuple, Union
 from urllib.parse import quote_plus
 from uuid import uuid1
 
 from pymongo import AsyncMongoClient
+from pymongo.asynchronous.client_session import AsyncClientSession
 from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import DuplicateKeyError
 import prometheus_client
 import pymongo
 from pymongo import MongoClient
-from rest_tools.utils.json_util import json_decode
+from rest_tools.utils.json_util import json_decode, json_encode
 from rest_tools.server import (
     RestHandler,
     RestHandlerSetup,
@@ -31,7 +36,7 @@ import tornado.web
 from wipac_dev_tools import from_environment, strtobool
 from wipac_dev_tools.string_tools import regex_named_groups_to_template
 
-from .rest_server_utils.status_poller import status_poller
+from .rest_server_utils.status_poller import STATUS_COUNTS, status_poller
 from .rest_server_utils.utils import (
     BUNDLES,
     DatabaseType,
@@ -48,6 +53,18 @@ from .utils import now
 # maximum number of Metadata UUIDs to supply to MongoDB.deleteMany() during bulk_delete
 DELETE_CHUNK_SIZE = 1000
 
+# maximum number of Bundle UUIDs to supply to MongoDB.find() at once during bulk_get
+GET_CHUNK_SIZE = 1000
+
+# seconds a lock document is held before another LTA DB replica may take it over
+LOCK_LEASE_SECONDS = 30
+
+# seconds to wait between attempts to take a lock document that is held
+LOCK_RETRY_SECONDS = 0.05
+
+# seconds to wait for a lock document before giving up with 503 Service Unavailable
+LOCK_WAIT_SECONDS = 10
+
 EXPECTED_CONFIG = {
     'LOG_LEVEL': 'DEBUG',
     'CI_TEST': 'FALSE',
@@ -72,20 +89,35 @@ LOG = logging.getLogger(__name__)
 AFTER = pymongo.ReturnDocument.AFTER
 ALL_DOCUMENTS: dict[str, Any] = {"uuid": {"$exists": True}}
 FIRST_IN_FIRST_OUT = [("work_priority_timestamp", pymongo.ASCENDING)]
+# the collection of lock documents shared by every replica of the LTA DB
+LOCKS = "Locks"
 LOGGING_DENY_LIST = ["LTA_MONGODB_AUTH_PASS"]
 LTA_AUTH_PREFIX = "resource_access.long-term-archive.roles"
 LTA_AUTH_ROLES = ["system"]
 REMOVE_ID = {"_id": False}
+REQUEST_STATUS = [("request", pymongo.ASCENDING), ("status", pymongo.ASCENDING)]
+TAPE_ORDER = [("tape.position", pymongo.ASCENDING), ("work_priority_timestamp", pymongo.ASCENDING)]
+# a TransferRequest may be completed once all of its Bundles are in these statuses
+TRANSFER_REQUEST_DONE_STATUSES = ["deleted", "finished"]
+# a TransferRequest in these statuses no longer claims its path
+TRANSFER_REQUEST_INACTIVE_STATUSES = ["completed", "finished"]
+# the lock document held while checking for overlapping TransferRequests and creating a new one
+TRANSFER_REQUESTS_LOCK = "transfer_requests"
+# the fields of each Bundle that GET /Dashboard reports
+DASHBOARD_BUNDLE_FIELDS = ["claim_timestamp", "claimant", "claimed", "create_timestamp", "path",
+                           "request", "status", "type", "update_timestamp", "uuid"]
 
 # -----------------------------------------------------------------------------
 
 # these are the indexes we expect in our backing MongoDB
-MONGO_INDEXES: List[Tuple[str, str, str, Optional[bool]]] = [
+MONGO_INDEXES: List[Tuple[str, Union[str, List[Tuple[str, int]]], str, Optional[bool]]] = [
     # (collection,       field,                     index_name,                                        unique)
     ("Bundles",          "create_timestamp",        "bundles_create_timestamp_index",                  False),  # noqa: E241
     ("Bundles",          "request",                 "bundles_request_index",                           None),   # noqa: E241
+    ("Bundles",          REQUEST_STATUS,            "bundles_request_status_index",                    None),   # noqa: E241
     ("Bundles",          "source",                  "bundles_source_index",                            None),   # noqa: E241
     ("Bundles",          "status",                  "bundles_status_index",                            None),   # noqa: E241
+    ("Bundles",          "tape.volume",             "bundles_tape_volume_index",                       None),   # noqa: E241
     ("Bundles",          "uuid",                    "bundles_uuid_index",                              True),   # noqa: E241
     ("Bundles",          "verified",                "bundles_verified_index",                          None),   # noqa: E241
     ("Bundles",          "work_priority_timestamp", "bundles_work_priority_timestamp_index",           False),  # noqa: E241
@@ -94,6 +126,7 @@ MONGO_INDEXES: List[Tuple[str, str, str, Optional[bool]]] = [
     ("Metadata",         "uuid",                    "metadata_uuid_index",                             True),   # noqa: E241
 
     ("TransferRequests", "create_timestamp",        "transfer_requests_create_timestamp_index",        False),  # noqa: E241
+    ("TransferRequests", "path",                    "transfer_requests_path_index",                    None),   # noqa: E241
     ("TransferRequests", "uuid",                    "transfer_requests_uuid_index",                    True),   # noqa: E241
     ("TransferRequests", "work_priority_timestamp", "transfer_requests_work_priority_timestamp_index", False),  # noqa: E241
 ]
@@ -102,6 +135,110 @@ MONGO_INDEXES: List[Tuple[str, str, str, Optional[bool]]] = [
 
 lta_auth = keycloak_role_auth
 
+
+def bulk_updates(req: dict[str, Any]) -> dict[str, dict[str, Any]]:
+    """Check the body of POST /Bundles/actions/bulk_update, and provide the update for each Bundle (by uuid).
+
+    The body has the same 'update' for all of the 'bundles', or a separate
+    update for each Bundle in 'updates' (an object keyed by uuid). With
+    'if_status', a Bundle is only updated if it is unclaimed and still has
+    that status.
+    """
+    if 'updates' in req:
+        updates = _separate_updates(req['updates'])
+    else:
+        updates = _shared_updates(req)
+    # remember when the Bundles entered their new status
+    right_now = now()
+    for update in updates.values():
+        if "status" in update:
+            update.setdefault("status_timestamp", right_now)
+    return updates
+
+
+def _separate_updates(updates: Any) -> dict[str, dict[str, Any]]:
+    """Check the 'updates' field of POST /Bundles/actions/bulk_update, or raise a 400 error."""
+    if not isinstance(updates, dict):
+        raise tornado.web.HTTPError(400, reason="updates field is not an object")
+    if not updates:
+        raise tornado.web.HTTPError(400, reason="updates field is empty")
+    if not all(isinstance(update, dict) for update in updates.values()):
+        raise tornado.web.HTTPError(400, reason="updates field is not an object of objects")
+    return updates
+
+
+def _shared_updates(req: dict[str, Any]) -> dict[str, dict[str, Any]]:
+    """Check the 'update' and 'bundles' fields of POST /Bundles/actions/bulk_update, or raise a 400 error."""
+    if 'update' not in req:
+        raise tornado.web.HTTPError(400, reason="missing update field")
+    if not isinstance(req['update'], dict):
+        raise tornado.web.HTTPError(400, reason="update field is not an object")
+    if 'bundles' not in req:
+        raise tornado.web.HTTPError(400, reason="missing bundles field")
+    if not isinstance(req['bundles'], list):
+        raise tornado.web.HTTPError(400, reason="bundles field is not a list")
+    if not req['bundles']:
+        raise tornado.web.HTTPError(400, reason="bundles field is empty")
+    return {uuid: dict(req['update']) for uuid in req['bundles']}
+
+
+def bundle_projection(fields: Optional[List[str]]) -> dict[str, bool]:
+    """Build the projection for Bundles that only includes the provided fields (and uuid), or everything but the files."""
+    if fields is None:
+        return {"_id": False, "files": False}
+    projection = {field: True for field in fields}
+    projection.update({"_id": False, "uuid": True})
+    return projection
+
+
+def overlap_query(path: str) -> dict[str, Any]:
+    """Build the query for the active TransferRequests whose paths overlap the provided (normalized) path."""
+    ancestors = [path]
+    while posixpath.dirname(ancestors[-1]) != ancestors[-1]:
+        ancestors.append(posixpath.dirname(ancestors[-1]))
+    # TransferRequests stored before paths were normalized may end with a slash
+    ancestors += [f"{ancestor}/" for ancestor in ancestors if ancestor != "/"]
+    return {
+        "status": {"$nin": TRANSFER_REQUEST_INACTIVE_STATUSES},
+        "$or": [
+            # the path itself, or any directory above it
+            {"path": {"$in": ancestors}},
+            # anything below the path; an anchored regex is a range scan on the index
+            {"path": {"$regex": f"^{re.escape(path.rstrip('/'))}/"}},
+        ],
+    }
+
+
+def check_transfer_request(req: dict[str, Any]) -> bool:
+    """Check the fields of POST /TransferRequests and pop its allow_overlap field, or raise a 400 error."""
+    fields = ["source", "dest", "path"]
+    for field in fields:
+        if field not in req:
+            raise tornado.web.HTTPError(400, reason=f"missing {field} field")
+    for field in fields:
+        if not isinstance(req[field], str):
+            raise tornado.web.HTTPError(400, reason=f"{field} field is not a string")
+    for field in fields:
+        if not req[field]:
+            raise tornado.web.HTTPError(400, reason=f"{field} field is empty")
+    allow_overlap = req.pop('allow_overlap', False)
+    if not isinstance(allow_overlap, bool):
+        raise tornado.web.HTTPError(400, reason="allow_overlap field is not a boolean")
+    return allow_overlap
+
+
+def parse_fields(fields: Any) -> List[str]:
+    """Check that the provided fields are a list of field names, or raise a 400 error."""
+    if isinstance(fields, str):
+        fields = [f.strip() for f in fields.split(",") if f.strip()]
+    if not isinstance(fields, list) or not all(isinstance(f, str) for f in fields):
+        raise tornado.web.HTTPError(400, reason="fields field is not a list of strings")
+    if not fields:
+        raise tornado.web.HTTPError(400, reason="fields field is empty")
+    if any(f == "_id" or f.startswith("$") for f in fields):
+        raise tornado.web.HTTPError(400, reason="fields field names a field that is not allowed")
+    return fields
+
 # -----------------------------------------------------------------------------
 
 
@@ -110,6 +247,63 @@ def unique_id() -> str:
     return uuid1().hex
 
 
+async def supports_transactions(db: AsyncDatabase[DatabaseType]) -> bool:
+    """Determine if the MongoDB deployment backing the database supports transactions."""
+    hello = await db.client.admin.command("hello")
+    # replica set members report 'setName', mongos routers report 'isdbgrid'
+    return ("setName" in hello) or (hello.get("msg") == "isdbgrid")
+
+
+class TransactionSupport:
+    """Ask the MongoDB deployment once whether it supports transactions, and remember the answer."""
+
+    def __init__(self, db: AsyncDatabase[DatabaseType]) -> None:
+        """Initialize a TransactionSupport object."""
+        self.db = db
+        self.supported: Optional[bool] = None
+
+    async def __call__(self) -> bool:
+        """Determine if the MongoDB deployment supports transactions."""
+        if self.supported is None:
+            self.supported = await supports_transactions(self.db)
+        return self.supported
+
+
+async def _take_lock(db: AsyncDatabase[DatabaseType], name: str, owner: str) -> bool:
+    """Try once to take the named lock document; return False if someone else holds it."""
+    right_now = time.time()
+    # match the lock only if its lease has run out; if someone else holds it, the upsert
+    # tries to insert a second document with the same _id, and MongoDB refuses
+    query = {"_id": name, "expires": {"$lt": right_now}}
+    update = {"$set": {"owner": owner, "expires": right_now + LOCK_LEASE_SECONDS}}
+    try:
+        logging.debug(f"MONGO-START: db.{LOCKS}.update_one(filter={query}, update={update}, upsert=True)")
+        await db[LOCKS].update_one(query, update, upsert=True)
+        logging.debug(f"MONGO-END:   db.{LOCKS}.update_one(filter, update, upsert)")
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+@asynccontextmanager
+async def mongo_lock(db: AsyncDatabase[DatabaseType], name: str) -> AsyncIterator[None]:
+    """Hold the named lock document, so only one replica of the LTA DB does the work at a time."""
+    owner = unique_id()
+    deadline = time.monotonic() + LOCK_WAIT_SECONDS
+    while not await _take_lock(db, name, owner):
+        if time.monotonic() > deadline:
+            raise tornado.web.HTTPError(503, reason=f"timed out waiting for lock {name}")
+        await asyncio.sleep(LOCK_RETRY_SECONDS)
+    try:
+        yield
+    finally:
+        # release the lock only if it is still ours; it may have outlived its lease
+        query = {"_id": name, "owner": owner}
+        logging.debug(f"MONGO-START: db.{LOCKS}.delete_one(filter={query})")
+        await db[LOCKS].delete_one(query)
+        logging.debug(f"MONGO-END:   db.{LOCKS}.delete_one(filter)")
+
+
 # -----------------------------------------------------------------------------
 
 
@@ -121,11 +315,17 @@ class BaseLTAHandler(RestHandler):
             db: AsyncDatabase[DatabaseType],
             prometheus_route_name: str,
             *args: Any,
+            transfer_requests_lock: Optional[asyncio.Lock] = None,
+            transaction_support: Optional[TransactionSupport] = None,
             **kwargs: Any) -> None:
         """Initialize a BaseLTAHandler object."""
         super(BaseLTAHandler, self).initialize(*args, **kwargs)
         self.db = db
         self.prometheus_route_name = prometheus_route_name
+        # held while checking for overlapping TransferRequests and creating a new one; this
+        # lock is per-process, the TRANSFER_REQUESTS_LOCK document covers the other replicas
+        self.transfer_requests_lock = transfer_requests_lock or asyncio.Lock()
+        self.transaction_support = transaction_support or TransactionSupport(db)
 
     def prepare(self):
         """Prepare before http-method request handlers."""
@@ -165,6 +365,7 @@ class BundlesActionsBulkCreateHandler(BaseLTAHandler):
             xfer_bundle["create_timestamp"] = right_now
             xfer_bundle["update_timestamp"] = right_now
             xfer_bundle["work_priority_timestamp"] = right_now
+            xfer_bundle["status_timestamp"] = right_now
             xfer_bundle["claimed"] = False
 
         logging.debug(f"MONGO-START: db.Bundles.insert_many(documents={req['bundles']})")
@@ -215,39 +416,69 @@ class BundlesActionsBulkDeleteHandler(BaseLTAHandler):
         self.write({'bundles': results, 'count': len(results)})
 
 
-class BundlesActionsBulkUpdateHandler(BaseLTAHandler):
-    """Handler for /Bundles/actions/bulk_update."""
+class BundlesActionsBulkGetHandler(BaseLTAHandler):
+    """Handler for /Bundles/actions/bulk_get."""
 
     @lta_auth(prefix=LTA_AUTH_PREFIX, roles=LTA_AUTH_ROLES)  # type: ignore
     async def post(self) -> None:
-        """Handle POST /Bundles/actions/bulk_update."""
+        """Handle POST /Bundles/actions/bulk_get."""
         req = json_decode(self.request.body)
-        if 'update' not in req:
-            raise tornado.web.HTTPError(400, reason="missing update field")
-        if not isinstance(req['update'], dict):
-            raise tornado.web.HTTPError(400, reason="update field is not an object")
         if 'bundles' not in req:
             raise tornado.web.HTTPError(400, reason="missing bundles field")
         if not isinstance(req['bundles'], list):
             raise tornado.web.HTTPError(400, reason="bundles field is not a list")
         if not req['bundles']:
             raise tornado.web.HTTPError(400, reason="bundles field is empty")
+        fields = parse_fields(req["fields"]) if "fields" in req else None
+        projection = bundle_projection(fields)
+
+        # stream the Bundles back as we find them, a chunk at a time
+        self.set_header("Content-Type", "application/json; charset=UTF-8")
+        self.write('{"bundles":[')
+        count = 0
+        uuids = req["bundles"]
+        for i in range(0, len(uuids), GET_CHUNK_SIZE):
+            query = {"uuid": {"$in": uuids[i:i + GET_CHUNK_SIZE]}}
+            logging.debug(f"MONGO-START: db.Bundles.find(filter={query}, projection={projection})")
+            async for row in self.db.Bundles.find(filter=query,
+                                                  projection=projection):
+                self.write(("," if count else "") + json_encode(row))
+                count += 1
+            logging.debug("MONGO-END*:   db.Bundles.find(filter, projection)")
+            await self.flush()
+        self.write(f'],"count":{count}}}')
+
+
+class BundlesActionsBulkUpdateHandler(BaseLTAHandler):
+    """Handler for /Bundles/actions/bulk_update."""
+
+    @lta_auth(prefix=LTA_AUTH_PREFIX, roles=LTA_AUTH_ROLES)  # type: ignore
+    async def post(self) -> None:
+        """Handle POST /Bundles/actions/bulk_update."""
+        req = json_decode(self.request.body)
+        updates = bulk_updates(req)
+        if_status = req.get('if_status')
+        if (if_status is not None) and (not isinstance(if_status, str)):
+            raise tornado.web.HTTPError(400, reason="if_status field is not a string")
 
         results = []
-        for uuid in req["bundles"]:
-            query = {"uuid": uuid}
-            update_doc = {"$set": req["update"]}
+        for uuid, update in updates.items():
+            query: dict[str, Any] = {"uuid": uuid}
+            # only update the Bundle if nobody has claimed or moved it on since the caller looked
+            if if_status:
+                query.update({"status": if_status, "claimed": False})
+            update_doc = {"$set": update}
             logging.debug(f"MONGO-START: db.Bundles.update_one(filter={query}, update={update_doc})")
             ret = await self.db.Bundles.update_one(filter=query, update=update_doc)
             logging.debug("MONGO-END:   db.Bundles.update_one(filter, update)")
             if ret.modified_count > 0:
                 logging.info(f"updated Bundle {uuid}")
                 results.append(uuid)
-                if "status" in req["update"]:
+                if "status" in update:
                     prometheus_record_status_write(
                         collection=BUNDLES,
-                        new_status=req["update"]["status"],
-                        original_status_for_quarantine=req["update"].get("original_status"),
+                        new_status=update["status"],
+                        original_status_for_quarantine=update.get("original_status"),
                     )
 
         self.write({'bundles': results, 'count': len(results)})
@@ -259,16 +490,23 @@ class BundlesHandler(BaseLTAHandler):
     @lta_auth(prefix=LTA_AUTH_PREFIX, roles=LTA_AUTH_ROLES)  # type: ignore
     async def get(self) -> None:
         """Handle GET /Bundles."""
+        dest = self.get_query_argument("dest", default=None)
+        fields = self.get_query_argument("fields", default=None)
         location = self.get_query_argument("location", default=None)
         request = self.get_query_argument("request", default=None)
+        source = self.get_query_argument("source", default=None)
         status = self.get_query_argument("status", default=None)
         verified = self.get_query_argument("verified", default=None)
 
         query: dict[str, Any] = {
             "uuid": {"$exists": True},
         }
+        if dest:
+            query["dest"] = dest
         if location:
             query["source"] = {"$regex": f"^{location}"}
+        if source:
+            query["source"] = source
         if request:
             query["request"] = request
         if status:
@@ -276,16 +514,19 @@ class BundlesHandler(BaseLTAHandler):
         if verified:
             query["verified"] = strtobool(verified)
 
+        # without fields, we list the UUIDs; with fields, we list the rows
         projection: dict[str, bool] = {
             "_id": False,
             "uuid": True,
         }
+        if fields is not None:
+            projection = bundle_projection(parse_fields(fields))
 
-        results = []
+        results: list[Any] = []
         logging.debug(f"MONGO-START: db.Bundles.find(filter={query}, projection={projection})")
         async for row in self.db.Bundles.find(filter=query,
                                               projection=projection):
-            results.append(row["uuid"])
+            results.append(row if fields is not None else row["uuid"])
         logging.debug("MONGO-END*:   db.Bundles.find(filter, projection)")
 
         ret = {
@@ -303,15 +544,19 @@ class BundlesActionsPopHandler(BaseLTAHandler):
         dest: Optional[str] = self.get_argument('dest', default=None)
         source: Optional[str] = self.get_argument('source', default=None)
         status: str = self.get_argument('status')
+        max_size: Optional[str] = self.get_argument('max_size', default=None)
+        tape_volume: Optional[str] = self.get_argument('tape_volume', default=None)
         if (not dest) and (not source):
             raise tornado.web.HTTPError(400, reason="missing source and dest fields")
+        if max_size and not max_size.isdigit():
+            raise tornado.web.HTTPError(400, reason="max_size field is not a non-negative integer")
         pop_body = json_decode(self.request.body)
         if 'claimant' not in pop_body:
             raise tornado.web.HTTPError(400, reason="missing claimant field")
         claimant = pop_body["claimant"]
         # find and claim a bundle for the specified source
         sdb = self.db.Bundles
-        find_query = {
+        find_query: dict[str, Any] = {
             "status": status,
             "claimed": False,
         }
@@ -319,6 +564,13 @@ class BundlesActionsPopHandler(BaseLTAHandler):
             find_query["dest"] = dest
         if source:
             find_query["source"] = source
+        if max_size:
+            find_query["size"] = {"$lte": int(max_size)}
+        # if the caller is recalling from a tape cartridge, read it front to back
+        sort = FIRST_IN_FIRST_OUT
+        if tape_volume:
+            find_query["tape.volume"] = tape_volume
+            sort = TAPE_ORDER
         right_now = now()  # https://www.youtube.com/watch?v=WaSy8yy-mr8
         update_doc = {
             "$set": {
@@ -328,11 +580,11 @@ class BundlesActionsPopHandler(BaseLTAHandler):
                 "claim_timestamp": right_now,
             }
         }
-        logging.debug(f"MONGO-START: db.Bundles.find_one_and_update(filter={find_query}, update={update_doc}, projection={REMOVE_ID}, sort={FIRST_IN_FIRST_OUT}, return_document={AFTER})")
+        logging.debug(f"MONGO-START: db.Bundles.find_one_and_update(filter={find_query}, update={update_doc}, projection={REMOVE_ID}, sort={sort}, return_document={AFTER})")
         bundle = await sdb.find_one_and_update(filter=find_query,
                                                update=update_doc,
                                                projection=REMOVE_ID,
-                                               sort=FIRST_IN_FIRST_OUT,
+                                               sort=sort,
                                                return_document=AFTER)
         logging.debug("MONGO-END:   db.Bundles.find_one_and_update(filter, update, projection, sort, return_document)")
         # return what we found to the caller
@@ -374,6 +626,9 @@ class BundlesSingleHandler(BaseLTAHandler):
         # -- if requestor is resetting the 'reason' field, also reset 'reason_details'
         if req.get('reason', None) == "":
             req['reason_details'] = ""
+        # -- if requestor is changing the status, remember when the Bundle entered it
+        if "status" in req:
+            req.setdefault("status_timestamp", now())
         update_doc = {"$set": req}
 
         # update
@@ -411,6 +666,50 @@ class BundlesSingleHandler(BaseLTAHandler):
 # -----------------------------------------------------------------------------
 
 
+class DashboardHandler(BaseLTAHandler):
+    """DashboardHandler handles /Dashboard."""
+
+    @lta_auth(prefix=LTA_AUTH_PREFIX, roles=LTA_AUTH_ROLES)  # type: ignore
+    async def get(self) -> None:
+        """Handle GET /Dashboard."""
+        active_only = strtobool(self.get_query_argument("active_only", default="false"))
+        limit: Optional[str] = self.get_query_argument("limit", default=None)
+        uuid: Optional[str] = self.get_query_argument("uuid", default=None)
+        if limit and not limit.isdigit():
+            raise tornado.web.HTTPError(400, reason="limit field is not a non-negative integer")
+
+        # find the TransferRequests, oldest first
+        query: dict[str, Any] = {"uuid": {"$exists": True}}
+        if uuid:
+            query["uuid"] = uuid
+        elif active_only:
+            query["status"] = {"$ne": "finished"}
+        sort = [("create_timestamp", pymongo.ASCENDING)]
+        requests: list[dict[str, Any]] = []
+        logging.debug(f"MONGO-START: db.TransferRequests.find(filter={query}, projection={REMOVE_ID}, sort={sort}, limit={limit})")
+        async for row in self.db.TransferRequests.find(filter=query,
+                                                       projection=REMOVE_ID,
+                                                       sort=sort,
+                                                       limit=int(limit) if limit else 0):
+            row["bundles"] = []
+            requests.append(row)
+        logging.debug("MONGO-END*:  db.TransferRequests.find(filter, projection, sort, limit)")
+
+        # find all of their Bundles at once, oldest first
+        by_request = {request["uuid"]: request for request in requests}
+        bundle_query = {"request": {"$in": list(by_request)}}
+        projection: dict[str, bool] = {"_id": False}
+        projection.update({field: True for field in DASHBOARD_BUNDLE_FIELDS})
+        logging.debug(f"MONGO-START: db.Bundles.find(filter={bundle_query}, projection={projection}, sort={sort})")
+        async for row in self.db.Bundles.find(filter=bundle_query,
+                                              projection=projection,
+                                              sort=sort):
+            by_request[row["request"]]["bundles"].append(row)
+        logging.debug("MONGO-END*:  db.Bundles.find(filter, projection, sort)")
+
+        self.write({'results': requests})
+
+
 class MainHandler(BaseLTAHandler):
     """MainHandler is a BaseLTAHandler that handles the root route."""
 
@@ -561,6 +860,23 @@ class MetadataSingleHandler(BaseLTAHandler):
 # -----------------------------------------------------------------------------
 
 
+class StatusCountsHandler(BaseLTAHandler):
+    """StatusCountsHandler handles /status/counts."""
+
+    @lta_auth(prefix=LTA_AUTH_PREFIX, roles=LTA_AUTH_ROLES)  # type: ignore
+    async def get(self) -> None:
+        """Handle GET /status/counts."""
+        # answered from the status poller's latest counts; no query of our own
+        if STATUS_COUNTS.timestamp is None:
+            raise tornado.web.HTTPError(503, reason="status counts are not yet available")
+        self.write({
+            'timestamp': STATUS_COUNTS.timestamp,
+            'counts': STATUS_COUNTS.counts,
+        })
+
+# -----------------------------------------------------------------------------
+
+
 class TransferRequestsHandler(BaseLTAHandler):
     """TransferRequestsHandler is a BaseLTAHandler that handles TransferRequests routes."""
 
@@ -579,24 +895,8 @@ class TransferRequestsHandler(BaseLTAHandler):
     async def post(self) -> None:
         """Handle POST /TransferRequests."""
         req = json_decode(self.request.body)
-        if 'source' not in req:
-            raise tornado.web.HTTPError(400, reason="missing source field")
-        if 'dest' not in req:
-            raise tornado.web.HTTPError(400, reason="missing dest field")
-        if 'path' not in req:
-            raise tornado.web.HTTPError(400, reason="missing path field")
-        if not isinstance(req['source'], str):
-            raise tornado.web.HTTPError(400, reason="source field is not a string")
-        if not isinstance(req['dest'], str):
-            raise tornado.web.HTTPError(400, reason="dest field is not a string")
-        if not isinstance(req['path'], str):
-            raise tornado.web.HTTPError(400, reason="path field is not a string")
-        if not req['source']:
-            raise tornado.web.HTTPError(400, reason="source field is empty")
-        if not req['dest']:
-            raise tornado.web.HTTPError(400, reason="dest field is empty")
-        if not req['path']:
-            raise tornado.web.HTTPError(400, reason="path field is empty")
+        allow_overlap = check_transfer_request(req)
+        req['path'] = posixpath.normpath(req['path'])
 
         right_now = now()  # https://www.youtube.com/watch?v=He0p5I0b8j8
 
@@ -607,9 +907,20 @@ class TransferRequestsHandler(BaseLTAHandler):
         req['update_timestamp'] = right_now
         req['work_priority_timestamp'] = right_now
         req['claimed'] = False
-        logging.debug(f"MONGO-START: db.TransferRequests.insert_one(document={req}")
-        await self.db.TransferRequests.insert_one(document=req)
-        logging.debug("MONGO-END:   db.TransferRequests.insert_one(document)")
+        # check for overlap and insert without another request slipping in between; the
+        # asyncio lock only covers this process, so queue here before taking the lock
+        # document that every replica of the LTA DB shares
+        async with self.transfer_requests_lock, mongo_lock(self.db, TRANSFER_REQUESTS_LOCK):
+            if not allow_overlap:
+                query = overlap_query(req['path'])
+                logging.debug(f"MONGO-START: db.TransferRequests.find_one(filter={query}, projection={REMOVE_ID})")
+                overlap = await self.db.TransferRequests.find_one(filter=query, projection=REMOVE_ID)
+                logging.debug("MONGO-END:   db.TransferRequests.find_one(filter, projection)")
+                if overlap:
+                    raise tornado.web.HTTPError(409, reason=f"path overlaps TransferRequest {overlap['uuid']} ({overlap['path']})")
+            logging.debug(f"MONGO-START: db.TransferRequests.insert_one(document={req}")
+            await self.db.TransferRequests.insert_one(document=req)
+            logging.debug("MONGO-END:   db.TransferRequests.insert_one(document)")
         logging.info(f"created TransferRequest {req['uuid']}")
 
         # done
@@ -683,6 +994,114 @@ class TransferRequestSingleHandler(BaseLTAHandler):
         self.set_status(204)
 
 
+class TransferRequestActionsTryCompleteHandler(BaseLTAHandler):
+    """TransferRequestActionsTryCompleteHandler handles /TransferRequests/{uuid}/actions/try_complete."""
+
+    @lta_auth(prefix=LTA_AUTH_PREFIX, roles=LTA_AUTH_ROLES)  # type: ignore
+    async def post(self, request_id: str) -> None:
+        """Handle POST /TransferRequests/{uuid}/actions/try_complete."""
+        argo = ArgumentHandler(ArgumentSource.JSON_BODY_ARGUMENTS, self)
+        argo.add_argument("claimant", type=str)
+        argo.add_argument("bundle_status", type=str, default="finished")
+        args = argo.parse_args()
+        if not args.claimant:
+            raise tornado.web.HTTPError(400, reason="claimant must not be empty")
+
+        # make sure the TransferRequest exists
+        query = {"uuid": request_id}
+        logging.debug(f"MONGO-START: db.TransferRequests.find_one(filter={query}, projection={REMOVE_ID}")
+        tr = await self.db.TransferRequests.find_one(filter=query, projection=REMOVE_ID)
+        logging.debug("MONGO-END:   db.TransferRequests.find_one(filter, projection)")
+        if not tr:
+            raise tornado.web.HTTPError(404, reason="not found")
+
+        # count the Bundles of the TransferRequest by status
+        pipeline: List[dict[str, Any]] = [
+            {"$match": {"request": request_id}},
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+        ]
+        counts: dict[str, int] = {}
+        logging.debug(f"MONGO-START: db.Bundles.aggregate(pipeline={pipeline})")
+        async for row in await self.db.Bundles.aggregate(pipeline):
+            counts[str(row["_id"])] = int(row["count"])
+        logging.debug("MONGO-END*:   db.Bundles.aggregate(pipeline)")
+        waiting = sum(count for status, count in counts.items()
+                      if status not in TRANSFER_REQUEST_DONE_STATUSES)
+        if waiting > 0:
+            logging.info(f"TransferRequest {request_id} has {waiting} Bundles not yet {TRANSFER_REQUEST_DONE_STATUSES}")
+            self.write({'completed': False, 'counts': counts, 'waiting': waiting, 'count': 0})
+            return
+
+        # mark the TransferRequest completed and its Bundles finished
+        right_now = now()
+        claim_fields = {
+            "claimant": args.claimant,
+            "claimed": False,
+            "claim_timestamp": right_now,
+            "reason": "",
+            "status_timestamp": right_now,
+            "update_timestamp": right_now,
+        }
+        tr_update = {"$set": {**claim_fields, "status": "completed"}}
+        bundles_query = {"request": request_id, "status": {"$in": TRANSFER_REQUEST_DONE_STATUSES}}
+        bundles_update = {"$set": {**claim_fields, "status": args.bundle_status}}
+
+        async def complete(session: Optional[AsyncClientSession]) -> int:
+            logging.debug(f"MONGO-START: db.TransferRequests.update_one(filter={query}, update={tr_update})")
+            await self.db.TransferRequests.update_one(filter=query, update=tr_update, session=session)
+            logging.debug("MONGO-END:   db.TransferRequests.update_one(filter, update)")
+            logging.debug(f"MONGO-START: db.Bundles.update_many(filter={bundles_query}, update={bundles_update})")
+            ret = await self.db.Bundles.update_many(filter=bundles_query, update=bundles_update, session=session)
+            logging.debug("MONGO-END:   db.Bundles.update_many(filter, update)")
+            return ret.modified_count
+
+        if await self.transaction_support():
+            async with self.db.client.start_session() as session:
+                modified_count = await session.with_transaction(complete)
+        else:
+            # standalone MongoDB has no transactions; TransferRequest goes first
+            modified_count = await complete(None)
+
+        logging.info(f"completed TransferRequest {request_id}; {modified_count} Bundles now {args.bundle_status}")
+        prometheus_record_status_write(
+            collection=TRANSFER_REQUESTS,
+            new_status="completed",
+            original_status_for_quarantine=None,
+        )
+        prometheus_record_status_write(
+            collection=BUNDLES,
+            new_status=args.bundle_status,
+            original_status_for_quarantine=None,
+            count=modified_count,
+        )
+        self.write({'completed': True, 'counts': counts, 'waiting': 0, 'count': modified_count})
+
+
+class TransferRequestActionsCheckOverlapHandler(BaseLTAHandler):
+    """TransferRequestActionsCheckOverlapHandler handles /TransferRequests/actions/check_overlap."""
+
+    @lta_auth(prefix=LTA_AUTH_PREFIX, roles=LTA_AUTH_ROLES)  # type: ignore
+    async def post(self) -> None:
+        """Handle POST /TransferRequests/actions/check_overlap."""
+        req = json_decode(self.request.body)
+        if 'path' not in req:
+            raise tornado.web.HTTPError(400, reason="missing path field")
+        if not isinstance(req['path'], str):
+            raise tornado.web.HTTPError(400, reason="path field is not a string")
+        if not req['path']:
+            raise tornado.web.HTTPError(400, reason="path field is empty")
+        path = posixpath.normpath(req['path'])
+
+        query = overlap_query(path)
+        projection = {"_id": False, "uuid": True, "path": True, "status": True}
+        overlaps = []
+        logging.debug(f"MONGO-START: db.TransferRequests.find(filter={query}, projection={projection})")
+        async for row in self.db.TransferRequests.find(filter=query, projection=projection):
+            overlaps.append(row)
+        logging.debug("MONGO-END*:  db.TransferRequests.find(filter, projection)")
+        self.write({'path': path, 'overlaps': overlaps})
+
+
 class TransferRequestActionsPopHandler(BaseLTAHandler):
     """TransferRequestActionsPopHandler handles /TransferRequests/actions/pop."""
 
@@ -795,6 +1214,10 @@ def start(
 
     # configure access to MongoDB as a backing store
     args['db'] = mongo_db
+    # per-process; replicas of the LTA DB share the TRANSFER_REQUESTS_LOCK document
+    args['transfer_requests_lock'] = asyncio.Lock()
+    # the deployment doesn't change under us, so ask it about transactions only once
+    args['transaction_support'] = TransactionSupport(mongo_db)
 
     # See: https://github.com/WIPACrepo/rest-tools/issues/2
     max_body_size = int(config["LTA_MAX_BODY_SIZE"])
@@ -804,15 +1227,20 @@ def start(
         (r'/Bundles', BundlesHandler),
         (r'/Bundles/actions/bulk_create', BundlesActionsBulkCreateHandler),
         (r'/Bundles/actions/bulk_delete', BundlesActionsBulkDeleteHandler),
+        (r'/Bundles/actions/bulk_get', BundlesActionsBulkGetHandler),
         (r'/Bundles/actions/bulk_update', BundlesActionsBulkUpdateHandler),
         (r'/Bundles/actions/pop', BundlesActionsPopHandler),
         (r'/Bundles/(?P<bundle_id>\w+)', BundlesSingleHandler),
+        (r'/Dashboard', DashboardHandler),
         (r'/Metadata', MetadataHandler),
         (r'/Metadata/actions/bulk_create', MetadataActionsBulkCreateHandler),
         (r'/Metadata/actions/bulk_delete', MetadataActionsBulkDeleteHandler),
         (r'/Metadata/(?P<metadata_id>\w+)', MetadataSingleHandler),
+        (r'/status/counts', StatusCountsHandler),
         (r'/TransferRequests', TransferRequestsHandler),
         (r'/TransferRequests/(?P<request_id>\w+)', TransferRequestSingleHandler),
+        (r'/TransferRequests/(?P<request_id>\w+)/actions/try_complete', TransferRequestActionsTryCompleteHandler),
+        (r'/TransferRequests/actions/check_overlap', TransferRequestActionsCheckOverlapHandler),
         (r'/TransferRequests/actions/pop', TransferRequestActionsPopHandler),
     ]
     for route, handler in route_handler_pairs:
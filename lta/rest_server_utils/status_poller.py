@@ -3,12 +3,13 @@
 import asyncio
 import dataclasses
 import logging
-from typing import Any, Mapping, Sequence
+from typing import Any, Mapping, Optional, Sequence
 
 from prometheus_client import Gauge
 from pymongo.asynchronous.database import AsyncDatabase
 from wipac_dev_tools.timing_tools import IntervalTimer
 
+from ..utils import now
 from .utils import (
     BUNDLES,
     DatabaseType,
@@ -34,6 +35,20 @@ class _GaugeAggregationJob:
     )
 
 
+@dataclasses.dataclass
+class StatusCounts:
+    """Keep the latest counts of the status poller, to answer GET /status/counts."""
+
+    # collection -> gauge label name (e.g. "status") -> label value -> count
+    counts: dict[str, dict[str, dict[str, int]]] = dataclasses.field(default_factory=dict)
+    # when the counts were last updated; None until the first poll
+    timestamp: Optional[str] = None
+
+
+# the latest counts, shared within this process like the gauges they mirror
+STATUS_COUNTS = StatusCounts()
+
+
 # 1) Aggregate per-status document counts for each collection
 STATUS_PIPELINE: Sequence[Mapping[str, Any]] = [
     # Stage 1: keep only documents that have a "status" field at all
@@ -78,23 +93,32 @@ QUARANTINE_BY_ORIGINAL_STATUS_PIPELINE: Sequence[Mapping[str, Any]] = [
 ]
 
 
-async def _update_gauge_from_aggregation(
+def _facet_pipeline(jobs: Sequence[_GaugeAggregationJob]) -> list[Mapping[str, Any]]:
+    """Combine the jobs' pipelines into one $facet pass over a collection."""
+    return [
+        # every job only counts documents that have a status
+        {"$match": {"status": {"$exists": True}}},
+        {"$facet": {j.gauge_label_name: list(j.pipeline) for j in jobs}},
+    ]
+
+
+def _update_gauge_from_aggregation(
     *,
-    mongo_db: AsyncDatabase[DatabaseType],
+    results: Sequence[Mapping[str, Any]],
     collection_name: str,
     job: _GaugeAggregationJob,
     do_log: bool,
-) -> None:
-    """Run one aggregation, update the gauge, and reset disappeared labels."""
-    cursor = await mongo_db[collection_name].aggregate(job.pipeline)
-
+) -> dict[str, int]:
+    """Update the gauge from one aggregation's results, and reset disappeared labels."""
     prev_label_values = job.prev_label_values_by_collection.get(collection_name, set())
     current_label_values: set[str] = set()
+    counts: dict[str, int] = {}
 
     # update the gauge for each bucket
-    async for result in cursor:
+    for result in results:
         label_value = str(result["_id"])
         count = int(result["count"])
+        counts[label_value] = count
         job.gauge.labels(
             collection=collection_name,
             **{job.gauge_label_name: label_value},
@@ -113,17 +137,38 @@ async def _update_gauge_from_aggregation(
             LOGGER.info(f"resetting {job.gauge} for {collection_name}.{label_value}: 0")
 
     job.prev_label_values_by_collection[collection_name] = current_label_values
+    return counts
 
 
-async def status_poller(
+async def update_status_counts(
     mongo_db: AsyncDatabase[DatabaseType],
-    status_poller_interval: int,
+    jobs: Sequence[_GaugeAggregationJob],
+    status_counts: StatusCounts,
+    do_log: bool = False,
 ) -> None:
-    """Periodically query MongoDB and update status-count gauges."""
-    logging_timer = IntervalTimer(STATUS_POLLER_INTERVAL_LOGGING, None)
-    status_poller_interval = max(STATUS_POLLER_INTERVAL_MINIMUM, status_poller_interval)
+    """Count each collection in one aggregation, and update the gauges and the latest counts."""
+    pipeline = _facet_pipeline(jobs)
+    counts: dict[str, dict[str, dict[str, int]]] = {}
+    for collection_name in (BUNDLES, TRANSFER_REQUESTS):
+        cursor = await mongo_db[collection_name].aggregate(pipeline)
+        # $facet always yields exactly one document, with one field per job
+        facets = await cursor.next()
+        counts[collection_name] = {
+            j.gauge_label_name: _update_gauge_from_aggregation(
+                results=facets[j.gauge_label_name],
+                collection_name=collection_name,
+                job=j,
+                do_log=do_log,
+            )
+            for j in jobs
+        }
+    status_counts.counts = counts
+    status_counts.timestamp = now()
+
 
-    jobs = [
+def make_jobs() -> list[_GaugeAggregationJob]:
+    """Create the jobs that keep the status gauges."""
+    return [
         _GaugeAggregationJob(
             STATUS_PIPELINE,
             PROMETHEUS_STATUS_GAUGE,
@@ -136,6 +181,18 @@ async def status_poller(
         ),
     ]
 
+
+async def status_poller(
+    mongo_db: AsyncDatabase[DatabaseType],
+    status_poller_interval: int,
+    status_counts: StatusCounts = STATUS_COUNTS,
+) -> None:
+    """Periodically query MongoDB and update status-count gauges and the latest counts."""
+    logging_timer = IntervalTimer(STATUS_POLLER_INTERVAL_LOGGING, None)
+    status_poller_interval = max(STATUS_POLLER_INTERVAL_MINIMUM, status_poller_interval)
+
+    jobs = make_jobs()
+
     # main loop
     while True:
         try:
@@ -145,15 +202,8 @@ async def status_poller(
                     f"logging={STATUS_POLLER_INTERVAL_LOGGING}s"
                 )
 
-            # for each job, update the gauge for each collection
-            for j in jobs:
-                for collection_name in (BUNDLES, TRANSFER_REQUESTS):
-                    await _update_gauge_from_aggregation(
-                        mongo_db=mongo_db,
-                        collection_name=collection_name,
-                        job=j,
-                        do_log=do_log,
-                    )
+            # for each collection, update the gauge of each job
+            await update_status_counts(mongo_db, jobs, status_counts, do_log)
 
         except asyncio.CancelledError:
             LOGGER.error("Status poller cancelled")
@@ -61,15 +61,20 @@ def prometheus_record_status_write(
     collection: str,
     new_status: str,
     original_status_for_quarantine: str | None,
+    count: int = 1,
 ) -> None:
     """For Prometheus, record a write to the status field of a LTA object.
 
     If the new status is "quarantined", also record the original status for quarantine.
+    Use 'count' to record the same write to several LTA objects at once.
     """
+    if count <= 0:
+        return
+
     PROMETHEUS_STATUS_WRITES_TOTAL.labels(
         collection=collection,
         to_status=str(new_status),
-    ).inc()
+    ).inc(count)
 
     # did the user quarantine?
     if new_status == "quarantined":
@@ -80,4 +85,4 @@ def prometheus_record_status_write(
                 if original_status_for_quarantine is None
                 else str(original_status_for_quarantine)
             ),
-        ).inc()
+        ).inc(count)
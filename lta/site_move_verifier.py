@@ -6,15 +6,15 @@
 import asyncio
 import logging
 import os
-from subprocess import PIPE, run
 import sys
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 
 from prometheus_client import start_http_server
 from rest_tools.client import RestClient
 from wipac_dev_tools import strtobool
 
-from .utils import InvalidBundlePathException, InvalidChecksumException
+from .utils import CommandTimeoutException, InvalidBundlePathException, InvalidChecksumException
+from .command import run_command
 from .component import COMMON_CONFIG, Component, work_loop, PrometheusResultTracker
 from .utils import now, quarantine_now
 from .crypto import sha512sum
@@ -29,6 +29,9 @@ LOG = logging.getLogger(__name__)
 
 EXPECTED_CONFIG = COMMON_CONFIG.copy()
 EXPECTED_CONFIG.update({
+    # comma separated checksum sources to try in order: 'globus', 'transfer', 'local'
+    # 'local' is always the last resort
+    "CHECKSUM_SOURCES": "local",
     "DEST_ROOT_PATH": None,
     "USE_FULL_BUNDLE_PATH": "FALSE",
     "WORK_RETRIES": "3",
@@ -36,11 +39,43 @@ EXPECTED_CONFIG.update({
 })
 
 MYQUOTA_ARGS = ["/usr/bin/myquota", "-G"]
+MYQUOTA_TIMEOUT_SECONDS = 60
 
 OLD_MTIME_EPOCH_SEC = 30 * 60  # 30 MINUTES * 60 SEC_PER_MIN
 
 QUARANTINE_THEN_KEEP_WORKING: list[type[Exception]] = [InvalidChecksumException]
 
+# a checksum source provides the SHA512 checksum of a bundle at the destination, if it can
+ChecksumSource = Callable[[BundleType, str], Optional[str]]
+
+
+def local_checksum(bundle: BundleType, bundle_path: str) -> Optional[str]:
+    """Compute the SHA512 checksum by reading the bundle at the destination."""
+    return sha512sum(bundle_path)
+
+
+def transfer_checksum(bundle: BundleType, bundle_path: str) -> Optional[str]:
+    """Provide the SHA512 checksum reported by the transfer service at the destination."""
+    reported = bundle.get("transfer_checksum")
+    if not reported:
+        return None
+    return reported.get("sha512")
+
+
+def globus_checksum(bundle: BundleType, bundle_path: str) -> Optional[str]:
+    """Provide the SHA512 checksum that Globus verified at the destination."""
+    reported = bundle.get("transfer_checksum")
+    if (not reported) or (reported.get("service") != "globus"):
+        return None
+    return reported.get("sha512")
+
+
+CHECKSUM_SOURCES: Dict[str, ChecksumSource] = {
+    "globus": globus_checksum,
+    "local": local_checksum,
+    "transfer": transfer_checksum,
+}
+
 
 def as_nonempty_columns(s: str) -> List[str]:
     """Split the provided string into columns and return the non-empty ones."""
@@ -80,6 +115,9 @@ class SiteMoveVerifier(Component):
     queried as to the status of its work. The SiteMoveVerifier then
     calculates the checksum of the file to verify that the contents have
     been copied faithfully.
+
+    If configured to trust it, a checksum that the transfer service computed
+    at the destination is used instead of reading the whole bundle again.
     """
 
     def __init__(self, config: Dict[str, str], logger: Logger) -> None:
@@ -90,19 +128,26 @@ class SiteMoveVerifier(Component):
         logger - The object the site_move_verifier should use for logging.
         """
         super(SiteMoveVerifier, self).__init__("site_move_verifier", config, logger)
+        self.checksum_sources = [x.strip() for x in config["CHECKSUM_SOURCES"].split(",") if x.strip()]
+        for name in self.checksum_sources:
+            if name not in CHECKSUM_SOURCES:
+                raise ValueError(f"Unknown checksum source '{name}'; expected one of {sorted(CHECKSUM_SOURCES)}")
+        if "local" not in self.checksum_sources:
+            self.checksum_sources.append("local")
         self.dest_root_path = config["DEST_ROOT_PATH"]
+        self.quota: List[Dict[str, str]] = []
         self.use_full_bundle_path = strtobool(config["USE_FULL_BUNDLE_PATH"])
         self.work_retries = int(config["WORK_RETRIES"])
         self.work_timeout_seconds = float(config["WORK_TIMEOUT_SECONDS"])
-        pass
 
     def _do_status(self) -> Dict[str, Any]:
         """Provide additional status for the SiteMoveVerifier."""
-        quota = []
-        stdout = self._execute_myquota()
-        if stdout:
-            quota = parse_myquota(stdout)
-        return {"quota": quota}
+        return {"quota": self.quota}
+
+    async def run(self) -> None:
+        """Check disk usage at the site, then perform the work cycle."""
+        await self._refresh_quota()
+        await super(SiteMoveVerifier, self).run()
 
     def _expected_config(self) -> Dict[str, Optional[str]]:
         """Provide expected configuration dictionary."""
@@ -168,10 +213,9 @@ class SiteMoveVerifier(Component):
         # get our ducks in a row
         bundle_id = bundle["uuid"]
 
-        # we'll compute the bundle's checksum
-        self.logger.info(f"Computing SHA512 checksum for bundle: '{bundle_path}'")
-        checksum_sha512 = sha512sum(bundle_path)
-        self.logger.info(f"Bundle '{bundle_path}' has SHA512 checksum '{checksum_sha512}'")
+        # we'll obtain the bundle's checksum
+        checksum_source, checksum_sha512 = self._get_dest_checksum(bundle, bundle_path)
+        self.logger.info(f"Bundle '{bundle_path}' has SHA512 checksum '{checksum_sha512}' (source: {checksum_source})")
 
         # now we'll compare the bundle's checksum
         if bundle["checksum"]["sha512"] != checksum_sha512:
@@ -188,13 +232,39 @@ class SiteMoveVerifier(Component):
             "reason": "",
             "update_timestamp": now(),
             "claimed": False,
+            "dest_checksum_source": checksum_source,
         }
         self.logger.info(f"PATCH /Bundles/{bundle_id} - '{patch_body}'")
         await lta_rc.request('PATCH', f'/Bundles/{bundle_id}', patch_body)
 
-    def _execute_myquota(self) -> Optional[str]:
+    def _get_dest_checksum(self, bundle: BundleType, bundle_path: str) -> tuple[str, str]:
+        """Obtain the SHA512 checksum of the bundle at the destination from the first source that has one."""
+        for name in self.checksum_sources:
+            self.logger.info(f"Obtaining SHA512 checksum for bundle '{bundle_path}' from source '{name}'")
+            checksum_sha512 = CHECKSUM_SOURCES[name](bundle, bundle_path)
+            if checksum_sha512:
+                return (name, checksum_sha512)
+            self.logger.info(f"Checksum source '{name}' has no SHA512 checksum for bundle '{bundle_path}'")
+        raise RuntimeError(f"No checksum source provided a SHA512 checksum for bundle '{bundle_path}'")
+
+    async def _refresh_quota(self) -> None:
+        """Update the disk usage at the site reported by _do_status."""
+        stdout = await self._execute_myquota()
+        if not stdout:
+            return
+        try:
+            self.quota = parse_myquota(stdout)
+        except Exception as e:
+            # the quota is only informational; keep the last one we understood
+            self.logger.error(f"Unable to parse the output of {MYQUOTA_ARGS}: {stdout!r}", exc_info=e)
+
+    async def _execute_myquota(self) -> Optional[str]:
         """Run the myquota command to determine disk usage at the site."""
-        completed_process = run(MYQUOTA_ARGS, stdout=PIPE, stderr=PIPE)
+        try:
+            completed_process = await run_command(MYQUOTA_ARGS, self.logger, timeout=MYQUOTA_TIMEOUT_SECONDS)
+        except (CommandTimeoutException, OSError) as e:
+            self.logger.info(f"Command to check quota failed: {MYQUOTA_ARGS} - {e}")
+            return None
         # if our command failed
         if completed_process.returncode != 0:
             self.logger.info(f"Command to check quota failed: {completed_process.args}")
@@ -4,17 +4,37 @@
 import asyncio
 import uuid
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import logging
 import os
 import dataclasses
-from typing import Any
+import time
+from typing import Any, Callable, TypeVar
 
 import globus_sdk
+from prometheus_client import Histogram
 from wipac_dev_tools import from_environment_as_dataclass
 
 LOGGER = logging.getLogger(__name__)
 
+# Globus accepts at most this many task IDs in one 'task_list' filter
+TASK_LIST_FILTER_MAX = 50
+# each time a transfer is found to be still in flight, wait this much longer before polling it again
+POLL_INTERVAL_GROWTH = 1.5
+
+T = TypeVar("T")
+
+# Prometheus metrics
+# -- make module-level so these are shared within this process (else, dups overwrite)
+
+PROMETHEUS_GLOBUS_API_DURATION = Histogram(
+    "lta_globus_api_duration_seconds",
+    "LTA component: time taken by a call to the Globus Transfer API",
+    labelnames=("method", "outcome"),
+    buckets=[0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60],
+)
+
 
 @dataclasses.dataclass(frozen=True)
 class GlobusTransferEnv:
@@ -29,20 +49,46 @@ class GlobusTransferEnv:
     # Optional
     GLOBUS_HARD_DEADLINE_SECONDS: int | None = None
     GLOBUS_TRANSFER_SCOPE: str = "urn:globus:auth:scope:transfer.api.globus.org:all"
+    # a transfer is polled every MIN seconds at first, backing off to every POLL_INTERVAL seconds
+    GLOBUS_POLL_INTERVAL_MIN_SECONDS: int = 5
     GLOBUS_POLL_INTERVAL_SECONDS: int = 60
+    # give up on a transfer if Globus doesn't report a status we understand this many polls in a row
+    GLOBUS_UNKNOWN_STATUS_MAX_POLLS: int = 10
+    # the 'globus_sdk' is not async, so its calls are made from this many threads
+    GLOBUS_API_THREADS: int = 4
+    # have Globus check each file against its SHA512 checksum at the destination
+    GLOBUS_VERIFY_CHECKSUM: bool = False
 
 
 class GlobusTransferFailedException(Exception):
     """Raised when globus transfer failed."""
 
 
+@dataclasses.dataclass
+class _TaskWait:
+    """The shared state of everybody waiting on one transfer."""
+
+    future: "asyncio.Future[dict[str, Any]]"
+    interval: float
+    next_poll: float
+    waiters: int = 0
+    unknown_polls: int = 0
+
+
 class GlobusTransfer:
-    """Manage single-file Globus transfers."""
+    """Manage single- and multi-file Globus transfers."""
 
     def __init__(self) -> None:
         """Load env config and initialize a TransferClient."""
         self._env = from_environment_as_dataclass(GlobusTransferEnv)
         self._transfer_client = self._create_client()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self._env.GLOBUS_API_THREADS,
+            thread_name_prefix="globus",
+        )
+        self._waits: dict[str, _TaskWait] = {}
+        self._poller: asyncio.Task[None] | None = None
+        self._poller_sleeping = False
 
     # ---------------------------
     # Internal Helpers
@@ -73,12 +119,118 @@ class GlobusTransfer:
 
         return tc
 
-    def make_transfer_document(
+    async def _call(self, method: str, func: Callable[[], T]) -> T:
+        """Call the Globus Transfer API from a thread, so the event loop keeps running."""
+        start = time.monotonic()
+        outcome = "error"
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._executor, func)
+            outcome = "ok"
+            return result
+        finally:
+            PROMETHEUS_GLOBUS_API_DURATION.labels(method=method, outcome=outcome).observe(time.monotonic() - start)
+
+    async def _get_tasks(self, task_ids: list[str]) -> dict[str, dict[str, Any]]:
+        """Look up many tasks with as few 'task_list' requests as Globus allows."""
+        tasks: dict[str, dict[str, Any]] = {}
+        for i in range(0, len(task_ids), TASK_LIST_FILTER_MAX):
+            chunk = task_ids[i:i + TASK_LIST_FILTER_MAX]
+            LOGGER.debug(f"checking status of {len(chunk)} transfers...")
+            found = await self._call(
+                "task_list",
+                lambda: list(self._transfer_client.paginated.task_list(filter={"task_id": chunk}).items()),
+            )
+            for task in found:
+                tasks[str(task["task_id"])] = dict(task)
+        return tasks
+
+    async def _poll(self) -> None:
+        """Poll Globus for every transfer that is being waited on, until there are none."""
+        while self._waits:
+            # sleep until the next transfer is due, then poll every transfer that is due
+            next_poll = min(wait.next_poll for wait in self._waits.values())
+            delay = next_poll - time.monotonic()
+            if delay > 0:
+                self._poller_sleeping = True
+                try:
+                    await asyncio.sleep(delay)
+                finally:
+                    if asyncio.current_task() is self._poller:
+                        self._poller_sleeping = False
+            horizon = max(next_poll, time.monotonic())
+            due = [key for key, wait in self._waits.items() if wait.next_poll <= horizon]
+            try:
+                tasks = await self._get_tasks(due)
+            except Exception as e:
+                for key in due:
+                    self._finish(key, error=e)
+                continue
+            polled_at = time.monotonic()
+
+            # look at status
+            for key in due:
+                if key not in self._waits:  # everybody gave up while we were polling
+                    continue
+                self._check_status(key, tasks.get(key, {}), polled_at)
+
+    def _check_status(self, key: str, task: dict[str, Any], polled_at: float) -> None:
+        """Finish waiting on a transfer that Globus reports as finished, otherwise schedule its next poll."""
+        LOGGER.debug(f"{task=}")
+        status = task.get("status")
+        LOGGER.debug(f"{status=}")
+        wait = self._waits[key]
+        match status:
+            case "SUCCEEDED":
+                # File(s) in transfer was/were:
+                #   (1) written at destination and/or
+                #   (2) did not need to be written due to `sync_level` setting
+                # To differentiate, look at `task` fields:
+                #   'files' (int),
+                #   'files_skipped' (int), and
+                #   'files_transferred' (int)
+                LOGGER.info(f"Globus transfer succeeded: task_id={key!r}")
+                self._finish(key, result=task)
+                return
+            case "FAILED" | "INACTIVE":
+                msg = f"Globus transfer failed ({status=}): task_id={key!r}"
+                LOGGER.error(msg)
+                self._finish(key, error=GlobusTransferFailedException(msg))
+                return
+            case "ACTIVE":
+                wait.unknown_polls = 0
+            case _:
+                # Globus doesn't know about the transfer, or reports something we don't understand
+                wait.unknown_polls += 1
+                if wait.unknown_polls >= self._env.GLOBUS_UNKNOWN_STATUS_MAX_POLLS:
+                    msg = f"Globus transfer status unknown ({status=}) after {wait.unknown_polls} polls: task_id={key!r}"
+                    LOGGER.error(msg)
+                    self._finish(key, error=GlobusTransferFailedException(msg))
+                    return
+                LOGGER.warning(f"received unknown {status=}: task_id={key!r} — continuing...")
+        # the longer a transfer runs, the less often we look at it
+        wait.next_poll = polled_at + wait.interval
+        wait.interval = min(
+            wait.interval * POLL_INTERVAL_GROWTH,
+            self._env.GLOBUS_POLL_INTERVAL_SECONDS,
+        )
+
+    def _finish(
         self,
-        source_path: Path,
-        dest_path: Path,
-    ) -> globus_sdk.TransferData:
-        """Create the object needed for submitting a transfer."""
+        key: str,
+        result: dict[str, Any] | None = None,
+        error: Exception | None = None,
+    ) -> None:
+        """Hand the outcome of a transfer to everybody waiting on it."""
+        wait = self._waits.pop(key, None)
+        if (wait is None) or wait.future.done():
+            return
+        if error:
+            wait.future.set_exception(error)
+        else:
+            wait.future.set_result(result or {})
+
+    def _new_transfer_data(self, label: str, **kwargs: Any) -> globus_sdk.TransferData:
+        """Create an empty TransferData with the settings LTA uses for every transfer."""
 
         # Unfortunately, 'globus_sdk' does not support passing 'None' for its args...
         #   So to avoid accessing its private 'globus_sdk._missing.MISSING',
@@ -92,28 +244,82 @@ class GlobusTransfer:
             optionals["deadline"] = deadline_dt.isoformat(timespec="seconds")
 
         # Construct
-        tdata = globus_sdk.TransferData(
+        return globus_sdk.TransferData(
             source_endpoint=self._env.GLOBUS_SOURCE_COLLECTION_ID,
             destination_endpoint=self._env.GLOBUS_DEST_COLLECTION_ID,
-            label=f"LTA bundle: {source_path.name}",
+            label=label,
             fail_on_quota_errors=True,
             # NOTE: 'sync_level'
             #   LTA doesn't assume the transfer mechanism is reliable, and computes
             #   checksums later in the pipeline. So 'mtime' is fine (and much cheaper).
             sync_level="mtime",
+            # NOTE: 'verify_checksum'
+            #   If on, a file with a known checksum (see `_add_item()`) is checked
+            #   against it at the destination, so the pipeline can trust it later.
+            verify_checksum=self._env.GLOBUS_VERIFY_CHECKSUM,
             **optionals,
+            **kwargs,
         )
-        tdata.add_item(str(source_path), str(dest_path))
+
+    def _add_item(
+        self,
+        tdata: globus_sdk.TransferData,
+        source_path: Path,
+        dest_path: Path,
+        checksum: str | None,
+    ) -> None:
+        """Add a file to the transfer, with its SHA512 checksum for Globus to verify."""
+        if checksum and self._env.GLOBUS_VERIFY_CHECKSUM:
+            tdata.add_item(
+                str(source_path),
+                str(dest_path),
+                external_checksum=checksum,
+                checksum_algorithm="SHA512",
+            )
+        else:
+            tdata.add_item(str(source_path), str(dest_path))
+
+    def make_transfer_document(
+        self,
+        source_path: Path,
+        dest_path: Path,
+        checksum: str | None = None,
+    ) -> globus_sdk.TransferData:
+        """Create the object needed for submitting a transfer."""
+        tdata = self._new_transfer_data(f"LTA bundle: {source_path.name}")
+        self._add_item(tdata, source_path, dest_path, checksum)
 
         LOGGER.info(f"Created transfer document for {source_path=} -> {dest_path=}")
         return tdata
 
+    def make_batch_transfer_document(
+        self,
+        items: list[tuple[Path, Path]],
+        checksums: dict[Path, str] | None = None,
+    ) -> globus_sdk.TransferData:
+        """Create the object needed for submitting a multi-file transfer.
+
+        NOTE: 'skip_source_errors'
+          A missing or unreadable source file is skipped (and reported by
+          'task_skipped_errors') instead of failing the whole task, so that
+          one bad bundle does not hold back the rest of the batch.
+        """
+        tdata = self._new_transfer_data(
+            f"LTA bundles: {len(items)} files",
+            skip_source_errors=True,
+        )
+        for source_path, dest_path in items:
+            self._add_item(tdata, source_path, dest_path, (checksums or {}).get(source_path))
+
+        LOGGER.info(f"Created transfer document for {len(items)} files")
+        return tdata
+
     async def _submit_transfer(self, tdata: globus_sdk.TransferData) -> uuid.UUID | str:
         """Submit a transfer via Globus TransferClient."""
         LOGGER.info(f"Submitting transfer: {list(tdata.iter_items())}")
-        task_id = self._transfer_client.submit_transfer(tdata)["task_id"]
+        response = await self._call("submit_transfer", lambda: self._transfer_client.submit_transfer(tdata))
+        task_id = response["task_id"]
         LOGGER.info(f"Globus transfer submitted: {task_id=}")
-        await asyncio.sleep(0)  # since request is not async, handover to pending tasks
 
         return task_id
 
@@ -126,6 +332,7 @@ class GlobusTransfer:
         *,
         source_path: Path,
         dest_path: Path,
+        checksum: str | None = None,
     ) -> uuid.UUID | str:
         """
         Submit a single-file Globus transfer return the task ID.
@@ -134,6 +341,7 @@ class GlobusTransfer:
 
         :param source_path: Absolute path on the source collection.
         :param dest_path: The filepath on the destination collection.
+        :param checksum: The SHA512 checksum of the file, if Globus should verify it.
 
         :returns: Globus task_id for the submitted transfer.
         """
@@ -141,7 +349,36 @@ class GlobusTransfer:
             raise ValueError(f"source_path must be absolute: {source_path}")
 
         # do transfer
-        tdata = self.make_transfer_document(source_path, dest_path)
+        tdata = self.make_transfer_document(source_path, dest_path, checksum)
+        task_id = await self._submit_transfer(tdata)
+
+        return task_id
+
+    async def transfer_files(
+        self,
+        *,
+        items: list[tuple[Path, Path]],
+        checksums: dict[Path, str] | None = None,
+    ) -> uuid.UUID | str:
+        """
+        Submit a multi-file Globus transfer return the task ID.
+
+        Globus applies its concurrency and pipelining across all of the files
+        in a task, so many files per task are much faster than one task per
+        file. Does not wait for transfer to complete, see
+        `wait_for_transfers_to_finish()`.
+
+        :param items: (source_path, dest_path) for each file; see `transfer_file()`.
+        :param checksums: The SHA512 checksum of each source_path, if Globus should verify it.
+
+        :returns: Globus task_id for the submitted transfer.
+        """
+        for source_path, _ in items:
+            if not os.path.isabs(source_path):
+                raise ValueError(f"source_path must be absolute: {source_path}")
+
+        # do transfer
+        tdata = self.make_batch_transfer_document(items, checksums)
         task_id = await self._submit_transfer(tdata)
 
         return task_id
@@ -150,52 +387,151 @@ class GlobusTransfer:
         self,
         task_id: uuid.UUID | str,
     ) -> dict[str, Any]:
-        """Wait (forever) for transfer to finish.
+        """Wait for transfer to finish.
 
         Return:
             The successful task object.
 
         Raises:
-            'GlobusTransferFailedException' if the transfer failed (FAILED or INACTIVE).
+            'GlobusTransferFailedException' if the transfer failed (FAILED or INACTIVE),
+            or Globus did not report a known status for GLOBUS_UNKNOWN_STATUS_MAX_POLLS
+            polls in a row.
 
         NOTE: 'globus_sdk.TransferClient.task_wait()' is *NOT* async, so we must diy
+          All of the concurrent waits share one poller, which looks up every
+          transfer that is due with a single 'task_list' request. A transfer
+          is polled right away, then every GLOBUS_POLL_INTERVAL_MIN_SECONDS,
+          backing off to every GLOBUS_POLL_INTERVAL_SECONDS for long transfers.
         """
         LOGGER.info(f"Waiting on transfer: {task_id=}")
+        key = str(task_id)
+        if key not in self._waits:
+            self._waits[key] = _TaskWait(
+                future=asyncio.get_running_loop().create_future(),
+                interval=min(
+                    self._env.GLOBUS_POLL_INTERVAL_MIN_SECONDS,
+                    self._env.GLOBUS_POLL_INTERVAL_SECONDS,
+                ),
+                next_poll=time.monotonic(),
+            )
+            # a new transfer is due right away; don't let it wait for the poller to wake up
+            if self._poller and self._poller_sleeping:
+                self._poller.cancel()
+                self._poller = None
+                self._poller_sleeping = False
+        wait = self._waits[key]
+        if (self._poller is None) or self._poller.done():
+            self._poller = asyncio.create_task(self._poll())
+
+        wait.waiters += 1
+        try:
+            return await asyncio.shield(wait.future)
+        finally:
+            wait.waiters -= 1
+            # if the last one waiting gave up, stop polling the transfer
+            if (not wait.waiters) and (not wait.future.done()):
+                wait.future.cancel()
+                self._waits.pop(key, None)
+
+    async def wait_for_transfers_to_finish(
+        self,
+        task_id: uuid.UUID | str,
+        dest_paths: list[Path],
+    ) -> dict[str, GlobusTransferFailedException | None]:
+        """Wait for a multi-file transfer to finish, then account for each file.
 
-        first = True
-        while True:
+        Return:
+            See `get_item_results()`.
+        """
+        task_error: GlobusTransferFailedException | None = None
+        try:
+            await self.wait_for_transfer_to_finish(task_id)
+        except GlobusTransferFailedException as e:
+            task_error = e
 
-            # sleep each time after first iteration
-            if first:
-                first = False
-            else:
-                await asyncio.sleep(self._env.GLOBUS_POLL_INTERVAL_SECONDS)
+        return await self.get_item_results(task_id, dest_paths, task_error)
 
-            # look at status
-            LOGGER.debug("checking transfer status...")
-            task = self._transfer_client.get_task(task_id)
-            LOGGER.debug(f"{task=}")
-            status = task["status"]
-            LOGGER.debug(f"{status=}")
-            match status:
-                case "SUCCEEDED":
-                    # File(s) in transfer was/were:
-                    #   (1) written at destination and/or
-                    #   (2) did not need to be written due to `sync_level` setting
-                    # To differentiate, look at `task` fields:
-                    #   'files' (int),
-                    #   'files_skipped' (int), and
-                    #   'files_transferred' (int)
-                    LOGGER.info(f"Globus transfer succeeded: {task_id=}")
-                    return task.data
-                case "FAILED" | "INACTIVE":
-                    msg = f"Globus transfer failed ({status=}): {task_id=}"
-                    LOGGER.error(msg)
-                    raise GlobusTransferFailedException(msg)
-                case "ACTIVE":
-                    continue
-                case _:
-                    LOGGER.warning(
-                        f"received unknown {status=}: {task_id=} — continuing..."
-                    )
-                    continue
+    async def get_task_statuses(
+        self,
+        task_ids: list[uuid.UUID | str],
+    ) -> dict[str, str]:
+        """Look up the status of many transfers at once.
+
+        Return:
+            A dict mapping each task_id (as a str) that Globus knows about
+            to its status (ACTIVE, INACTIVE, SUCCEEDED, or FAILED).
+
+        Rather than one 'get_task' per transfer, the task IDs are looked up
+        with as few 'task_list' requests as Globus allows.
+        """
+        tasks = await self._get_tasks([str(task_id) for task_id in task_ids])
+        return {key: task["status"] for key, task in tasks.items()}
+
+    async def get_item_results(
+        self,
+        task_id: uuid.UUID | str,
+        dest_paths: list[Path],
+        task_error: GlobusTransferFailedException | None,
+    ) -> dict[str, GlobusTransferFailedException | None]:
+        """Account for each file of a finished transfer.
+
+        Return:
+            A dict mapping each destination path (as a str) to None, if the
+            file is at the destination, or the exception describing why not.
+
+        A file that Globus skipped ('task_skipped_errors') failed. If the task
+        itself failed (task_error), every file that Globus did not report as
+        transferred ('task_successful_transfers') failed with it.
+        """
+        results: dict[str, GlobusTransferFailedException | None] = {
+            str(dest_path): task_error for dest_path in dest_paths
+        }
+
+        # the files that were transferred before the task failed are still good
+        if task_error:
+            transferred = await self._call(
+                "task_successful_transfers",
+                lambda: list(self._transfer_client.paginated.task_successful_transfers(task_id).items()),
+            )
+            for item in transferred:
+                if item["destination_path"] in results:
+                    results[item["destination_path"]] = None
+
+        # the files that were skipped are not
+        skipped = await self._call(
+            "task_skipped_errors",
+            lambda: list(self._transfer_client.paginated.task_skipped_errors(task_id).items()),
+        )
+        for item in skipped:
+            if item["destination_path"] in results:
+                msg = (
+                    f"Globus transfer skipped {item['source_path']} "
+                    f"({item.get('error_code')}: {item.get('error_details')}): {task_id=}"
+                )
+                LOGGER.error(msg)
+                results[item["destination_path"]] = GlobusTransferFailedException(msg)
+
+        return results
+
+    async def get_verified_paths(
+        self,
+        task_id: uuid.UUID | str,
+        dest_paths: list[Path],
+    ) -> set[str]:
+        """Find the files of a finished transfer that Globus verified at the destination.
+
+        Return:
+            The destination paths (as a str) that Globus reports as transferred
+            ('task_successful_transfers'). With GLOBUS_VERIFY_CHECKSUM on, each
+            of them was checked against its SHA512 checksum at the destination.
+            A file that Globus did not need to transfer (see 'sync_level') was
+            not checked, so it is not included.
+        """
+        if not self._env.GLOBUS_VERIFY_CHECKSUM:
+            return set()
+        wanted = {str(dest_path) for dest_path in dest_paths}
+        transferred = await self._call(
+            "task_successful_transfers",
+            lambda: list(self._transfer_client.paginated.task_successful_transfers(task_id).items()),
+        )
+        return {item["destination_path"] for item in transferred if item["destination_path"] in wanted}
@@ -5,21 +5,91 @@
 
 import asyncio
 import base64
+from contextlib import aclosing
 from enum import Enum
-from functools import wraps
+from functools import partial, wraps
+from itertools import groupby
 import hashlib
+import json
 import logging
 from pathlib import Path
-from typing import Any, Awaitable, Callable, cast, Concatenate, Coroutine, Optional, ParamSpec, TypeVar, Union
+import time
+from typing import Any, AsyncGenerator, Awaitable, BinaryIO, Callable, cast, Concatenate, Coroutine, Optional, ParamSpec, TypeVar, Union
 import xml.etree.ElementTree as ET
 from xml.etree.ElementTree import Element
 
+from prometheus_client import Counter, Gauge, Histogram
 import pycurl
 from rest_tools.client import ClientCredentialsAuth
 from tornado.httpclient import AsyncHTTPClient, HTTPError, HTTPRequest
 
 LOG = logging.getLogger(__name__)
 
+# curl hands data to (and takes data from) Python in chunks of this size;
+# the default of 16 KiB means tens of thousands of callbacks per GB
+CURL_BUFFER_SIZE = 1024 * 1024 * 2
+
+# remember that a remote directory exists for this long (unless configured otherwise)
+DIR_CACHE_TTL_SECONDS = 600
+
+# let a burst of this many seconds' worth of the bandwidth limit through at once
+BANDWIDTH_BURST_SECONDS = 1.0
+# don't hand curl a throttled upload in pieces smaller than this (unless that's all it asked for)
+BANDWIDTH_MIN_GRANT = 64 * 1024
+# look in on a paused upload at least this often, so a new limit takes effect quickly
+BANDWIDTH_MAX_PAUSE_SECONDS = 0.25
+# measure the aggregate upload throughput over windows of this length
+BANDWIDTH_WINDOW_SECONDS = 1.0
+
+# get a new access token this long before the current one expires
+TOKEN_REFRESH_MARGIN_SECONDS = 60
+# reuse an access token that doesn't say when it expires for this long
+TOKEN_FALLBACK_TTL_SECONDS = 60
+
+# Prometheus metrics
+# -- make module-level so these are shared within this process (else, dups overwrite)
+
+PROMETHEUS_DIR_CACHE_LOOKUPS_TOTAL = Counter(
+    "lta_desy_dir_cache_lookups_total",
+    "LTA component: count of mkdir_p calls by whether the directory was known to exist (hit) or not (miss)",
+    labelnames=("result",),
+)
+PROMETHEUS_BANDWIDTH_LIMIT = Gauge(
+    "lta_desy_bandwidth_limit_bytes_per_second",
+    "LTA component: upload bandwidth limit shared by the uploads in this process (0 is no limit), by WebDAV host",
+    labelnames=("dest_url",),
+)
+PROMETHEUS_UPLOAD_BYTES_TOTAL = Counter(
+    "lta_desy_upload_bytes_total",
+    "LTA component: count of bytes handed to curl for upload, by WebDAV host",
+    labelnames=("dest_url",),
+)
+PROMETHEUS_UPLOAD_THROUGHPUT = Histogram(
+    "lta_desy_upload_throughput_bytes_per_second",
+    "LTA component: throughput of a single upload (file size / time to PUT it)",
+    buckets=[1e5, 1e6, 5e6, 1e7, 2.5e7, 5e7, 1e8, 2.5e8, 5e8, 1e9],
+)
+PROMETHEUS_AGGREGATE_THROUGHPUT = Histogram(
+    "lta_desy_aggregate_throughput_bytes_per_second",
+    "LTA component: throughput of all of the uploads in this process together, measured over short windows",
+    buckets=[1e5, 1e6, 5e6, 1e7, 2.5e7, 5e7, 1e8, 2.5e8, 5e8, 1e9, 2.5e9],
+)
+PROMETHEUS_TREE_JOBS_TOTAL = Counter(
+    "lta_desy_tree_jobs_total",
+    "LTA component: count of jobs finished by tree operations (rmtree, sync_dir), by operation, job, and outcome",
+    labelnames=("operation", "job", "outcome"),
+)
+PROMETHEUS_TREE_JOBS_QUEUED = Gauge(
+    "lta_desy_tree_jobs_queued",
+    "LTA component: count of jobs waiting for a worker in tree operations (rmtree, sync_dir), by operation",
+    labelnames=("operation",),
+)
+
+# the caches shared by all of the Sync objects in this process, by DEST_URL
+_DIR_CACHES: dict[str, "RemoteDirCache"] = {}
+# the bandwidth limiters shared by all of the Sync objects in this process, by DEST_URL
+_BANDWIDTH_LIMITERS: dict[str, "BandwidthLimiter"] = {}
+
 DataDict = dict[str, Any]
 
 P = ParamSpec("P")
@@ -32,6 +102,7 @@ XMLNS = {
     'ns1': 'http://srm.lbl.gov/StorageResourceManager',
     'ns2': 'http://www.dcache.org/2013/webdav',
 }
+RESPONSE_TAG = '{DAV:}response'
 
 
 class DirObject(Enum):
@@ -44,14 +115,27 @@ def _as_task(task: Awaitable[TaskReturn]) -> Coroutine[Any, Any, TaskReturn]:
     return cast(Coroutine[Any, Any, TaskReturn], task)
 
 
-def bind_setup_curl(config: dict[str, str]) -> Callable[[pycurl.Curl], None]:
+def bind_setup_curl(config: dict[str, str], share: Optional[pycurl.CurlShare] = None) -> Callable[[pycurl.Curl], None]:
     def setup_curl(c: pycurl.Curl) -> None:
         c.setopt(pycurl.CAPATH, '/etc/grid-security/certificates')
+        if share is not None:
+            try:
+                c.setopt(pycurl.SHARE, share)
+            except pycurl.error:
+                pass  # the client reuses its handles; this one is already sharing
         if config["LOG_LEVEL"].lower() == 'debug':
             c.setopt(pycurl.VERBOSE, True)
     return setup_curl
 
 
+def make_curl_share() -> pycurl.CurlShare:
+    """Create a curl share, so that all of a client's handles share DNS lookups and TLS sessions."""
+    share = pycurl.CurlShare()
+    share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+    share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
+    return share
+
+
 def convert_checksum_from_dcache(checksum: str) -> str:
     """DCache returns a binary checksum, but we want the hex digest"""
     if checksum.startswith('sha-512='):
@@ -69,6 +153,16 @@ def _decode_if_necessary(value: Optional[Union[str, bytes]]) -> Optional[str]:
     raise TypeError(f"Expected str or bytes or None, got {type(value).__name__}")
 
 
+def _token_expiry(token: Optional[str]) -> Optional[float]:
+    """Return the expiry (seconds since the epoch) claimed by a JWT, without verifying it."""
+    try:
+        payload = cast(str, token).split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        return float(claims['exp'])
+    except Exception:
+        return None
+
+
 def sha512sum(filename: Path, blocksize: int = 1024 * 1024 * 2) -> str:
     """
     Compute the SHA512 hash of the data in the specified file.
@@ -83,8 +177,332 @@ def sha512sum(filename: Path, blocksize: int = 1024 * 1024 * 2) -> str:
     return h.hexdigest()
 
 
+class HashingReader:
+    """
+    Feed a file to pycurl, computing its SHA512 on the way through.
+
+    If curl seeks (to rewind the upload for a retry), the hash starts over
+    and catches up to the new position, so that it always covers exactly
+    the bytes that were sent.
+    """
+    def __init__(self, f: BinaryIO, size: int):
+        self._f = f
+        self._hasher = hashlib.sha512()
+        self.position = 0
+        self.size = size
+
+    def read(self, size: int) -> bytes:
+        """Read up to size bytes for pycurl's READFUNCTION."""
+        data = self._f.read(size)
+        self._hasher.update(data)
+        self.position += len(data)
+        return data
+
+    def seek(self, offset: int, origin: int) -> int:
+        """Seek to offset for pycurl's SEEKFUNCTION; curl only seeks from the start."""
+        try:
+            self._f.seek(0)
+            self._hasher = hashlib.sha512()
+            self.position = 0
+            while self.position < offset:
+                data = self._f.read(min(CURL_BUFFER_SIZE, offset - self.position))
+                if not data:
+                    return pycurl.SEEKFUNC_FAIL
+                self._hasher.update(data)
+                self.position += len(data)
+            return pycurl.SEEKFUNC_OK
+        except Exception:
+            return pycurl.SEEKFUNC_FAIL
+
+    def hexdigest(self) -> Optional[str]:
+        """Return the SHA512 of the file, or None if the whole file was not read."""
+        if self.position != self.size:
+            return None
+        return self._hasher.hexdigest()
+
+
+class BandwidthLimiter:
+    """
+    Share an upload bandwidth limit among all of the uploads to a WebDAV host.
+
+    This is a token bucket: it fills at 'rate' bytes per second, up to
+    BANDWIDTH_BURST_SECONDS worth of bytes, and every byte handed to curl
+    takes one out. A rate of 0 (or less) means no limit. The rate can be
+    changed at any time; uploads in progress pick it up with their next read.
+
+    It also measures the aggregate throughput of the uploads, and reports it
+    to Prometheus once per BANDWIDTH_WINDOW_SECONDS while data is moving.
+    """
+    def __init__(self, dest_url: str, rate: float = 0):
+        self.dest_url = dest_url
+        self.rate = 0.0
+        self._tokens = 0.0
+        self._filled_at = time.monotonic()
+        self._window_start = self._filled_at
+        self._window_bytes = 0
+        self._bytes_total = PROMETHEUS_UPLOAD_BYTES_TOTAL.labels(dest_url=dest_url)
+        self.set_rate(rate)
+
+    @property
+    def capacity(self) -> float:
+        """The most bytes that can be sent at once, after a rest."""
+        return max(self.rate * BANDWIDTH_BURST_SECONDS, BANDWIDTH_MIN_GRANT)
+
+    def set_rate(self, rate: float) -> None:
+        """Change the limit, in bytes per second; 0 for no limit."""
+        self._fill()
+        self.rate = max(0.0, rate)
+        self._tokens = min(self._tokens, self.capacity)
+        PROMETHEUS_BANDWIDTH_LIMIT.labels(dest_url=self.dest_url).set(self.rate)
+
+    def grant(self, size: int) -> int:
+        """Return how many of the size bytes may be sent now; 0 means wait (see delay)."""
+        if self.rate <= 0:
+            return size
+        self._fill()
+        if self._tokens < min(size, BANDWIDTH_MIN_GRANT):
+            return 0
+        granted = min(size, int(self._tokens))
+        self._tokens -= granted
+        return granted
+
+    def delay(self, size: int) -> float:
+        """Return how many seconds until grant(size) would let something through."""
+        if self.rate <= 0:
+            return 0.0
+        self._fill()
+        return max(0.0, (min(size, BANDWIDTH_MIN_GRANT) - self._tokens) / self.rate)
+
+    def record(self, nbytes: int) -> None:
+        """Count bytes that were handed to curl toward the throughput measurements."""
+        self._bytes_total.inc(nbytes)
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed >= BANDWIDTH_WINDOW_SECONDS:
+            if self._window_bytes:
+                PROMETHEUS_AGGREGATE_THROUGHPUT.observe(self._window_bytes / elapsed)
+            self._window_start = now
+            self._window_bytes = 0
+        self._window_bytes += nbytes
+
+    def _fill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._filled_at) * self.rate)
+        self._filled_at = now
+
+
+class ThrottledReader:
+    """
+    Feed a HashingReader to pycurl no faster than a BandwidthLimiter allows.
+
+    While the limiter has nothing to give, the transfer is paused, and a
+    timer on the event loop un-pauses it once the limiter will let some
+    data through. Call close() once the transfer is over.
+    """
+    def __init__(self, reader: HashingReader, limiter: BandwidthLimiter):
+        self._reader = reader
+        self._limiter = limiter
+        self._curl: Optional[pycurl.Curl] = None
+        self._resume_handle: Optional[asyncio.TimerHandle] = None
+
+    def bind(self, c: pycurl.Curl) -> None:
+        """Have the curl handle read (and seek) through us."""
+        self._curl = c
+        c.setopt(pycurl.READFUNCTION, self.read)
+        c.setopt(pycurl.SEEKFUNCTION, self._reader.seek)
+
+    def read(self, size: int) -> Union[bytes, int]:
+        """Read up to size bytes for pycurl's READFUNCTION, or pause the transfer."""
+        granted = self._limiter.grant(size)
+        if not granted:
+            delay = min(self._limiter.delay(size), BANDWIDTH_MAX_PAUSE_SECONDS)
+            self._resume_handle = asyncio.get_running_loop().call_later(delay, self._resume)
+            return pycurl.READFUNC_PAUSE
+        data = self._reader.read(granted)
+        self._limiter.record(len(data))
+        return data
+
+    def close(self) -> None:
+        """Forget the curl handle (it goes back to the client's pool) and any pending resume."""
+        if self._resume_handle is not None:
+            self._resume_handle.cancel()
+            self._resume_handle = None
+        self._curl = None
+
+    def _resume(self) -> None:
+        self._resume_handle = None
+        if self._curl is not None:
+            try:
+                self._curl.pause(pycurl.PAUSE_CONT)
+            except pycurl.error as e:
+                LOG.warning(f"Unable to resume a throttled upload: {e}")
+
+
+class RemoteDirCache:
+    """
+    RemoteDirCache remembers the remote directories known to exist.
+
+    Most bundles go into a directory that already exists at DESY, so
+    mkdir_p can skip the PROPFIND walk entirely. A directory is remembered
+    for ttl_seconds after a PROPFIND or MKCOL shows that it exists, and is
+    forgotten (along with everything below it) when DESY says otherwise.
+
+    Use get_remote_dir_cache to share one cache among all of the Sync
+    objects in a process.
+    """
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._expires: dict[Path, float] = {}
+
+    def __contains__(self, path: Path) -> bool:
+        expires = self._expires.get(path)
+        if expires is None:
+            return False
+        if expires < time.monotonic():
+            del self._expires[path]
+            return False
+        return True
+
+    def add(self, path: Path) -> None:
+        """Remember that the directory (and so all of its parents) exists."""
+        if self.ttl_seconds <= 0:
+            return
+        expires = time.monotonic() + self.ttl_seconds
+        for p in [path, *path.parents]:
+            self._expires[p] = expires
+
+    def discard(self, path: Path) -> None:
+        """Forget the directory, and everything below it."""
+        for p in list(self._expires):
+            if p == path or path in p.parents:
+                del self._expires[p]
+
+    def clear(self) -> None:
+        """Forget every directory."""
+        self._expires.clear()
+
+
+def get_remote_dir_cache(dest_url: str, ttl_seconds: float) -> RemoteDirCache:
+    """Return the directory cache for the provided WebDAV host that is shared within this process."""
+    if dest_url not in _DIR_CACHES:
+        _DIR_CACHES[dest_url] = RemoteDirCache(ttl_seconds)
+    cache = _DIR_CACHES[dest_url]
+    # if Sync objects disagree, trust the cache as little as the most careful one wants
+    cache.ttl_seconds = min(cache.ttl_seconds, ttl_seconds)
+    return cache
+
+
+class PropfindStream:
+    """
+    PropfindStream parses the children out of a PROPFIND response as it arrives.
+
+    Each child is put on the children queue as soon as its response element
+    is complete. Once a caller is no longer interested (wanted is False), the
+    rest of the response is ignored.
+    """
+
+    def __init__(self, process_response: Callable[[Element], Optional[DataDict]]):
+        self.children: asyncio.Queue[Optional[DataDict]] = asyncio.Queue()
+        self.wanted = True
+        self._parser: ET.XMLPullParser[Element] = ET.XMLPullParser(events=('start', 'end'))
+        self._process_response = process_response
+        self._roots: list[Element] = []
+
+    def feed(self, chunk: bytes) -> None:
+        """Parse the next chunk of the response."""
+        if self.wanted:
+            self._parser.feed(chunk)
+            self._parse()
+
+    def close(self) -> None:
+        """Parse whatever is left at the end of the response."""
+        if self.wanted:
+            self._parser.close()
+            self._parse()
+
+    def _parse(self) -> None:
+        for event_item in self._parser.read_events():
+            event, e = cast(tuple[str, Element], event_item)
+            if event == 'start':
+                if not self._roots:
+                    self._roots.append(e)
+            elif e.tag == RESPONSE_TAG:
+                child = self._process_response(e)
+                # forget the responses we've already handled
+                del self._roots[0][:]
+                if child is not None:
+                    self.children.put_nowait(child)
+
+
+class TreeWorkQueue:
+    """
+    TreeWorkQueue runs the jobs of a tree operation with a fixed pool of workers.
+
+    Jobs may add more jobs (listing a directory queues up its children), and
+    they are taken first-in first-out, so a tree is walked breadth-first.
+    A job must not wait on another job; it only queues it up. Together with
+    jobs that hold a connection slot only for a single request, this means
+    no job can starve while holding a slot that another one needs, however
+    small MAX_PARALLEL is, and however deep or wide the tree is.
+
+    The queue itself is unbounded: the workers are its only producers, so a
+    limit would leave them all waiting on each other. The work in progress
+    is bounded by the number of workers instead; a queued job is only a
+    small callable.
+    """
+
+    def __init__(self, operation: str, workers: int):
+        self.operation = operation
+        self.workers = max(1, workers)
+        self._queue: asyncio.Queue[tuple[str, Callable[[], Awaitable[Any]]]] = asyncio.Queue()
+        self._errors: list[Exception] = []
+        self._queued = PROMETHEUS_TREE_JOBS_QUEUED.labels(operation=operation)
+
+    def put(self, job: str, func: Callable[[], Awaitable[Any]]) -> None:
+        """Queue up a job; it runs once a worker is free."""
+        self._queue.put_nowait((job, func))
+        self._queued.inc()
+
+    async def run(self) -> None:
+        """Run the queued jobs, and any jobs they add; raise the first error, if any."""
+        workers = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        try:
+            await self._queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        if self._errors:
+            raise self._errors[0]
+
+    async def _work(self) -> None:
+        while True:
+            job, func = await self._queue.get()
+            self._queued.dec()
+            outcome = "skipped"
+            try:
+                # after an error, we drain the queue without doing any more work
+                if not self._errors:
+                    await func()
+                    outcome = "success"
+            except Exception as e:
+                outcome = "failure"
+                self._errors.append(e)
+            finally:
+                PROMETHEUS_TREE_JOBS_TOTAL.labels(operation=self.operation, job=job, outcome=outcome).inc()
+                self._queue.task_done()
+
+
+def get_bandwidth_limiter(dest_url: str) -> BandwidthLimiter:
+    """Return the bandwidth limiter for the provided WebDAV host that is shared within this process."""
+    if dest_url not in _BANDWIDTH_LIMITERS:
+        _BANDWIDTH_LIMITERS[dest_url] = BandwidthLimiter(dest_url)
+    return _BANDWIDTH_LIMITERS[dest_url]
+
+
 class ParallelAsync:
     def __init__(self, max_parallel: int):
+        self.max_parallel = max_parallel
         self._semaphore = asyncio.Semaphore(max_parallel)
 
 
@@ -101,11 +519,23 @@ class Sync(ParallelAsync):
     Sync is a transfer implementation using WebDAV to copy files to DESY.
 
     Original code by David Schultz; gently adapted for LTA by Patrick Meade.
+
+    A Sync is meant to be long-lived: it owns the HTTP client (so keep-alive
+    connections and TLS sessions to DESY are reused) and the access token
+    (so it is only refreshed shortly before it expires). Call close() when
+    you are done with it.
     """
     def __init__(self, config: dict[str, str]):
         super().__init__(int(config["MAX_PARALLEL"]))
 
         self.config = config
+        self.dir_cache = get_remote_dir_cache(
+            config["DEST_URL"],
+            float(config.get("DIR_CACHE_TTL_SECONDS", DIR_CACHE_TTL_SECONDS)),
+        )
+        self.bandwidth = get_bandwidth_limiter(config["DEST_URL"])
+        if "MAX_SEND_BYTES_PER_SECOND" in config:
+            self.bandwidth.set_rate(float(config["MAX_SEND_BYTES_PER_SECOND"]))
 
         self.rc = ClientCredentialsAuth(
             address=config["DEST_URL"],
@@ -116,63 +546,112 @@ class Sync(ParallelAsync):
             retries=int(config["WORK_RETRIES"]),
         )
 
+        self._token: Optional[str] = None
+        self._token_refresh_at = 0.0
+        self._token_lock = asyncio.Lock()
+
+        self._curl_share = make_curl_share()
+        self._setup_curl = bind_setup_curl(self.config, self._curl_share)
         AsyncHTTPClient.configure("tornado.curl_httpclient.CurlAsyncHTTPClient")
-        self.http_client = AsyncHTTPClient(max_clients=100, defaults={
+        self.http_client = AsyncHTTPClient(force_instance=True, max_clients=100, defaults={
             'allow_nonstandard_methods': True,
             'connect_timeout': 0,
-            'prepare_curl_callback': bind_setup_curl(self.config),
+            'prepare_curl_callback': self._setup_curl,
         })
 
+    def close(self) -> None:
+        """Close the HTTP client, and its connections to DESY."""
+        self.http_client.close()
+
+    async def _get_access_token(self) -> Optional[str]:
+        """Return an access token for DESY, getting a new one only when it is about to expire."""
+        async with self._token_lock:
+            if (self._token is None) or (time.time() >= self._token_refresh_at):
+                if self._token is not None:
+                    # don't let the client hand back the token that is about to expire
+                    self.rc.access_token = None
+                # getting a token is a blocking HTTP request; keep it off the event loop
+                await asyncio.to_thread(self.rc._get_token)
+                self._token = _decode_if_necessary(self.rc.access_token)
+                expiry = _token_expiry(self._token)
+                if expiry is None:
+                    self._token_refresh_at = time.time() + TOKEN_FALLBACK_TTL_SECONDS
+                else:
+                    self._token_refresh_at = expiry - TOKEN_REFRESH_MARGIN_SECONDS
+            return self._token
+
     async def run(self) -> None:
         # await self.sync_dir(Path(ENV.SRC_DIRECTORY))
         raise NotImplementedError("Directory sync is not used for LTA; please call `await sync.put_path(src_path, dest_path)` instead")
 
-    @connection_semaphore
-    async def get_children(self, path_str: str) -> DataDict:
+    async def get_children(self, path_str: str, timeout: int = 600) -> DataDict:
+        return {child['name']: child async for child in self.iter_children(path_str, timeout)}
+
+    async def iter_children(self, path_str: str, timeout: int = 600) -> AsyncGenerator[DataDict, None]:
+        """
+        Yield the children of a remote directory, as the PROPFIND response arrives.
+
+        The response is parsed incrementally, so a directory with tens of
+        thousands of entries is never held in memory as a whole, and the
+        caller can start work on the first children while the rest are
+        still on the wire. If the caller stops early, the rest of the
+        response is read (so the connection can be reused) and thrown away.
+        """
         fullpath = Path(self.config["DEST_BASE_PATH"]) / path_str.lstrip('/')
-        self.rc._get_token()
-        token = _decode_if_necessary(self.rc.access_token)
+        token = await self._get_access_token()
         headers = {
             'Authorization': f'bearer {token}',
             'Depth': '1',
         }
         body = b'<?xml version="1.0"?><propfind xmlns="DAV:"><allprop/></propfind>'
-        req = HTTPRequest(
-            method='PROPFIND',
-            url=f'{self.config["DEST_URL"]}{fullpath}',
-            headers=headers,
-            body=body,
-        )
-        ret = await self.http_client.fetch(req)
-
-        content = ret.body.decode('utf-8')
-        logging.debug(content)
-        root = ET.fromstring(content)
-        children = self._process_children(fullpath, root)
-        return children
+        stream = PropfindStream(partial(self._process_response, fullpath))
 
-    def _process_children(self, fullpath: Path, root: Element) -> DataDict:
-        """Process the children into a data dictionary."""
-        children: DataDict = {}
-        for e in root.findall('.//d:response', XMLNS):
-            # sometimes e.find() returns None
-            href = e.find('./d:href', XMLNS)
-            if href is None or href.text is None:
-                continue
-            # href.text is a str, so wrap it up in a Path object
-            path = Path(href.text)
-            if path != fullpath:
-                data = {'name': path.name, 'type': DirObject.Directory}
-                proplist = e.findall('./d:propstat/d:prop', XMLNS)
-                for props in proplist:
-                    if len(props) > 5:
-                        break
-                else:
-                    props = None
-                if props:
-                    data.update(self._process_props(props))
-                children[path.name] = data
-        return children
+        async def fetch() -> None:
+            try:
+                req = HTTPRequest(
+                    method='PROPFIND',
+                    url=f'{self.config["DEST_URL"]}{fullpath}',
+                    headers=headers,
+                    body=body,
+                    request_timeout=timeout,
+                    streaming_callback=stream.feed,
+                )
+                async with self._semaphore:
+                    await self.http_client.fetch(req)
+                stream.close()
+            finally:
+                stream.children.put_nowait(None)
+
+        task = asyncio.create_task(fetch())
+        try:
+            while (child := await stream.children.get()) is not None:
+                yield child
+            await task
+        finally:
+            if not task.done():
+                stream.wanted = False
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    def _process_response(self, fullpath: Path, e: Element) -> Optional[DataDict]:
+        """Process a response into a data dictionary, or None if it isn't a child."""
+        # sometimes e.find() returns None
+        href = e.find('./d:href', XMLNS)
+        if href is None or href.text is None:
+            return None
+        # href.text is a str, so wrap it up in a Path object
+        path = Path(href.text)
+        if path == fullpath:
+            return None
+        data = {'name': path.name, 'type': DirObject.Directory}
+        proplist = e.findall('./d:propstat/d:prop', XMLNS)
+        for props in proplist:
+            if len(props) > 5:
+                break
+        else:
+            props = None
+        if props:
+            data.update(self._process_props(props))
+        return data
 
     def _process_props(self, props: Element) -> DataDict:
         """Process the properties into a data dictionary."""
@@ -197,8 +676,7 @@ class Sync(ParallelAsync):
     @connection_semaphore
     async def get_file(self, path: str, timeout: int = 1200) -> None:
         fullpath = Path(self.config["DEST_BASE_PATH"]) / path.lstrip('/')
-        self.rc._get_token()
-        token = _decode_if_necessary(self.rc.access_token)
+        token = await self._get_access_token()
         headers = {
             'Authorization': f'bearer {token}',
         }
@@ -219,8 +697,7 @@ class Sync(ParallelAsync):
     async def rmfile(self, path: str, timeout: int = 600) -> None:
         logging.info('RMFILE %s', path)
         fullpath = Path(self.config["DEST_BASE_PATH"]) / path.lstrip('/')
-        self.rc._get_token()
-        token = _decode_if_necessary(self.rc.access_token)
+        token = await self._get_access_token()
         headers = {
             'Authorization': f'bearer {token}',
         }
@@ -232,30 +709,57 @@ class Sync(ParallelAsync):
         )
         await self.http_client.fetch(req)
 
-    @connection_semaphore
     async def rmtree(self, path: Path, timeout: int = 600) -> None:
+        """
+        Remove a remote file or directory tree.
+
+        The tree is listed breadth-first, removing files as they show up,
+        and then the directories are removed, deepest first.
+        """
         logging.info('RMTREE %s', path)
-        ret = await self.get_children(str(path.parent))
-        if path.name not in ret:
+        found = await self._find_child(path)
+        if found is None:
             logging.info("does not exist")
-        elif ret[path.name]['type'] == DirObject.File:
-            await self.rmfile(str(path))
-        else:
-            children = await self.get_children(str(path))
-            async with asyncio.TaskGroup() as tg:
-                for child in children.values():
-                    if child['type'] == DirObject.File:
-                        tg.create_task(_as_task(self.rmfile(str(path / child['name']), timeout)))
-                    else:
-                        tg.create_task(_as_task(self.rmtree(path / child['name'], timeout)))
+            return
+        if found['type'] == DirObject.File:
             await self.rmfile(str(path))
+            return
+
+        dirs: list[Path] = []
+        work = TreeWorkQueue("rmtree", self.max_parallel)
+
+        async def list_dir(d: Path) -> None:
+            dirs.append(d)
+            async for child in self.iter_children(str(d)):
+                if child['type'] == DirObject.File:
+                    work.put("rmfile", partial(self.rmfile, str(d / child['name']), timeout))
+                else:
+                    work.put("list", partial(list_dir, d / child['name']))
+
+        work.put("list", partial(list_dir, path))
+        await work.run()
+
+        # a directory can only go once everything inside it is gone
+        by_depth = sorted(dirs, key=lambda d: len(d.parts), reverse=True)
+        for _, level in groupby(by_depth, key=lambda d: len(d.parts)):
+            work = TreeWorkQueue("rmtree", self.max_parallel)
+            for d in level:
+                work.put("rmdir", partial(self.rmfile, str(d), timeout))
+            await work.run()
+
+    async def _find_child(self, path: Path) -> Optional[DataDict]:
+        """Look for the remote path in its parent directory, stopping as soon as it shows up."""
+        async with aclosing(self.iter_children(str(path.parent))) as siblings:
+            async for child in siblings:
+                if child['name'] == path.name:
+                    return child
+        return None
 
     @connection_semaphore
     async def mkdir(self, path: str, timeout: int = 60) -> None:
         logging.info('MKDIR %s', path)
         fullpath = Path(self.config["DEST_BASE_PATH"]) / path.lstrip('/')
-        self.rc._get_token()
-        token = _decode_if_necessary(self.rc.access_token)
+        token = await self._get_access_token()
         headers = {
             'Authorization': f'bearer {token}',
         }
@@ -276,8 +780,7 @@ class Sync(ParallelAsync):
         logging.info('PUT %s', path)
         fullpath = Path(self.config["DEST_BASE_PATH"]) / path.lstrip('/')
         uploadpath = fullpath.with_name('_upload_' + fullpath.name)
-        self.rc._get_token()
-        token = _decode_if_necessary(self.rc.access_token)
+        token = await self._get_access_token()
         filesize = Path(path).stat(follow_symlinks=True).st_size
         headers = {
             'Authorization': f'bearer {token}',
@@ -295,8 +798,7 @@ class Sync(ParallelAsync):
                     return pycurl.SEEKFUNC_FAIL
 
             def cb(c: pycurl.Curl) -> None:
-                setup_curl = bind_setup_curl(self.config)
-                setup_curl(c)
+                self._setup_curl(c)
                 if filesize >= 2000000000:
                     # c.unsetopt(pycurl.INFILESIZE)
                     c.setopt(pycurl.INFILESIZE_LARGE, filesize)
@@ -339,8 +841,7 @@ class Sync(ParallelAsync):
             logging.error('PUT %s - bad checksum. expected %s, but received %s', path, expected_checksum, checksum)
             raise RuntimeError('bad checksum!')
 
-        self.rc._get_token()
-        token = _decode_if_necessary(self.rc.access_token)
+        token = await self._get_access_token()
         headers = {
             'Authorization': f'bearer {token}',
             'Destination': str(fullpath),
@@ -350,7 +851,7 @@ class Sync(ParallelAsync):
             url=f'{self.config["DEST_URL"]}{uploadpath}',
             headers=headers,
             request_timeout=timeout,
-            prepare_curl_callback=bind_setup_curl(self.config),
+            prepare_curl_callback=self._setup_curl,
         )
         await self.http_client.fetch(req)
 
@@ -370,61 +871,75 @@ class Sync(ParallelAsync):
         return children
 
     async def sync_dir(self, path: Path) -> None:
+        """Bring the remote copy of a local directory tree up to date, breadth-first."""
+        work = TreeWorkQueue("sync_dir", self.max_parallel)
+        exists = await self._find_child(path) is not None
+        work.put("sync", partial(self._sync_one_dir, work, path, exists))
+        await work.run()
+
+    async def _sync_one_dir(self, work: TreeWorkQueue, path: Path, exists: bool) -> None:
+        """Bring one remote directory up to date, and queue up the work for its children."""
         logging.info("SYNC %s", path)
-        # check if dir exists
-        ret = await self.get_children(str(path.parent))
-        if path.name not in ret:
+        children: DataDict = {}
+        if not exists:
             await self.mkdir(str(path))
-            children = {}
         else:
-            children = await self.get_children(str(path))
+            stale_uploads = []
+            async for child in self.iter_children(str(path)):
+                children[child['name']] = child
+                if child['name'].startswith('_upload_'):
+                    stale_uploads.append(str(path / child['name']))
+            # delete prev failed uploads before any new upload can reuse their names
+            await asyncio.gather(*(self.rmfile(upload) for upload in stale_uploads))
 
         # check contents
         expected_children = self.get_local_children(path)
         logging.debug('expected children: %s', expected_children)
         logging.debug('actual children: %s', children)
 
-        # delete prev failed uploads
-        async with asyncio.TaskGroup() as tg:
-            for name in sorted(children):
-                if name.startswith('_upload_'):
-                    tg.create_task(_as_task(self.rmfile(str(path / name))))
-
         # now upload as necessary
-        async with asyncio.TaskGroup() as tg:
-            for name in sorted(expected_children):
-                if name in children:
-                    # verify size at least
-                    e = expected_children[name]
-                    c = children[name]
-                    if e['type'] != c['type']:
-                        logging.error('Bad type on %s', path / name)
-                        await self.rmtree(Path(path / name))
-                    elif e['type'] == DirObject.File and e.get('size', -1) == c.get('size', -1):
-                        logging.info('verified %s', path / name)
-                        continue
-                else:
-                    logging.info('missing from dest: %s', path / name)
+        for name in sorted(expected_children):
+            child_exists = name in children
+            if child_exists:
+                # verify size at least
+                e = expected_children[name]
+                c = children[name]
+                if e['type'] != c['type']:
+                    logging.error('Bad type on %s', path / name)
+                    await self.rmtree(Path(path / name))
+                    child_exists = False
+                elif e['type'] == DirObject.File and e.get('size', -1) == c.get('size', -1):
+                    logging.info('verified %s', path / name)
+                    continue
+            else:
+                logging.info('missing from dest: %s', path / name)
 
-                if expected_children[name]['type'] == DirObject.Directory:
-                    tg.create_task(_as_task(self.sync_dir(path / name)))
-                else:
-                    tg.create_task(_as_task(self.put_file(str(path / name))))
+            if expected_children[name]['type'] == DirObject.Directory:
+                work.put("sync", partial(self._sync_one_dir, work, path / name, child_exists))
+            else:
+                work.put("put_file", partial(self.put_file, str(path / name)))
 
     @connection_semaphore
     async def mkdir_p(self, path: str, timeout: int = 60) -> None:
         logging.info('MKDIR -p %s', path)
-        dest_base = Path(self.config["DEST_BASE_PATH"])
-        #  fullpath = dest_base / path.lstrip('/')
         fullpath = Path(self.config["DEST_BASE_PATH"]) / path.lstrip('/')
+        # If we already know the directory is there, we have nothing to do
+        if fullpath in self.dir_cache:
+            PROMETHEUS_DIR_CACHE_LOOKUPS_TOTAL.labels(result="hit").inc()
+            return
+        PROMETHEUS_DIR_CACHE_LOOKUPS_TOTAL.labels(result="miss").inc()
+        token = await self._get_access_token()
+        current, missing_parts = await self._find_existing_ancestor(fullpath, token, timeout)
+        await self._make_missing_dirs(current, missing_parts, token, timeout)
+
+    async def _find_existing_ancestor(self, fullpath: Path, token: Optional[str], timeout: int) -> tuple[Path, list[str]]:
+        """Find the deepest ancestor of the path that exists, and the parts of the path below it that don't."""
+        dest_base = Path(self.config["DEST_BASE_PATH"])
         # Break into components
         parts = fullpath.parts
         # We assume DEST_BASE_PATH exists
         base_parts = dest_base.parts
         missing_parts: list[str] = []
-
-        self.rc._get_token()
-        token = _decode_if_necessary(self.rc.access_token)
         headers = {
             'Authorization': f'bearer {token}',
             'Depth': '0',
@@ -433,6 +948,8 @@ class Sync(ParallelAsync):
         # Walk from full path up to base to find the first existing directory
         for i in range(len(parts), len(base_parts), -1):
             candidate = Path(*parts[:i])
+            if candidate in self.dir_cache:
+                return candidate, missing_parts
             url = f'{self.config["DEST_URL"]}{candidate}'
             req = HTTPRequest(
                 method='PROPFIND',
@@ -443,19 +960,21 @@ class Sync(ParallelAsync):
             try:
                 await self.http_client.fetch(req)
                 # If PROPFIND succeeds, we found the highest existing parent
-                break
+                self.dir_cache.add(candidate)
+                return candidate, missing_parts
             except HTTPError as e:
                 if e.code in (404, 405):
                     # Does not exist, add to missing
+                    self.dir_cache.discard(candidate)
                     missing_parts.insert(0, parts[i - 1])
                 else:
                     raise Exception(f'Unexpected error checking {candidate}: {e}')
-        else:
-            # If we got here, none of the ancestors existed, which shouldn't happen
-            raise Exception(f'Base path {dest_base} does not exist on remote.')
+        # If we got here, none of the ancestors existed, which shouldn't happen
+        raise Exception(f'Base path {dest_base} does not exist on remote.')
 
+    async def _make_missing_dirs(self, current: Path, missing_parts: list[str], token: Optional[str], timeout: int) -> None:
+        """Create each of the missing directories below the existing one, in turn."""
         # Build up the path incrementally
-        current = Path(*parts[:i])
         for part in missing_parts:
             current = current / part
             url = f'{self.config["DEST_URL"]}{current}'
@@ -468,25 +987,32 @@ class Sync(ParallelAsync):
             try:
                 await self.http_client.fetch(req)
                 logging.info('Created directory %s', current)
+                self.dir_cache.add(current)
             except HTTPError as e:
                 if e.code in (405, 409):
                     # Already exists or conflict—ignore
                     logging.info('Directory %s already exists', current)
+                    if e.code == 409:
+                        # but don't trust what we thought we knew about it
+                        self.dir_cache.discard(current)
+                    else:
+                        self.dir_cache.add(current)
                     continue
                 else:
                     raise Exception(f'Error creating directory {current}: {e}')
 
     @connection_semaphore
-    async def put_file_src_dest(self, src_path: str, dest_path: str, timeout: int = 1200) -> None:
+    async def put_file_src_dest(self, src_path: str, dest_path: str, timeout: int = 1200) -> str:
         """
         Uploads file to a tmp name first, checks the checksum, then
         moves it to the final location.
+
+        Returns the SHA512 checksum of the file at the destination.
         """
         logging.info('PUT %s', dest_path)
         fullpath = Path(self.config["DEST_BASE_PATH"]) / dest_path.lstrip('/')
         uploadpath = fullpath.with_name('_upload_' + fullpath.name)
-        self.rc._get_token()
-        token = _decode_if_necessary(self.rc.access_token)
+        token = await self._get_access_token()
         filesize = Path(src_path).stat(follow_symlinks=True).st_size
         headers = {
             'Authorization': f'bearer {token}',
@@ -498,23 +1024,20 @@ class Sync(ParallelAsync):
         timeout = max(timeout, int(filesize / 10**9) * 600)
 
         with open(src_path, 'rb') as f:
-            def seek(offset: int, _origin: int) -> int:
-                try:
-                    f.seek(offset)
-                    return pycurl.SEEKFUNC_OK
-                except Exception:
-                    return pycurl.SEEKFUNC_FAIL
+            # hash the file as curl reads it, instead of reading it twice
+            reader = HashingReader(f, filesize)
+            # and share the bandwidth with the other uploads in this process
+            throttle = ThrottledReader(reader, self.bandwidth)
 
             def cb(c: pycurl.Curl) -> None:
-                setup_curl = bind_setup_curl(self.config)
-                setup_curl(c)
+                self._setup_curl(c)
                 if filesize >= 2000000000:
                     # c.unsetopt(pycurl.INFILESIZE)
                     c.setopt(pycurl.INFILESIZE_LARGE, filesize)
                 else:
                     c.setopt(pycurl.INFILESIZE, filesize)
-                c.setopt(pycurl.READDATA, f)
-                c.setopt(pycurl.SEEKFUNCTION, seek)
+                c.setopt(pycurl.UPLOAD_BUFFERSIZE, CURL_BUFFER_SIZE)
+                throttle.bind(c)
 
             upload_url = f'{self.config["DEST_URL"]}{uploadpath}'
             LOG.info(f"PUT {upload_url} (timeout={timeout})")
@@ -525,26 +1048,28 @@ class Sync(ParallelAsync):
                 request_timeout=timeout,
                 prepare_curl_callback=cb,
             )
-            ret = await self.http_client.fetch(req)
+            start = time.monotonic()
+            try:
+                ret = await self.http_client.fetch(req)
+            except HTTPError as e:
+                if e.code in (404, 409):
+                    # a directory we thought was there is not; we don't know
+                    # which one, so start over with what we know about DESY
+                    self.dir_cache.clear()
+                raise
+            finally:
+                throttle.close()
+            elapsed = time.monotonic() - start
+            if elapsed > 0:
+                PROMETHEUS_UPLOAD_THROUGHPUT.observe(filesize / elapsed)
 
         checksum = ret.headers.get('Digest', None)
-        expected_checksum = sha512sum(Path(src_path))
-        if checksum:
-            # we got a checksum back, so compare that directly
-            checksum = convert_checksum_from_dcache(checksum)
-        else:
-            # read back file, and run checksum manually
-            logging.info("PUT %s - no checksum in headers, so get manually", dest_path)
-            hasher = hashlib.sha512()
-            req = HTTPRequest(
-                method='GET',
-                url=f'{self.config["DEST_URL"]}{uploadpath}',
-                headers=headers,
-                request_timeout=timeout,
-                streaming_callback=hasher.update,
-            )
-            await self.http_client.fetch(req)
-            checksum = hasher.hexdigest()
+        expected_checksum = reader.hexdigest()
+        if expected_checksum is None:
+            # curl didn't read the whole file through us, so hash it the slow way
+            logging.info("PUT %s - upload did not hash the whole file, so hash %s", dest_path, src_path)
+            expected_checksum = sha512sum(Path(src_path))
+        checksum = await self._checksum_at_dest(checksum, dest_path, uploadpath, headers, timeout)
 
         if expected_checksum == checksum:
             logging.info("PUT %s complete - checksum successful!", dest_path)
@@ -552,8 +1077,7 @@ class Sync(ParallelAsync):
             logging.error('PUT %s - bad checksum. expected %s, but received %s', dest_path, expected_checksum, checksum)
             raise RuntimeError('bad checksum!')
 
-        self.rc._get_token()
-        token = _decode_if_necessary(self.rc.access_token)
+        token = await self._get_access_token()
         headers = {
             'Authorization': f'bearer {token}',
             'Destination': str(fullpath),
@@ -563,18 +1087,45 @@ class Sync(ParallelAsync):
             url=f'{self.config["DEST_URL"]}{uploadpath}',
             headers=headers,
             request_timeout=timeout,
-            prepare_curl_callback=bind_setup_curl(self.config),
+            prepare_curl_callback=self._setup_curl,
         )
         await self.http_client.fetch(req)
+        return checksum
 
-    @connection_semaphore
-    async def put_path(self, src_path: str, dest_path: str, timeout: int = 1200) -> None:
+    async def _checksum_at_dest(self, digest: Optional[str], dest_path: str, uploadpath: Path,
+                                headers: dict[str, str], timeout: int) -> str:
+        """Return the SHA512 checksum of the uploaded file, from the Digest header or by reading it back."""
+        if digest:
+            # we got a checksum back, so compare that directly
+            return convert_checksum_from_dcache(digest)
+        # read back file, and run checksum manually
+        logging.info("PUT %s - no checksum in headers, so get manually", dest_path)
+        hasher = hashlib.sha512()
+
+        def readback_cb(c: pycurl.Curl) -> None:
+            self._setup_curl(c)
+            c.setopt(pycurl.BUFFERSIZE, CURL_BUFFER_SIZE)
+
+        req = HTTPRequest(
+            method='GET',
+            url=f'{self.config["DEST_URL"]}{uploadpath}',
+            headers=headers,
+            request_timeout=timeout,
+            streaming_callback=hasher.update,
+            prepare_curl_callback=readback_cb,
+        )
+        await self.http_client.fetch(req)
+        return hasher.hexdigest()
+
+    async def put_path(self, src_path: str, dest_path: str, timeout: int = 1200) -> str:
         """
         Ensures that the parent directory exists, then uploads the
         file to the final location.
+
+        Returns the SHA512 checksum of the file at the destination.
         """
         dest_dir = str(Path(dest_path).parent)
         LOG.info(f"Ensuring {dest_dir} exists at destination")
         await self.mkdir_p(dest_dir, timeout)
         LOG.info(f"Uploading {src_path} -> {dest_path}")
-        await self.put_file_src_dest(src_path, dest_path, timeout)
+        return await self.put_file_src_dest(src_path, dest_path, timeout)
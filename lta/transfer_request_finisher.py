@@ -205,61 +205,32 @@ class TransferRequestFinisher(Component):
 
         If all of the Bundles created by the TransferRequest are now status
         "deleted" or "finished", then mark the TransferRequest as status "completed".
+        The LTA DB checks the Bundles and updates everything in a single request.
         """
-        # look up the TransferRequest associated with the bundle
+        # ask the LTA DB to complete the TransferRequest associated with the bundle
         request_uuid = bundle["request"]
-        self.logger.info(f"Querying status of all bundles for TransferRequest {request_uuid}")
-        response = await lta_rc.request('GET', f'/Bundles?request={request_uuid}')
-        results = response["results"]
-        deleted_count = len(results)
-        self.logger.info(f"Found {deleted_count} bundles for TransferRequest {request_uuid}")
-        # check each constituent bundle for "deleted" or "finished" status
-        for bundle_uuid in results:
-            result = await lta_rc.request('GET', f'/Bundles/{bundle_uuid}')
-            self.logger.info(f"Bundle {result['uuid']} has status {result['status']}")
-            if (result["status"] == "deleted") or (result["status"] == "finished"):
-                deleted_count = deleted_count - 1
-            else:
-                self.logger.info(f'{result["status"]} is not "deleted" or "finished"; TransferRequest {request_uuid} will not be updated.')
-        # if there are some bundles that have not reached "deleted" or "finished" status
-        if deleted_count > 0:
-            self.logger.info(f'TransferRequest {request_uuid} has {deleted_count} Bundles still waiting for status "deleted" or "finished"')
-            # put the bundle at the back of the line to be checked later
-            bundle_id = bundle["uuid"]
-            right_now = now()
-            patch_body: Dict[str, Union[bool, str]] = {
-                "claimed": False,
-                "update_timestamp": right_now,
-                "work_priority_timestamp": right_now,
-            }
-            self.logger.info(f"PATCH /Bundles/{bundle_id} - '{patch_body}'")
-            await lta_rc.request('PATCH', f'/Bundles/{bundle_id}', patch_body)
+        try_complete_body = {
+            "claimant": f"{self.name}-{self.instance_uuid}",
+            "bundle_status": self.output_status,
+        }
+        self.logger.info(f"POST /TransferRequests/{request_uuid}/actions/try_complete - '{try_complete_body}'")
+        response = await lta_rc.request('POST', f'/TransferRequests/{request_uuid}/actions/try_complete', try_complete_body)
+        self.logger.info(f"TransferRequest {request_uuid} Bundle status counts: {response['counts']}")
+        if response["completed"]:
+            self.logger.info(f"TransferRequest {request_uuid} marked as completed; {response['count']} Bundles updated to {self.output_status}.")
             return
-        # otherwise, we're ready to complete the TransferRequest
-        self.logger.info(f"Updating TransferRequest {request_uuid} to mark as completed.")
+        # if there are some bundles that have not reached "deleted" or "finished" status
+        self.logger.info(f'TransferRequest {request_uuid} has {response["waiting"]} Bundles still waiting for status "deleted" or "finished"')
+        # put the bundle at the back of the line to be checked later
+        bundle_id = bundle["uuid"]
         right_now = now()
-        patch_body = {
-            "claimant": f"{self.name}-{self.instance_uuid}",
+        patch_body: Dict[str, Union[bool, str]] = {
             "claimed": False,
-            "claim_timestamp": right_now,
-            "status": "completed",
-            "reason": "",
             "update_timestamp": right_now,
+            "work_priority_timestamp": right_now,
         }
-        self.logger.info(f"PATCH /TransferRequests/{request_uuid} - '{patch_body}'")
-        await lta_rc.request('PATCH', f'/TransferRequests/{request_uuid}', patch_body)
-        # update each of the constituent bundles to status "finished"
-        for bundle_id in results:
-            patch_body = {
-                "claimant": f"{self.name}-{self.instance_uuid}",
-                "claimed": False,
-                "claim_timestamp": right_now,
-                "status": self.output_status,
-                "reason": "",
-                "update_timestamp": right_now,
-            }
-            self.logger.info(f"PATCH /Bundles/{bundle_id} - '{patch_body}'")
-            await lta_rc.request('PATCH', f'/Bundles/{bundle_id}', patch_body)
+        self.logger.info(f"PATCH /Bundles/{bundle_id} - '{patch_body}'")
+        await lta_rc.request('PATCH', f'/Bundles/{bundle_id}', patch_body)
 
 
 async def main(transfer_request_finisher: TransferRequestFinisher) -> None:
@@ -90,6 +90,35 @@ class HSICommandFailedException(Exception):
         )
 
 
+class HSIBatchItemFailedException(Exception):
+    """Raised when the commands for one item of a batched HSI session fail."""
+
+    def __init__(
+        self,
+        hsi_cmd_description: str,
+        path: str,
+        output_lines: list[str],
+        logger: Logger,
+    ):
+        logger.error(f"Command '{hsi_cmd_description}' FAILED for {path}")
+        for line in output_lines:
+            logger.error(f"output: {line}")
+        super().__init__(f"{hsi_cmd_description} - {path} - {output_lines}")
+
+
+class CommandTimeoutException(Exception):
+    """Raised when an external command is killed for running past its deadline."""
+
+    def __init__(
+        self,
+        args: list[str],
+        timeout: float | None,
+        logger: Logger,
+    ):
+        logger.error(f"Command {args} did not finish within {timeout} seconds; it was killed")
+        super().__init__(f"{args} - timed out after {timeout} seconds")
+
+
 async def patch_bundle(
     lta_rc: RestClient,
     bundle_id: str,
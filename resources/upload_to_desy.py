@@ -36,6 +36,8 @@ async def upload_file_to_desy(config: dict[str, str], src_path: str, dest_path:
     except Exception as e:
         LOG.error(f'DESY Sync raised an Exception: {e}')
         raise e
+    finally:
+        sync.close()
     # all done
     LOG.info("Upload complete.")
 
@@ -7,6 +7,7 @@ import asyncio
 import logging
 import os
 import socket
+import time
 import tracemalloc
 from typing import Any, AsyncGenerator, Callable, Dict, List, cast
 from unittest.mock import AsyncMock
@@ -23,7 +24,8 @@ from rest_tools.client import RestClient
 from rest_tools.utils import Auth
 from wipac_dev_tools import from_environment, strtobool
 
-from lta.rest_server import EXPECTED_CONFIG, create_mongodb_client, main, start, unique_id
+from lta.rest_server import EXPECTED_CONFIG, create_mongodb_client, main, start, TransactionSupport, TRANSFER_REQUESTS_LOCK, unique_id
+from lta.rest_server_utils.status_poller import make_jobs, STATUS_COUNTS, update_status_counts
 
 LtaCollection = Database[Dict[str, Any]]
 RestClientFactory = Callable[[str, float], RestClient]
@@ -180,6 +182,34 @@ async def test_100_server_reachability(rest: RestClientFactory) -> None:
     assert ret == {}
 
 
+@pytest.mark.asyncio
+async def test_110_status_counts(mongo: LtaCollection, rest: RestClientFactory, monkeypatch: MonkeyPatch) -> None:
+    """Check that GET /status/counts serves the status poller's latest counts."""
+    r = rest("system")  # type: ignore[call-arg]
+    monkeypatch.setattr(STATUS_COUNTS, "counts", {})
+    monkeypatch.setattr(STATUS_COUNTS, "timestamp", None)
+
+    # request: GET
+    # nothing to serve before the first poll
+    with pytest.raises(HTTPError) as exc:
+        await r.request('GET', '/status/counts')
+    assert exc.value.response.status_code == 503  # type: ignore[union-attr]
+
+    # request: POST
+    bundles = [{"status": "created"}, {"status": "created"}, {"status": "quarantined", "original_status": "taping"}]
+    await r.request('POST', '/Bundles/actions/bulk_create', {'bundles': bundles})
+    await r.request('POST', '/TransferRequests', {'source': 'WIPAC', 'dest': 'NERSC', 'path': '/data/exp/foo/bar'})
+    await update_status_counts(create_mongodb_client(from_environment(EXPECTED_CONFIG)), make_jobs(), STATUS_COUNTS)
+
+    # request: GET
+    ret = await r.request('GET', '/status/counts')
+    assert ret['timestamp']
+    assert ret['counts'] == {
+        'Bundles': {'status': {'created': 2, 'quarantined': 1}, 'original_status': {'taping': 1}},
+        'TransferRequests': {'status': {'unclaimed': 1}, 'original_status': {}},
+    }
+
+
 # -----------------------------------------------------------------------------
 # 200s - TransferRequests endpoints
 # -----------------------------------------------------------------------------
@@ -346,11 +376,247 @@ async def test_220_transfer_request_pop(rest: RestClientFactory) -> None:
     assert not ret['transfer_request']
 
 
+@pytest.mark.asyncio
+async def test_230_transfer_request_try_complete(mongo: LtaCollection, rest: RestClientFactory) -> None:
+    """Check try_complete action for transfer requests."""
+    r = rest('system')  # type: ignore[call-arg]
+    claimant_body = {
+        'claimant': 'testing-transfer_request_finisher-0a2b2f47-bd43-4bc0-8b5f-8a3e0cd32e61',
+    }
+
+    # request: POST
+    # unknown TransferRequest
+    with pytest.raises(HTTPError) as exc:
+        await r.request('POST', '/TransferRequests/7e5b8c3a7ab211eeb7b1b8ca3a5d2b4c/actions/try_complete', claimant_body)
+    assert exc.value.response.status_code == 404  # type: ignore[union-attr]
+
+    # request: POST
+    request = {
+        'source': 'WIPAC',
+        'dest': 'NERSC',
+        'path': '/data/exp/foo/bar',
+    }
+    ret = await r.request('POST', '/TransferRequests', request)
+    tr_uuid = ret['TransferRequest']
+
+    # request: POST
+    # I'm being a jerk and trying to complete without naming myself as claimant
+    with pytest.raises(HTTPError) as exc:
+        await r.request('POST', f'/TransferRequests/{tr_uuid}/actions/try_complete', {})
+    assert exc.value.response.status_code == 400  # type: ignore[union-attr]
+
+    # request: POST
+    test_data = {
+        'bundles': [
+            {"request": tr_uuid, "source": "WIPAC", "dest": "NERSC", "status": "deleted"},
+            {"request": tr_uuid, "source": "WIPAC", "dest": "NERSC", "status": "finished"},
+            {"request": tr_uuid, "source": "WIPAC", "dest": "NERSC", "status": "transferring"},
+            {"request": "some-other-request", "source": "WIPAC", "dest": "NERSC", "status": "deleted"},
+        ]
+    }
+    ret = await r.request('POST', '/Bundles/actions/bulk_create', test_data)
+    uuids = ret['bundles']
+
+    # request: POST
+    # one of the bundles is still transferring, so nothing changes
+    ret = await r.request('POST', f'/TransferRequests/{tr_uuid}/actions/try_complete', claimant_body)
+    assert ret == {
+        'completed': False,
+        'counts': {'deleted': 1, 'finished': 1, 'transferring': 1},
+        'waiting': 1,
+        'count': 0,
+    }
+    ret = await r.request('GET', f'/TransferRequests/{tr_uuid}')
+    assert ret['status'] == 'unclaimed'
+
+    # request: PATCH
+    await r.request('PATCH', f'/Bundles/{uuids[2]}', {'status': 'deleted'})
+
+    # request: POST
+    # all of the bundles are done, so the request is completed
+    ret = await r.request('POST', f'/TransferRequests/{tr_uuid}/actions/try_complete', claimant_body)
+    assert ret == {
+        'completed': True,
+        'counts': {'deleted': 2, 'finished': 1},
+        'waiting': 0,
+        'count': 2,
+    }
+    ret = await r.request('GET', f'/TransferRequests/{tr_uuid}')
+    assert ret['status'] == 'completed'
+    assert ret['status_timestamp'] == ret['update_timestamp']
+    assert ret['claimant'] == claimant_body['claimant']
+    assert not ret['claimed']
+    for uuid in uuids[:3]:
+        ret = await r.request('GET', f'/Bundles/{uuid}')
+        assert ret['status'] == 'finished'
+        assert ret['status_timestamp'] == ret['update_timestamp']
+        assert ret['claimant'] == claimant_body['claimant']
+
+    # the bundle of the other request is left alone
+    ret = await r.request('GET', f'/Bundles/{uuids[3]}')
+    assert ret['status'] == 'deleted'
+
+
+@pytest.mark.asyncio
+async def test_235_transaction_support(monkeypatch: MonkeyPatch) -> None:
+    """Check that the LTA DB asks MongoDB about transactions only once."""
+    st_mock = AsyncMock(return_value=True)
+    monkeypatch.setattr("lta.rest_server.supports_transactions", st_mock)
+    transaction_support = TransactionSupport(AsyncMock())
+    assert await transaction_support()
+    assert await transaction_support()
+    st_mock.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_240_dashboard(mongo: LtaCollection, rest: RestClientFactory) -> None:
+    """Check that GET /Dashboard returns TransferRequests with the status of their Bundles."""
+    r = rest('system')  # type: ignore[call-arg]
+
+    # request: POST
+    tr_uuids = []
+    for i in range(3):
+        ret = await r.request('POST', '/TransferRequests', {'source': 'WIPAC', 'dest': 'NERSC', 'path': f'/data/exp/foo/bar{i}'})
+        tr_uuids.append(ret['TransferRequest'])
+        # the last request is the oldest (and it will be finished)
+        await r.request('PATCH', f'/TransferRequests/{tr_uuids[i]}', {'create_timestamp': f'2024-01-0{3 - i}T00:00:00'})
+    await r.request('PATCH', f'/TransferRequests/{tr_uuids[2]}', {'status': 'finished'})
+
+    # request: POST
+    test_data = {
+        'bundles': [
+            {"request": tr_uuids[0], "source": "WIPAC", "dest": "NERSC", "status": "taping", "claimant": "nersc-mover"},
+            {"request": tr_uuids[0], "source": "WIPAC", "dest": "NERSC", "status": "completed", "claimant": "deleter"},
+            {"request": tr_uuids[2], "source": "WIPAC", "dest": "NERSC", "status": "finished", "claimant": "finisher"},
+        ]
+    }
+    ret = await r.request('POST', '/Bundles/actions/bulk_create', test_data)
+    b_uuids = ret['bundles']
+    await r.request('PATCH', f'/Bundles/{b_uuids[0]}', {'create_timestamp': '2024-02-02T00:00:00'})
+    await r.request('PATCH', f'/Bundles/{b_uuids[1]}', {'create_timestamp': '2024-02-01T00:00:00'})
+
+    # request: GET
+    ret = await r.request('GET', '/Dashboard')
+    results = ret['results']
+    assert [tr['uuid'] for tr in results] == [tr_uuids[2], tr_uuids[1], tr_uuids[0]]
+    assert [b['uuid'] for b in results[2]['bundles']] == [b_uuids[1], b_uuids[0]]
+    assert results[2]['bundles'][1]['status'] == 'taping'
+    assert results[2]['bundles'][1]['claimant'] == 'nersc-mover'
+    assert 'files' not in results[2]['bundles'][1]
+    assert results[1]['bundles'] == []
+
+    # request: GET
+    ret = await r.request('GET', '/Dashboard?active_only=true&limit=1')
+    assert [tr['uuid'] for tr in ret['results']] == [tr_uuids[1]]
+
+    # request: GET
+    ret = await r.request('GET', f'/Dashboard?uuid={tr_uuids[0]}')
+    assert [tr['uuid'] for tr in ret['results']] == [tr_uuids[0]]
+    assert len(ret['results'][0]['bundles']) == 2
+
+    # request: GET
+    with pytest.raises(HTTPError) as exc:
+        await r.request('GET', '/Dashboard?limit=lots')
+    assert exc.value.response.status_code == 400  # type: ignore[union-attr]
+
+
 # -----------------------------------------------------------------------------
 # 300s - Script main
 # -----------------------------------------------------------------------------
 
 
+@pytest.mark.asyncio
+async def test_250_transfer_request_overlap(mongo: LtaCollection, rest: RestClientFactory) -> None:
+    """Check that overlapping TransferRequests are found, and refused unless allowed."""
+    r = rest('system')  # type: ignore[call-arg]
+
+    # request: POST
+    ret = await r.request('POST', '/TransferRequests', {'source': 'WIPAC', 'dest': 'NERSC', 'path': '/data/exp/IceCube/2024//'})
+    uuid = ret['TransferRequest']
+    ret = await r.request('GET', f'/TransferRequests/{uuid}')
+    assert ret['path'] == '/data/exp/IceCube/2024'
+    assert 'allow_overlap' not in ret
+
+    # request: POST
+    for path in ['/data/exp/IceCube/2024', '/data/exp/IceCube', '/data/exp/IceCube/2024/0101', '/', '/data/exp/IceCube/2024/../2024']:
+        ret = await r.request('POST', '/TransferRequests/actions/check_overlap', {'path': path})
+        assert [o['uuid'] for o in ret['overlaps']] == [uuid]
+        with pytest.raises(HTTPError) as exc:
+            await r.request('POST', '/TransferRequests', {'source': 'WIPAC', 'dest': 'NERSC', 'path': path})
+        assert exc.value.response.status_code == 409  # type: ignore[union-attr]
+
+    # request: POST
+    # siblings don't overlap, even if one name begins with the other
+    for path in ['/data/exp/IceCube/20245', '/data/exp/IceCube/2023', '/data/sim/IceCube/2024']:
+        ret = await r.request('POST', '/TransferRequests/actions/check_overlap', {'path': path})
+        assert ret == {'path': path, 'overlaps': []}
+    ret = await r.request('POST', '/TransferRequests', {'source': 'WIPAC', 'dest': 'NERSC', 'path': '/data/exp/IceCube/20245'})
+    assert ret['TransferRequest']
+
+    # request: POST
+    # the operator may insist on an overlapping request
+    ret = await r.request('POST', '/TransferRequests', {'source': 'WIPAC', 'dest': 'NERSC', 'path': '/data/exp/IceCube/2024/0101', 'allow_overlap': True})
+    assert ret['TransferRequest']
+    with pytest.raises(HTTPError) as exc:
+        await r.request('POST', '/TransferRequests', {'source': 'WIPAC', 'dest': 'NERSC', 'path': '/data/exp/x', 'allow_overlap': 'yes'})
+    assert exc.value.response.status_code == 400  # type: ignore[union-attr]
+
+    # request: POST
+    # a request stored before paths were normalized still claims its path
+    old_uuid = unique_id()
+    mongo.TransferRequests.insert_one({'uuid': old_uuid, 'source': 'WIPAC', 'dest': 'NERSC', 'path': '/data/exp/IceCube/2022/', 'status': 'unclaimed'})
+    for path in ['/data/exp/IceCube/2022', '/data/exp/IceCube/2022/0101']:
+        ret = await r.request('POST', '/TransferRequests/actions/check_overlap', {'path': path})
+        assert [o['uuid'] for o in ret['overlaps']] == [old_uuid]
+
+    # request: POST
+    # a completed request no longer claims its path
+    await r.request('PATCH', f'/TransferRequests/{uuid}', {'status': 'completed'})
+    ret = await r.request('POST', '/TransferRequests/actions/check_overlap', {'path': '/data/exp/IceCube/2024/0102'})
+    assert ret['overlaps'] == []
+
+    # request: POST
+    for body in [{}, {'path': 7}, {'path': ''}]:
+        with pytest.raises(HTTPError) as exc:
+            await r.request('POST', '/TransferRequests/actions/check_overlap', body)
+        assert exc.value.response.status_code == 400  # type: ignore[union-attr]
+
+
+@pytest.mark.asyncio
+async def test_260_transfer_request_lock(mongo: LtaCollection, rest: RestClientFactory, monkeypatch: MonkeyPatch) -> None:
+    """Check that TransferRequests are created under the lock document shared by every LTA DB replica."""
+    monkeypatch.setattr("lta.rest_server.LOCK_WAIT_SECONDS", 0.1)
+    r = rest('system')  # type: ignore[call-arg]
+    body = {'source': 'WIPAC', 'dest': 'NERSC', 'path': '/data/exp/IceCube/2025'}
+
+    # request: POST
+    # another replica holds the lock, so this one gives up waiting
+    mongo.Locks.insert_one({'_id': TRANSFER_REQUESTS_LOCK, 'owner': 'other-replica', 'expires': time.time() + 60})
+    with pytest.raises(HTTPError) as exc:
+        await r.request('POST', '/TransferRequests', body)
+    assert exc.value.response.status_code == 503  # type: ignore[union-attr]
+    assert mongo.Locks.find_one({'_id': TRANSFER_REQUESTS_LOCK})['owner'] == 'other-replica'  # type: ignore[index]
+    assert mongo.TransferRequests.count_documents({}) == 0
+
+    # request: POST
+    # the other replica's lease has run out, so this one takes the lock over and releases it after
+    mongo.Locks.update_one({'_id': TRANSFER_REQUESTS_LOCK}, {'$set': {'expires': time.time() - 1}})
+    ret = await r.request('POST', '/TransferRequests', body)
+    assert ret['TransferRequest']
+    assert mongo.Locks.count_documents({}) == 0
+
+    # request: POST
+    # of two concurrent overlapping requests, only one is created
+    results = await asyncio.gather(
+        r.request('POST', '/TransferRequests', {**body, 'path': '/data/exp/IceCube/2026'}),
+        r.request('POST', '/TransferRequests', {**body, 'path': '/data/exp/IceCube/2026/0101'}),
+        return_exceptions=True,
+    )
+    assert len([ret for ret in results if not isinstance(ret, BaseException)]) == 1
+    assert [ret.response.status_code for ret in results if isinstance(ret, HTTPError)] == [409]  # type: ignore[union-attr]
+    assert mongo.Locks.count_documents({}) == 0
+
+
 @pytest.mark.asyncio
 async def test_300_script_main(mocker: MockerFixture) -> None:
     """Ensure that main sets up logging, starts a server, and runs the event loop."""
@@ -407,15 +673,22 @@ async def test_400_bundles_bulk_crud(mongo: LtaCollection, rest: RestClientFacto
     assert ret["count"] == 2
     assert ret["bundles"] == results
 
+    # request: POST, with a separate update for each Bundle
+    request3 = {'updates': {uuid: {'position': idx} for idx, uuid in enumerate(results2)}}
+    ret = await r.request('POST', '/Bundles/actions/bulk_update', request3)
+    assert ret["count"] == 2
+    assert ret["bundles"] == results
+
     #
     # Read - GET /Bundles/UUID
     #
-    for idx, result in enumerate(results, start=1):
+    for idx, result in enumerate(results):
         # request: GET
         ret = await r.request('GET', f'/Bundles/{result}')
         assert ret["uuid"] == result
         assert ret["name"] in ["one", "two"]
         assert ret["key"] == "value"
+        assert ret["position"] == idx
 
     #
     # Delete - POST /Bundles/actions/bulk_delete
@@ -519,6 +792,24 @@ async def test_430_bundles_actions_bulk_update_errors(rest: RestClientFactory) -
         await r.request('POST', '/Bundles/actions/bulk_update', request)
     assert exc.value.response.status_code == 400  # type: ignore[union-attr]
 
+    # request: POST
+    request = {'updates': []}
+    with pytest.raises(HTTPError, match=r"updates field is not an object") as exc:
+        await r.request('POST', '/Bundles/actions/bulk_update', request)
+    assert exc.value.response.status_code == 400  # type: ignore[union-attr]
+
+    # request: POST
+    request = {'updates': {}}
+    with pytest.raises(HTTPError, match=r"updates field is empty") as exc:
+        await r.request('POST', '/Bundles/actions/bulk_update', request)
+    assert exc.value.response.status_code == 400  # type: ignore[union-attr]
+
+    # request: POST
+    request = {'updates': {'d4390bca': 'value'}}
+    with pytest.raises(HTTPError, match=r"updates field is not an object of objects") as exc:
+        await r.request('POST', '/Bundles/actions/bulk_update', request)
+    assert exc.value.response.status_code == 400  # type: ignore[union-attr]
+
 
 @pytest.mark.asyncio
 async def test_440_get_bundles_filter(mongo: LtaCollection, rest: RestClientFactory) -> None:
@@ -805,6 +1096,16 @@ async def test_480_patch_bundles_uuid(mongo: LtaCollection, rest: RestClientFact
     request = {"key": "value"}
     ret = await r.request('PATCH', f'/Bundles/{test_uuid}', request)
     assert ret["key"] == "value"
+    created = ret["status_timestamp"]
+
+    # request: PATCH
+    # changing the status records when the Bundle entered it
+    request = {"status": "transferring"}
+    ret = await r.request('PATCH', f'/Bundles/{test_uuid}', request)
+    assert ret["status_timestamp"] >= created
+    request = {"status": "taping", "status_timestamp": "2024-02-01T00:00:00"}
+    ret = await r.request('PATCH', f'/Bundles/{test_uuid}', request)
+    assert ret["status_timestamp"] == "2024-02-01T00:00:00"
 
     # request: PATCH
     # we try to patch the uuid; error
@@ -953,6 +1254,12 @@ async def test_500_bundles_actions_pop_errors(mongo: LtaCollection, rest: RestCl
         await r.request('POST', '/Bundles/actions/pop?source=WIPAC&status=inaccessible', {})
     assert exc.value.response.status_code == 400  # type: ignore[union-attr]
 
+    # request: POST
+    # max_size is not a number of bytes
+    with pytest.raises(HTTPError, match=r"max_size field is not a non-negative integer") as exc:
+        await r.request('POST', '/Bundles/actions/pop?source=WIPAC&status=inaccessible&max_size=big', {"claimant": "x"})
+    assert exc.value.response.status_code == 400  # type: ignore[union-attr]
+
 
 @pytest.mark.asyncio
 async def test_510_bundles_actions_pop_at_destination(mongo: LtaCollection, rest: RestClientFactory) -> None:
@@ -1047,6 +1354,213 @@ async def test_520_bundles_actions_bulk_create_huge(mongo: LtaCollection, rest:
     assert ret["count"] == 1
 
 
+@pytest.mark.asyncio
+async def test_530_bundles_actions_pop_max_size(mongo: LtaCollection, rest: RestClientFactory) -> None:
+    """Check pop action for bundles no larger than max_size."""
+    r = rest('system')  # type: ignore[call-arg]
+
+    test_data = {
+        'bundles': [
+            {
+                "source": "WIPAC",
+                "dest": "NERSC",
+                "path": "/data/exp/IceCube/2014/15f7a399-fe40-4337-bb7e-d68d2d28ec8e.zip",
+                "status": "created",
+                "size": 5000,
+            },
+            {
+                "source": "WIPAC",
+                "dest": "NERSC",
+                "path": "/data/exp/IceCube/2014/48091a00-0c97-482f-a716-2e721b8e9662.zip",
+                "status": "created",
+                "size": 1000,
+            },
+        ]
+    }
+
+    # request: POST
+    ret = await r.request('POST', '/Bundles/actions/bulk_create', test_data)
+    assert ret["count"] == 2
+
+    claimant_body = {
+        'claimant': 'testing-rate_limiter-aaaed864-0112-4bcf-a069-bb55c12e291d',
+    }
+
+    # request: POST
+    # nothing is small enough
+    ret = await r.request('POST', '/Bundles/actions/pop?source=WIPAC&dest=NERSC&status=created&max_size=999', claimant_body)
+    assert not ret['bundle']
+
+    # request: POST
+    # only the small bundle fits
+    ret = await r.request('POST', '/Bundles/actions/pop?source=WIPAC&dest=NERSC&status=created&max_size=4999', claimant_body)
+    assert ret['bundle']
+    assert ret['bundle']["size"] == 1000
+
+    # request: POST
+    # the big bundle fits exactly
+    ret = await r.request('POST', '/Bundles/actions/pop?source=WIPAC&dest=NERSC&status=created&max_size=5000', claimant_body)
+    assert ret['bundle']
+    assert ret['bundle']["size"] == 5000
+
+
+@pytest.mark.asyncio
+async def test_540_bundles_actions_pop_tape_volume(mongo: LtaCollection, rest: RestClientFactory) -> None:
+    """Check pop action for bundles on a tape volume, in tape position order."""
+    r = rest('system')  # type: ignore[call-arg]
+
+    test_data = {
+        'bundles': [
+            {
+                "source": "NERSC",
+                "dest": "WIPAC",
+                "path": "/data/exp/IceCube/2014/15f7a399-fe40-4337-bb7e-d68d2d28ec8e.zip",
+                "status": "located",
+                "tape": {"volume": "EA871300", "position": 3729},
+            },
+            {
+                "source": "NERSC",
+                "dest": "WIPAC",
+                "path": "/data/exp/IceCube/2014/48091a00-0c97-482f-a716-2e721b8e9662.zip",
+                "status": "located",
+                "tape": {"volume": "EA871301", "position": 12},
+            },
+            {
+                "source": "NERSC",
+                "dest": "WIPAC",
+                "path": "/data/exp/IceCube/2014/9a1a6b79-b9e4-4e5a-8ec1-6a8ba4e7a5b2.zip",
+                "status": "located",
+                "tape": {"volume": "EA871300", "position": 51},
+            },
+        ]
+    }
+
+    # request: POST
+    ret = await r.request('POST', '/Bundles/actions/bulk_create', test_data)
+    assert ret["count"] == 3
+
+    claimant_body = {
+        'claimant': 'testing-nersc_retriever-aaaed864-0112-4bcf-a069-bb55c12e291d',
+    }
+
+    # request: POST
+    # nothing is on an unknown volume
+    ret = await r.request('POST', '/Bundles/actions/pop?source=NERSC&status=located&tape_volume=EA000000', claimant_body)
+    assert not ret['bundle']
+
+    # request: POST
+    # the volume is read front to back, regardless of creation order
+    ret = await r.request('POST', '/Bundles/actions/pop?source=NERSC&status=located&tape_volume=EA871300', claimant_body)
+    assert ret['bundle']["tape"] == {"volume": "EA871300", "position": 51}
+    ret = await r.request('POST', '/Bundles/actions/pop?source=NERSC&status=located&tape_volume=EA871300', claimant_body)
+    assert ret['bundle']["tape"] == {"volume": "EA871300", "position": 3729}
+    ret = await r.request('POST', '/Bundles/actions/pop?source=NERSC&status=located&tape_volume=EA871300', claimant_body)
+    assert not ret['bundle']
+
+    # request: POST
+    # without a volume, the remaining bundle is popped as usual
+    ret = await r.request('POST', '/Bundles/actions/pop?source=NERSC&status=located', claimant_body)
+    assert ret['bundle']["tape"] == {"volume": "EA871301", "position": 12}
+
+
+@pytest.mark.asyncio
+async def test_550_bundles_actions_bulk_get(mongo: LtaCollection, rest: RestClientFactory) -> None:
+    """Check that POST /Bundles/actions/bulk_get and GET /Bundles?fields= return rows with the requested fields."""
+    r = rest('system')  # type: ignore[call-arg]
+
+    # request: POST
+    test_data = {
+        'bundles': [
+            {"request": "r1", "source": "WIPAC", "dest": "NERSC", "status": "taping", "claimant": "nersc-mover", "size": i, "files": [{"uuid": "f"}]}
+            for i in range(2500)
+        ]
+    }
+    ret = await r.request('POST', '/Bundles/actions/bulk_create', test_data)
+    uuids = ret['bundles']
+
+    # request: POST
+    # more than one chunk, along with a bundle that doesn't exist
+    ret = await r.request('POST', '/Bundles/actions/bulk_get', {'bundles': uuids + ['not-a-bundle'], 'fields': ['status', 'size']})
+    assert ret['count'] == 2500
+    assert sorted(b['uuid'] for b in ret['bundles']) == sorted(uuids)
+    assert all(set(b) == {'uuid', 'status', 'size'} for b in ret['bundles'])
+
+    # request: POST
+    # without fields, everything but the files
+    ret = await r.request('POST', '/Bundles/actions/bulk_get', {'bundles': uuids[:2]})
+    assert ret['count'] == 2
+    assert ret['bundles'][0]['claimant'] == 'nersc-mover'
+    assert 'files' not in ret['bundles'][0]
+    assert '_id' not in ret['bundles'][0]
+
+    # request: POST
+    for body in [{}, {'bundles': 'nope'}, {'bundles': []}, {'bundles': uuids[:1], 'fields': 'status'},
+                 {'bundles': uuids[:1], 'fields': []}, {'bundles': uuids[:1], 'fields': ['_id']}]:
+        with pytest.raises(HTTPError) as exc:
+            await r.request('POST', '/Bundles/actions/bulk_get', body)
+        assert exc.value.response.status_code == 400  # type: ignore[union-attr]
+
+    # request: GET
+    ret = await r.request('GET', '/Bundles?status=taping&fields=claimant,size')
+    assert len(ret['results']) == 2500
+    assert all(set(b) == {'uuid', 'claimant', 'size'} for b in ret['results'])
+
+    # request: GET
+    # without fields, just the UUIDs
+    ret = await r.request('GET', '/Bundles?status=taping')
+    assert sorted(ret['results']) == sorted(uuids)
+
+
+@pytest.mark.asyncio
+async def test_560_bundles_source_dest_and_if_status(mongo: LtaCollection, rest: RestClientFactory) -> None:
+    """Check that GET /Bundles filters by source and dest, and that bulk_update with if_status leaves moved-on Bundles alone."""
+    r = rest('system')  # type: ignore[call-arg]
+    claimant_body = {'claimant': 'testing-globus-tracker'}
+
+    # request: POST
+    test_data = {
+        'bundles': [
+            {"request": "r1", "source": "WIPAC", "dest": "NERSC", "status": "transfer-submitted"},
+            {"request": "r1", "source": "WIPAC", "dest": "NERSC", "status": "transfer-submitted"},
+            {"request": "r1", "source": "WIPAC", "dest": "NERSC", "status": "transfer-submitted"},
+            {"request": "r2", "source": "WIPAC", "dest": "DESY", "status": "transfer-submitted"},
+        ]
+    }
+    ret = await r.request('POST', '/Bundles/actions/bulk_create', test_data)
+    uuids = ret['bundles']
+
+    # request: GET
+    ret = await r.request('GET', '/Bundles?source=WIPAC&dest=NERSC&status=transfer-submitted&fields=claimed')
+    assert sorted(b['uuid'] for b in ret['results']) == sorted(uuids[:3])
+    assert all(b['claimed'] is False for b in ret['results'])
+    ret = await r.request('GET', '/Bundles?dest=DESY')
+    assert ret['results'] == [uuids[3]]
+
+    # somebody claims one of them, and somebody else moves another one on
+    ret = await r.request('POST', '/Bundles/actions/pop?source=WIPAC&dest=NERSC&status=transfer-submitted', claimant_body)
+    claimed = ret['bundle']['uuid']
+    moved_on = [uuid for uuid in uuids[:3] if uuid != claimed][0]
+    await r.request('PATCH', f'/Bundles/{moved_on}', {'status': 'taping'})
+
+    # request: POST
+    request = {
+        'updates': {uuid: {'status': 'transferring'} for uuid in uuids[:3]},
+        'if_status': 'transfer-submitted',
+    }
+    ret = await r.request('POST', '/Bundles/actions/bulk_update', request)
+    untouched = [uuid for uuid in uuids[:3] if uuid not in [claimed, moved_on]]
+    assert ret['bundles'] == untouched
+    assert (await r.request('GET', f'/Bundles/{claimed}'))['status'] == 'transfer-submitted'
+    assert (await r.request('GET', f'/Bundles/{moved_on}'))['status'] == 'taping'
+    assert (await r.request('GET', f'/Bundles/{untouched[0]}'))['status'] == 'transferring'
+
+    # request: POST
+    request = {'updates': {uuids[3]: {'status': 'transferring'}}, 'if_status': ['transfer-submitted']}
+    with pytest.raises(HTTPError, match=r"if_status field is not a string") as exc:
+        await r.request('POST', '/Bundles/actions/bulk_update', request)
+    assert exc.value.response.status_code == 400  # type: ignore[union-attr]
+
+
 # -----------------------------------------------------------------------------
 # 600s - Metadata endpoints
 # -----------------------------------------------------------------------------
@@ -1,8 +1,16 @@
 """Pytest fixtures and plugins."""
 
 import logging
+from pathlib import Path
+from typing import AsyncIterator
+
 import pytest
 from prometheus_client import REGISTRY
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+
+from lta.transfer.sync import _BANDWIDTH_LIMITERS, _DIR_CACHES
+from .fake_webdav import FakeWebDav
 
 
 def pytest_configure(config):
@@ -17,3 +25,34 @@ def _clear_prometheus_registry() -> None:
     collectors = list(REGISTRY._collector_to_names.keys())
     for c in collectors:
         REGISTRY.unregister(c)
+
+
+@pytest.fixture(autouse=True)
+def _clear_remote_dir_caches() -> None:
+    """Ensure tests don't see the remote directories (or bandwidth limits) that other tests created."""
+    _DIR_CACHES.clear()
+    _BANDWIDTH_LIMITERS.clear()
+
+
+@pytest.fixture
+def fake_hsi(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Provide a simulated HPSS namespace for the fake hsi executable."""
+    hpss_root = tmp_path / "hpss"
+    hpss_root.mkdir()
+    monkeypatch.setenv("FAKE_HSI_ROOT", str(hpss_root))
+    monkeypatch.setenv("FAKE_HSI_LOG", str(tmp_path / "fake_hsi.log"))
+    return hpss_root
+
+
+@pytest.fixture
+async def fake_webdav() -> AsyncIterator[FakeWebDav]:
+    """Provide a local stand-in for the WebDAV door at DESY."""
+    dav = FakeWebDav()
+    sock, port = bind_unused_port()
+    server = HTTPServer(dav.make_app())
+    server.add_sockets([sock])
+    dav.url = f"http://127.0.0.1:{port}"
+    try:
+        yield dav
+    finally:
+        server.stop()
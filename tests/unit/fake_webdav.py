@@ -0,0 +1,248 @@
+"""Module to provide a local stand-in for the WebDAV door at DESY."""
+
+# fmt:off
+
+import asyncio
+import base64
+from collections import Counter
+from functools import lru_cache
+import hashlib
+from pathlib import PurePosixPath
+from typing import Any, Callable, Optional
+from urllib.parse import unquote, urlparse
+from xml.sax.saxutils import escape
+
+import pycurl
+from tornado.httpclient import HTTPClientError, HTTPRequest
+from tornado.httputil import HTTPHeaders
+from tornado.web import Application, RequestHandler
+
+from .utils import ObjectLiteral
+
+MULTISTATUS_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<d:multistatus xmlns:d="DAV:" xmlns:ns1="http://srm.lbl.gov/StorageResourceManager"'
+    ' xmlns:ns2="http://www.dcache.org/2013/webdav">'
+)
+MULTISTATUS_TAIL = '</d:multistatus>'
+
+# (status code, response headers, response body)
+Reply = tuple[int, dict[str, str], bytes]
+
+
+class FakeWebDav:
+    """
+    FakeWebDav keeps a WebDAV namespace in memory.
+
+    It speaks just enough of dCache's dialect for lta.transfer.sync: PROPFIND
+    (Depth 0 and 1), MKCOL, PUT (answering Want-Digest), GET, MOVE, and DELETE.
+    It can be served over HTTP with Tornado (make_app), or answer requests
+    in-process (client) when a test needs more requests than a socket can
+    carry in reasonable time.
+
+    Every request is counted by method in 'requests', the paths listed by
+    PROPFIND are kept in order in 'listed', and the address of every
+    client connection that made a request is kept in 'connections'.
+    """
+
+    def __init__(self) -> None:
+        """Create an empty namespace; only the root directory exists."""
+        self.dirs: set[PurePosixPath] = {PurePosixPath("/")}
+        self.files: dict[PurePosixPath, bytes] = {}
+        self.requests: Counter[str] = Counter()
+        self.listed: list[PurePosixPath] = []
+        self.connections: set[tuple[str, int]] = set()
+        self.url = ""
+        self._children: dict[PurePosixPath, set[PurePosixPath]] = {PurePosixPath("/"): set()}
+
+    def make_app(self) -> Application:
+        """Create the Tornado application that serves this namespace."""
+        return Application([(r"(.*)", _FakeWebDavHandler, {"dav": self})])
+
+    def client(self) -> "FakeWebDavClient":
+        """Create an in-process stand-in for the HTTP client of a Sync."""
+        return FakeWebDavClient(self)
+
+    def mkdir_p(self, path: str) -> None:
+        """Create the directory, and any missing parents."""
+        p = PurePosixPath(path)
+        for d in reversed([p, *p.parents]):
+            if d not in self.dirs:
+                self.dirs.add(d)
+                self._children[d] = set()
+                self._children[d.parent].add(d)
+
+    def add_file(self, path: str, data: bytes = b"") -> None:
+        """Create (or replace) the file; its directory must exist."""
+        p = PurePosixPath(path)
+        self.files[p] = data
+        self._children[p.parent].add(p)
+
+    def rmtree(self, path: str) -> None:
+        """Remove the file or directory, and everything below it."""
+        p = PurePosixPath(path)
+        self._children.get(p.parent, set()).discard(p)
+        todo = [p]
+        while todo:
+            q = todo.pop()
+            self.files.pop(q, None)
+            self.dirs.discard(q)
+            todo.extend(self._children.pop(q, ()))
+
+    def children(self, path: PurePosixPath) -> list[PurePosixPath]:
+        """List the directories and files directly inside the directory."""
+        return sorted(self._children.get(path, ()))
+
+    def propstat(self, path: PurePosixPath) -> str:
+        """Render the d:response element that describes the directory or file."""
+        data = self.files.get(path)
+        if data is None:
+            props = (
+                '<d:iscollection>TRUE</d:iscollection>'
+                '<d:resourcetype><d:collection/></d:resourcetype>'
+            )
+        else:
+            props = (
+                '<d:iscollection>FALSE</d:iscollection>'
+                '<d:resourcetype/>'
+                f'<d:getcontentlength>{len(data)}</d:getcontentlength>'
+                f'<ns2:Checksums>sha-512={_checksum(data)}</ns2:Checksums>'
+                '<ns1:FileLocality>ONLINE_AND_NEARLINE</ns1:FileLocality>'
+            )
+        return (
+            f'<d:response><d:href>{escape(str(path))}</d:href><d:propstat><d:prop>'
+            f'<d:displayname>{escape(path.name)}</d:displayname>'
+            '<d:getlastmodified>Mon, 01 Jan 2024 00:00:00 GMT</d:getlastmodified>'
+            f'{props}'
+            '</d:prop><d:status>HTTP/1.1 200 OK</d:status></d:propstat></d:response>'
+        )
+
+    def handle(self, method: str, path: str, headers: dict[str, str], body: bytes) -> Reply:
+        """Answer a WebDAV request."""
+        self.requests[method] += 1
+        p = PurePosixPath("/" + unquote(path).strip("/"))
+        exists = (p in self.dirs) or (p in self.files)
+        match method:
+            case "PROPFIND":
+                if not exists:
+                    return 404, {}, b""
+                self.listed.append(p)
+                responses = [p]
+                if headers.get("Depth", "1") != "0" and p in self.dirs:
+                    responses += self.children(p)
+                xml = MULTISTATUS_HEAD + "".join(self.propstat(r) for r in responses) + MULTISTATUS_TAIL
+                return 207, {"Content-Type": "application/xml; charset=utf-8"}, xml.encode("utf-8")
+            case "MKCOL":
+                if exists:
+                    return 405, {}, b""
+                if p.parent not in self.dirs:
+                    return 409, {}, b""
+                self.mkdir_p(str(p))
+                return 201, {}, b""
+            case "PUT":
+                if p.parent not in self.dirs:
+                    return 409, {}, b""
+                self.add_file(str(p), body)
+                reply = {}
+                if headers.get("Want-Digest", "").upper() == "SHA-512":
+                    reply["Digest"] = f"sha-512={_checksum(body)}"
+                return 201, reply, b""
+            case "GET":
+                if p not in self.files:
+                    return 404, {}, b""
+                return 200, {}, self.files[p]
+            case "MOVE":
+                dest = PurePosixPath(unquote(urlparse(headers["Destination"]).path))
+                if p not in self.files:
+                    return 404, {}, b""
+                if dest.parent not in self.dirs:
+                    return 409, {}, b""
+                data = self.files[p]
+                self.rmtree(str(p))
+                self.add_file(str(dest), data)
+                return 201, {}, b""
+            case "DELETE":
+                if not exists:
+                    return 404, {}, b""
+                self.rmtree(str(p))
+                return 204, {}, b""
+        return 405, {}, b""
+
+
+@lru_cache(maxsize=1024)
+def _checksum(data: bytes) -> str:
+    """Return the SHA-512 checksum of the data, the way dCache reports it."""
+    return base64.b64encode(hashlib.sha512(data).digest()).decode()
+
+
+class FakeWebDavClient:
+    """
+    FakeWebDavClient answers the requests of a Sync without a socket.
+
+    The most requests it ever had in flight at once is kept in 'max_in_flight'.
+    """
+
+    def __init__(self, dav: FakeWebDav) -> None:
+        """Create a client for the provided namespace."""
+        self.dav = dav
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def fetch(self, req: HTTPRequest) -> ObjectLiteral:
+        """Answer the request like tornado's AsyncHTTPClient would."""
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            # give the other requests a chance to be in flight too
+            await asyncio.sleep(0)
+            path = urlparse(req.url).path
+            code, headers, body = self.dav.handle(req.method, path, dict(req.headers), self._request_body(req))
+        finally:
+            self.in_flight -= 1
+        if code >= 400:
+            raise HTTPClientError(code)
+        if req.streaming_callback:
+            req.streaming_callback(body)
+            body = b""
+        return ObjectLiteral(code=code, headers=HTTPHeaders(headers), body=body)
+
+    def close(self) -> None:
+        """Nothing to close; there is no socket."""
+
+    def _request_body(self, req: HTTPRequest) -> bytes:
+        if req.body:
+            return req.body
+        if not req.prepare_curl_callback:
+            return b""
+        # read an upload through the callbacks the request would give to curl
+        options: dict[int, Any] = {}
+        req.prepare_curl_callback(ObjectLiteral(setopt=options.__setitem__))
+        read: Optional[Callable[[int], bytes]] = options.get(pycurl.READFUNCTION)
+        if read is None:
+            if pycurl.READDATA not in options:
+                return b""
+            read = options[pycurl.READDATA].read
+        chunks = []
+        while chunk := read(1024 * 1024):
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+
+class _FakeWebDavHandler(RequestHandler):
+    SUPPORTED_METHODS = RequestHandler.SUPPORTED_METHODS + ("PROPFIND", "MKCOL", "MOVE")  # type: ignore[assignment]
+
+    def initialize(self, dav: FakeWebDav) -> None:
+        self.dav = dav
+
+    def _handle(self, path: str) -> None:
+        self.dav.connections.add(self.request.connection.context.address)  # type: ignore[union-attr]
+        code, headers, body = self.dav.handle(
+            self.request.method or "", path, dict(self.request.headers), self.request.body
+        )
+        self.set_status(code)
+        for name, value in headers.items():
+            self.set_header(name, value)
+        if body:
+            self.write(body)
+
+    propfind = mkcol = put = get = move = delete = _handle
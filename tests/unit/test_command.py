@@ -0,0 +1,90 @@
+# test_command.py
+"""Unit tests for lta/command.py."""
+
+# fmt:off
+
+import asyncio
+from asyncio.subprocess import Process
+import logging
+import os
+import sys
+from typing import List
+
+import pytest
+from pytest_mock import MockerFixture
+
+from lta.command import PROMETHEUS_COMMAND_EXITS_TOTAL, run_command
+from lta.utils import CommandTimeoutException
+
+PYTHON = sys.executable
+COMMAND = os.path.basename(PYTHON)
+
+
+def exits(returncode: str) -> float:
+    """Return the number of times a command run by the tests exited with the provided returncode."""
+    for metric in PROMETHEUS_COMMAND_EXITS_TOTAL.collect():
+        for sample in metric.samples:
+            if sample.name == "lta_command_exits_total" and sample.labels == {"command": COMMAND, "returncode": returncode}:
+                return sample.value
+    return 0.0
+
+
+@pytest.mark.asyncio
+async def test_run_command() -> None:
+    """Test that run_command returns a CompletedProcess, like subprocess.run."""
+    before = exits("3")
+    completed_process = await run_command(
+        [PYTHON, "-c", "import sys; print('out'); print('err', file=sys.stderr); sys.exit(3)"],
+        logging.getLogger(),
+    )
+    assert completed_process.returncode == 3
+    assert completed_process.stdout == b"out\n"
+    assert completed_process.stderr == b"err\n"
+    assert exits("3") == before + 1
+
+
+@pytest.mark.asyncio
+async def test_run_command_on_line() -> None:
+    """Test that run_command hands each line of stdout to the callback instead of keeping it."""
+    lines: List[str] = []
+    completed_process = await run_command(
+        [PYTHON, "-c", "print('one'); print('two'); print('three')"],
+        logging.getLogger(),
+        on_line=lines.append,
+    )
+    assert completed_process.returncode == 0
+    assert completed_process.stdout == b""
+    assert lines == ["one", "two", "three"]
+
+
+@pytest.mark.asyncio
+async def test_run_command_timeout(mocker: MockerFixture) -> None:
+    """Test that run_command kills a command that runs past its deadline."""
+    kill_spy = mocker.spy(Process, "kill")
+    before = exits("timeout")
+    with pytest.raises(CommandTimeoutException):
+        await run_command([PYTHON, "-c", "import time; time.sleep(60)"], logging.getLogger(), timeout=0.5)
+    kill_spy.assert_called_once()
+    assert exits("timeout") == before + 1
+
+
+@pytest.mark.asyncio
+async def test_run_command_cancelled(mocker: MockerFixture) -> None:
+    """Test that run_command kills the command when the caller is cancelled."""
+    kill_spy = mocker.spy(Process, "kill")
+    wait_spy = mocker.spy(Process, "wait")
+    started = asyncio.Event()
+    task = asyncio.create_task(run_command(
+        [PYTHON, "-c", "import time; print('started', flush=True); time.sleep(60)"],
+        logging.getLogger(),
+        on_line=lambda line: started.set(),
+    ))
+    await asyncio.wait_for(started.wait(), 30)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    kill_spy.assert_called_once()
+    # the killed command was reaped, not left behind as a zombie
+    process = kill_spy.call_args.args[0]
+    assert process.returncode is not None
+    assert wait_spy.call_count >= 2
@@ -3,6 +3,7 @@
 import logging
 # fmt:off
 
+from pathlib import Path
 from typing import Awaitable, Callable, cast, Concatenate, ParamSpec, TypeVar
 from unittest.mock import AsyncMock, call, MagicMock
 
@@ -27,12 +28,15 @@ def config() -> TestConfig:
         "DEST_BASE_PATH": "/some/root/at/desy/icecube/archive",
         "DEST_SITE": "DESY",
         "DEST_URL": "https://localhost:12880/",
+        "DIR_CACHE_TTL_SECONDS": "600",
         "INPUT_PATH": "/path/to/bundler_todesy",
         "INPUT_STATUS": "staged",
         "LOG_LEVEL": "DEBUG",
         "LTA_AUTH_OPENID_URL": "localhost:12345",
         "LTA_REST_URL": "localhost:12347",
         "MAX_PARALLEL": "100",
+        "MAX_SEND_BYTES_PER_SECOND": "0",
+        "MAX_SEND_BYTES_PER_SECOND_FILE": "max-send-bytes-per-second",
         "OUTPUT_STATUS": "transferring",
         "PROMETHEUS_METRICS_PORT": "8080",
         "RUN_ONCE_AND_DIE": "FALSE",
@@ -167,12 +171,15 @@ async def test_desy_mirror_replicator_logs_configuration(mocker: MockerFixture)
         "DEST_BASE_PATH": "/some/root/at/desy/icecube/archive",
         "DEST_SITE": "DESY",
         "DEST_URL": "https://localhost:12880/",
+        "DIR_CACHE_TTL_SECONDS": "600",
         "INPUT_PATH": "/path/to/bundler_todesy",
         "INPUT_STATUS": "staged",
         "LOG_LEVEL": "DEBUG",
         "LTA_AUTH_OPENID_URL": "localhost:12345",
         "LTA_REST_URL": "logme-http://RmMNHdPhHpH2ZxfaFAC9d2jiIbf5pZiHDqy43rFLQiM.com/",
         "MAX_PARALLEL": "100",
+        "MAX_SEND_BYTES_PER_SECOND": "0",
+        "MAX_SEND_BYTES_PER_SECOND_FILE": "max-send-bytes-per-second",
         "OUTPUT_STATUS": "transferring",
         "PROMETHEUS_METRICS_PORT": "8080",
         "RUN_ONCE_AND_DIE": "FALSE",
@@ -192,12 +199,15 @@ async def test_desy_mirror_replicator_logs_configuration(mocker: MockerFixture)
         call('DEST_BASE_PATH = /some/root/at/desy/icecube/archive'),
         call('DEST_SITE = DESY'),
         call('DEST_URL = https://localhost:12880/'),
+        call('DIR_CACHE_TTL_SECONDS = 600'),
         call('INPUT_PATH = /path/to/bundler_todesy'),
         call('INPUT_STATUS = staged'),
         call('LOG_LEVEL = DEBUG'),
         call('LTA_AUTH_OPENID_URL = localhost:12345'),
         call('LTA_REST_URL = logme-http://RmMNHdPhHpH2ZxfaFAC9d2jiIbf5pZiHDqy43rFLQiM.com/'),
         call('MAX_PARALLEL = 100'),
+        call('MAX_SEND_BYTES_PER_SECOND = 0'),
+        call('MAX_SEND_BYTES_PER_SECOND_FILE = max-send-bytes-per-second'),
         call('OUTPUT_STATUS = transferring'),
         call('PROMETHEUS_METRICS_PORT = 8080'),
         call('RUN_ONCE_AND_DIE = FALSE'),
@@ -397,6 +407,7 @@ async def test_desy_mirror_replicator_replicate_bundle_to_destination_site(confi
     sync_class_mock = mocker.patch("lta.desy_mirror_replicator.Sync", new_callable=MagicMock)
     sync_class_mock.return_value = AsyncMock()
     sync_class_mock.return_value.put_path = AsyncMock()
+    sync_class_mock.return_value.put_path.return_value = "12345"
     p = DesyMirrorReplicator(config, logging.getLogger())
     await p._do_work_claim(lta_rc_mock, MagicMock())
     sync_class_mock.return_value.put_path.assert_called_with(
@@ -404,4 +415,62 @@ async def test_desy_mirror_replicator_replicate_bundle_to_destination_site(confi
         '/data/exp/IceCube/2019/filtered/PFFilt/1109/398ca1ed-0178-4333-a323-8b9158c3dd88.zip',
         30
     )
-    lta_rc_mock.request.assert_called_with("PATCH", '/Bundles/398ca1ed-0178-4333-a323-8b9158c3dd88', mocker.ANY)
+    lta_rc_mock.request.assert_called_with("PATCH", '/Bundles/398ca1ed-0178-4333-a323-8b9158c3dd88', {
+        "status": "transferring",
+        "reason": "",
+        "transfer_dest_path": "/data/exp/IceCube/2019/filtered/PFFilt/1109/398ca1ed-0178-4333-a323-8b9158c3dd88.zip",
+        "final_dest_location": {
+            "path": "/data/exp/IceCube/2019/filtered/PFFilt/1109/398ca1ed-0178-4333-a323-8b9158c3dd88.zip",
+        },
+        "update_timestamp": mocker.ANY,
+        "claimed": False,
+        "transfer_reference": "desy-mirror-replicator",
+        "transfer_checksum": {
+            "sha512": "12345",
+            "service": "desy-webdav",
+        },
+    })
+
+
+@pytest.mark.asyncio
+async def test_desy_mirror_replicator_reuses_sync(config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that DesyMirrorReplicator keeps one Sync (and its connections to DESY) for every bundle."""
+    lta_rc_mock = AsyncMock()
+    sync_class_mock = mocker.patch("lta.desy_mirror_replicator.Sync", new_callable=MagicMock)
+    sync_class_mock.return_value.put_path = AsyncMock(return_value="12345")
+    p = DesyMirrorReplicator(config, logging.getLogger())
+    for i in range(3):
+        await p._replicate_bundle_to_destination_site(lta_rc_mock, {
+            "uuid": f"398ca1ed-0178-4333-a323-8b9158c3dd8{i}",
+            "bundle_path": f"/path/on/source/rse/398ca1ed-0178-4333-a323-8b9158c3dd8{i}.zip",
+            "path": "/data/exp/IceCube/2019/filtered/PFFilt/1109",
+        })
+    sync_class_mock.assert_called_once_with(config)
+    assert sync_class_mock.return_value.put_path.call_count == 3
+
+
+async def test_desy_mirror_replicator_bandwidth_limit_file(config: TestConfig, mocker: MockerFixture, tmp_path: Path) -> None:
+    """Test that DesyMirrorReplicator picks up a new bandwidth limit from a file before each upload."""
+    limit_file = tmp_path / "max_send_bytes_per_second"
+    config["MAX_SEND_BYTES_PER_SECOND_FILE"] = str(limit_file)
+    lta_rc_mock = AsyncMock()
+    put_path_mock = mocker.patch("lta.desy_mirror_replicator.Sync.put_path", new_callable=AsyncMock)
+    put_path_mock.return_value = "12345"
+    p = DesyMirrorReplicator(config, logging.getLogger())
+    bundle = {
+        "uuid": "398ca1ed-0178-4333-a323-8b9158c3dd88",
+        "bundle_path": "/path/on/source/rse/398ca1ed-0178-4333-a323-8b9158c3dd88.zip",
+        "path": "/data/exp/IceCube/2019/filtered/PFFilt/1109",
+    }
+    # no file yet; keep the configured limit
+    await p._replicate_bundle_to_destination_site(lta_rc_mock, bundle)
+    assert p.sync is not None
+    assert p.sync.bandwidth.rate == 0
+    limit_file.write_text("25000000\n")
+    await p._replicate_bundle_to_destination_site(lta_rc_mock, bundle)
+    assert p.sync.bandwidth.rate == 25_000_000
+    # nonsense in the file; keep the limit we had
+    limit_file.write_text("lots\n")
+    await p._replicate_bundle_to_destination_site(lta_rc_mock, bundle)
+    assert p.sync.bandwidth.rate == 25_000_000
+    assert put_path_mock.call_count == 3
@@ -15,9 +15,12 @@ import logging
 from pathlib import Path
 from typing import Any, Callable
 
+import globus_sdk
 import lta
+from lta.transfer.globus import GlobusTransferFailedException
 
 import pytest
+import requests
 from unittest.mock import AsyncMock, patch, MagicMock
 
 # --------------------------------------------------------------------------------------
@@ -27,7 +30,9 @@ from unittest.mock import AsyncMock, patch, MagicMock
 GLOBUS_REPLICATOR_DEST_DIRPATH = Path("/path/to/destination/")
 
 EXPECTED_CONFIG_KEYS = [
+    "MAX_COUNT",
     "USE_FULL_BUNDLE_PATH",
+    "WAIT_FOR_TRANSFER",
     "WORK_RETRIES",
     "WORK_TIMEOUT_SECONDS",
     "GLOBUS_REPLICATOR_DEST_DIRPATH",
@@ -50,6 +55,9 @@ def setup(
     instance = mock_globus_transfer.return_value
     instance.transfer_file = AsyncMock()
     instance.wait_for_transfer_to_finish = AsyncMock()
+    instance.transfer_files = AsyncMock()
+    instance.wait_for_transfers_to_finish = AsyncMock()
+    instance.get_verified_paths = AsyncMock(return_value=set())
 
 
 # --------------------------------------------------------------------------------------
@@ -70,6 +78,7 @@ def base_config() -> dict[str, str]:
         "LOG_LEVEL": "DEBUG",
         "LTA_AUTH_OPENID_URL": "https://auth.local/oidc/token",
         "LTA_REST_URL": "https://lta.local/api",
+        "MAX_COUNT": "1",
         "OUTPUT_STATUS": "transferring",
         "PROMETHEUS_METRICS_PORT": "9102",
         "RUN_ONCE_AND_DIE": "FALSE",
@@ -79,6 +88,7 @@ def base_config() -> dict[str, str]:
         "WORK_SLEEP_DURATION_SECONDS": "0.01",  # keep tests snappy
         "WORK_TIMEOUT_SECONDS": "30",
         "USE_FULL_BUNDLE_PATH": "FALSE",
+        "WAIT_FOR_TRANSFER": "TRUE",
         "GLOBUS_REPLICATOR_DEST_DIRPATH": str(GLOBUS_REPLICATOR_DEST_DIRPATH),
         "GLOBUS_REPLICATOR_SOURCE_BIND_ROOTPATH": "/one/two/three",
     }
@@ -145,7 +155,9 @@ def test_010_init_parses_config(
     assert not hasattr(rep, "globus_dest_url")
     assert not hasattr(rep, "globus_timeout")
 
+    assert rep.max_count == 1
     assert rep.use_full_bundle_path is False
+    assert rep.wait_for_transfer is True
     assert rep.work_retries == 3
     assert rep.work_timeout_seconds == 30.0
 
@@ -404,3 +416,177 @@ async def test_090_replication_use_full_bundle_path_false(
     )
 
     assert kwargs["dest_path"] == GLOBUS_REPLICATOR_DEST_DIRPATH / "baz.zip"
+
+
+def _batch_of_bundles(count: int) -> list[dict[str, Any]]:
+    """Bundles as the LTA DB would hand them to the replicator."""
+    return [
+        {
+            "uuid": f"B-{i}",
+            "status": "completed",
+            "bundle_path": f"/one/two/three/bundle-{i}.zip",
+            "path": "/data/exp/IceCube/2015/bar",
+            "type": "Bundle",
+        }
+        for i in range(count)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_100_do_work_claim_batch_tracks_each_bundle(
+    base_config: dict[str, str],
+    mock_now: str,
+) -> None:
+    """A batch is sent as one Globus task; each bundle is advanced or quarantined on its own."""
+    cfg = dict(base_config)
+    cfg["MAX_COUNT"] = "5"
+    rep = lta.globus_replicator.GlobusReplicator(cfg, logging.getLogger())
+
+    bundles = _batch_of_bundles(3)
+    for i, bundle in enumerate(bundles):
+        bundle["checksum"] = {"sha512": f"sha512-{i}"}
+    rc = DummyRestClient(responses=[{"bundle": b} for b in bundles] + [{"bundle": None}])
+    gt = lta.globus_replicator.GlobusTransfer.return_value  # type: ignore
+    gt.transfer_files.return_value = "TASK-BATCH"
+    gt.wait_for_transfers_to_finish.return_value = {
+        str(GLOBUS_REPLICATOR_DEST_DIRPATH / "bundle-0.zip"): None,
+        str(GLOBUS_REPLICATOR_DEST_DIRPATH / "bundle-1.zip"): GlobusTransferFailedException("skipped"),
+        str(GLOBUS_REPLICATOR_DEST_DIRPATH / "bundle-2.zip"): None,
+    }
+    # Globus verified the checksum of bundle-0 at the destination, but not bundle-2
+    gt.get_verified_paths.return_value = {str(GLOBUS_REPLICATOR_DEST_DIRPATH / "bundle-0.zip")}
+
+    ok = await rep._do_work_claim(rc, MagicMock())  # type: ignore[arg-type]
+    assert ok is True
+
+    # one task for the whole batch
+    gt.transfer_file.assert_not_called()
+    gt.transfer_files.assert_called_once_with(
+        items=[
+            (Path(f"/bundle-{i}.zip"), GLOBUS_REPLICATOR_DEST_DIRPATH / f"bundle-{i}.zip")
+            for i in range(3)
+        ],
+        checksums={Path(f"/bundle-{i}.zip"): f"sha512-{i}" for i in range(3)},
+    )
+    gt.wait_for_transfers_to_finish.assert_called_once_with(
+        "TASK-BATCH",
+        [GLOBUS_REPLICATOR_DEST_DIRPATH / f"bundle-{i}.zip" for i in range(3)],
+    )
+
+    # every bundle records the task; then each is advanced or quarantined
+    patches = [(url, body) for method, url, body in rc.calls if method == "PATCH"]
+    assert [url for url, body in patches[:3]] == ["/Bundles/B-0", "/Bundles/B-1", "/Bundles/B-2"]
+    assert all(body["transfer_reference"] == "globus/TASK-BATCH" for _, body in patches[:3])
+    assert patches[3] == ("/Bundles/B-0", {
+        "status": rep.output_status,
+        "reason": "",
+        "update_timestamp": mock_now,
+        "claimed": False,
+        "transfer_checksum": {"sha512": "sha512-0", "service": "globus"},
+    })
+    assert patches[4][0] == "/Bundles/B-2"
+    assert patches[4][1]["status"] == rep.output_status
+    assert "transfer_checksum" not in patches[4][1]
+    assert patches[5][0] == "/Bundles/B-1"
+    assert patches[5][1]["status"] == "quarantined"
+    assert len(patches) == 6
+
+
+@pytest.mark.asyncio
+async def test_110_do_work_claim_batch_all_failed_raises(
+    base_config: dict[str, str],
+    mock_now: str,
+) -> None:
+    """If Globus transferred none of the batch, every bundle is quarantined and the error is raised."""
+    cfg = dict(base_config)
+    cfg["MAX_COUNT"] = "2"
+    rep = lta.globus_replicator.GlobusReplicator(cfg, logging.getLogger())
+
+    bundles = _batch_of_bundles(2)
+    rc = DummyRestClient(responses=[{"bundle": b} for b in bundles])
+    gt = lta.globus_replicator.GlobusTransfer.return_value  # type: ignore
+    gt.transfer_files.return_value = "TASK-BATCH"
+    exc = GlobusTransferFailedException("task failed")
+    gt.wait_for_transfers_to_finish.return_value = {
+        str(GLOBUS_REPLICATOR_DEST_DIRPATH / "bundle-0.zip"): exc,
+        str(GLOBUS_REPLICATOR_DEST_DIRPATH / "bundle-1.zip"): exc,
+    }
+
+    with pytest.raises(GlobusTransferFailedException) as excinfo:
+        await rep._do_work_claim(rc, MagicMock())  # type: ignore[arg-type]
+    assert excinfo.value == exc
+
+    statuses = [body.get("status") for method, _, body in rc.calls if method == "PATCH"]
+    assert statuses.count("quarantined") == 2
+    assert rep.output_status not in statuses
+
+
+@pytest.mark.asyncio
+async def test_120_do_work_claim_batch_inflight_duplicate_falls_back(
+    base_config: dict[str, str],
+    mock_now: str,
+) -> None:
+    """If Globus rejects the batch as an inflight duplicate, the bundles are transferred one at a time."""
+    cfg = dict(base_config)
+    cfg["MAX_COUNT"] = "2"
+    rep = lta.globus_replicator.GlobusReplicator(cfg, logging.getLogger())
+
+    bundles = _batch_of_bundles(2)
+    rc = DummyRestClient(responses=[{"bundle": b} for b in bundles])
+    response = requests.Response()
+    response.status_code = 409
+    response.headers["Content-Type"] = "application/json"
+    response._content = b'{"code": "ConflictError", "message": "A transfer with identical paths has not yet completed"}'
+    response.request = requests.Request("POST", "https://transfer.api.globus.org/v0.10/transfer").prepare()
+    gt = lta.globus_replicator.GlobusTransfer.return_value  # type: ignore
+    gt.transfer_files.side_effect = globus_sdk.TransferAPIError(response)
+    gt.transfer_file.side_effect = ["TASK-0", "TASK-1"]
+
+    ok = await rep._do_work_claim(rc, MagicMock())  # type: ignore[arg-type]
+    assert ok is True
+
+    assert gt.transfer_file.call_count == 2
+    assert [c.args for c in gt.wait_for_transfer_to_finish.call_args_list] == [("TASK-0",), ("TASK-1",)]
+    statuses = [(url, body.get("status")) for method, url, body in rc.calls if method == "PATCH"]
+    assert ("/Bundles/B-0", rep.output_status) in statuses
+    assert ("/Bundles/B-1", rep.output_status) in statuses
+
+
+@pytest.mark.parametrize("count", [1, 3])
+@pytest.mark.asyncio
+async def test_130_do_work_claim_without_waiting(
+    base_config: dict[str, str],
+    mock_now: str,
+    count: int,
+) -> None:
+    """With WAIT_FOR_TRANSFER=FALSE, bundles are released as soon as the transfer is submitted."""
+    cfg = dict(base_config)
+    cfg["MAX_COUNT"] = "5"
+    cfg["OUTPUT_STATUS"] = "transfer-submitted"
+    cfg["WAIT_FOR_TRANSFER"] = "FALSE"
+    rep = lta.globus_replicator.GlobusReplicator(cfg, logging.getLogger())
+
+    bundles = _batch_of_bundles(count)
+    rc = DummyRestClient(responses=[{"bundle": b} for b in bundles] + [{"bundle": None}])
+    gt = lta.globus_replicator.GlobusTransfer.return_value  # type: ignore
+    gt.transfer_file.return_value = "TASK-ONE"
+    gt.transfer_files.return_value = "TASK-BATCH"
+
+    ok = await rep._do_work_claim(rc, MagicMock())  # type: ignore[arg-type]
+    assert ok is True
+
+    # nobody waited on Globus
+    gt.wait_for_transfer_to_finish.assert_not_called()
+    gt.wait_for_transfers_to_finish.assert_not_called()
+    # every bundle has its transfer_reference, and is left for the tracker
+    task_id = "TASK-ONE" if count == 1 else "TASK-BATCH"
+    patches = [(url, body) for method, url, body in rc.calls if method == "PATCH"]
+    for bundle in bundles:
+        bodies = [body for url, body in patches if url == f"/Bundles/{bundle['uuid']}"]
+        assert bodies[0]["transfer_reference"] == f"globus/{task_id}"
+        assert bodies[1] == {
+            "status": "transfer-submitted",
+            "reason": "",
+            "update_timestamp": mock_now,
+            "claimed": False,
+        }
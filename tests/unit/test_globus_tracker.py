@@ -0,0 +1,244 @@
+# test_globus_tracker.py
+"""Unit tests for lta/globus_tracker.py."""
+
+# fmt:off
+
+import logging
+from pathlib import Path
+from typing import Any
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from pytest_mock import MockerFixture
+
+from lta.globus_tracker import GlobusTracker, main_sync, TRACKER_FIELDS
+from lta.transfer.globus import GlobusTransferFailedException
+
+
+@pytest.fixture(autouse=True)
+def setup(request: pytest.FixtureRequest) -> None:
+    """Stub GlobusTransfer for all tests in this module."""
+    patcher = patch("lta.globus_tracker.GlobusTransfer")
+    mock_globus_transfer = patcher.start()
+    request.addfinalizer(patcher.stop)
+
+    instance = mock_globus_transfer.return_value
+    instance.get_task_statuses = AsyncMock()
+    instance.get_item_results = AsyncMock(return_value={})
+    instance.get_verified_paths = AsyncMock(return_value=set())
+
+
+@pytest.fixture
+def config() -> dict[str, str]:
+    """Supply a stock GlobusTracker component configuration."""
+    return {
+        "CLIENT_ID": "test-client-id",
+        "CLIENT_SECRET": "test-client-secret",
+        "COMPONENT_NAME": "globus-tracker",
+        "DEST_SITE": "NERSC",
+        "INPUT_STATUS": "transfer-submitted",
+        "LOG_LEVEL": "DEBUG",
+        "LTA_AUTH_OPENID_URL": "https://auth.local/oidc/token",
+        "LTA_REST_URL": "https://lta.local/api",
+        "MAX_COUNT": "10",
+        "OUTPUT_STATUS": "transferring",
+        "PROMETHEUS_METRICS_PORT": "9102",
+        "RUN_ONCE_AND_DIE": "FALSE",
+        "RUN_UNTIL_NO_WORK": "FALSE",
+        "SOURCE_SITE": "WIPAC",
+        "WORK_RETRIES": "3",
+        "WORK_SLEEP_DURATION_SECONDS": "60",
+        "WORK_TIMEOUT_SECONDS": "30",
+    }
+
+
+class DummyRestClient:
+    """A stub RestClient that returns queued responses and records requests."""
+
+    def __init__(self, responses: list[dict[str, Any]] | None = None) -> None:
+        self._responses: list[dict[str, Any]] = list(responses or [])
+        self.calls: list[tuple[str, str, dict[str, Any]]] = []
+
+    async def request(
+        self, method: str, url: str, body: dict[str, Any] | None = None
+    ) -> dict[str, Any]:
+        self.calls.append((method, url, body or {}))
+        if self._responses:
+            return self._responses.pop(0)
+        return {"bundle": None}
+
+    def patches(self) -> dict[str, dict[str, Any]]:
+        """Return the body of the PATCH sent for each Bundle."""
+        return {url.removeprefix("/Bundles/"): body for method, url, body in self.calls if method == "PATCH"}
+
+    def bulk_updates(self) -> list[dict[str, Any]]:
+        """Return the body of each POST /Bundles/actions/bulk_update."""
+        return [body for method, url, body in self.calls if (method, url) == ("POST", "/Bundles/actions/bulk_update")]
+
+
+def _bundle(uuid: str, task_id: str | None) -> dict[str, Any]:
+    """Create a Bundle as the GlobusReplicator leaves it."""
+    bundle: dict[str, Any] = {
+        "uuid": uuid,
+        "type": "Bundle",
+        "status": "transfer-submitted",
+        "claimed": False,
+        "transfer_dest_path": f"/path/to/destination/{uuid}.zip",
+    }
+    if task_id:
+        bundle["transfer_reference"] = f"globus/{task_id}"
+    return bundle
+
+
+def test_constructor_config(config: dict[str, str]) -> None:
+    """Test that a GlobusTracker can be constructed with a configuration object and a logging object."""
+    p = GlobusTracker(config, logging.getLogger())
+    assert p.name == "globus-tracker"
+    assert p.max_count == 10
+    assert p.work_retries == 3
+    assert p.work_timeout_seconds == 30
+    assert p._do_status() == {}
+
+
+GET_BUNDLES = f"/Bundles?source=WIPAC&dest=NERSC&status=transfer-submitted&fields={TRACKER_FIELDS}"
+
+
+@pytest.mark.asyncio
+async def test_do_work_claim_no_bundle(config: dict[str, str]) -> None:
+    """Test that _do_work_claim returns False when there are no transfers to check on."""
+    p = GlobusTracker(config, logging.getLogger())
+    rc = DummyRestClient(responses=[{"results": []}])
+    assert not await p._do_work_claim(rc, MagicMock())  # type: ignore[arg-type]
+    assert rc.calls == [("GET", GET_BUNDLES, {})]
+    p.globus_transfer.get_task_statuses.assert_not_called()  # type: ignore[attr-defined]
+
+
+@pytest.mark.asyncio
+async def test_do_work_claim_polls_many_transfers_at_once(config: dict[str, str], mocker: MockerFixture) -> None:
+    """Test that _do_work_claim checks every transfer with one lookup, and only writes to the Bundles that finished."""
+    mocker.patch("lta.globus_tracker.now", return_value="2025-01-01T00:00:00")
+    bundles = [
+        _bundle("B-0", "TASK-A"),
+        _bundle("B-1", "TASK-A"),
+        _bundle("B-2", "TASK-B"),
+        _bundle("B-3", None),
+    ]
+    rc = DummyRestClient(responses=[{"results": bundles}, {}, {"bundles": ["B-0", "B-3"], "count": 2}])
+    p = GlobusTracker(config, logging.getLogger())
+    gt = p.globus_transfer
+    gt.get_task_statuses.return_value = {"TASK-A": "SUCCEEDED", "TASK-B": "ACTIVE"}  # type: ignore[attr-defined]
+    gt.get_item_results.return_value = {  # type: ignore[attr-defined]
+        "/path/to/destination/B-0.zip": None,
+        "/path/to/destination/B-1.zip": GlobusTransferFailedException("skipped"),
+    }
+
+    assert await p._do_work_claim(rc, MagicMock())  # type: ignore[arg-type]
+
+    gt.get_task_statuses.assert_called_once_with(["TASK-A", "TASK-B"])  # type: ignore[attr-defined]
+    gt.get_item_results.assert_called_once_with(  # type: ignore[attr-defined]
+        "TASK-A",
+        [Path("/path/to/destination/B-0.zip"), Path("/path/to/destination/B-1.zip")],
+        None,
+    )
+    # finished, but Globus skipped it
+    assert rc.patches()["B-1"]["status"] == "quarantined"
+    # still in flight; nothing is written to it
+    assert "B-2" not in rc.patches()
+    # the rest are advanced with one request, unless somebody else got to them first
+    assert rc.bulk_updates() == [{
+        "updates": {
+            # finished and transferred
+            "B-0": {
+                "status": "transferring",
+                "reason": "",
+                "update_timestamp": "2025-01-01T00:00:00",
+            },
+            # can't be tracked; assume it finished
+            "B-3": {
+                "status": "transferring",
+                "reason": "",
+                "update_timestamp": "2025-01-01T00:00:00",
+                "work_priority_timestamp": "2025-01-01T00:00:00",
+            },
+        },
+        "if_status": "transfer-submitted",
+    }]
+
+
+@pytest.mark.asyncio
+async def test_do_work_claim_failed_transfer(config: dict[str, str]) -> None:
+    """Test that _do_work_claim hands a failed transfer's error to the per-item accounting."""
+    rc = DummyRestClient(responses=[{"results": [_bundle("B-0", "TASK-A")]}])
+    p = GlobusTracker(config, logging.getLogger())
+    gt = p.globus_transfer
+    gt.get_task_statuses.return_value = {"TASK-A": "FAILED"}  # type: ignore[attr-defined]
+    gt.get_item_results.side_effect = lambda task_id, dest_paths, task_error: {str(d): task_error for d in dest_paths}  # type: ignore[attr-defined]
+
+    assert await p._do_work_claim(rc, MagicMock())  # type: ignore[arg-type]
+
+    task_error = gt.get_item_results.call_args.args[2]  # type: ignore[attr-defined]
+    assert isinstance(task_error, GlobusTransferFailedException)
+    assert "FAILED" in str(task_error)
+    assert rc.patches()["B-0"]["status"] == "quarantined"
+    assert rc.bulk_updates() == []
+
+
+@pytest.mark.asyncio
+async def test_do_work_claim_all_in_flight(config: dict[str, str]) -> None:
+    """Test that _do_work_claim returns False (so the tracker sleeps) if no transfer has finished."""
+    rc = DummyRestClient(responses=[{"results": [_bundle("B-0", "TASK-A"), _bundle("B-1", "TASK-B")]}])
+    p = GlobusTracker(config, logging.getLogger())
+    p.globus_transfer.get_task_statuses.return_value = {"TASK-A": "ACTIVE"}  # type: ignore[attr-defined]
+
+    assert not await p._do_work_claim(rc, MagicMock())  # type: ignore[arg-type]
+
+    # the only request to the LTA DB was the one that found the Bundles
+    assert rc.calls == [("GET", GET_BUNDLES, {})]
+    p.globus_transfer.get_item_results.assert_not_called()  # type: ignore[attr-defined]
+
+
+@pytest.mark.asyncio
+async def test_do_work_claim_least_recently_polled_first(config: dict[str, str]) -> None:
+    """Test that _do_work_claim skips claimed Bundles, and checks on the transfers it polled least recently first."""
+    config["MAX_COUNT"] = "2"
+    claimed = _bundle("B-9", "TASK-Z")
+    claimed["claimed"] = True
+    bundles = [_bundle("B-0", "TASK-A"), _bundle("B-1", "TASK-B"), _bundle("B-2", "TASK-C"), claimed]
+    rc = DummyRestClient(responses=[{"results": bundles}, {"results": bundles}])
+    p = GlobusTracker(config, logging.getLogger())
+    gt = p.globus_transfer
+    gt.get_task_statuses.return_value = {}  # type: ignore[attr-defined]
+
+    assert not await p._do_work_claim(rc, MagicMock())  # type: ignore[arg-type]
+    gt.get_task_statuses.assert_called_with(["TASK-A", "TASK-B"])  # type: ignore[attr-defined]
+
+    assert not await p._do_work_claim(rc, MagicMock())  # type: ignore[arg-type]
+    gt.get_task_statuses.assert_called_with(["TASK-C", "TASK-A"])  # type: ignore[attr-defined]
+
+
+@pytest.mark.asyncio
+async def test_do_work_claim_somebody_else_advanced(config: dict[str, str]) -> None:
+    """Test that _do_work_claim carries on when another tracker already advanced the Bundle."""
+    rc = DummyRestClient(responses=[{"results": [_bundle("B-0", "TASK-A")]}, {"bundles": [], "count": 0}])
+    p = GlobusTracker(config, logging.getLogger())
+    p.globus_transfer.get_task_statuses.return_value = {"TASK-A": "SUCCEEDED"}  # type: ignore[attr-defined]
+
+    assert await p._do_work_claim(rc, MagicMock())  # type: ignore[arg-type]
+
+    assert list(rc.bulk_updates()[0]["updates"]) == ["B-0"]
+    assert rc.patches() == {}
+
+
+def test_script_main_sync(config: dict[str, str], mocker: MockerFixture, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that running the GlobusTracker as a script does the setup work and launches the service."""
+    for key in config.keys():
+        monkeypatch.setenv(key, config[key])
+    mock_run = mocker.patch("asyncio.run")
+    mock_main = mocker.patch("lta.globus_tracker.main")
+    mock_shs = mocker.patch("lta.globus_tracker.start_http_server")
+    main_sync()
+    mock_shs.assert_called()
+    mock_main.assert_called()
+    mock_run.assert_called()
+    # asyncio.run was mocked, so nobody ran the coroutine it was given
+    mock_run.call_args.args[0].close()
@@ -1,10 +1,12 @@
 """Tests for lta.transfer.globus.GlobusTransfer"""
 
 # fmt:off
+import asyncio
 import dataclasses
 import datetime
+import time
 from pathlib import Path
-from typing import cast
+from typing import Any, cast
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
@@ -15,6 +17,8 @@ from lta.transfer.globus import (
     GlobusTransfer,
     GlobusTransferEnv,
     GlobusTransferFailedException,
+    PROMETHEUS_GLOBUS_API_DURATION,
+    TASK_LIST_FILTER_MAX,
 )
 
 
@@ -33,6 +37,28 @@ class _FakeResponse:
         return self._data
 
 
+def _task_list(*statuses: str) -> MagicMock:
+    """This mimics TransferClient.paginated.task_list, reporting each of the statuses in turn."""
+    remaining = list(statuses)
+
+    def _pages(filter: dict) -> MagicMock:
+        status = remaining.pop(0) if len(remaining) > 1 else remaining[0]
+        pages = MagicMock()
+        pages.items.return_value = [{"task_id": task_id, "status": status} for task_id in filter["task_id"]]
+        return pages
+
+    return MagicMock(side_effect=_pages)
+
+
+def _api_calls(method: str, outcome: str) -> float:
+    """Return the number of calls to the Globus Transfer API that have been observed."""
+    for metric in PROMETHEUS_GLOBUS_API_DURATION.collect():
+        for sample in metric.samples:
+            if sample.name.endswith("_count") and sample.labels == {"method": method, "outcome": outcome}:
+                return sample.value
+    return 0.0
+
+
 # ---------------------------------------------------------------------------
 # GlobusTransferEnv
 # ---------------------------------------------------------------------------
@@ -53,6 +79,9 @@ def test_000_globus_transfer_env_defaults() -> None:
         env.GLOBUS_TRANSFER_SCOPE == "urn:globus:auth:scope:transfer.api.globus.org:all"
     )
     assert env.GLOBUS_POLL_INTERVAL_SECONDS == 60
+    assert env.GLOBUS_POLL_INTERVAL_MIN_SECONDS == 5
+    assert env.GLOBUS_UNKNOWN_STATUS_MAX_POLLS == 10
+    assert env.GLOBUS_API_THREADS == 4
     assert env.GLOBUS_HARD_DEADLINE_SECONDS is None
 
     # act + assert: immutability
@@ -184,7 +213,7 @@ async def test_300_submit_transfer_uses_client_and_returns_task_id(
     mock_transfer_client,
     mock_sleep,
 ) -> None:
-    """_submit_transfer calls submit_transfer and returns the task_id."""
+    """_submit_transfer calls submit_transfer (from a thread) and returns the task_id."""
     # arrange: environment + SDK patches
     mock_from_env.return_value = GlobusTransferEnv(
         GLOBUS_CLIENT_ID="cid",
@@ -207,9 +236,9 @@ async def test_300_submit_transfer_uses_client_and_returns_task_id(
     gt = GlobusTransfer()
     tid = await gt._submit_transfer(tdata)
 
-    # assert: client call + cooperative yield
+    # assert: client call, without a cooperative yield (the call didn't block the loop)
     client.submit_transfer.assert_called_once_with(tdata)
-    mock_sleep.assert_awaited_once_with(0)
+    mock_sleep.assert_not_awaited()
     assert tid == "TASK-123"
 
 
@@ -273,9 +302,7 @@ async def test_410_transfer_file_success_on_first_poll(
     client.submit_transfer.return_value = GlobusHTTPResponse(
         cast(Response, _FakeResponse({"task_id": "TASK-123"})), client=MagicMock()
     )
-    client.get_task.return_value = GlobusHTTPResponse(
-        cast(Response, _FakeResponse({"status": "SUCCEEDED"})), client=MagicMock()
-    )
+    client.paginated.task_list = _task_list("SUCCEEDED")
     mock_transfer_client.return_value = client
 
     # act
@@ -288,7 +315,7 @@ async def test_410_transfer_file_success_on_first_poll(
 
     # assert: submit + single poll
     client.submit_transfer.assert_called_once()
-    client.get_task.assert_called_once_with("TASK-123")
+    client.paginated.task_list.assert_called_once_with(filter={"task_id": ["TASK-123"]})
     assert task_id == "TASK-123"
 
 
@@ -320,14 +347,7 @@ async def test_420_transfer_file_active_then_succeeds(
     client.submit_transfer.return_value = GlobusHTTPResponse(
         cast(Response, _FakeResponse({"task_id": "TASK-123"})), client=MagicMock()
     )
-    client.get_task.side_effect = [
-        GlobusHTTPResponse(
-            cast(Response, _FakeResponse({"status": "ACTIVE"})), client=MagicMock()
-        ),
-        GlobusHTTPResponse(
-            cast(Response, _FakeResponse({"status": "SUCCEEDED"})), client=MagicMock()
-        ),
-    ]
+    client.paginated.task_list = _task_list("ACTIVE", "SUCCEEDED")
     mock_transfer_client.return_value = client
 
     # act
@@ -338,13 +358,10 @@ async def test_420_transfer_file_active_then_succeeds(
     )
     await gt.wait_for_transfer_to_finish(task_id)
 
-    # assert: two polls + expected sleeps (0 from _submit_transfer, then poll_interval)
-    assert client.get_task.call_count == 2
-    assert mock_sleep.await_count == 2
-    first_call_args = mock_sleep.await_args_list[0].args
-    second_call_args = mock_sleep.await_args_list[1].args
-    assert first_call_args == (0,)
-    assert second_call_args == (poll_interval,)
+    # assert: two polls + one sleep, no longer than poll_interval
+    assert client.paginated.task_list.call_count == 2
+    mock_sleep.assert_awaited_once()
+    assert 0 < mock_sleep.await_args.args[0] <= poll_interval
     assert task_id == "TASK-123"
 
 
@@ -372,9 +389,7 @@ async def test_440_transfer_file_failed_raises(
     client.submit_transfer.return_value = GlobusHTTPResponse(
         cast(Response, _FakeResponse({"task_id": "TASK-123"})), client=MagicMock()
     )
-    client.get_task.return_value = GlobusHTTPResponse(
-        cast(Response, _FakeResponse({"status": "FAILED"})), client=MagicMock()
-    )
+    client.paginated.task_list = _task_list("FAILED")
     mock_transfer_client.return_value = client
 
     # act
@@ -391,7 +406,7 @@ async def test_440_transfer_file_failed_raises(
     assert "FAILED" in text
     assert "TASK-123" in text
     client.submit_transfer.assert_called_once()
-    client.get_task.assert_called_once_with("TASK-123")
+    client.paginated.task_list.assert_called_once_with(filter={"task_id": ["TASK-123"]})
 
 
 @patch("lta.transfer.globus.globus_sdk.TransferClient")
@@ -418,9 +433,7 @@ async def test_450_transfer_file_inactive_raises(
     client.submit_transfer.return_value = GlobusHTTPResponse(
         cast(Response, _FakeResponse({"task_id": "TASK-123"})), client=MagicMock()
     )
-    client.get_task.return_value = GlobusHTTPResponse(
-        cast(Response, _FakeResponse({"status": "INACTIVE"})), client=MagicMock()
-    )
+    client.paginated.task_list = _task_list("INACTIVE")
     mock_transfer_client.return_value = client
 
     # act
@@ -437,7 +450,7 @@ async def test_450_transfer_file_inactive_raises(
     assert "INACTIVE" in text
     assert "TASK-123" in text
     client.submit_transfer.assert_called_once()
-    client.get_task.assert_called_once_with("TASK-123")
+    client.paginated.task_list.assert_called_once_with(filter={"task_id": ["TASK-123"]})
 
 
 @patch("lta.transfer.globus.asyncio.sleep", new_callable=AsyncMock)
@@ -468,14 +481,7 @@ async def test_460_transfer_file_unknown_status_then_succeeds(
     client.submit_transfer.return_value = GlobusHTTPResponse(
         cast(Response, _FakeResponse({"task_id": "TASK-123"})), client=MagicMock()
     )
-    client.get_task.side_effect = [
-        GlobusHTTPResponse(
-            cast(Response, _FakeResponse({"status": "FOO"})), client=MagicMock()
-        ),
-        GlobusHTTPResponse(
-            cast(Response, _FakeResponse({"status": "SUCCEEDED"})), client=MagicMock()
-        ),
-    ]
+    client.paginated.task_list = _task_list("FOO", "SUCCEEDED")
     mock_transfer_client.return_value = client
 
     # act
@@ -488,10 +494,493 @@ async def test_460_transfer_file_unknown_status_then_succeeds(
 
     # assert: unknown status tolerant
     assert task_id == "TASK-123"
-    assert client.get_task.call_count == 2
-    # _submit_transfer: sleep(0), then polling sleep(poll_interval)
+    assert client.paginated.task_list.call_count == 2
+    # polling sleep, no longer than poll_interval
+    mock_sleep.assert_awaited_once()
+    assert 0 < mock_sleep.await_args.args[0] <= poll_interval
+
+
+@patch("lta.transfer.globus.asyncio.sleep", new_callable=AsyncMock)
+@patch("lta.transfer.globus.globus_sdk.TransferClient")
+@patch("lta.transfer.globus.globus_sdk.ClientCredentialsAuthorizer")
+@patch("lta.transfer.globus.globus_sdk.ConfidentialAppAuthClient")
+@patch("lta.transfer.globus.from_environment_as_dataclass")
+@pytest.mark.asyncio
+async def test_470_transfer_file_unknown_status_gives_up(
+    mock_from_env,
+    mock_confidential,
+    mock_cc_authorizer,
+    mock_transfer_client,
+    mock_sleep,
+) -> None:
+    """A transfer that Globus never reports on fails after GLOBUS_UNKNOWN_STATUS_MAX_POLLS polls."""
+    # arrange: environment + SDK patches
+    mock_from_env.return_value = GlobusTransferEnv(
+        GLOBUS_CLIENT_ID="cid",
+        GLOBUS_CLIENT_SECRET="secret",
+        GLOBUS_SOURCE_COLLECTION_ID="src-id",
+        GLOBUS_DEST_COLLECTION_ID="dst-id",
+        GLOBUS_UNKNOWN_STATUS_MAX_POLLS=3,
+    )
+
+    client = MagicMock()
+    client.paginated.task_list.return_value.items.return_value = []
+    mock_transfer_client.return_value = client
+
+    # act
+    with pytest.raises(GlobusTransferFailedException) as excinfo:
+        await GlobusTransfer().wait_for_transfer_to_finish("TASK-123")
+
+    # assert: gave up after the third poll
+    assert "status=None" in str(excinfo.value)
+    assert "TASK-123" in str(excinfo.value)
+    assert client.paginated.task_list.call_count == 3
     assert mock_sleep.await_count == 2
-    first_call_args = mock_sleep.await_args_list[0].args
-    second_call_args = mock_sleep.await_args_list[1].args
-    assert first_call_args == (0,)
-    assert second_call_args == (poll_interval,)
+
+
+# ---------------------------------------------------------------------------
+# transfer_files / wait_for_transfers_to_finish – multi-file public API
+# ---------------------------------------------------------------------------
+
+
+@patch("lta.transfer.globus.globus_sdk.TransferClient")
+@patch("lta.transfer.globus.globus_sdk.ClientCredentialsAuthorizer")
+@patch("lta.transfer.globus.globus_sdk.ConfidentialAppAuthClient")
+@patch("lta.transfer.globus.from_environment_as_dataclass")
+@pytest.mark.asyncio
+async def test_500_transfer_files_submits_one_task(
+    mock_from_env,
+    mock_confidential,
+    mock_cc_authorizer,
+    mock_transfer_client,
+) -> None:
+    """transfer_files submits every file as an item of a single task, skipping source errors."""
+    # arrange: environment + SDK patches
+    mock_from_env.return_value = GlobusTransferEnv(
+        GLOBUS_CLIENT_ID="cid",
+        GLOBUS_CLIENT_SECRET="secret",
+        GLOBUS_SOURCE_COLLECTION_ID="src-id",
+        GLOBUS_DEST_COLLECTION_ID="dst-id",
+    )
+
+    client = MagicMock()
+    client.submit_transfer.return_value = GlobusHTTPResponse(
+        cast(Response, _FakeResponse({"task_id": "TASK-123"})), client=MagicMock()
+    )
+    mock_transfer_client.return_value = client
+
+    # arrange: inputs
+    items = [(Path(f"/abs/file-{i}.dat"), Path(f"/dest/file-{i}.dat")) for i in range(3)]
+
+    # act
+    task_id = await GlobusTransfer().transfer_files(items=items)
+
+    # assert: one submission with all of the items
+    assert task_id == "TASK-123"
+    client.submit_transfer.assert_called_once()
+    tdata = client.submit_transfer.call_args.args[0]
+    assert tdata["skip_source_errors"] is True
+    assert tdata["label"] == "LTA bundles: 3 files"
+    assert [(item["source_path"], item["destination_path"]) for item in tdata["DATA"]] == [
+        (str(source), str(dest)) for source, dest in items
+    ]
+
+
+@patch("lta.transfer.globus.globus_sdk.TransferClient")
+@patch("lta.transfer.globus.globus_sdk.ClientCredentialsAuthorizer")
+@patch("lta.transfer.globus.globus_sdk.ConfidentialAppAuthClient")
+@patch("lta.transfer.globus.from_environment_as_dataclass")
+@pytest.mark.asyncio
+async def test_510_transfer_files_rejects_relative_source_path(
+    mock_from_env,
+    mock_confidential,
+    mock_cc_authorizer,
+    mock_transfer_client,
+) -> None:
+    """transfer_files enforces absolute source paths before submitting anything."""
+    # arrange: environment + SDK patches
+    mock_from_env.return_value = GlobusTransferEnv(
+        GLOBUS_CLIENT_ID="cid",
+        GLOBUS_CLIENT_SECRET="secret",
+        GLOBUS_SOURCE_COLLECTION_ID="src-id",
+        GLOBUS_DEST_COLLECTION_ID="dst-id",
+    )
+    client = MagicMock()
+    mock_transfer_client.return_value = client
+
+    # act + assert: relative path rejected
+    with pytest.raises(ValueError) as excinfo:
+        await GlobusTransfer().transfer_files(items=[
+            (Path("/abs/file.dat"), Path("/dest/file.dat")),
+            (Path("relative/path.dat"), Path("/dest/path.dat")),
+        ])
+    assert "must be absolute" in str(excinfo.value)
+    client.submit_transfer.assert_not_called()
+
+
+@patch("lta.transfer.globus.globus_sdk.TransferClient")
+@patch("lta.transfer.globus.globus_sdk.ClientCredentialsAuthorizer")
+@patch("lta.transfer.globus.globus_sdk.ConfidentialAppAuthClient")
+@patch("lta.transfer.globus.from_environment_as_dataclass")
+@pytest.mark.asyncio
+async def test_520_wait_for_transfers_to_finish_reports_skipped_items(
+    mock_from_env,
+    mock_confidential,
+    mock_cc_authorizer,
+    mock_transfer_client,
+) -> None:
+    """On SUCCEEDED, only the items in task_skipped_errors have failed."""
+    # arrange: environment + SDK patches
+    mock_from_env.return_value = GlobusTransferEnv(
+        GLOBUS_CLIENT_ID="cid",
+        GLOBUS_CLIENT_SECRET="secret",
+        GLOBUS_SOURCE_COLLECTION_ID="src-id",
+        GLOBUS_DEST_COLLECTION_ID="dst-id",
+    )
+
+    client = MagicMock()
+    client.paginated.task_list = _task_list("SUCCEEDED")
+    client.paginated.task_skipped_errors.return_value.items.return_value = [
+        {
+            "source_path": "/abs/file-1.dat",
+            "destination_path": "/dest/file-1.dat",
+            "error_code": "FILE_NOT_FOUND",
+            "error_details": "No such file or directory",
+        },
+    ]
+    mock_transfer_client.return_value = client
+
+    # act
+    results = await GlobusTransfer().wait_for_transfers_to_finish(
+        "TASK-123",
+        [Path(f"/dest/file-{i}.dat") for i in range(3)],
+    )
+
+    # assert: per-item outcomes
+    assert results["/dest/file-0.dat"] is None
+    assert results["/dest/file-2.dat"] is None
+    error = results["/dest/file-1.dat"]
+    assert isinstance(error, GlobusTransferFailedException)
+    assert "FILE_NOT_FOUND" in str(error)
+    client.paginated.task_skipped_errors.assert_called_once_with("TASK-123")
+    client.paginated.task_successful_transfers.assert_not_called()
+
+
+@patch("lta.transfer.globus.globus_sdk.TransferClient")
+@patch("lta.transfer.globus.globus_sdk.ClientCredentialsAuthorizer")
+@patch("lta.transfer.globus.globus_sdk.ConfidentialAppAuthClient")
+@patch("lta.transfer.globus.from_environment_as_dataclass")
+@pytest.mark.asyncio
+async def test_525_verify_checksum(
+    mock_from_env,
+    mock_confidential,
+    mock_cc_authorizer,
+    mock_transfer_client,
+) -> None:
+    """With GLOBUS_VERIFY_CHECKSUM, Globus checks each file against its SHA512 checksum."""
+    # arrange: environment + SDK patches
+    mock_from_env.return_value = GlobusTransferEnv(
+        GLOBUS_CLIENT_ID="cid",
+        GLOBUS_CLIENT_SECRET="secret",
+        GLOBUS_SOURCE_COLLECTION_ID="src-id",
+        GLOBUS_DEST_COLLECTION_ID="dst-id",
+        GLOBUS_VERIFY_CHECKSUM=True,
+    )
+
+    client = MagicMock()
+    client.submit_transfer.return_value = GlobusHTTPResponse(
+        cast(Response, _FakeResponse({"task_id": "TASK-123"})), client=MagicMock()
+    )
+    client.paginated.task_successful_transfers.return_value.items.return_value = [
+        {"source_path": "/abs/file-0.dat", "destination_path": "/dest/file-0.dat"},
+        {"source_path": "/abs/other.dat", "destination_path": "/dest/other.dat"},
+    ]
+    mock_transfer_client.return_value = client
+    items = [(Path(f"/abs/file-{i}.dat"), Path(f"/dest/file-{i}.dat")) for i in range(2)]
+
+    # act
+    gt = GlobusTransfer()
+    await gt.transfer_files(items=items, checksums={Path("/abs/file-0.dat"): "abc123"})
+    verified = await gt.get_verified_paths("TASK-123", [dest for _, dest in items])
+
+    # assert: only the file with a known checksum is checked against it
+    tdata = client.submit_transfer.call_args.args[0]
+    assert tdata["verify_checksum"] is True
+    assert tdata["DATA"][0]["external_checksum"] == "abc123"
+    assert tdata["DATA"][0]["checksum_algorithm"] == "SHA512"
+    assert "external_checksum" not in tdata["DATA"][1]
+    # assert: only the files of this transfer that Globus transferred were verified
+    assert verified == {"/dest/file-0.dat"}
+    client.paginated.task_successful_transfers.assert_called_once_with("TASK-123")
+
+    # act + assert: without GLOBUS_VERIFY_CHECKSUM, nothing is verified
+    mock_from_env.return_value = dataclasses.replace(mock_from_env.return_value, GLOBUS_VERIFY_CHECKSUM=False)
+    gt = GlobusTransfer()
+    tdata = gt.make_transfer_document(Path("/abs/file-0.dat"), Path("/dest/file-0.dat"), "abc123")
+    assert tdata["verify_checksum"] is False
+    assert "external_checksum" not in tdata["DATA"][0]
+    assert await gt.get_verified_paths("TASK-123", [Path("/dest/file-0.dat")]) == set()
+
+
+@patch("lta.transfer.globus.globus_sdk.TransferClient")
+@patch("lta.transfer.globus.globus_sdk.ClientCredentialsAuthorizer")
+@patch("lta.transfer.globus.globus_sdk.ConfidentialAppAuthClient")
+@patch("lta.transfer.globus.from_environment_as_dataclass")
+@pytest.mark.asyncio
+async def test_530_wait_for_transfers_to_finish_task_failed(
+    mock_from_env,
+    mock_confidential,
+    mock_cc_authorizer,
+    mock_transfer_client,
+) -> None:
+    """On FAILED, the items in task_successful_transfers are still good; the rest have failed."""
+    # arrange: environment + SDK patches
+    mock_from_env.return_value = GlobusTransferEnv(
+        GLOBUS_CLIENT_ID="cid",
+        GLOBUS_CLIENT_SECRET="secret",
+        GLOBUS_SOURCE_COLLECTION_ID="src-id",
+        GLOBUS_DEST_COLLECTION_ID="dst-id",
+    )
+
+    client = MagicMock()
+    client.paginated.task_list = _task_list("FAILED")
+    client.paginated.task_successful_transfers.return_value.items.return_value = [
+        {"source_path": "/abs/file-0.dat", "destination_path": "/dest/file-0.dat"},
+    ]
+    client.paginated.task_skipped_errors.return_value.items.return_value = []
+    mock_transfer_client.return_value = client
+
+    # act
+    results = await GlobusTransfer().wait_for_transfers_to_finish(
+        "TASK-123",
+        [Path("/dest/file-0.dat"), Path("/dest/file-1.dat")],
+    )
+
+    # assert: per-item outcomes
+    assert results["/dest/file-0.dat"] is None
+    error = results["/dest/file-1.dat"]
+    assert isinstance(error, GlobusTransferFailedException)
+    assert "FAILED" in str(error)
+    client.paginated.task_successful_transfers.assert_called_once_with("TASK-123")
+
+
+@patch("lta.transfer.globus.globus_sdk.TransferClient")
+@patch("lta.transfer.globus.globus_sdk.ClientCredentialsAuthorizer")
+@patch("lta.transfer.globus.globus_sdk.ConfidentialAppAuthClient")
+@patch("lta.transfer.globus.from_environment_as_dataclass")
+@pytest.mark.asyncio
+async def test_600_get_task_statuses_uses_task_list(
+    mock_from_env,
+    mock_confidential,
+    mock_cc_authorizer,
+    mock_transfer_client,
+) -> None:
+    """get_task_statuses looks up many tasks with filtered task_list requests, not one get_task each."""
+    # arrange: environment + SDK patches
+    mock_from_env.return_value = GlobusTransferEnv(
+        GLOBUS_CLIENT_ID="cid",
+        GLOBUS_CLIENT_SECRET="secret",
+        GLOBUS_SOURCE_COLLECTION_ID="src-id",
+        GLOBUS_DEST_COLLECTION_ID="dst-id",
+    )
+
+    def _task_list(filter: dict) -> MagicMock:
+        pages = MagicMock()
+        pages.items.return_value = [
+            {"task_id": task_id, "status": "SUCCEEDED" if task_id.endswith("0") else "ACTIVE"}
+            for task_id in filter["task_id"]
+        ]
+        return pages
+
+    client = MagicMock()
+    client.paginated.task_list.side_effect = _task_list
+    mock_transfer_client.return_value = client
+
+    # arrange: inputs -- more tasks than fit in one filter
+    task_ids = [f"TASK-{i}" for i in range(TASK_LIST_FILTER_MAX + 10)]
+
+    # act
+    statuses = await GlobusTransfer().get_task_statuses(task_ids)  # type: ignore[arg-type]
+
+    # assert: two lookups, every task accounted for
+    assert client.paginated.task_list.call_count == 2
+    client.get_task.assert_not_called()
+    assert len(statuses) == len(task_ids)
+    assert statuses["TASK-0"] == "SUCCEEDED"
+    assert statuses["TASK-1"] == "ACTIVE"
+
+
+# ---------------------------------------------------------------------------
+# non-blocking calls + shared polling
+# ---------------------------------------------------------------------------
+
+
+@patch("lta.transfer.globus.asyncio.sleep", new_callable=AsyncMock)
+@patch("lta.transfer.globus.globus_sdk.TransferClient")
+@patch("lta.transfer.globus.globus_sdk.ClientCredentialsAuthorizer")
+@patch("lta.transfer.globus.globus_sdk.ConfidentialAppAuthClient")
+@patch("lta.transfer.globus.from_environment_as_dataclass")
+@pytest.mark.asyncio
+async def test_700_concurrent_waits_share_polling(
+    mock_from_env,
+    mock_confidential,
+    mock_cc_authorizer,
+    mock_transfer_client,
+    mock_sleep,
+) -> None:
+    """Concurrent waits on different transfers are polled together with one task_list request."""
+    # arrange: environment + SDK patches
+    mock_from_env.return_value = GlobusTransferEnv(
+        GLOBUS_CLIENT_ID="cid",
+        GLOBUS_CLIENT_SECRET="secret",
+        GLOBUS_SOURCE_COLLECTION_ID="src-id",
+        GLOBUS_DEST_COLLECTION_ID="dst-id",
+    )
+
+    client = MagicMock()
+    client.paginated.task_list = _task_list("ACTIVE", "ACTIVE", "SUCCEEDED")
+    mock_transfer_client.return_value = client
+
+    # act
+    gt = GlobusTransfer()
+    tasks = await asyncio.gather(*[
+        gt.wait_for_transfer_to_finish(f"TASK-{i}") for i in range(3)
+    ])
+
+    # assert: every poll looked at every transfer
+    assert [task["task_id"] for task in tasks] == ["TASK-0", "TASK-1", "TASK-2"]
+    assert client.paginated.task_list.call_count == 3
+    for c in client.paginated.task_list.call_args_list:
+        assert sorted(c.kwargs["filter"]["task_id"]) == ["TASK-0", "TASK-1", "TASK-2"]
+    assert not gt._waits
+
+
+@patch("lta.transfer.globus.asyncio.sleep", new_callable=AsyncMock)
+@patch("lta.transfer.globus.globus_sdk.TransferClient")
+@patch("lta.transfer.globus.globus_sdk.ClientCredentialsAuthorizer")
+@patch("lta.transfer.globus.globus_sdk.ConfidentialAppAuthClient")
+@patch("lta.transfer.globus.from_environment_as_dataclass")
+@pytest.mark.asyncio
+async def test_710_polling_backs_off(
+    mock_from_env,
+    mock_confidential,
+    mock_cc_authorizer,
+    mock_transfer_client,
+    mock_sleep,
+) -> None:
+    """A long transfer is polled less and less often, up to GLOBUS_POLL_INTERVAL_SECONDS."""
+    # arrange: environment + SDK patches
+    mock_from_env.return_value = GlobusTransferEnv(
+        GLOBUS_CLIENT_ID="cid",
+        GLOBUS_CLIENT_SECRET="secret",
+        GLOBUS_SOURCE_COLLECTION_ID="src-id",
+        GLOBUS_DEST_COLLECTION_ID="dst-id",
+        GLOBUS_POLL_INTERVAL_MIN_SECONDS=2,
+        GLOBUS_POLL_INTERVAL_SECONDS=4,
+    )
+
+    client = MagicMock()
+    client.paginated.task_list = _task_list("ACTIVE", "ACTIVE", "ACTIVE", "ACTIVE", "SUCCEEDED")
+    mock_transfer_client.return_value = client
+
+    # act
+    await GlobusTransfer().wait_for_transfer_to_finish("TASK-123")
+
+    # assert: sleeps of about 2, 3, 4, 4 seconds
+    delays = [c.args[0] for c in mock_sleep.await_args_list]
+    expected = [2, 3, 4, 4]
+    assert len(delays) == len(expected)
+    for delay, most in zip(delays, expected):
+        assert most - 0.5 < delay <= most
+
+
+@patch("lta.transfer.globus.globus_sdk.TransferClient")
+@patch("lta.transfer.globus.globus_sdk.ClientCredentialsAuthorizer")
+@patch("lta.transfer.globus.globus_sdk.ConfidentialAppAuthClient")
+@patch("lta.transfer.globus.from_environment_as_dataclass")
+@pytest.mark.asyncio
+async def test_720_slow_api_does_not_block_the_loop(
+    mock_from_env,
+    mock_confidential,
+    mock_cc_authorizer,
+    mock_transfer_client,
+) -> None:
+    """A slow Globus API call runs in a thread (so the event loop keeps running), and is measured."""
+    # arrange: environment + SDK patches
+    mock_from_env.return_value = GlobusTransferEnv(
+        GLOBUS_CLIENT_ID="cid",
+        GLOBUS_CLIENT_SECRET="secret",
+        GLOBUS_SOURCE_COLLECTION_ID="src-id",
+        GLOBUS_DEST_COLLECTION_ID="dst-id",
+    )
+
+    def _slow_submit(tdata: Any) -> dict:
+        time.sleep(0.3)
+        return {"task_id": "TASK-123"}
+
+    client = MagicMock()
+    client.submit_transfer.side_effect = _slow_submit
+    mock_transfer_client.return_value = client
+    ok_before = _api_calls("submit_transfer", "ok")
+
+    # act: count ticks of the event loop while the transfer is submitted
+    ticks = 0
+
+    async def _tick() -> None:
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticker = asyncio.create_task(_tick())
+    try:
+        task_id = await GlobusTransfer().transfer_file(
+            source_path=Path("/abs/file.dat"),
+            dest_path=Path("/dest/path.dat"),
+        )
+    finally:
+        ticker.cancel()
+
+    # assert: the loop kept running, and the call was measured
+    assert task_id == "TASK-123"
+    assert ticks > 5
+    assert _api_calls("submit_transfer", "ok") == ok_before + 1
+
+
+@patch("lta.transfer.globus.globus_sdk.TransferClient")
+@patch("lta.transfer.globus.globus_sdk.ClientCredentialsAuthorizer")
+@patch("lta.transfer.globus.globus_sdk.ConfidentialAppAuthClient")
+@patch("lta.transfer.globus.from_environment_as_dataclass")
+@pytest.mark.asyncio
+async def test_730_api_error_reaches_every_waiter(
+    mock_from_env,
+    mock_confidential,
+    mock_cc_authorizer,
+    mock_transfer_client,
+) -> None:
+    """If polling Globus fails, the error is raised to the waiters instead of leaving them hanging."""
+    # arrange: environment + SDK patches
+    mock_from_env.return_value = GlobusTransferEnv(
+        GLOBUS_CLIENT_ID="cid",
+        GLOBUS_CLIENT_SECRET="secret",
+        GLOBUS_SOURCE_COLLECTION_ID="src-id",
+        GLOBUS_DEST_COLLECTION_ID="dst-id",
+    )
+
+    client = MagicMock()
+    client.paginated.task_list.side_effect = RuntimeError("Globus is down")
+    mock_transfer_client.return_value = client
+    error_before = _api_calls("task_list", "error")
+
+    # act
+    gt = GlobusTransfer()
+    results = await asyncio.gather(
+        gt.wait_for_transfer_to_finish("TASK-0"),
+        gt.wait_for_transfer_to_finish("TASK-1"),
+        return_exceptions=True,
+    )
+
+    # assert: both waiters got the error, which was measured once
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert _api_calls("task_list", "error") == error_before + 1
+    assert not gt._waits
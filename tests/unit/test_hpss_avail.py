@@ -0,0 +1,91 @@
+# test_hpss_avail.py
+"""Unit tests for lta/hpss_avail.py."""
+
+# fmt:off
+
+import asyncio
+import logging
+from typing import List
+
+import pytest
+from pytest_mock import MockerFixture
+
+from lta.hpss_avail import BACKOFF_JITTER, BACKOFF_MAX_SECONDS, BACKOFF_MIN_SECONDS, \
+    get_hpss_avail_monitor, HpssAvailMonitor, PROMETHEUS_HPSS_AVAILABLE
+from lta.utils import CommandTimeoutException
+from .utils import ObjectLiteral
+
+
+def gauge() -> float:
+    """Return the current value of the hpss_available gauge."""
+    return [s.value for m in PROMETHEUS_HPSS_AVAILABLE.collect() for s in m.samples][0]
+
+
+@pytest.mark.asyncio
+async def test_is_available_caches_probe(mocker: MockerFixture) -> None:
+    """Test that is_available only probes HPSS when it has no recent answer."""
+    run_mock = mocker.patch("lta.hpss_avail.run_command")
+    run_mock.return_value = ObjectLiteral(returncode=0)
+    monitor = HpssAvailMonitor("/usr/bin/hpss_avail.py", 60, logging.getLogger())
+    try:
+        for i in range(10):
+            assert await monitor.is_available()
+        run_mock.assert_called_once_with(["/usr/bin/hpss_avail.py", "archive"], mocker.ANY, timeout=mocker.ANY)
+        assert gauge() == 1
+    finally:
+        monitor.stop()
+
+
+@pytest.mark.asyncio
+async def test_is_available_probes_in_background(mocker: MockerFixture) -> None:
+    """Test that the monitor notices HPSS going down without being asked."""
+    run_mock = mocker.patch("lta.hpss_avail.run_command")
+    run_mock.side_effect = [ObjectLiteral(returncode=0)] + [ObjectLiteral(returncode=1)] * 100
+    monitor = HpssAvailMonitor("/usr/bin/hpss_avail.py", 0.01, logging.getLogger())
+    try:
+        assert await monitor.is_available()
+        await asyncio.sleep(0.1)
+        assert not await monitor.is_available()
+        assert gauge() == 0
+    finally:
+        monitor.stop()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("error", [
+    FileNotFoundError(2, "No such file or directory"),
+    CommandTimeoutException(["/usr/bin/hpss_avail.py", "archive"], 60, logging.getLogger()),
+])
+async def test_probe_failure(error: Exception, mocker: MockerFixture) -> None:
+    """Test that HPSS is not available if hpss_avail is missing or hangs."""
+    run_mock = mocker.patch("lta.hpss_avail.run_command")
+    run_mock.side_effect = error
+    monitor = HpssAvailMonitor("/usr/bin/hpss_avail.py", 60, logging.getLogger())
+    assert not await monitor.probe()
+    assert monitor.failures == 1
+
+
+def test_next_delay() -> None:
+    """Test that the monitor backs off with jitter while HPSS is down."""
+    monitor = HpssAvailMonitor("/usr/bin/hpss_avail.py", 60, logging.getLogger())
+    monitor.available = True
+    assert monitor.next_delay() == 60
+    monitor.available = False
+    delays: List[float] = []
+    for failures in range(1, 20):
+        monitor.failures = failures
+        delays.append(monitor.next_delay())
+    assert BACKOFF_MIN_SECONDS * (1 - BACKOFF_JITTER) <= delays[0] <= BACKOFF_MIN_SECONDS * (1 + BACKOFF_JITTER)
+    assert delays[2] > delays[0]
+    assert all(delay <= BACKOFF_MAX_SECONDS * (1 + BACKOFF_JITTER) for delay in delays)
+    assert delays[-1] >= BACKOFF_MAX_SECONDS * (1 - BACKOFF_JITTER)
+
+
+def test_get_hpss_avail_monitor() -> None:
+    """Test that components in the same process share a monitor."""
+    a = get_hpss_avail_monitor("/opt/test/hpss_avail.py", 60, logging.getLogger())
+    b = get_hpss_avail_monitor("/opt/test/hpss_avail.py", 30, logging.getLogger())
+    c = get_hpss_avail_monitor("/opt/other/hpss_avail.py", 60, logging.getLogger())
+    assert a is b
+    assert a is not c
+    assert a.ttl_seconds == 30
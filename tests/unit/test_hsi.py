@@ -0,0 +1,75 @@
+# test_hsi.py
+"""Unit tests for lta/hsi.py."""
+
+# fmt:off
+
+import logging
+from pathlib import Path
+
+import pytest
+
+from lta.hsi import HsiSession, HsiSessionResult
+from .utils import FAKE_HSI_PATH, ObjectLiteral
+
+
+def test_hsi_session_result_parse() -> None:
+    """Test that HsiSessionResult sorts the output of a session by path."""
+    result = HsiSessionResult(ObjectLiteral(  # type: ignore[arg-type]
+        returncode=72,
+        args=["/usr/bin/hsi", "-P", "in", "/tmp/lta-hsi-xyz.cmd"],
+        stdout=(
+            b"1693e9d0 sha512 /home/projects/icecube/a.zip [hsi]\n"
+            b"*** hashlist: Error on HPSS file /home/projects/icecube/b.zip: No such file or directory\n"
+            b"/home/projects/icecube/a.zip: (sha512) OK\n"
+            b"/home/projects/icecube/c.zip: (sha512) FAILED (hash mismatch)\n"
+            b"get  '/scratch/a.zip' : '/home/projects/icecube/a.zip' (2019/09/25 15:33:47 109192514585 bytes, 250132.4 KBS )\n"
+            b"FILE\t/home/projects/icecube/a.zip\t109192514585\t109192514585\t3729+0\tEA871300\t5\t0\t1\t09/25/2019\t15:33:47\t09/25/2019\t15:33:47\n"
+        ),
+        stderr=b"*** put: Error on HPSS file /home/projects/icecube/d.zip: Permission denied\n",
+    ))
+    assert result.returncode == 72
+    assert result.hashlist == {"/home/projects/icecube/a.zip": "1693e9d0"}
+    assert result.hashverify == {
+        "/home/projects/icecube/a.zip": "(sha512) OK",
+        "/home/projects/icecube/c.zip": "(sha512) FAILED (hash mismatch)",
+    }
+    assert result.tape == {"/home/projects/icecube/a.zip": ("EA871300", 3729)}
+    assert result.gets == {"/scratch/a.zip": 109192514585}
+    assert result.errors_for("/home/projects/icecube/a.zip") == []
+    assert result.errors_for("/home/projects/icecube/b.zip") == [
+        "*** hashlist: Error on HPSS file /home/projects/icecube/b.zip: No such file or directory",
+    ]
+    assert result.errors_for("/scratch/d.zip", "/home/projects/icecube/d.zip") == [
+        "*** put: Error on HPSS file /home/projects/icecube/d.zip: Permission denied",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_hsi_session_run(fake_hsi: Path, tmp_path: Path) -> None:
+    """Test that HsiSession runs all of its commands with a single hsi process."""
+    src = tmp_path / "bundle.zip"
+    src.write_bytes(b"some bundle contents")
+    session = HsiSession(FAKE_HSI_PATH, logging.getLogger())
+    session.add("mkdir", "-p", "/home/projects/icecube/data")
+    session.add("put", "-c", "on", "-H", "sha512", str(src), ":", "/home/projects/icecube/data/bundle.zip")
+    session.add("hashlist", "/home/projects/icecube/data/bundle.zip")
+    session.add("hashlist", "/home/projects/icecube/data/missing.zip")
+    session.add("ls", "-P", "/home/projects/icecube/data/bundle.zip")
+    result = await session.run()
+    assert result.returncode != 0
+    assert list(result.hashlist) == ["/home/projects/icecube/data/bundle.zip"]
+    assert result.tape == {"/home/projects/icecube/data/bundle.zip": ("EA000000", 0)}
+    assert result.errors_for("/home/projects/icecube/data/missing.zip")
+    assert (fake_hsi / "home/projects/icecube/data/bundle.zip").read_bytes() == b"some bundle contents"
+    assert len((tmp_path / "fake_hsi.log").read_text().splitlines()) == 1
+
+
+@pytest.mark.asyncio
+async def test_hsi_session_run_failed(fake_hsi: Path) -> None:
+    """Test that HsiSession keeps the output it could not parse, to explain a failure."""
+    session = HsiSession(FAKE_HSI_PATH, logging.getLogger(), timeout=60)
+    session.add("frobnicate", "/home/projects/icecube/data/bundle.zip")
+    result = await session.run()
+    assert result.returncode == 72
+    assert result.lines == ["*** frobnicate: Error on HPSS file : Unknown command"]
+    assert result.completed_process.stdout == b"*** frobnicate: Error on HPSS file : Unknown command"
@@ -1,11 +1,40 @@
 # test_lta_cmd.py
-"""Unit tests for lta/lta_cmd.py."""
+"""Unit tests for lta/lta_cmd.py and the lta/cmd subcommands."""
 
 # fmt:off
 
+from argparse import Namespace
+import asyncio
+import json
+import os
+from pathlib import Path
+import subprocess
+import sys
+from typing import Any, Dict, Optional
+from unittest.mock import AsyncMock
+
 import pytest
+from pytest_mock import MockerFixture
+from requests import Response
+from requests.exceptions import HTTPError
+
+from lta.cmd.bundle import bundle_overdue
+from lta.cmd.catalog import catalog_check
+from lta.cmd.common import EXIT_ERROR, EXIT_OK, MAX_CONCURRENT_REQUESTS, normalize_path
+from lta.cmd.lta_db import _get_bundle_rows, _get_bundles, _get_dashboard, _get_overlapping_requests
+from lta.cmd.snapshot import snapshot_export, SnapshotClient
+from lta.crypto import sha512sum
+
+# what `import lta.lta_cmd` may cost, as reported by `python -X importtime`; it takes about 60ms,
+# and importing every subcommand eagerly took about 300ms, so this leaves room for a busy runner
+LTA_CMD_IMPORT_BUDGET_MICROSECONDS = 250_000
 
-from lta.lta_cmd import normalize_path
+# how many times to time `import lta.lta_cmd`; the fastest one counts
+LTA_CMD_IMPORT_TIMINGS = 3
+
+# modules that only the subcommands that use them should import
+LTA_CMD_LAZY_MODULES = ["colorama", "globus_sdk", "hurry", "lta.crypto", "lta.globus_replicator", "lta.transfer",
+                        "pymongo", "requests", "rest_tools", "tornado"]
 
 
 def test_normalize_path() -> None:
@@ -19,3 +48,260 @@ def test_PATH_PREFIX_ALLOW_LIST() -> None:
     """Test that normalize_path will enforce PATH_PREFIX_ALLOW_LIST."""
     with pytest.raises(ValueError):
         normalize_path("/mnt/lfs7/exp/IceCube/2018/unbiased/PFRaw/1109")
+
+
+def _lta_cmd_import_microseconds() -> int:
+    """Time `import lta.lta_cmd` in a fresh interpreter, with `python -X importtime`."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import lta.lta_cmd"],
+                            capture_output=True, check=True, text=True)
+    # import time: self [us] | cumulative | imported package
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and line.endswith("| lta.lta_cmd"):
+            return int(line.split("|")[1])
+    raise AssertionError("python -X importtime did not report lta.lta_cmd")
+
+
+def test_lta_cmd_import_time() -> None:
+    """Test that importing lta_cmd stays within its budget."""
+    fastest = min(_lta_cmd_import_microseconds() for _ in range(LTA_CMD_IMPORT_TIMINGS))
+    assert fastest < LTA_CMD_IMPORT_BUDGET_MICROSECONDS
+
+
+def test_lta_cmd_imports() -> None:
+    """Test that importing lta_cmd stays cheap, leaving the subcommands and their dependencies until they run."""
+    script = "import json, sys; before = set(sys.modules); import lta.lta_cmd; print(json.dumps(sorted(set(sys.modules) - before)))"
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, check=True, text=True)
+    imported = json.loads(result.stdout)
+    assert "lta.lta_cmd" in imported
+    # the subcommands only share their common helpers
+    assert [module for module in imported if module.startswith("lta.cmd.")] == ["lta.cmd.common"]
+    for lazy in LTA_CMD_LAZY_MODULES:
+        assert not [module for module in imported if (module == lazy) or module.startswith(f"{lazy}.")]
+
+
+def test_lta_cmd_display_config() -> None:
+    """Test that display-config runs without creating any REST clients."""
+    env = dict(os.environ)
+    for key in ["CLIENT_ID", "CLIENT_SECRET", "FILE_CATALOG_CLIENT_ID", "FILE_CATALOG_CLIENT_SECRET"]:
+        env[key] = key.lower()
+    for key in ["FILE_CATALOG_REST_URL", "LTA_AUTH_OPENID_URL", "LTA_REST_URL"]:
+        # nothing listens here, so creating a client would fail
+        env[key] = "http://localhost:1"
+    result = subprocess.run([sys.executable, "-m", "lta.lta_cmd", "display-config", "--json"],
+                            capture_output=True, check=True, env=env, text=True)
+    assert json.loads(result.stdout)["LTA_REST_URL"] == "http://localhost:1"
+
+
+async def test_get_dashboard() -> None:
+    """Test that _get_dashboard asks the LTA DB for the whole dashboard in one request."""
+    rc = AsyncMock()
+    rc.request.return_value = {"results": [{"uuid": "r1", "bundles": [{"uuid": "b1"}]}]}
+    assert await _get_dashboard(rc, True, 10, None) == [{"uuid": "r1", "bundles": [{"uuid": "b1"}]}]
+    rc.request.assert_called_once_with("GET", "/Dashboard?active_only=true&limit=10")
+
+
+async def test_get_dashboard_older_server() -> None:
+    """Test that _get_dashboard gathers the dashboard itself, a few requests at a time, from an older LTA DB."""
+    not_found = Response()
+    not_found.status_code = 404
+    in_flight = 0
+    most_in_flight = 0
+
+    async def request(method: str, path: str, body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        nonlocal in_flight, most_in_flight
+        if path.startswith("/Dashboard"):
+            raise HTTPError(response=not_found)
+        in_flight += 1
+        most_in_flight = max(most_in_flight, in_flight)
+        await asyncio.sleep(0.001)
+        in_flight -= 1
+        if path == "/TransferRequests":
+            return {"results": [
+                {"uuid": f"r{i}", "status": "finished" if i == 3 else "processing", "create_timestamp": f"2024-01-{30 - i:02}"}
+                for i in range(10)
+            ]}
+        if path.startswith("/Bundles?request="):
+            request = path.split("=")[1]
+            return {"results": [f"{request}-b{j}" for j in range(10)]}
+        bundle = path.split("/")[2]
+        return {"uuid": bundle, "request": bundle.split("-")[0], "status": "created",
+                "create_timestamp": f"2024-02-{20 - int(bundle[-1]):02}", "unwanted": "field"}
+
+    rc = AsyncMock()
+    rc.request.side_effect = request
+    requests = await _get_dashboard(rc, True, 5, None)
+
+    # oldest requests first, leaving out the finished one
+    assert [r["uuid"] for r in requests] == ["r9", "r8", "r7", "r6", "r5"]
+    for r in requests:
+        # oldest bundles first, with just the fields we want
+        assert [b["uuid"] for b in r["bundles"]] == [f"{r['uuid']}-b{j}" for j in range(9, -1, -1)]
+        assert "unwanted" not in r["bundles"][0]
+    assert rc.request.call_count == 1 + 1 + 5 + 50
+    assert 1 < most_in_flight <= MAX_CONCURRENT_REQUESTS
+
+
+async def test_get_bundle_rows() -> None:
+    """Test that _get_bundle_rows asks the LTA DB for the fields of every Bundle in one request."""
+    rc = AsyncMock()
+    rc.request.return_value = {"results": [{"uuid": "b1", "status": "created"}]}
+    assert await _get_bundle_rows(rc, ["status", "claimant"]) == [{"uuid": "b1", "status": "created"}]
+    rc.request.assert_called_once_with("GET", "/Bundles?fields=status,claimant")
+
+
+async def test_get_bundle_rows_older_server() -> None:
+    """Test that _get_bundle_rows fetches each Bundle, a few at a time, from an older LTA DB."""
+    not_found = Response()
+    not_found.status_code = 404
+    in_flight = 0
+    most_in_flight = 0
+
+    async def request(method: str, path: str, body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        nonlocal in_flight, most_in_flight
+        if path == "/Bundles?fields=status":
+            return {"results": [f"b{i}" for i in range(40)]}
+        if path == "/Bundles/actions/bulk_get":
+            raise HTTPError(response=not_found)
+        in_flight += 1
+        most_in_flight = max(most_in_flight, in_flight)
+        await asyncio.sleep(0.001)
+        in_flight -= 1
+        return {"uuid": path.split("/")[2].split("?")[0], "status": "created"}
+
+    rc = AsyncMock()
+    rc.request.side_effect = request
+    rows = await _get_bundle_rows(rc, ["status"])
+    assert [row["uuid"] for row in rows] == [f"b{i}" for i in range(40)]
+    assert rc.request.call_count == 1 + 1 + 40
+    assert 1 < most_in_flight <= MAX_CONCURRENT_REQUESTS
+
+
+async def test_get_bundles() -> None:
+    """Test that _get_bundles asks the LTA DB for all of the Bundles in one request."""
+    rc = AsyncMock()
+    rc.request.return_value = {"bundles": [{"uuid": "b1"}, {"uuid": "b2"}], "count": 2}
+    assert await _get_bundles(rc, ["b1", "b2", "b3"]) == [{"uuid": "b1"}, {"uuid": "b2"}]
+    rc.request.assert_called_once_with("POST", "/Bundles/actions/bulk_get", {"bundles": ["b1", "b2", "b3"]})
+    # no questions, no answers
+    assert await _get_bundles(rc, []) == []
+    assert rc.request.call_count == 1
+
+
+async def test_get_overlapping_requests() -> None:
+    """Test that _get_overlapping_requests asks the LTA DB to check for overlapping TransferRequests."""
+    rc = AsyncMock()
+    rc.request.return_value = {"path": "/data/exp/2024", "overlaps": [{"uuid": "r1", "path": "/data/exp", "status": "unclaimed"}]}
+    assert await _get_overlapping_requests(rc, "/data/exp/2024") == [{"uuid": "r1", "path": "/data/exp", "status": "unclaimed"}]
+    rc.request.assert_called_once_with("POST", "/TransferRequests/actions/check_overlap", {"path": "/data/exp/2024"})
+
+
+async def test_get_overlapping_requests_older_server() -> None:
+    """Test that _get_overlapping_requests checks every TransferRequest itself against an older LTA DB."""
+    not_found = Response()
+    not_found.status_code = 404
+
+    async def request(method: str, path: str, body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        if path == "/TransferRequests/actions/check_overlap":
+            raise HTTPError(response=not_found)
+        return {"results": [
+            {"uuid": "above", "path": "/data/exp/", "status": "processing"},
+            {"uuid": "same", "path": "/data/exp/2024", "status": "unclaimed"},
+            {"uuid": "below", "path": "/data/exp/2024/0101", "status": "processing"},
+            {"uuid": "done", "path": "/data/exp/2024/0102", "status": "completed"},
+            {"uuid": "sibling", "path": "/data/exp/20245", "status": "processing"},
+            {"uuid": "elsewhere", "path": "/data/sim/2024", "status": "processing"},
+        ]}
+
+    rc = AsyncMock()
+    rc.request.side_effect = request
+    overlaps = await _get_overlapping_requests(rc, "/data/exp/2024")
+    assert [r["uuid"] for r in overlaps] == ["above", "same", "below"]
+
+
+async def test_catalog_check(mocker: MockerFixture, tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    """Test that catalog_check pages through the File Catalog and reconciles it with the checksums of the files on disk."""
+    mocker.patch("lta.cmd.catalog.CATALOG_PAGE_SIZE", 2)
+    for name in ["a", "b", "c", "d", "e"]:
+        (tmp_path / "run" / name[0]).mkdir(parents=True, exist_ok=True)
+        (tmp_path / "run" / name[0] / name).write_bytes(name.encode() * 10)
+
+    def record(name: str, size: int = 10, checksum: Optional[str] = None) -> Dict[str, Any]:
+        path = str(tmp_path / "run" / name[0] / name)
+        return {"uuid": f"uuid-{name}", "logical_name": path, "file_size": size,
+                "checksum": {"sha512": checksum or sha512sum(path)}}
+
+    records = [record("a"), record("b", size=11), record("c", checksum="0" * 128), record("e"), {
+        "uuid": "uuid-gone", "logical_name": str(tmp_path / "run" / "gone"), "file_size": 10, "checksum": {"sha512": "0"},
+    }]
+    fc_rc = AsyncMock()
+    fc_rc.request.side_effect = [{"files": records[0:2]}, {"files": records[2:4]}, {"files": records[4:5]}]
+    report = tmp_path / "report.json"
+    args = Namespace(checksums=True, di={"fc_rc": fc_rc}, json=False, path=str(tmp_path / "run"),
+                     progress=True, report=str(report), workers=2)
+    assert await catalog_check(args) == EXIT_ERROR
+
+    # three pages, the last one short
+    assert fc_rc.request.call_count == 3
+    assert fc_rc.request.call_args_list[2].args[1].endswith("&keys=checksum|file_size|logical_name|uuid&start=4&limit=2")
+    results = json.loads(report.read_text())
+    assert results["disk_files"] == 5
+    assert results["catalog_files"] == 5
+    assert results["catalog_missing"] == [str(tmp_path / "run" / "d" / "d")]
+    assert results["disk_missing"] == [str(tmp_path / "run" / "gone")]
+    assert [m["uuid"] for m in results["mismatch"]] == ["uuid-b", "uuid-c"]
+    assert results["mismatch"][1]["disk_sha512"] == sha512sum(str(tmp_path / "run" / "c" / "c"))
+    out, err = capsys.readouterr()
+    assert "Missing from the File Catalog" in out
+    assert "5/5 files hashed; 5 catalog records" in err
+
+
+async def test_snapshot(mocker: MockerFixture, tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    """Test that snapshot export writes the LTA DB to a file that SnapshotClient can answer from."""
+    mocker.patch("lta.cmd.snapshot.SNAPSHOT_BATCH_SIZE", 4)
+    requests = [{"uuid": f"r{i}", "status": "finished" if i == 0 else "processing", "create_timestamp": f"2024-01-{10 - i:02}",
+                 "path": f"/data/exp/{i}"} for i in range(3)]
+    bundles = [{"uuid": f"r{i % 3}-b{i}", "request": f"r{i % 3}", "status": "quarantined" if i == 5 else "created",
+                "claimed": False, "claimant": "bundler", "create_timestamp": f"2024-02-{20 - i:02}",
+                "update_timestamp": "2999-01-01T00:00:00", "size": i} for i in range(10)]
+
+    async def request(method: str, path: str, body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        if path == "/TransferRequests":
+            return {"results": requests}
+        if path == "/Bundles":
+            return {"results": [b["uuid"] for b in bundles]}
+        assert body is not None
+        return {"bundles": [b for b in bundles if b["uuid"] in body["bundles"]]}
+
+    lta_rc = AsyncMock()
+    lta_rc.request.side_effect = request
+    snapshot = tmp_path / "lta.sqlite"
+    args = Namespace(di={"config": {"LTA_REST_URL": "https://lta.example"}, "lta_rc": lta_rc}, output=str(snapshot))
+    assert await snapshot_export(args) == EXIT_OK
+    # one request for the TransferRequests, one for the UUIDs, and the Bundles in batches
+    assert lta_rc.request.call_count == 1 + 1 + 3
+    assert not (tmp_path / "lta.sqlite.tmp").exists()
+    assert "Exported 3 TransferRequests and 10 Bundles" in capsys.readouterr().out
+
+    rc = SnapshotClient(str(snapshot))
+    assert (await rc.request("GET", "/Bundles/r1-b4"))["size"] == 4
+    assert len((await rc.request("GET", "/TransferRequests"))["results"]) == 3
+    assert (await rc.request("GET", "/TransferRequests/r2"))["path"] == "/data/exp/2"
+    assert sorted((await rc.request("GET", "/Bundles?request=r2"))["results"]) == ["r2-b2", "r2-b5", "r2-b8"]
+    assert (await rc.request("GET", "/Bundles?status=quarantined&fields=status")) == {"results": [{"uuid": "r2-b5", "status": "quarantined"}]}
+    ret = await rc.request("POST", "/Bundles/actions/bulk_get", {"bundles": ["r0-b0", "nope"], "fields": ["size"]})
+    assert ret == {"bundles": [{"uuid": "r0-b0", "size": 0}], "count": 1}
+    dashboard = (await rc.request("GET", "/Dashboard?active_only=true&limit=1"))["results"]
+    assert [r["uuid"] for r in dashboard] == ["r2"]
+    assert [b["uuid"] for b in dashboard[0]["bundles"]] == ["r2-b8", "r2-b5", "r2-b2"]
+    assert "size" not in dashboard[0]["bundles"][0]
+    with pytest.raises(HTTPError) as exc:
+        await rc.request("GET", "/Bundles/nope")
+    assert exc.value.response.status_code == 404  # type: ignore[union-attr]
+    with pytest.raises(Exception, match="read-only"):
+        await rc.request("PATCH", "/Bundles/r0-b0", {"status": "deleted"})
+
+    # a subcommand answers from the snapshot as it would from the LTA DB
+    args = Namespace(days=3, di={"lta_rc": rc}, json=True)
+    assert await bundle_overdue(args) == EXIT_OK
+    assert [b["uuid"] for b in json.loads(capsys.readouterr().out)["bundles"]] == ["r2-b5"]
+    rc.close()
@@ -1,14 +1,15 @@
 # test_nersc_mover.py
 """Unit tests for lta/nersc_mover.py."""
 import logging
-from unittest import mock
+from pathlib import Path
 
 # fmt:off
 
-from lta.utils import HSICommandFailedException
+from lta.crypto import sha512sum
+from lta.utils import HSIBatchItemFailedException, HSICommandFailedException, InvalidChecksumException
 
 
-from typing import Dict
+from typing import Any, Dict, List
 from unittest.mock import AsyncMock, call, MagicMock
 
 import pytest
@@ -17,7 +18,7 @@ from pytest_mock import MockerFixture
 from tornado.web import HTTPError
 
 from lta.nersc_mover import main_sync, NerscMover
-from .utils import ObjectLiteral
+from .utils import FAKE_HSI_PATH, ObjectLiteral
 
 TestConfig = Dict[str, str]
 
@@ -31,11 +32,14 @@ def config() -> TestConfig:
         "COMPONENT_NAME": "testing-nersc-mover",
         "DEST_SITE": "NERSC",
         "HPSS_AVAIL_PATH": "/path/to/hpss_avail.py",
+        "HPSS_AVAIL_TTL_SECONDS": "60",
+        "HSI_PATH": FAKE_HSI_PATH,
+        "HSI_TIMEOUT_SECONDS": "60",
         "INPUT_STATUS": "taping",
         "LOG_LEVEL": "DEBUG",
         "LTA_AUTH_OPENID_URL": "localhost:12345",
         "LTA_REST_URL": "localhost:12347",
-        "MAX_COUNT": "5",
+        "MAX_COUNT": "1",
         "OUTPUT_STATUS": "verifying",
         "PROMETHEUS_METRICS_PORT": "8080",
         "RSE_BASE_PATH": "/path/to/rse",
@@ -120,6 +124,9 @@ async def test_nersc_mover_logs_configuration(mocker: MockerFixture) -> None:
         "COMPONENT_NAME": "logme-testing-nersc-mover",
         "DEST_SITE": "NERSC",
         "HPSS_AVAIL_PATH": "/log/me/path/to/hpss_avail.py",
+        "HPSS_AVAIL_TTL_SECONDS": "300",
+        "HSI_PATH": "/log/me/path/to/hsi",
+        "HSI_TIMEOUT_SECONDS": "6000",
         "INPUT_STATUS": "taping",
         "LOG_LEVEL": "DEBUG",
         "LTA_AUTH_OPENID_URL": "localhost:12345",
@@ -144,6 +151,9 @@ async def test_nersc_mover_logs_configuration(mocker: MockerFixture) -> None:
         call('COMPONENT_NAME = logme-testing-nersc-mover'),
         call('DEST_SITE = NERSC'),
         call('HPSS_AVAIL_PATH = /log/me/path/to/hpss_avail.py'),
+        call('HPSS_AVAIL_TTL_SECONDS = 300'),
+        call('HSI_PATH = /log/me/path/to/hsi'),
+        call('HSI_TIMEOUT_SECONDS = 6000'),
         call('INPUT_STATUS = taping'),
         call('LOG_LEVEL = DEBUG'),
         call('LTA_AUTH_OPENID_URL = localhost:12345'),
@@ -205,13 +215,8 @@ async def test_nersc_mover_do_work_yes_results(config: TestConfig, mocker: Mocke
 @pytest.mark.asyncio
 async def test_nersc_mover_hpss_not_available(config: TestConfig, mocker: MockerFixture) -> None:
     """Test that a bad returncode on hpss_avail will prevent work."""
-    run_mock = mocker.patch("lta.nersc_mover.run", new_callable=MagicMock)
-    run_mock.return_value = ObjectLiteral(
-        returncode=1,
-        args=["/usr/common/software/bin/hpss_avail", "archive"],
-        stdout="some text on stdout",
-        stderr="some text on stderr",
-    )
+    avail_mock = mocker.patch("lta.hpss_avail.HpssAvailMonitor.is_available", new_callable=AsyncMock)
+    avail_mock.return_value = False
     p = NerscMover(config, logging.getLogger())
     assert not await p._do_work_claim(AsyncMock(), MagicMock())
 
@@ -219,13 +224,8 @@ async def test_nersc_mover_hpss_not_available(config: TestConfig, mocker: Mocker
 @pytest.mark.asyncio
 async def test_nersc_mover_do_work_pop_exception(config: TestConfig, mocker: MockerFixture) -> None:
     """Test that _do_work raises when the RestClient can't pop."""
-    run_mock = mocker.patch("lta.nersc_mover.run", new_callable=MagicMock)
-    run_mock.return_value = ObjectLiteral(
-        returncode=0,
-        args=["/usr/common/software/bin/hpss_avail", "archive"],
-        stdout="some text on stdout",
-        stderr="some text on stderr",
-    )
+    avail_mock = mocker.patch("lta.hpss_avail.HpssAvailMonitor.is_available", new_callable=AsyncMock)
+    avail_mock.return_value = True
     lta_rc_mock = AsyncMock()
     lta_rc_mock.request = AsyncMock()
     lta_rc_mock.request.side_effect = [
@@ -240,13 +240,8 @@ async def test_nersc_mover_do_work_pop_exception(config: TestConfig, mocker: Moc
 @pytest.mark.asyncio
 async def test_nersc_mover_do_work_claim_no_result(config: TestConfig, mocker: MockerFixture) -> None:
     """Test that _do_work_claim does not work when the LTA DB has no work."""
-    run_mock = mocker.patch("lta.nersc_mover.run", new_callable=MagicMock)
-    run_mock.return_value = ObjectLiteral(
-        returncode=0,
-        args=["/usr/common/software/bin/hpss_avail", "archive"],
-        stdout="some text on stdout",
-        stderr="some text on stderr",
-    )
+    avail_mock = mocker.patch("lta.hpss_avail.HpssAvailMonitor.is_available", new_callable=AsyncMock)
+    avail_mock.return_value = True
     lta_rc_mock = AsyncMock()
     lta_rc_mock.request = AsyncMock()
     lta_rc_mock.request.side_effect = [
@@ -254,9 +249,9 @@ async def test_nersc_mover_do_work_claim_no_result(config: TestConfig, mocker: M
             "bundle": None
         }
     ]
-    wbth_mock = mocker.patch("lta.nersc_mover.NerscMover._write_bundle_to_hpss", new_callable=AsyncMock)
+    wbth_mock = mocker.patch("lta.nersc_mover.NerscMover._write_bundles_to_hpss", new_callable=AsyncMock)
     p = NerscMover(config, logging.getLogger())
-    await p._do_work_claim(lta_rc_mock, MagicMock())
+    assert not await p._do_work_claim(lta_rc_mock, MagicMock())
     lta_rc_mock.request.assert_called_with("POST", '/Bundles/actions/pop?source=WIPAC&dest=NERSC&status=taping', {'claimant': f'{p.name}-{p.instance_uuid}'})
     wbth_mock.assert_not_called()
 
@@ -264,37 +259,34 @@ async def test_nersc_mover_do_work_claim_no_result(config: TestConfig, mocker: M
 @pytest.mark.asyncio
 async def test_nersc_mover_do_work_claim_yes_result(config: TestConfig, mocker: MockerFixture) -> None:
     """Test that _do_work_claim processes the Bundle it gets from the LTA DB."""
-    run_mock = mocker.patch("lta.nersc_mover.run", new_callable=MagicMock)
-    run_mock.return_value = ObjectLiteral(
-        returncode=0,
-        args=["/usr/common/software/bin/hpss_avail", "archive"],
-        stdout="some text on stdout",
-        stderr="some text on stderr",
-    )
+    avail_mock = mocker.patch("lta.hpss_avail.HpssAvailMonitor.is_available", new_callable=AsyncMock)
+    avail_mock.return_value = True
     lta_rc_mock = AsyncMock()
     lta_rc_mock.request = AsyncMock()
     lta_rc_mock.request.side_effect = [
         {
             "bundle": {"one": 1, "uuid": "abc123", "type": "Bundle"}
-        }
+        },
+        {},
     ]
-    wbth_mock = mocker.patch("lta.nersc_mover.NerscMover._write_bundle_to_hpss", new_callable=AsyncMock)
+    wbth_mock = mocker.patch("lta.nersc_mover.NerscMover._write_bundles_to_hpss", new_callable=AsyncMock)
+    wbth_mock.return_value = {"abc123": None}
     p = NerscMover(config, logging.getLogger())
-    await p._do_work_claim(lta_rc_mock, MagicMock())
-    lta_rc_mock.request.assert_called_with("POST", '/Bundles/actions/pop?source=WIPAC&dest=NERSC&status=taping', {'claimant': f'{p.name}-{p.instance_uuid}'})
-    wbth_mock.assert_called_with(mocker.ANY, {"one": 1, "uuid": "abc123", "type": "Bundle"})
+    assert await p._do_work_claim(lta_rc_mock, MagicMock())
+    wbth_mock.assert_called_with([{"one": 1, "uuid": "abc123", "type": "Bundle"}])
+    lta_rc_mock.request.assert_called_with("PATCH", '/Bundles/abc123', {
+        "status": "verifying",
+        "reason": "",
+        "update_timestamp": mocker.ANY,
+        "claimed": False,
+    })
 
 
 @pytest.mark.asyncio
 async def test_nersc_mover_do_work_claim_write_bundle_raise_exception(config: TestConfig, mocker: MockerFixture) -> None:
     """Test that _do_work_claim will quarantine a bundle if an exception occurs."""
-    run_mock = mocker.patch("lta.nersc_mover.run", new_callable=MagicMock)
-    run_mock.return_value = ObjectLiteral(
-        returncode=0,
-        args=["/usr/common/software/bin/hpss_avail", "archive"],
-        stdout="some text on stdout",
-        stderr="some text on stderr",
-    )
+    avail_mock = mocker.patch("lta.hpss_avail.HpssAvailMonitor.is_available", new_callable=AsyncMock)
+    avail_mock.return_value = True
     lta_rc_mock = AsyncMock()
     lta_rc_mock.request = AsyncMock()
     lta_rc_mock.request.side_effect = [
@@ -307,7 +299,7 @@ async def test_nersc_mover_do_work_claim_write_bundle_raise_exception(config: Te
         },
         {}
     ]
-    wbth_mock = mocker.patch("lta.nersc_mover.NerscMover._write_bundle_to_hpss", new_callable=AsyncMock)
+    wbth_mock = mocker.patch("lta.nersc_mover.NerscMover._write_bundles_to_hpss", new_callable=AsyncMock)
     exc = Exception("BAD THING HAPPEN!")
     wbth_mock.side_effect = exc
     p = NerscMover(config, logging.getLogger())
@@ -316,218 +308,160 @@ async def test_nersc_mover_do_work_claim_write_bundle_raise_exception(config: Te
     assert excinfo.value == exc
     lta_rc_mock.request.assert_called_with("PATCH", '/Bundles/8f03a920-49d6-446b-811e-830e3f7942f5', mocker.ANY)
     wbth_mock.assert_called_with(
-        mocker.ANY,
-        {"uuid": "8f03a920-49d6-446b-811e-830e3f7942f5", "status": "taping", "type": "Bundle"}
+        [{"uuid": "8f03a920-49d6-446b-811e-830e3f7942f5", "status": "taping", "type": "Bundle"}]
     )
 
 
+def make_bundles(tmp_path: Path, count: int) -> List[Dict[str, Any]]:
+    """Create bundle files in a fake RSE directory and the Bundle records that describe them."""
+    rse_path = tmp_path / "rse"
+    rse_path.mkdir()
+    bundles = []
+    for i in range(count):
+        bundle_file = rse_path / f"bundle-{i}.zip"
+        bundle_file.write_bytes(f"contents of bundle {i}".encode("utf-8"))
+        bundles.append({
+            "uuid": f"bundle-{i}",
+            "type": "Bundle",
+            "status": "taping",
+            "path": "/data/exp/IceCube/2019/filtered/PFFilt/1109",
+            "bundle_path": f"/path/on/source/rse/bundle-{i}.zip",
+            "checksum": {"sha512": sha512sum(str(bundle_file))},
+        })
+    return bundles
+
+
 @pytest.mark.asyncio
-async def test_nersc_mover_write_bundle_to_hpss_mkdir(config: TestConfig, mocker: MockerFixture) -> None:
-    """Test that _write_bundle_to_hpss executes an HSI command to create the destination directory."""
-    run_mock = mocker.patch("lta.nersc_mover.run", new_callable=MagicMock)
-    run_mock.return_value = ObjectLiteral(
-        returncode=0,
-        args=["/usr/common/software/bin/hpss_avail", "archive"],
-        stdout="some text on stdout",
-        stderr="some text on stderr",
-    )
-    lta_rc_mock = AsyncMock()
-    lta_rc_mock.request = AsyncMock()
-    lta_rc_mock.request.side_effect = [
-        {
-            "bundle": {
-                "uuid": "398ca1ed-0178-4333-a323-8b9158c3dd88",
-                "bundle_path": "/path/on/source/rse/398ca1ed-0178-4333-a323-8b9158c3dd88.zip",
-                "path": "/data/exp/IceCube/2019/filtered/PFFilt/1109",
-                "status": "taping",
-                "type": "Bundle",
-            },
-        },
-        {},  # <- for the quarantine PATCH
-    ]
-    ehc_mock = mocker.patch("lta.nersc_mover.NerscMover._execute_hsi_command", new_callable=MagicMock)
-    exc = HSICommandFailedException("from test", MagicMock(), MagicMock())
-    ehc_mock.side_effect = exc
+async def test_nersc_mover_write_bundles_to_hpss(config: TestConfig, fake_hsi: Path, tmp_path: Path) -> None:
+    """Test that _write_bundles_to_hpss tapes a batch of bundles with a single HSI session."""
+    config["RSE_BASE_PATH"] = str(tmp_path / "rse")
+    bundles = make_bundles(tmp_path, 3)
     p = NerscMover(config, logging.getLogger())
-    with pytest.raises(type(exc)) as excinfo:
-        await p._do_work_claim(lta_rc_mock, MagicMock())
-    assert excinfo.value == exc
-    ehc_mock.assert_called_with(['/usr/bin/hsi', 'mkdir', '-p', '/path/to/hpss/data/exp/IceCube/2019/filtered/PFFilt/1109'])
-    lta_rc_mock.request.assert_has_calls(
-        [
-            call(
-                "POST",
-                '/Bundles/actions/pop?source=WIPAC&dest=NERSC&status=taping',
-                {'claimant': f'{p.name}-{p.instance_uuid}'},
-            ),
-            call(
-                "PATCH",
-                "/Bundles/398ca1ed-0178-4333-a323-8b9158c3dd88",
-                {
-                    "original_status": "taping",
-                    "status": "quarantined",
-                    "reason": mock.ANY,
-                    "reason_details": mock.ANY,  # stacktrace logic is tested in test_utils.py
-                    "work_priority_timestamp": mock.ANY,
-                }
-            ),
-        ]
-    )
+    assert await p._write_bundles_to_hpss(bundles) == {
+        "bundle-0": None,
+        "bundle-1": None,
+        "bundle-2": None,
+    }
+    for i in range(3):
+        taped = fake_hsi / f"path/to/hpss/data/exp/IceCube/2019/filtered/PFFilt/1109/bundle-{i}.zip"
+        assert taped.read_bytes() == f"contents of bundle {i}".encode("utf-8")
+    hsi_log = (tmp_path / "fake_hsi.log").read_text().splitlines()
+    assert len(hsi_log) == 1
+    assert hsi_log[0].startswith("in ")
+
 
 @pytest.mark.asyncio
-async def test_nersc_mover_write_bundle_to_hpss_hsi_put(config: TestConfig, mocker: MockerFixture) -> None:
-    """Test that _write_bundle_to_hpss executes an HSI command to write the file to tape."""
-    run_mock = mocker.patch("lta.nersc_mover.run", new_callable=MagicMock)
-    run_mock.return_value = ObjectLiteral(
-        returncode=0,
-        args=["/usr/common/software/bin/hpss_avail", "archive"],
-        stdout="some text on stdout",
-        stderr="some text on stderr",
-    )
-    lta_rc_mock = AsyncMock()
-    lta_rc_mock.request = AsyncMock()
-    lta_rc_mock.request.side_effect = [
-        {
-            "bundle": {
-                "uuid": "398ca1ed-0178-4333-a323-8b9158c3dd88",
-                "bundle_path": "/path/on/source/rse/398ca1ed-0178-4333-a323-8b9158c3dd88.zip",
-                "path": "/data/exp/IceCube/2019/filtered/PFFilt/1109",
-                "status": "taping",
-                "type": "Bundle",
-            },
-        },
-        {},  # <- for the quarantine PATCH
-    ]
-    ehc_mock = mocker.patch("lta.nersc_mover.NerscMover._execute_hsi_command", new_callable=MagicMock)
-    exc = HSICommandFailedException("from test", MagicMock(), MagicMock())
-    ehc_mock.side_effect = [None, exc]
+async def test_nersc_mover_write_bundles_to_hpss_partial_failure(config: TestConfig, fake_hsi: Path, tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    """Test that _write_bundles_to_hpss only reports the bundles that failed."""
+    config["RSE_BASE_PATH"] = str(tmp_path / "rse")
+    monkeypatch.setenv("FAKE_HSI_FAIL", "bundle-1.zip")
+    bundles = make_bundles(tmp_path, 3)
     p = NerscMover(config, logging.getLogger())
-    with pytest.raises(type(exc)) as excinfo:
-        await p._do_work_claim(lta_rc_mock, MagicMock())
-    assert excinfo.value == exc
-    ehc_mock.assert_called_with(['/usr/bin/hsi', 'put', '-c', 'on', '-H', 'sha512', '/path/to/rse/398ca1ed-0178-4333-a323-8b9158c3dd88.zip', ':', '/path/to/hpss/data/exp/IceCube/2019/filtered/PFFilt/1109/398ca1ed-0178-4333-a323-8b9158c3dd88.zip'])
-    lta_rc_mock.request.assert_has_calls(
-        [
-            call(
-                "POST",
-                '/Bundles/actions/pop?source=WIPAC&dest=NERSC&status=taping',
-                {'claimant': f'{p.name}-{p.instance_uuid}'},
-            ),
-            call(
-                "PATCH",
-                "/Bundles/398ca1ed-0178-4333-a323-8b9158c3dd88",
-                {
-                    "original_status": "taping",
-                    "status": "quarantined",
-                    "reason": mock.ANY,
-                    "reason_details": mock.ANY,  # stacktrace logic is tested in test_utils.py
-                    "work_priority_timestamp": mock.ANY,
-                }
-            ),
-        ]
-    )
+    outcomes = await p._write_bundles_to_hpss(bundles)
+    assert outcomes["bundle-0"] is None
+    assert isinstance(outcomes["bundle-1"], HSIBatchItemFailedException)
+    assert outcomes["bundle-2"] is None
 
 
 @pytest.mark.asyncio
-async def test_nersc_mover_write_bundle_to_hpss(config: TestConfig, mocker: MockerFixture) -> None:
-    """Test that _write_bundle_to_hpss updates the LTA DB after success."""
-    run_mock = mocker.patch("lta.nersc_mover.run", new_callable=MagicMock)
-    run_mock.return_value = ObjectLiteral(
-        returncode=0,
-        args=["/usr/common/software/bin/hpss_avail", "archive"],
-        stdout="some text on stdout",
-        stderr="some text on stderr",
-    )
-    lta_rc_mock = AsyncMock()
-    lta_rc_mock.request = AsyncMock()
-    lta_rc_mock.request.side_effect = [
-        {
-            "bundle": {
-                "uuid": "398ca1ed-0178-4333-a323-8b9158c3dd88",
-                "bundle_path": "/path/on/source/rse/398ca1ed-0178-4333-a323-8b9158c3dd88.zip",
-                "path": "/data/exp/IceCube/2019/filtered/PFFilt/1109",
-            },
-        },
-        {
-            "type": "Bundle",
-        },
-    ]
-    ehc_mock = mocker.patch("lta.nersc_mover.NerscMover._execute_hsi_command", new_callable=MagicMock)
-    ehc_mock.side_effect = [None, None]
+async def test_nersc_mover_write_bundles_to_hpss_bad_checksum(config: TestConfig, fake_hsi: Path, tmp_path: Path) -> None:
+    """Test that _write_bundles_to_hpss reports a bundle when the checksum calculated by HPSS does not match."""
+    config["RSE_BASE_PATH"] = str(tmp_path / "rse")
+    bundles = make_bundles(tmp_path, 2)
+    bundles[1]["checksum"]["sha512"] = "0123456789abcdef"
     p = NerscMover(config, logging.getLogger())
-    await p._do_work_claim(lta_rc_mock, MagicMock())
-    ehc_mock.assert_called_with(['/usr/bin/hsi', 'put', '-c', 'on', '-H', 'sha512', '/path/to/rse/398ca1ed-0178-4333-a323-8b9158c3dd88.zip', ':', '/path/to/hpss/data/exp/IceCube/2019/filtered/PFFilt/1109/398ca1ed-0178-4333-a323-8b9158c3dd88.zip'])
-    lta_rc_mock.request.assert_called_with("PATCH", '/Bundles/398ca1ed-0178-4333-a323-8b9158c3dd88', mocker.ANY)
+    outcomes = await p._write_bundles_to_hpss(bundles)
+    assert outcomes["bundle-0"] is None
+    assert isinstance(outcomes["bundle-1"], InvalidChecksumException)
 
 
 @pytest.mark.asyncio
-async def test_nersc_mover_execute_hsi_command_failed(config: TestConfig, mocker: MockerFixture) -> None:
-    """Test that _execute_hsi_command will PATCH a bundle to quarantine on failure."""
-    run_mock = mocker.patch("lta.nersc_mover.run", new_callable=MagicMock)
-    run_mock.side_effect = [
-        ObjectLiteral(
-            returncode=0,
-            args=["/usr/common/software/bin/hpss_avail", "archive"],
-            stdout="some text on stdout",
-            stderr="some text on stderr",
-        ),
-        ObjectLiteral(
-            returncode=1,
-            args=['/usr/bin/hsi', 'mkdir', '-p', '/path/to/hpss/data/exp/IceCube/2019/filtered/PFFilt/1109'],
-            stdout="some text on stdout",
-            stderr="some text on stderr",
-        )
-    ]
+async def test_nersc_mover_write_bundles_to_hpss_aborted(config: TestConfig, fake_hsi: Path, tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    """Test that _write_bundles_to_hpss leaves out the bundles that an aborted HSI session did not get to."""
+    config["RSE_BASE_PATH"] = str(tmp_path / "rse")
+    monkeypatch.setenv("FAKE_HSI_FAIL", "bundle-0.zip")
+    monkeypatch.setenv("FAKE_HSI_ABORT", "1")
+    bundles = make_bundles(tmp_path, 2)
+    p = NerscMover(config, logging.getLogger())
+    outcomes = await p._write_bundles_to_hpss(bundles)
+    assert list(outcomes) == ["bundle-0"]
+    assert isinstance(outcomes["bundle-0"], HSIBatchItemFailedException)
+
+
+@pytest.mark.asyncio
+async def test_nersc_mover_write_bundles_to_hpss_session_failed(config: TestConfig, tmp_path: Path) -> None:
+    """Test that _write_bundles_to_hpss raises when the HSI session fails without reporting on any bundle."""
+    config["HSI_PATH"] = "/bin/false"
+    config["RSE_BASE_PATH"] = str(tmp_path / "rse")
+    bundles = make_bundles(tmp_path, 2)
+    p = NerscMover(config, logging.getLogger())
+    with pytest.raises(HSICommandFailedException) as excinfo:
+        await p._write_bundles_to_hpss(bundles)
+    assert "tape bundles to HPSS" in str(excinfo.value)
+
+
+@pytest.mark.asyncio
+async def test_nersc_mover_do_work_claim_batch(config: TestConfig, tmp_path: Path, mocker: MockerFixture) -> None:
+    """Test that _do_work_claim quarantines only the Bundles that failed and unclaims the ones HSI did not get to."""
+    config["MAX_COUNT"] = "3"
+    config["RSE_BASE_PATH"] = str(tmp_path / "rse")
+    avail_mock = mocker.patch("lta.hpss_avail.HpssAvailMonitor.is_available", new_callable=AsyncMock)
+    avail_mock.return_value = True
+    bundles = make_bundles(tmp_path, 3)
+    # HSI taped bundle-0, failed on bundle-1, and gave up before bundle-2
+    hsi_run_mock = mocker.patch("lta.hsi.run_command", new_callable=AsyncMock)
+    hsi_run_mock.return_value = ObjectLiteral(
+        returncode=72,
+        args=["/usr/bin/hsi", "-P", "in", "/tmp/lta-hsi-xyz.cmd"],
+        stdout=(
+            "*** put: Error on HPSS file /path/to/hpss/data/exp/IceCube/2019/filtered/PFFilt/1109/bundle-1.zip: Injected failure\n"
+            f"{bundles[0]['checksum']['sha512']} sha512 /path/to/hpss/data/exp/IceCube/2019/filtered/PFFilt/1109/bundle-0.zip [hsi]\n"
+        ).encode("utf-8"),
+        stderr=b"",
+    )
     lta_rc_mock = AsyncMock()
     lta_rc_mock.request = AsyncMock()
-    lta_rc_mock.request.side_effect = [
-        {
-            "bundle": {
-                "uuid": "398ca1ed-0178-4333-a323-8b9158c3dd88",
-                "bundle_path": "/path/on/source/rse/398ca1ed-0178-4333-a323-8b9158c3dd88.zip",
-                "path": "/data/exp/IceCube/2019/filtered/PFFilt/1109",
-                "status": "taping",
-                "type": "Bundle",
-            },
-        },
-        {
-            "type": "Bundle",
-        },
-    ]
+    lta_rc_mock.request.side_effect = [{"bundle": b} for b in bundles] + [{}, {}, {}]
     p = NerscMover(config, logging.getLogger())
-    with pytest.raises(HSICommandFailedException):
-        await p._do_work_claim(lta_rc_mock, MagicMock())
-    lta_rc_mock.request.assert_called_with("PATCH", '/Bundles/398ca1ed-0178-4333-a323-8b9158c3dd88', mocker.ANY)
+    assert await p._do_work_claim(lta_rc_mock, MagicMock())
+    assert hsi_run_mock.call_count == 1
+    lta_rc_mock.request.assert_has_calls([
+        call("PATCH", "/Bundles/bundle-0", {
+            "status": "verifying",
+            "reason": "",
+            "update_timestamp": mocker.ANY,
+            "claimed": False,
+        }),
+        call("PATCH", "/Bundles/bundle-1", {
+            "original_status": "taping",
+            "status": "quarantined",
+            "reason": mocker.ANY,
+            "reason_details": mocker.ANY,
+            "work_priority_timestamp": mocker.ANY,
+        }),
+        call("PATCH", "/Bundles/bundle-2", {
+            "claimed": False,
+            "update_timestamp": mocker.ANY,
+        }),
+    ])
 
 
 @pytest.mark.asyncio
-async def test_nersc_mover_execute_hsi_command_success(config: TestConfig, mocker: MockerFixture) -> None:
-    """Test that _execute_hsi_command will PATCH a bundle to quarantine on failure."""
-    run_mock = mocker.patch("lta.nersc_mover.run", new_callable=MagicMock)
-    run_mock.side_effect = [
-        ObjectLiteral(
-            returncode=0,
-            args=["/usr/common/software/bin/hpss_avail", "archive"],
-            stdout="some text on stdout",
-            stderr="some text on stderr",
-        ),
-        ObjectLiteral(returncode=0),
-        ObjectLiteral(returncode=0)
-    ]
+async def test_nersc_mover_do_work_claim_batch_all_failed(config: TestConfig, fake_hsi: Path, tmp_path: Path, mocker: MockerFixture, monkeypatch: MonkeyPatch) -> None:
+    """Test that _do_work_claim raises when every Bundle in the batch fails."""
+    config["MAX_COUNT"] = "2"
+    config["RSE_BASE_PATH"] = str(tmp_path / "rse")
+    monkeypatch.setenv("FAKE_HSI_FAIL", "bundle-")
+    avail_mock = mocker.patch("lta.hpss_avail.HpssAvailMonitor.is_available", new_callable=AsyncMock)
+    avail_mock.return_value = True
+    bundles = make_bundles(tmp_path, 2)
     lta_rc_mock = AsyncMock()
     lta_rc_mock.request = AsyncMock()
-    lta_rc_mock.request.side_effect = [
-        {
-            "bundle": {
-                "uuid": "398ca1ed-0178-4333-a323-8b9158c3dd88",
-                "bundle_path": "/path/on/source/rse/398ca1ed-0178-4333-a323-8b9158c3dd88.zip",
-                "path": "/data/exp/IceCube/2019/filtered/PFFilt/1109",
-            },
-        },
-        {
-            "type": "Bundle",
-        },
-    ]
+    lta_rc_mock.request.side_effect = [{"bundle": b} for b in bundles] + [{}, {}]
     p = NerscMover(config, logging.getLogger())
-    await p._do_work_claim(lta_rc_mock, MagicMock())
-    lta_rc_mock.request.assert_called_with("PATCH", '/Bundles/398ca1ed-0178-4333-a323-8b9158c3dd88', mocker.ANY)
+    with pytest.raises(HSIBatchItemFailedException):
+        await p._do_work_claim(lta_rc_mock, MagicMock())
+    lta_rc_mock.request.assert_has_calls([
+        call("PATCH", "/Bundles/bundle-0", mocker.ANY),
+        call("PATCH", "/Bundles/bundle-1", mocker.ANY),
+    ])
@@ -1,13 +1,16 @@
 # test_nersc_retriever.py
 """Unit tests for lta/nersc_retriever.py."""
 import logging
+import os
+from pathlib import Path
+from subprocess import run
 
 # fmt:off
 
-from lta.utils import HSICommandFailedException
+from lta.utils import HSIBatchItemFailedException, HSICommandFailedException
 
 
-from typing import Dict
+from typing import Any, Dict, List
 from unittest.mock import AsyncMock, call, MagicMock
 
 import pytest
@@ -16,7 +19,7 @@ from pytest_mock import MockerFixture
 from tornado.web import HTTPError
 
 from lta.nersc_retriever import main_sync, NerscRetriever
-from .utils import ObjectLiteral
+from .utils import FAKE_HSI_PATH
 
 TestConfig = Dict[str, str]
 
@@ -30,11 +33,14 @@ def config() -> TestConfig:
         "COMPONENT_NAME": "testing-nersc-mover",
         "DEST_SITE": "WIPAC",
         "HPSS_AVAIL_PATH": "/path/to/hpss_avail.py",
+        "HPSS_AVAIL_TTL_SECONDS": "60",
+        "HSI_PATH": FAKE_HSI_PATH,
+        "HSI_TIMEOUT_SECONDS": "60",
         "INPUT_STATUS": "located",
         "LOG_LEVEL": "DEBUG",
         "LTA_AUTH_OPENID_URL": "localhost:12345",
         "LTA_REST_URL": "localhost:12347",
-        "MAX_COUNT": "5",
+        "MAX_COUNT": "1",
         "OUTPUT_STATUS": "staged",
         "PROMETHEUS_METRICS_PORT": "8080",
         "RSE_BASE_PATH": "/path/to/rse",
@@ -119,6 +125,9 @@ async def test_nersc_retriever_logs_configuration(mocker: MockerFixture) -> None
         "COMPONENT_NAME": "logme-testing-nersc-mover",
         "DEST_SITE": "WIPAC",
         "HPSS_AVAIL_PATH": "/log/me/path/to/hpss_avail.py",
+        "HPSS_AVAIL_TTL_SECONDS": "300",
+        "HSI_PATH": "/log/me/path/to/hsi",
+        "HSI_TIMEOUT_SECONDS": "6000",
         "INPUT_STATUS": "located",
         "LOG_LEVEL": "DEBUG",
         "LTA_AUTH_OPENID_URL": "localhost:12345",
@@ -143,6 +152,9 @@ async def test_nersc_retriever_logs_configuration(mocker: MockerFixture) -> None
         call('COMPONENT_NAME = logme-testing-nersc-mover'),
         call('DEST_SITE = WIPAC'),
         call('HPSS_AVAIL_PATH = /log/me/path/to/hpss_avail.py'),
+        call('HPSS_AVAIL_TTL_SECONDS = 300'),
+        call('HSI_PATH = /log/me/path/to/hsi'),
+        call('HSI_TIMEOUT_SECONDS = 6000'),
         call('INPUT_STATUS = located'),
         call('LOG_LEVEL = DEBUG'),
         call('LTA_AUTH_OPENID_URL = localhost:12345'),
@@ -204,13 +216,8 @@ async def test_nersc_retriever_do_work_yes_results(config: TestConfig, mocker: M
 @pytest.mark.asyncio
 async def test_nersc_retriever_hpss_not_available(config: TestConfig, mocker: MockerFixture) -> None:
     """Test that a bad returncode on hpss_avail will prevent work."""
-    run_mock = mocker.patch("lta.nersc_retriever.run", new_callable=MagicMock)
-    run_mock.return_value = ObjectLiteral(
-        returncode=1,
-        args=["/usr/common/software/bin/hpss_avail", "archive"],
-        stdout="some text on stdout",
-        stderr="some text on stderr",
-    )
+    avail_mock = mocker.patch("lta.hpss_avail.HpssAvailMonitor.is_available", new_callable=AsyncMock)
+    avail_mock.return_value = False
     p = NerscRetriever(config, logging.getLogger())
     assert not await p._do_work_claim(AsyncMock(), MagicMock())
 
@@ -218,13 +225,8 @@ async def test_nersc_retriever_hpss_not_available(config: TestConfig, mocker: Mo
 @pytest.mark.asyncio
 async def test_nersc_retriever_do_work_pop_exception(config: TestConfig, mocker: MockerFixture) -> None:
     """Test that _do_work raises when the RestClient can't pop."""
-    run_mock = mocker.patch("lta.nersc_retriever.run", new_callable=MagicMock)
-    run_mock.return_value = ObjectLiteral(
-        returncode=0,
-        args=["/usr/common/software/bin/hpss_avail", "archive"],
-        stdout="some text on stdout",
-        stderr="some text on stderr",
-    )
+    avail_mock = mocker.patch("lta.hpss_avail.HpssAvailMonitor.is_available", new_callable=AsyncMock)
+    avail_mock.return_value = True
     lta_rc_mock = AsyncMock()
     lta_rc_mock.request = AsyncMock()
     lta_rc_mock.request.side_effect = [
@@ -239,13 +241,8 @@ async def test_nersc_retriever_do_work_pop_exception(config: TestConfig, mocker:
 @pytest.mark.asyncio
 async def test_nersc_retriever_do_work_claim_no_result(config: TestConfig, mocker: MockerFixture) -> None:
     """Test that _do_work_claim does not work when the LTA DB has no work."""
-    run_mock = mocker.patch("lta.nersc_retriever.run", new_callable=MagicMock)
-    run_mock.return_value = ObjectLiteral(
-        returncode=0,
-        args=["/usr/common/software/bin/hpss_avail", "archive"],
-        stdout="some text on stdout",
-        stderr="some text on stderr",
-    )
+    avail_mock = mocker.patch("lta.hpss_avail.HpssAvailMonitor.is_available", new_callable=AsyncMock)
+    avail_mock.return_value = True
     lta_rc_mock = AsyncMock()
     lta_rc_mock.request = AsyncMock()
     lta_rc_mock.request.side_effect = [
@@ -253,47 +250,46 @@ async def test_nersc_retriever_do_work_claim_no_result(config: TestConfig, mocke
             "bundle": None
         }
     ]
-    wbth_mock = mocker.patch("lta.nersc_retriever.NerscRetriever._read_bundle_from_hpss", new_callable=AsyncMock)
+    rbfh_mock = mocker.patch("lta.nersc_retriever.NerscRetriever._read_bundles_from_hpss", new_callable=AsyncMock)
     p = NerscRetriever(config, logging.getLogger())
-    await p._do_work_claim(lta_rc_mock, MagicMock())
+    assert not await p._do_work_claim(lta_rc_mock, MagicMock())
     lta_rc_mock.request.assert_called_with("POST", '/Bundles/actions/pop?source=NERSC&dest=WIPAC&status=located', {'claimant': f'{p.name}-{p.instance_uuid}'})
-    wbth_mock.assert_not_called()
+    rbfh_mock.assert_not_called()
 
 
 @pytest.mark.asyncio
 async def test_nersc_retriever_do_work_claim_yes_result(config: TestConfig, mocker: MockerFixture) -> None:
     """Test that _do_work_claim processes the Bundle it gets from the LTA DB."""
-    run_mock = mocker.patch("lta.nersc_retriever.run", new_callable=MagicMock)
-    run_mock.return_value = ObjectLiteral(
-        returncode=0,
-        args=["/usr/common/software/bin/hpss_avail", "archive"],
-        stdout="some text on stdout",
-        stderr="some text on stderr",
-    )
+    avail_mock = mocker.patch("lta.hpss_avail.HpssAvailMonitor.is_available", new_callable=AsyncMock)
+    avail_mock.return_value = True
     lta_rc_mock = AsyncMock()
     lta_rc_mock.request = AsyncMock()
     lta_rc_mock.request.side_effect = [
         {
             "bundle": {"one": 1, "uuid": "abc123", "type": "Bundle"}
-        }
+        },
+        {},
     ]
-    wbth_mock = mocker.patch("lta.nersc_retriever.NerscRetriever._read_bundle_from_hpss", new_callable=AsyncMock)
+    pr_mock = mocker.patch("lta.nersc_retriever.NerscRetriever._plan_recall", new_callable=AsyncMock)
+    rbfh_mock = mocker.patch("lta.nersc_retriever.NerscRetriever._read_bundles_from_hpss", new_callable=AsyncMock)
+    rbfh_mock.return_value = {"abc123": None}
     p = NerscRetriever(config, logging.getLogger())
-    await p._do_work_claim(lta_rc_mock, MagicMock())
-    lta_rc_mock.request.assert_called_with("POST", '/Bundles/actions/pop?source=NERSC&dest=WIPAC&status=located', {'claimant': f'{p.name}-{p.instance_uuid}'})
-    wbth_mock.assert_called_with(mocker.ANY, {"one": 1, "uuid": "abc123", "type": "Bundle"})
+    assert await p._do_work_claim(lta_rc_mock, MagicMock())
+    pr_mock.assert_called_with(lta_rc_mock, {"one": 1, "uuid": "abc123", "type": "Bundle"})
+    rbfh_mock.assert_called_with([{"one": 1, "uuid": "abc123", "type": "Bundle"}])
+    lta_rc_mock.request.assert_called_with("PATCH", '/Bundles/abc123', {
+        "status": "staged",
+        "reason": "",
+        "update_timestamp": mocker.ANY,
+        "claimed": False,
+    })
 
 
 @pytest.mark.asyncio
 async def test_nersc_retriever_do_work_claim_write_bundle_raise_exception(config: TestConfig, mocker: MockerFixture) -> None:
     """Test that _do_work_claim will quarantine a bundle if an exception occurs."""
-    run_mock = mocker.patch("lta.nersc_retriever.run", new_callable=MagicMock)
-    run_mock.return_value = ObjectLiteral(
-        returncode=0,
-        args=["/usr/common/software/bin/hpss_avail", "archive"],
-        stdout="some text on stdout",
-        stderr="some text on stderr",
-    )
+    avail_mock = mocker.patch("lta.hpss_avail.HpssAvailMonitor.is_available", new_callable=AsyncMock)
+    avail_mock.return_value = True
     lta_rc_mock = AsyncMock()
     lta_rc_mock.request = AsyncMock()
     lta_rc_mock.request.side_effect = [
@@ -306,161 +302,244 @@ async def test_nersc_retriever_do_work_claim_write_bundle_raise_exception(config
         },
         {}
     ]
-    wbth_mock = mocker.patch("lta.nersc_retriever.NerscRetriever._read_bundle_from_hpss", new_callable=AsyncMock)
+    mocker.patch("lta.nersc_retriever.NerscRetriever._plan_recall", new_callable=AsyncMock)
+    rbfh_mock = mocker.patch("lta.nersc_retriever.NerscRetriever._read_bundles_from_hpss", new_callable=AsyncMock)
     exc = Exception("BAD THING HAPPEN!")
-    wbth_mock.side_effect = exc
+    rbfh_mock.side_effect = exc
     p = NerscRetriever(config, logging.getLogger())
     with pytest.raises(Exception) as excinfo:
         await p._do_work_claim(lta_rc_mock, MagicMock())
     assert excinfo.value == exc
     lta_rc_mock.request.assert_called_with("PATCH", '/Bundles/8f03a920-49d6-446b-811e-830e3f7942f5', mocker.ANY)
-    wbth_mock.assert_called_with(
-        mocker.ANY,
-        {"status": "located", "uuid": "8f03a920-49d6-446b-811e-830e3f7942f5", "type": "Bundle"}
+    rbfh_mock.assert_called_with(
+        [{"status": "located", "uuid": "8f03a920-49d6-446b-811e-830e3f7942f5", "type": "Bundle"}]
     )
 
 
+def put_bundles_on_tape(tmp_path: Path, count: int) -> List[Dict[str, Any]]:
+    """Use the fake hsi to put bundle files on tape, and return the Bundle records that describe them."""
+    bundles = []
+    for i in range(count):
+        bundle_file = tmp_path / f"bundle-{i}.zip"
+        contents = f"contents of bundle {i}".encode("utf-8")
+        bundle_file.write_bytes(contents)
+        hpss_path = f"/path/to/hpss/data/exp/IceCube/2019/filtered/PFFilt/1109/bundle-{i}.zip"
+        run([FAKE_HSI_PATH, f"mkdir -p {os.path.dirname(hpss_path)}; put -c on -H sha512 {bundle_file} : {hpss_path}"], check=True)
+        bundle_file.unlink()
+        bundles.append({
+            "uuid": f"bundle-{i}",
+            "type": "Bundle",
+            "status": "located",
+            "path": "/data/exp/IceCube/2019/filtered/PFFilt/1109",
+            "bundle_path": f"/path/on/tape/bundle-{i}.zip",
+            "size": len(contents),
+        })
+    (tmp_path / "fake_hsi.log").unlink()
+    return bundles
+
+
 @pytest.mark.asyncio
-async def test_nersc_retriever_read_bundle_from_hpss_hsi_get(config: TestConfig, mocker: MockerFixture) -> None:
-    """Test that _read_bundle_from_hpss executes an HSI command to read the file from tape."""
-    run_mock = mocker.patch("lta.nersc_retriever.run", new_callable=MagicMock)
-    run_mock.return_value = ObjectLiteral(
-        returncode=0,
-        args=["/usr/common/software/bin/hpss_avail", "archive"],
-        stdout="some text on stdout",
-        stderr="some text on stderr",
-    )
+async def test_nersc_retriever_read_bundles_from_hpss(config: TestConfig, fake_hsi: Path, tmp_path: Path) -> None:
+    """Test that _read_bundles_from_hpss copies a batch of bundles from tape with a single HSI session."""
+    config["RSE_BASE_PATH"] = str(tmp_path / "rse")
+    (tmp_path / "rse").mkdir()
+    bundles = put_bundles_on_tape(tmp_path, 3)
+    p = NerscRetriever(config, logging.getLogger())
+    assert await p._read_bundles_from_hpss(bundles) == {
+        "bundle-0": None,
+        "bundle-1": None,
+        "bundle-2": None,
+    }
+    for i in range(3):
+        assert (tmp_path / "rse" / f"bundle-{i}.zip").read_bytes() == f"contents of bundle {i}".encode("utf-8")
+    assert len((tmp_path / "fake_hsi.log").read_text().splitlines()) == 1
+
+
+@pytest.mark.asyncio
+async def test_nersc_retriever_read_bundles_from_hpss_partial_failure(config: TestConfig, fake_hsi: Path, tmp_path: Path) -> None:
+    """Test that _read_bundles_from_hpss only reports the bundles that failed."""
+    config["RSE_BASE_PATH"] = str(tmp_path / "rse")
+    (tmp_path / "rse").mkdir()
+    bundles = put_bundles_on_tape(tmp_path, 3)
+    # somebody deleted bundle-1 from tape
+    (fake_hsi / "path/to/hpss/data/exp/IceCube/2019/filtered/PFFilt/1109/bundle-1.zip").unlink()
+    p = NerscRetriever(config, logging.getLogger())
+    outcomes = await p._read_bundles_from_hpss(bundles)
+    assert outcomes["bundle-0"] is None
+    assert isinstance(outcomes["bundle-1"], HSIBatchItemFailedException)
+    assert outcomes["bundle-2"] is None
+
+
+@pytest.mark.asyncio
+async def test_nersc_retriever_read_bundles_from_hpss_stale_file(config: TestConfig, fake_hsi: Path, tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    """Test that _read_bundles_from_hpss does not mistake a file left by an earlier attempt for a copy."""
+    config["RSE_BASE_PATH"] = str(tmp_path / "rse")
+    (tmp_path / "rse").mkdir()
+    bundles = put_bundles_on_tape(tmp_path, 2)
+    # an earlier attempt left partial copies behind, and HSI stops before it gets to bundle-1
+    for i in range(2):
+        (tmp_path / "rse" / f"bundle-{i}.zip").write_bytes(b"partial")
+    monkeypatch.setenv("FAKE_HSI_FAIL", "bundle-0.zip")
+    monkeypatch.setenv("FAKE_HSI_ABORT", "1")
+    p = NerscRetriever(config, logging.getLogger())
+    outcomes = await p._read_bundles_from_hpss(bundles)
+    assert isinstance(outcomes["bundle-0"], HSIBatchItemFailedException)
+    assert "bundle-1" not in outcomes
+    assert not (tmp_path / "rse" / "bundle-1.zip").exists()
+
+
+@pytest.mark.asyncio
+async def test_nersc_retriever_read_bundles_from_hpss_short_copy(config: TestConfig, fake_hsi: Path, tmp_path: Path) -> None:
+    """Test that _read_bundles_from_hpss fails a bundle whose copy does not have the size of the bundle."""
+    config["RSE_BASE_PATH"] = str(tmp_path / "rse")
+    (tmp_path / "rse").mkdir()
+    bundles = put_bundles_on_tape(tmp_path, 2)
+    bundles[1]["size"] += 1
+    p = NerscRetriever(config, logging.getLogger())
+    outcomes = await p._read_bundles_from_hpss(bundles)
+    assert outcomes["bundle-0"] is None
+    assert isinstance(outcomes["bundle-1"], HSIBatchItemFailedException)
+    assert "expected" in str(outcomes["bundle-1"])
+
+
+@pytest.mark.asyncio
+async def test_nersc_retriever_read_bundles_from_hpss_session_failed(config: TestConfig, tmp_path: Path) -> None:
+    """Test that _read_bundles_from_hpss raises when the HSI session fails without reporting on any bundle."""
+    config["HSI_PATH"] = "/bin/false"
+    config["RSE_BASE_PATH"] = str(tmp_path / "rse")
+    p = NerscRetriever(config, logging.getLogger())
+    bundle = {
+        "uuid": "398ca1ed-0178-4333-a323-8b9158c3dd88",
+        "bundle_path": "/path/on/source/rse/398ca1ed-0178-4333-a323-8b9158c3dd88.zip",
+        "path": "/data/exp/IceCube/2019/filtered/PFFilt/1109",
+    }
+    with pytest.raises(HSICommandFailedException) as excinfo:
+        await p._read_bundles_from_hpss([bundle])
+    assert "read bundles from HPSS" in str(excinfo.value)
+
+
+@pytest.mark.asyncio
+async def test_nersc_retriever_do_work_claim_batch(config: TestConfig, fake_hsi: Path, tmp_path: Path, mocker: MockerFixture, monkeypatch: MonkeyPatch) -> None:
+    """Test that _do_work_claim quarantines only the Bundles that failed and unclaims the ones HSI did not get to."""
+    config["MAX_COUNT"] = "3"
+    config["RSE_BASE_PATH"] = str(tmp_path / "rse")
+    (tmp_path / "rse").mkdir()
+    avail_mock = mocker.patch("lta.hpss_avail.HpssAvailMonitor.is_available", new_callable=AsyncMock)
+    avail_mock.return_value = True
+    bundles = put_bundles_on_tape(tmp_path, 3)
+    monkeypatch.setenv("FAKE_HSI_FAIL", "bundle-1.zip")
+    monkeypatch.setenv("FAKE_HSI_ABORT", "1")
     lta_rc_mock = AsyncMock()
     lta_rc_mock.request = AsyncMock()
     lta_rc_mock.request.side_effect = [
-        {
-            "bundle": {
-                "uuid": "398ca1ed-0178-4333-a323-8b9158c3dd88",
-                "bundle_path": "/path/on/source/rse/398ca1ed-0178-4333-a323-8b9158c3dd88.zip",
-                "path": "/data/exp/IceCube/2019/filtered/PFFilt/1109",
-                "status": "located",
-                "type": "Bundle",
-            },
-        },
-        {
-            "type": "Bundle",
-        },
+        {"bundle": bundles[0]},
+        {},  # record the tape location of bundle-0
+        {"bundle": bundles[1]},
+        {"bundle": bundles[2]},
+        {"bundle": None},
+        {}, {}, {},
     ]
-    ehc_mock = mocker.patch("lta.nersc_retriever.NerscRetriever._execute_hsi_command", new_callable=MagicMock)
-    exc = HSICommandFailedException("from test", MagicMock(), MagicMock())
-    ehc_mock.side_effect = exc
     p = NerscRetriever(config, logging.getLogger())
-    with pytest.raises(type(exc)) as excinfo:
-        await p._do_work_claim(lta_rc_mock, MagicMock())
-    assert excinfo.value == exc
-    ehc_mock.assert_called_with(['/usr/bin/hsi', 'get', '-c', 'on', '/path/to/rse/398ca1ed-0178-4333-a323-8b9158c3dd88.zip', ':', '/path/to/hpss/data/exp/IceCube/2019/filtered/PFFilt/1109/398ca1ed-0178-4333-a323-8b9158c3dd88.zip'])
-    lta_rc_mock.request.assert_called_with("PATCH", '/Bundles/398ca1ed-0178-4333-a323-8b9158c3dd88', mocker.ANY)
+    assert await p._do_work_claim(lta_rc_mock, MagicMock())
+    lta_rc_mock.request.assert_has_calls([
+        call("PATCH", "/Bundles/bundle-0", {
+            "status": "staged",
+            "reason": "",
+            "update_timestamp": mocker.ANY,
+            "claimed": False,
+        }),
+        call("PATCH", "/Bundles/bundle-1", {
+            "original_status": "located",
+            "status": "quarantined",
+            "reason": mocker.ANY,
+            "reason_details": mocker.ANY,
+            "work_priority_timestamp": mocker.ANY,
+        }),
+        call("PATCH", "/Bundles/bundle-2", {
+            "claimed": False,
+            "update_timestamp": mocker.ANY,
+        }),
+    ])
 
 
 @pytest.mark.asyncio
-async def test_nersc_retriever_read_bundle_from_hpss(config: TestConfig, mocker: MockerFixture) -> None:
-    """Test that _read_bundle_from_hpss updates the LTA DB after success."""
-    run_mock = mocker.patch("lta.nersc_retriever.run", new_callable=MagicMock)
-    run_mock.return_value = ObjectLiteral(
-        returncode=0,
-        args=["/usr/common/software/bin/hpss_avail", "archive"],
-        stdout="some text on stdout",
-        stderr="some text on stderr",
-    )
+async def test_nersc_retriever_plan_recall(config: TestConfig, fake_hsi: Path, tmp_path: Path, mocker: MockerFixture) -> None:
+    """Test that _plan_recall records the tape location of the pending Bundles of a request with a single HSI session."""
+    bundles = put_bundles_on_tape(tmp_path, 4)
+    for bundle in bundles:
+        bundle["request"] = "d8a4f2f3-c2d6-4a4b-a2d1-1e5e8a9a3d1c"
+    # bundle-3 was planned by an earlier recall
+    bundles[3]["tape"] = {"volume": "EA000000", "position": 3}
     lta_rc_mock = AsyncMock()
     lta_rc_mock.request = AsyncMock()
     lta_rc_mock.request.side_effect = [
-        {
-            "bundle": {
-                "uuid": "398ca1ed-0178-4333-a323-8b9158c3dd88",
-                "bundle_path": "/path/on/source/rse/398ca1ed-0178-4333-a323-8b9158c3dd88.zip",
-                "path": "/data/exp/IceCube/2019/filtered/PFFilt/1109",
-                "status": "located",
-                "type": "Bundle",
-            },
-        },
-        {
-            "type": "Bundle",
-        },
+        {"results": bundles},
+        {},
     ]
-    ehc_mock = mocker.patch("lta.nersc_retriever.NerscRetriever._execute_hsi_command", new_callable=MagicMock)
-    ehc_mock.side_effect = [None, None]
     p = NerscRetriever(config, logging.getLogger())
-    await p._do_work_claim(lta_rc_mock, MagicMock())
-    ehc_mock.assert_called_with(['/usr/bin/hsi', 'get', '-c', 'on', '/path/to/rse/398ca1ed-0178-4333-a323-8b9158c3dd88.zip', ':', '/path/to/hpss/data/exp/IceCube/2019/filtered/PFFilt/1109/398ca1ed-0178-4333-a323-8b9158c3dd88.zip'])
-    lta_rc_mock.request.assert_called_with("PATCH", '/Bundles/398ca1ed-0178-4333-a323-8b9158c3dd88', mocker.ANY)
+    await p._plan_recall(lta_rc_mock, bundles[0])
+    assert bundles[0]["tape"] == {"volume": "EA000000", "position": 0}
+    # one request to find the pending Bundles, and one to record where they are on tape
+    lta_rc_mock.request.assert_has_calls([
+        call("GET", "/Bundles?request=d8a4f2f3-c2d6-4a4b-a2d1-1e5e8a9a3d1c&status=located&fields=uuid,path,bundle_path,tape"),
+        call("POST", "/Bundles/actions/bulk_update", {"updates": {
+            "bundle-0": {"tape": {"volume": "EA000000", "position": 0}, "update_timestamp": mocker.ANY},
+            "bundle-1": {"tape": {"volume": "EA000000", "position": 1}, "update_timestamp": mocker.ANY},
+            "bundle-2": {"tape": {"volume": "EA000000", "position": 2}, "update_timestamp": mocker.ANY},
+        }}),
+    ])
+    assert lta_rc_mock.request.call_count == 2
+    assert len((tmp_path / "fake_hsi.log").read_text().splitlines()) == 1
 
 
 @pytest.mark.asyncio
-async def test_nersc_retriever_execute_hsi_command_failed(config: TestConfig, mocker: MockerFixture) -> None:
-    """Test that _execute_hsi_command will PATCH a bundle to quarantine on failure."""
-    run_mock = mocker.patch("lta.nersc_retriever.run", new_callable=MagicMock)
-    run_mock.side_effect = [
-        ObjectLiteral(
-            returncode=0,
-            args=["/usr/common/software/bin/hpss_avail", "archive"],
-            stdout="some text on stdout",
-            stderr="some text on stderr",
-        ),
-        ObjectLiteral(
-            returncode=1,
-            args=['/usr/bin/hsi', 'mkdir', '-p', '/path/to/hpss/data/exp/IceCube/2019/filtered/PFFilt/1109'],
-            stdout="some text on stdout",
-            stderr="some text on stderr",
-        )
+async def test_nersc_retriever_do_work_claim_tape_order(config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that _do_work_claim fills the batch from the same tape volume and reads it front to back."""
+    config["MAX_COUNT"] = "5"
+    avail_mock = mocker.patch("lta.hpss_avail.HpssAvailMonitor.is_available", new_callable=AsyncMock)
+    avail_mock.return_value = True
+    bundles = [
+        {"uuid": "bundle-0", "type": "Bundle", "tape": {"volume": "EA871300", "position": 3729}},
+        {"uuid": "bundle-1", "type": "Bundle", "tape": {"volume": "EA871300", "position": 51}},
+        {"uuid": "bundle-2", "type": "Bundle", "tape": {"volume": "EA871300", "position": 1024}},
     ]
     lta_rc_mock = AsyncMock()
     lta_rc_mock.request = AsyncMock()
-    lta_rc_mock.request.side_effect = [
-        {
-            "bundle": {
-                "uuid": "398ca1ed-0178-4333-a323-8b9158c3dd88",
-                "bundle_path": "/path/on/source/rse/398ca1ed-0178-4333-a323-8b9158c3dd88.zip",
-                "path": "/data/exp/IceCube/2019/filtered/PFFilt/1109",
-                "status": "located",
-                "type": "Bundle",
-            },
-        },
-        {
-            "type": "Bundle",
-        },
-    ]
+    lta_rc_mock.request.side_effect = [{"bundle": b} for b in bundles] + [{"bundle": None}, {}, {}, {}]
+    pr_mock = mocker.patch("lta.nersc_retriever.NerscRetriever._plan_recall", new_callable=AsyncMock)
+    rbfh_mock = mocker.patch("lta.nersc_retriever.NerscRetriever._read_bundles_from_hpss", new_callable=AsyncMock)
+    rbfh_mock.return_value = {"bundle-0": None, "bundle-1": None, "bundle-2": None}
     p = NerscRetriever(config, logging.getLogger())
-    with pytest.raises(HSICommandFailedException):
-        await p._do_work_claim(lta_rc_mock, MagicMock())
-    lta_rc_mock.request.assert_called_with("PATCH", '/Bundles/398ca1ed-0178-4333-a323-8b9158c3dd88', mocker.ANY)
+    assert await p._do_work_claim(lta_rc_mock, MagicMock())
+    pr_mock.assert_not_called()
+    claimant = {'claimant': f'{p.name}-{p.instance_uuid}'}
+    lta_rc_mock.request.assert_has_calls([
+        call("POST", "/Bundles/actions/pop?source=NERSC&dest=WIPAC&status=located", claimant),
+        call("POST", "/Bundles/actions/pop?source=NERSC&dest=WIPAC&status=located&tape_volume=EA871300", claimant),
+        call("POST", "/Bundles/actions/pop?source=NERSC&dest=WIPAC&status=located&tape_volume=EA871300", claimant),
+        call("POST", "/Bundles/actions/pop?source=NERSC&dest=WIPAC&status=located&tape_volume=EA871300", claimant),
+    ])
+    rbfh_mock.assert_called_with([bundles[1], bundles[2], bundles[0]])
 
 
 @pytest.mark.asyncio
-async def test_nersc_retriever_execute_hsi_command_success(config: TestConfig, mocker: MockerFixture) -> None:
-    """Test that _execute_hsi_command will PATCH a bundle to quarantine on failure."""
-    run_mock = mocker.patch("lta.nersc_retriever.run", new_callable=MagicMock)
-    run_mock.side_effect = [
-        ObjectLiteral(
-            returncode=0,
-            args=["/usr/common/software/bin/hpss_avail", "archive"],
-            stdout="some text on stdout",
-            stderr="some text on stderr",
-        ),
-        ObjectLiteral(returncode=0),
-        ObjectLiteral(returncode=0)
+async def test_nersc_retriever_do_work_claim_front_of_tape(config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that _do_work_claim reads the front of the tape volume, even if the first Bundle is further along."""
+    config["MAX_COUNT"] = "2"
+    avail_mock = mocker.patch("lta.hpss_avail.HpssAvailMonitor.is_available", new_callable=AsyncMock)
+    avail_mock.return_value = True
+    bundles = [
+        {"uuid": "bundle-0", "type": "Bundle", "tape": {"volume": "EA871300", "position": 3729}},
+        {"uuid": "bundle-1", "type": "Bundle", "tape": {"volume": "EA871300", "position": 51}},
+        {"uuid": "bundle-2", "type": "Bundle", "tape": {"volume": "EA871300", "position": 1024}},
     ]
     lta_rc_mock = AsyncMock()
     lta_rc_mock.request = AsyncMock()
-    lta_rc_mock.request.side_effect = [
-        {
-            "bundle": {
-                "uuid": "398ca1ed-0178-4333-a323-8b9158c3dd88",
-                "bundle_path": "/path/on/source/rse/398ca1ed-0178-4333-a323-8b9158c3dd88.zip",
-                "path": "/data/exp/IceCube/2019/filtered/PFFilt/1109",
-                "status": "located",
-                "type": "Bundle",
-            },
-        },
-        {
-            "type": "Bundle",
-        },
-    ]
+    lta_rc_mock.request.side_effect = [{"bundle": b} for b in bundles] + [{}, {}, {}]
+    rbfh_mock = mocker.patch("lta.nersc_retriever.NerscRetriever._read_bundles_from_hpss", new_callable=AsyncMock)
+    rbfh_mock.return_value = {"bundle-1": None, "bundle-2": None}
     p = NerscRetriever(config, logging.getLogger())
-    await p._do_work_claim(lta_rc_mock, MagicMock())
-    lta_rc_mock.request.assert_called_with("PATCH", '/Bundles/398ca1ed-0178-4333-a323-8b9158c3dd88', mocker.ANY)
+    assert await p._do_work_claim(lta_rc_mock, MagicMock())
+    rbfh_mock.assert_called_with([bundles[1], bundles[2]])
+    # bundle-0 waits for a later batch
+    lta_rc_mock.request.assert_any_call("PATCH", "/Bundles/bundle-0", {"claimed": False, "update_timestamp": mocker.ANY})
@@ -1,13 +1,18 @@
 # test_nersc_verifier.py
 """Unit tests for lta/nersc_verifier.py."""
+import asyncio
 import logging
+import os
 from pathlib import Path
+from subprocess import run
 
 # fmt:off
 
-from lta.utils import HSICommandFailedException, InvalidChecksumException
+from lta.crypto import sha512sum
+from lta.lta_types import BundleType
+from lta.utils import HSIBatchItemFailedException, HSICommandFailedException, InvalidChecksumException
 
-from typing import Dict
+from typing import Dict, List, Optional
 from unittest.mock import AsyncMock, call, MagicMock
 from uuid import uuid1
 
@@ -17,7 +22,7 @@ from pytest_mock import MockerFixture
 from tornado.web import HTTPError
 
 from lta.nersc_verifier import main_sync, NerscVerifier
-from .utils import ObjectLiteral
+from .utils import FAKE_HSI_PATH, ObjectLiteral
 
 TestConfig = Dict[str, str]
 
@@ -30,11 +35,16 @@ def config() -> TestConfig:
         "CLIENT_SECRET": "hunter2",  # http://bash.org/?244321
         "COMPONENT_NAME": "testing-nersc_verifier",
         "DEST_SITE": "NERSC",
+        "HASHVERIFY_CONCURRENCY": "2",
         "HPSS_AVAIL_PATH": "/path/to/hpss_avail.py",
+        "HPSS_AVAIL_TTL_SECONDS": "60",
+        "HSI_PATH": FAKE_HSI_PATH,
+        "HSI_TIMEOUT_SECONDS": "60",
         "INPUT_STATUS": "verifying",
         "LOG_LEVEL": "DEBUG",
         "LTA_AUTH_OPENID_URL": "localhost:12345",
         "LTA_REST_URL": "localhost:12347",
+        "MAX_COUNT": "1",
         "OUTPUT_STATUS": "completed",
         "PROMETHEUS_METRICS_PORT": "8080",
         "RUN_ONCE_AND_DIE": "False",
@@ -58,6 +68,7 @@ def test_constructor_config(config: TestConfig, mocker: MockerFixture) -> None:
     assert p.work_retries == 3
     assert p.work_sleep_duration_seconds == 60
     assert p.work_timeout_seconds == 30
+    assert p.hashverify_concurrency == 2
     assert p.logger == logging.getLogger()
 
 
@@ -76,11 +87,16 @@ async def test_nersc_verifier_logs_configuration(mocker: MockerFixture) -> None:
         "CLIENT_SECRET": "hunter2",  # http://bash.org/?244321
         "COMPONENT_NAME": "logme-testing-nersc_verifier",
         "DEST_SITE": "NERSC",
+        "HASHVERIFY_CONCURRENCY": "4",
         "HPSS_AVAIL_PATH": "/log/me/path/to/hpss_avail.py",
+        "HPSS_AVAIL_TTL_SECONDS": "300",
+        "HSI_PATH": "/log/me/path/to/hsi",
+        "HSI_TIMEOUT_SECONDS": "6000",
         "INPUT_STATUS": "verifying",
         "LOG_LEVEL": "DEBUG",
         "LTA_AUTH_OPENID_URL": "localhost:12345",
         "LTA_REST_URL": "logme-http://RmMNHdPhHpH2ZxfaFAC9d2jiIbf5pZiHDqy43rFLQiM.com/",
+        "MAX_COUNT": "9001",
         "OUTPUT_STATUS": "completed",
         "PROMETHEUS_METRICS_PORT": "8080",
         "RUN_ONCE_AND_DIE": "False",
@@ -98,11 +114,16 @@ async def test_nersc_verifier_logs_configuration(mocker: MockerFixture) -> None:
         call('CLIENT_SECRET = [秘密]'),
         call('COMPONENT_NAME = logme-testing-nersc_verifier'),
         call('DEST_SITE = NERSC'),
+        call('HASHVERIFY_CONCURRENCY = 4'),
         call('HPSS_AVAIL_PATH = /log/me/path/to/hpss_avail.py'),
+        call('HPSS_AVAIL_TTL_SECONDS = 300'),
+        call('HSI_PATH = /log/me/path/to/hsi'),
+        call('HSI_TIMEOUT_SECONDS = 6000'),
         call('INPUT_STATUS = verifying'),
         call('LOG_LEVEL = DEBUG'),
         call('LTA_AUTH_OPENID_URL = localhost:12345'),
         call('LTA_REST_URL = logme-http://RmMNHdPhHpH2ZxfaFAC9d2jiIbf5pZiHDqy43rFLQiM.com/'),
+        call('MAX_COUNT = 9001'),
         call('OUTPUT_STATUS = completed'),
         call('PROMETHEUS_METRICS_PORT = 8080'),
         call('RUN_ONCE_AND_DIE = False'),
@@ -158,13 +179,8 @@ async def test_nersc_verifier_run_exception(config: TestConfig, mocker: MockerFi
 @pytest.mark.asyncio
 async def test_nersc_verifier_hpss_not_available(config: TestConfig, mocker: MockerFixture) -> None:
     """Test that a bad returncode on hpss_avail will prevent work."""
-    run_mock = mocker.patch("lta.nersc_verifier.run", new_callable=MagicMock)
-    run_mock.return_value = ObjectLiteral(
-        returncode=1,
-        args=["/usr/common/software/bin/hpss_avail", "archive"],
-        stdout="some text on stdout",
-        stderr="some text on stderr",
-    )
+    avail_mock = mocker.patch("lta.hpss_avail.HpssAvailMonitor.is_available", new_callable=AsyncMock)
+    avail_mock.return_value = False
     p = NerscVerifier(config, logging.getLogger())
     assert not await p._do_work_claim(AsyncMock(), MagicMock())
 
@@ -172,21 +188,8 @@ async def test_nersc_verifier_hpss_not_available(config: TestConfig, mocker: Moc
 @pytest.mark.asyncio
 async def test_nersc_verifier_do_work_pop_exception(config: TestConfig, mocker: MockerFixture) -> None:
     """Test that _do_work raises when the RestClient can't pop."""
-    run_mock = mocker.patch("lta.nersc_verifier.run", new_callable=MagicMock)
-    run_mock.side_effect = [
-        ObjectLiteral(
-            returncode=0,
-            args=["/usr/common/software/bin/hpss_avail", "archive"],
-            stdout="some text on stdout",
-            stderr="some text on stderr",
-        ),
-        ObjectLiteral(
-            returncode=0,
-            args=["/usr/bin/which", "hsi"],
-            stdout="some text on stdout",
-            stderr="some text on stderr",
-        ),
-    ]
+    avail_mock = mocker.patch("lta.hpss_avail.HpssAvailMonitor.is_available", new_callable=AsyncMock)
+    avail_mock.return_value = True
     lta_rc_mock = AsyncMock()
     lta_rc_mock.request = AsyncMock()
     lta_rc_mock.request.side_effect = HTTPError(500, "LTA DB on fire. Again.")
@@ -219,29 +222,16 @@ async def test_nersc_verifier_do_work_yes_results(config: TestConfig, mocker: Mo
 @pytest.mark.asyncio
 async def test_nersc_verifier_do_work_claim_no_result(config: TestConfig, mocker: MockerFixture) -> None:
     """Test that _do_work_claim does not work when the LTA DB has no work."""
-    run_mock = mocker.patch("lta.nersc_verifier.run", new_callable=MagicMock)
-    run_mock.side_effect = [
-        ObjectLiteral(
-            returncode=0,
-            args=["/usr/common/software/bin/hpss_avail", "archive"],
-            stdout="some text on stdout",
-            stderr="some text on stderr",
-        ),
-        ObjectLiteral(
-            returncode=0,
-            args=["/usr/bin/which", "hsi"],
-            stdout="some text on stdout",
-            stderr="some text on stderr",
-        ),
-    ]
+    avail_mock = mocker.patch("lta.hpss_avail.HpssAvailMonitor.is_available", new_callable=AsyncMock)
+    avail_mock.return_value = True
     lta_rc_mock = AsyncMock()
     lta_rc_mock.request = AsyncMock()
     lta_rc_mock.request.return_value = {
         "bundle": None
     }
-    vbih_mock = mocker.patch("lta.nersc_verifier.NerscVerifier._verify_bundle_in_hpss", new_callable=MagicMock)
+    vbih_mock = mocker.patch("lta.nersc_verifier.NerscVerifier._verify_bundles_in_hpss", new_callable=AsyncMock)
     p = NerscVerifier(config, logging.getLogger())
-    await p._do_work_claim(lta_rc_mock, MagicMock())
+    assert not await p._do_work_claim(lta_rc_mock, MagicMock())
     lta_rc_mock.request.assert_called_with("POST", '/Bundles/actions/pop?source=WIPAC&dest=NERSC&status=verifying', {'claimant': f'{p.name}-{p.instance_uuid}'})
     vbih_mock.assert_not_called()
 
@@ -249,53 +239,35 @@ async def test_nersc_verifier_do_work_claim_no_result(config: TestConfig, mocker
 @pytest.mark.asyncio
 async def test_nersc_verifier_do_work_claim_yes_result(config: TestConfig, mocker: MockerFixture) -> None:
     """Test that _do_work_claim processes the Bundle that it gets from the LTA DB."""
-    run_mock = mocker.patch("lta.nersc_verifier.run", new_callable=MagicMock)
-    run_mock.side_effect = [
-        ObjectLiteral(
-            returncode=0,
-            args=["/usr/common/software/bin/hpss_avail", "archive"],
-            stdout="some text on stdout",
-            stderr="some text on stderr",
-        ),
-        ObjectLiteral(
-            returncode=0,
-            args=["/usr/bin/which", "hsi"],
-            stdout="some text on stdout",
-            stderr="some text on stderr",
-        ),
-    ]
+    avail_mock = mocker.patch("lta.hpss_avail.HpssAvailMonitor.is_available", new_callable=AsyncMock)
+    avail_mock.return_value = True
+    bundle = {
+        "one": 1,
+        "uuid": "abc123",
+        "type": "Bundle",
+        "path": "/data/exp/IceCube/2019/filtered/PFFilt/1109",
+        "bundle_path": "/path/to/source/rse/abc123.zip",
+    }
     lta_rc_mock = AsyncMock()
     lta_rc_mock.request = AsyncMock()
     lta_rc_mock.request.return_value = {
-        "bundle": {"one": 1, "uuid": "abc123", "type": "Bundle"}
+        "bundle": bundle
     }
-    vbih_mock = mocker.patch("lta.nersc_verifier.NerscVerifier._verify_bundle_in_hpss", new_callable=MagicMock)
+    vbih_mock = mocker.patch("lta.nersc_verifier.NerscVerifier._verify_bundles_in_hpss", new_callable=AsyncMock)
+    vbih_mock.return_value = {"abc123": None}
     ubild_mock = mocker.patch("lta.nersc_verifier.NerscVerifier._update_bundle_in_lta_db", new_callable=AsyncMock)
     p = NerscVerifier(config, logging.getLogger())
     assert await p._do_work_claim(lta_rc_mock, MagicMock())
     lta_rc_mock.request.assert_called_with("POST", '/Bundles/actions/pop?source=WIPAC&dest=NERSC&status=verifying', {'claimant': f'{p.name}-{p.instance_uuid}'})
-    vbih_mock.assert_called_with({"one": 1, "uuid": "abc123", "type": "Bundle"})
-    ubild_mock.assert_called_with(lta_rc_mock, {"one": 1, "uuid": "abc123", "type": "Bundle"}, vbih_mock.return_value)
+    vbih_mock.assert_called_with([bundle], mocker.ANY)
+    ubild_mock.assert_called_with(lta_rc_mock, bundle, Path("/path/to/hpss/data/exp/IceCube/2019/filtered/PFFilt/1109/abc123.zip"))
 
 
 @pytest.mark.asyncio
 async def test_nersc_verifier_do_work_claim_exception_caught(config: TestConfig, mocker: MockerFixture) -> None:
     """Test that _do_work_claim quarantines a Bundle if it catches an Exception."""
-    run_mock = mocker.patch("lta.nersc_verifier.run", new_callable=MagicMock)
-    run_mock.side_effect = [
-        ObjectLiteral(
-            returncode=0,
-            args=["/usr/common/software/bin/hpss_avail", "archive"],
-            stdout="some text on stdout",
-            stderr="some text on stderr",
-        ),
-        ObjectLiteral(
-            returncode=0,
-            args=["/usr/bin/which", "hsi"],
-            stdout="some text on stdout",
-            stderr="some text on stderr",
-        ),
-    ]
+    avail_mock = mocker.patch("lta.hpss_avail.HpssAvailMonitor.is_available", new_callable=AsyncMock)
+    avail_mock.return_value = True
     lta_rc_mock = AsyncMock()
     lta_rc_mock.request = AsyncMock()
     lta_rc_mock.request.side_effect = [
@@ -309,7 +281,7 @@ async def test_nersc_verifier_do_work_claim_exception_caught(config: TestConfig,
         },
         {}
     ]
-    vbih_mock = mocker.patch("lta.nersc_verifier.NerscVerifier._verify_bundle_in_hpss", new_callable=MagicMock)
+    vbih_mock = mocker.patch("lta.nersc_verifier.NerscVerifier._verify_bundles_in_hpss", new_callable=AsyncMock)
     exc = Exception("Database totally on fire, guys")
     vbih_mock.side_effect = exc
     p = NerscVerifier(config, logging.getLogger())
@@ -318,10 +290,99 @@ async def test_nersc_verifier_do_work_claim_exception_caught(config: TestConfig,
     assert excinfo.value == exc
     lta_rc_mock.request.assert_called_with("PATCH", '/Bundles/45ae2ad39c664fda86e5981be0976d9c', mocker.ANY)
     vbih_mock.assert_called_with(
-        {"uuid": "45ae2ad39c664fda86e5981be0976d9c", "status": "verifying", "one": 1, "type": "Bundle"}
+        [{"uuid": "45ae2ad39c664fda86e5981be0976d9c", "status": "verifying", "one": 1, "type": "Bundle"}],
+        mocker.ANY,
     )
 
 
+@pytest.mark.asyncio
+async def test_nersc_verifier_do_work_claim_batch(config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that _do_work_claim quarantines only the failed Bundles of a batch, and unclaims the ones HSI did not get to."""
+    config["MAX_COUNT"] = "5"
+    avail_mock = mocker.patch("lta.hpss_avail.HpssAvailMonitor.is_available", new_callable=AsyncMock)
+    avail_mock.return_value = True
+    bundles = [
+        {
+            "uuid": f"bundle-{i}",
+            "type": "Bundle",
+            "status": "verifying",
+            "path": "/data/exp/IceCube/2019/filtered/PFFilt/1109",
+            "bundle_path": f"/path/to/source/rse/bundle-{i}.zip",
+        }
+        for i in range(3)
+    ]
+    lta_rc_mock = AsyncMock()
+    lta_rc_mock.request = AsyncMock()
+    lta_rc_mock.request.side_effect = [
+        {"bundle": bundles[0]},
+        {"bundle": bundles[1]},
+        {"bundle": bundles[2]},
+        {"bundle": None},
+        {},  # PATCH bundle-0 as verified
+        {},  # PATCH bundle-1 as quarantined
+        {},  # PATCH bundle-2 as unclaimed
+    ]
+    vbih_mock = mocker.patch("lta.nersc_verifier.NerscVerifier._verify_bundles_in_hpss", new_callable=AsyncMock)
+    vbih_mock.return_value = {
+        "bundle-0": None,
+        "bundle-1": InvalidChecksumException("abc", "def", logging.getLogger()),
+    }
+    p = NerscVerifier(config, logging.getLogger())
+    assert await p._do_work_claim(lta_rc_mock, MagicMock())
+    vbih_mock.assert_called_with(bundles, mocker.ANY)
+    lta_rc_mock.request.assert_has_calls([
+        call("PATCH", "/Bundles/bundle-0", {
+            "status": "completed",
+            "reason": "",
+            "final_dest_location": {
+                "path": "/path/to/hpss/data/exp/IceCube/2019/filtered/PFFilt/1109/bundle-0.zip",
+                "hpss": True,
+                "online": False,
+            },
+            "update_timestamp": mocker.ANY,
+            "claimed": False,
+        }),
+        call("PATCH", "/Bundles/bundle-1", {
+            "original_status": "verifying",
+            "status": "quarantined",
+            "reason": mocker.ANY,
+            "reason_details": mocker.ANY,
+            "work_priority_timestamp": mocker.ANY,
+        }),
+        call("PATCH", "/Bundles/bundle-2", {
+            "claimed": False,
+            "update_timestamp": mocker.ANY,
+        }),
+    ])
+
+
+@pytest.mark.asyncio
+async def test_nersc_verifier_do_work_claim_batch_all_failed(config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that _do_work_claim raises if every Bundle in the batch fails."""
+    config["MAX_COUNT"] = "2"
+    avail_mock = mocker.patch("lta.hpss_avail.HpssAvailMonitor.is_available", new_callable=AsyncMock)
+    avail_mock.return_value = True
+    lta_rc_mock = AsyncMock()
+    lta_rc_mock.request = AsyncMock()
+    lta_rc_mock.request.side_effect = [
+        {"bundle": {"uuid": "bundle-0", "type": "Bundle", "status": "verifying"}},
+        {"bundle": {"uuid": "bundle-1", "type": "Bundle", "status": "verifying"}},
+        {},
+        {},
+    ]
+    exc = HSIBatchItemFailedException("from test", "/path/to/hpss/bundle-1.zip", [], logging.getLogger())
+    vbih_mock = mocker.patch("lta.nersc_verifier.NerscVerifier._verify_bundles_in_hpss", new_callable=AsyncMock)
+    vbih_mock.return_value = {
+        "bundle-0": InvalidChecksumException("abc", "def", logging.getLogger()),
+        "bundle-1": exc,
+    }
+    p = NerscVerifier(config, logging.getLogger())
+    with pytest.raises(HSIBatchItemFailedException) as excinfo:
+        await p._do_work_claim(lta_rc_mock, MagicMock())
+    assert excinfo.value == exc
+    lta_rc_mock.request.assert_called_with("PATCH", "/Bundles/bundle-1", mocker.ANY)
+
+
 @pytest.mark.asyncio
 async def test_nersc_verifier_update_bundle_in_lta_db(config: TestConfig, mocker: MockerFixture) -> None:
     """Test that _update_bundle_in_lta_db updates the bundle as verified in the LTA DB."""
@@ -335,190 +396,222 @@ async def test_nersc_verifier_update_bundle_in_lta_db(config: TestConfig, mocker
     lta_rc_mock.assert_called_with("PATCH", '/Bundles/7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef', mocker.ANY)
 
 
+BUNDLE = {
+    "uuid": "7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef",
+    "path": "/data/exp/IceCube/2019/filtered/PFFilt/1109",
+    "bundle_path": "/path/to/source/rse/7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef.zip",
+    "checksum": {
+        "sha512": "97de2a6ad728f50a381eb1be6ecf015019887fac27e8bf608334fb72caf8d3f654fdcce68c33b0f0f27de499b84e67b8357cd81ef7bba3cdaa9e23a648f43ad2",
+    },
+    "status": "verifying",
+}
+HASHLIST_OK = b"97de2a6ad728f50a381eb1be6ecf015019887fac27e8bf608334fb72caf8d3f654fdcce68c33b0f0f27de499b84e67b8357cd81ef7bba3cdaa9e23a648f43ad2 sha512 /path/to/hpss/data/exp/IceCube/2019/filtered/PFFilt/1109/7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef.zip [hsi]\n"
+HPSS_PATH = "/path/to/hpss/data/exp/IceCube/2019/filtered/PFFilt/1109/7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef.zip"
+
+
 @pytest.mark.asyncio
-async def test_nersc_verifier_verify_bundle_in_hpss_success_no_quarantine(config: TestConfig, mocker: MockerFixture) -> None:
-    """Test that _verify_bundle_in_hpss does not quarantine a bundle if the HSI command succeeds."""
-    bundle = {
-        "uuid": "7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef",
-        "path": "/data/exp/IceCube/2019/filtered/PFFilt/1109",
-        "bundle_path": "/path/to/source/rse/7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef.zip",
-        "checksum": {
-            "sha512": "97de2a6ad728f50a381eb1be6ecf015019887fac27e8bf608334fb72caf8d3f654fdcce68c33b0f0f27de499b84e67b8357cd81ef7bba3cdaa9e23a648f43ad2",
-        },
-    }
-    run_mock = mocker.patch("lta.nersc_verifier.run", new_callable=MagicMock)
-    run_mock.side_effect = [
-        ObjectLiteral(
-            returncode=0,
-            args=["hsi", "-q", "hashlist", "/home/projects/icecube/data/exp/IceCube/2019/filtered/PFFilt/1109/7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef.zip"],
-            stdout=b"97de2a6ad728f50a381eb1be6ecf015019887fac27e8bf608334fb72caf8d3f654fdcce68c33b0f0f27de499b84e67b8357cd81ef7bba3cdaa9e23a648f43ad2 sha512 /home/projects/icecube/data/exp/IceCube/2019/filtered/PFFilt/1109/7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef.zip [hsi]\n",
-            stderr=b"",
-        ),
-        ObjectLiteral(
-            returncode=0,
-            args=["hsi", "-q", "hashverify", "-A", "/home/projects/icecube/data/exp/IceCube/2019/filtered/PFFilt/1109/7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef.zip"],
-            stdout=b"/home/projects/icecube/data/exp/IceCube/2018/unbiased/PFDST/1230/50145c5c-01e1-4727-a9a1-324e5af09a29.zip: (sha512) OK\n",
-            stderr=b"",
-        ),
-    ]
+async def test_nersc_verifier_verify_bundles_in_hpss_success(config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that _verify_bundles_in_hpss verifies a bundle with one HSI session for hashlist and one for hashverify."""
+    run_mock = mocker.patch("lta.hsi.run_command", new_callable=AsyncMock)
+    run_mock.return_value = ObjectLiteral(
+        returncode=0,
+        args=["/usr/bin/hsi", "-P", "in", "/tmp/lta-hsi-xyz.cmd"],
+        stdout=HASHLIST_OK + f"{HPSS_PATH}: (sha512) OK\n".encode("utf-8"),
+        stderr=b"",
+    )
     p = NerscVerifier(config, logging.getLogger())
-    p._verify_bundle_in_hpss(bundle)
+    assert await p._verify_bundles_in_hpss([BUNDLE]) == {"7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef": None}
     assert run_mock.call_count == 2
 
 
 @pytest.mark.asyncio
-async def test_nersc_verifier_verify_bundle_in_hpss_hsi_failure_quarantine(config: TestConfig, mocker: MockerFixture) -> None:
-    """Test that _verify_bundle_in_hpss quarantines a bundle if the HSI command fails."""
-    bundle = {
-        "uuid": "7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef",
-        "path": "/data/exp/IceCube/2019/filtered/PFFilt/1109",
-        "bundle_path": "/path/to/source/rse/7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef.zip",
-        "checksum": {
-            "sha512": "97de2a6ad728f50a381eb1be6ecf015019887fac27e8bf608334fb72caf8d3f654fdcce68c33b0f0f27de499b84e67b8357cd81ef7bba3cdaa9e23a648f43ad2",
-        },
-        "status": "verifying",
-    }
-    run_mock = mocker.patch("lta.nersc_verifier.run", new_callable=MagicMock)
-    run_mock.side_effect = [
-        ObjectLiteral(
-            returncode=1,
-            args=["hsi", "-q", "hashlist", "/home/projects/icecube/data/exp/IceCube/2019/filtered/PFFilt/1109/7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef.zip"],
-            stdout=b"",
-            stderr=b"",
-        ),
-    ]
+async def test_nersc_verifier_verify_bundles_in_hpss_hsi_failure(config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that _verify_bundles_in_hpss raises if the HSI session fails without reporting on any bundle."""
+    run_mock = mocker.patch("lta.hsi.run_command", new_callable=AsyncMock)
+    run_mock.return_value = ObjectLiteral(
+        returncode=1,
+        args=["/usr/bin/hsi", "-P", "in", "/tmp/lta-hsi-xyz.cmd"],
+        stdout=b"",
+        stderr=b"",
+    )
     p = NerscVerifier(config, logging.getLogger())
     with pytest.raises(HSICommandFailedException) as excinfo:
-        p._verify_bundle_in_hpss(bundle)
-    assert "list checksum in HPSS (hashlist)" in str(excinfo.value)
+        await p._verify_bundles_in_hpss([BUNDLE])
+    assert "verify bundles in HPSS" in str(excinfo.value)
     assert run_mock.call_count == 1
 
 
 @pytest.mark.asyncio
-async def test_nersc_verifier_verify_bundle_in_hpss_mismatch_checksum_quarantine(config: TestConfig, mocker: MockerFixture) -> None:
-    """Test that _verify_bundle_in_hpss quarantines a bundle if the checksums do not match."""
-    bundle = {
-        "uuid": "7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef",
-        "path": "/data/exp/IceCube/2019/filtered/PFFilt/1109",
-        "bundle_path": "/path/to/source/rse/7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef.zip",
-        "checksum": {
-            "sha512": "97de2a6ad728f50a381eb1be6ecf015019887fac27e8bf608334fb72caf8d3f654fdcce68c33b0f0f27de499b84e67b8357cd81ef7bba3cdaa9e23a648f43ad2",
-        },
-        "status": "verifying",
-    }
-    run_mock = mocker.patch("lta.nersc_verifier.run", new_callable=MagicMock)
-    run_mock.side_effect = [
-        ObjectLiteral(
-            returncode=0,
-            args=["hsi", "-q", "hashlist", "/home/projects/icecube/data/exp/IceCube/2019/filtered/PFFilt/1109/7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef.zip"],
-            stdout=b"1693e9d0273e3a2995b917c0e72e6bd2f40ea677f3613b6d57eaa14bd3a285c73e8db8b6e556b886c3929afe324bcc718711f2faddfeb43c3e030d9afe697873 sha512 /home/projects/icecube/data/exp/IceCube/2018/unbiased/PFDST/1230/50145c5c-01e1-4727-a9a1-324e5af09a29.zip [hsi]\n",
-            stderr=b"",
-        ),
-    ]
+async def test_nersc_verifier_verify_bundles_in_hpss_hashlist_failure(config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that _verify_bundles_in_hpss reports a bundle that hashlist failed on."""
+    run_mock = mocker.patch("lta.hsi.run_command", new_callable=AsyncMock)
+    run_mock.return_value = ObjectLiteral(
+        returncode=72,
+        args=["/usr/bin/hsi", "-P", "in", "/tmp/lta-hsi-xyz.cmd"],
+        stdout=f"*** hashlist: Error on HPSS file {HPSS_PATH}: No such file or directory\n".encode("utf-8"),
+        stderr=b"",
+    )
     p = NerscVerifier(config, logging.getLogger())
-    with pytest.raises(InvalidChecksumException) as excinfo:
-        p._verify_bundle_in_hpss(bundle)
-    assert str(excinfo.value).startswith("Checksum mismatch between creation and destination:")
-    assert run_mock.call_count == 1
+    outcomes = await p._verify_bundles_in_hpss([BUNDLE])
+    error = outcomes["7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef"]
+    assert isinstance(error, HSIBatchItemFailedException)
+    assert "list checksum in HPSS (hashlist)" in str(error)
 
 
 @pytest.mark.asyncio
-async def test_nersc_verifier_verify_bundle_in_hpss_failure_hashverify_quarantine(config: TestConfig, mocker: MockerFixture) -> None:
-    """Test that _verify_bundle_in_hpss raises if the HSI hashverify command fails."""
-    bundle = {
-        "uuid": "7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef",
-        "path": "/data/exp/IceCube/2019/filtered/PFFilt/1109",
-        "bundle_path": "/path/to/source/rse/7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef.zip",
-        "checksum": {
-            "sha512": "97de2a6ad728f50a381eb1be6ecf015019887fac27e8bf608334fb72caf8d3f654fdcce68c33b0f0f27de499b84e67b8357cd81ef7bba3cdaa9e23a648f43ad2",
-        },
-        "status": "verifying",
-    }
-    run_mock = mocker.patch("lta.nersc_verifier.run", new_callable=MagicMock)
-    run_mock.side_effect = [
-        ObjectLiteral(
-            returncode=0,
-            args=["hsi", "-q", "hashlist", "/home/projects/icecube/data/exp/IceCube/2019/filtered/PFFilt/1109/7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef.zip"],
-            stdout=b"97de2a6ad728f50a381eb1be6ecf015019887fac27e8bf608334fb72caf8d3f654fdcce68c33b0f0f27de499b84e67b8357cd81ef7bba3cdaa9e23a648f43ad2 sha512 /home/projects/icecube/data/exp/IceCube/2019/filtered/PFFilt/1109/7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef.zip [hsi]\n",
-            stderr=b"",
-        ),
-        ObjectLiteral(
-            returncode=1,
-            args=["hsi", "-q", "hashverify", "-A", "/home/projects/icecube/data/exp/IceCube/2019/filtered/PFFilt/1109/7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef.zip"],
-            stdout=b"",
-            stderr=b"",
-        ),
-    ]
+async def test_nersc_verifier_verify_bundles_in_hpss_mismatch_checksum(config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that _verify_bundles_in_hpss reports a bundle if the checksums do not match."""
+    run_mock = mocker.patch("lta.hsi.run_command", new_callable=AsyncMock)
+    run_mock.return_value = ObjectLiteral(
+        returncode=0,
+        args=["/usr/bin/hsi", "-P", "in", "/tmp/lta-hsi-xyz.cmd"],
+        stdout=f"1693e9d0273e3a2995b917c0e72e6bd2f40ea677f3613b6d57eaa14bd3a285c73e8db8b6e556b886c3929afe324bcc718711f2faddfeb43c3e030d9afe697873 sha512 {HPSS_PATH} [hsi]\n".encode("utf-8"),
+        stderr=b"",
+    )
     p = NerscVerifier(config, logging.getLogger())
-    with pytest.raises(HSICommandFailedException) as excinfo:
-        p._verify_bundle_in_hpss(bundle)
-    assert "verify bundle in HPSS (hashverify)" in str(excinfo.value)
-    assert run_mock.call_count == 2
+    outcomes = await p._verify_bundles_in_hpss([BUNDLE])
+    error = outcomes["7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef"]
+    assert isinstance(error, InvalidChecksumException)
+    assert str(error).startswith("Checksum mismatch between creation and destination:")
 
 
 @pytest.mark.asyncio
-async def test_nersc_verifier_verify_bundle_in_hpss_hashverify_bad_type_quarantine(config: TestConfig, mocker: MockerFixture) -> None:
-    """Test that _verify_bundle_in_hpss raises when hashverify output is not '(sha512) OK'."""
-    bundle = {
-        "uuid": "7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef",
-        "path": "/data/exp/IceCube/2019/filtered/PFFilt/1109",
-        "bundle_path": "/path/to/source/rse/7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef.zip",
-        "checksum": {
-            "sha512": "97de2a6ad728f50a381eb1be6ecf015019887fac27e8bf608334fb72caf8d3f654fdcce68c33b0f0f27de499b84e67b8357cd81ef7bba3cdaa9e23a648f43ad2",
-        },
-        "status": "verifying",
-    }
-    run_mock = mocker.patch("lta.nersc_verifier.run", new_callable=MagicMock)
-    run_mock.side_effect = [
-        ObjectLiteral(
-            returncode=0,
-            args=["hsi", "-q", "hashlist", "/home/projects/icecube/data/exp/IceCube/2019/filtered/PFFilt/1109/7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef.zip"],
-            stdout=b"97de2a6ad728f50a381eb1be6ecf015019887fac27e8bf608334fb72caf8d3f654fdcce68c33b0f0f27de499b84e67b8357cd81ef7bba3cdaa9e23a648f43ad2 sha512 /home/projects/icecube/data/exp/IceCube/2019/filtered/PFFilt/1109/7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef.zip [hsi]\n",
-            stderr=b"",
-        ),
-        ObjectLiteral(
-            returncode=0,
-            args=["hsi", "-q", "hashverify", "-A", "/home/projects/icecube/data/exp/IceCube/2019/filtered/PFFilt/1109/7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef.zip"],
-            stdout=b"/home/projects/icecube/data/exp/IceCube/2018/unbiased/PFDST/1230/50145c5c-01e1-4727-a9a1-324e5af09a29.zip: (sha256) OK\n",
-            stderr=b"",
-        ),
-    ]
+async def test_nersc_verifier_verify_bundles_in_hpss_hashverify_failure(config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that _verify_bundles_in_hpss reports a bundle that hashverify failed on."""
+    run_mock = mocker.patch("lta.hsi.run_command", new_callable=AsyncMock)
+    run_mock.return_value = ObjectLiteral(
+        returncode=72,
+        args=["/usr/bin/hsi", "-P", "in", "/tmp/lta-hsi-xyz.cmd"],
+        stdout=HASHLIST_OK + f"*** hashverify: Error on HPSS file {HPSS_PATH}: Unable to stage file\n".encode("utf-8"),
+        stderr=b"",
+    )
     p = NerscVerifier(config, logging.getLogger())
-    with pytest.raises(InvalidChecksumException) as excinfo:
-        p._verify_bundle_in_hpss(bundle)
-    assert str(excinfo.value).startswith("Checksum mismatch between creation and destination:")
-    assert run_mock.call_count == 2
+    outcomes = await p._verify_bundles_in_hpss([BUNDLE])
+    error = outcomes["7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef"]
+    assert isinstance(error, HSIBatchItemFailedException)
+    assert "verify bundle in HPSS (hashverify)" in str(error)
 
 
+@pytest.mark.parametrize("hashverify", ["(sha256) OK", "(sha512) FAILED (hash mismatch)"])
 @pytest.mark.asyncio
-async def test_nersc_verifier_verify_bundle_in_hpss_hashverify_bad_result_quarantine(config: TestConfig, mocker: MockerFixture) -> None:
-    """Test that _verify_bundle_in_hpss raises when hashverify output is not '(sha512) OK'."""
-    bundle = {
-        "uuid": "7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef",
-        "path": "/data/exp/IceCube/2019/filtered/PFFilt/1109",
-        "bundle_path": "/path/to/source/rse/7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef.zip",
-        "checksum": {
-            "sha512": "97de2a6ad728f50a381eb1be6ecf015019887fac27e8bf608334fb72caf8d3f654fdcce68c33b0f0f27de499b84e67b8357cd81ef7bba3cdaa9e23a648f43ad2",
-        },
-        "status": "verifying",
-    }
-    run_mock = mocker.patch("lta.nersc_verifier.run", new_callable=MagicMock)
-    run_mock.side_effect = [
-        ObjectLiteral(
-            returncode=0,
-            args=["hsi", "-q", "hashlist", "/home/projects/icecube/data/exp/IceCube/2019/filtered/PFFilt/1109/7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef.zip"],
-            stdout=b"97de2a6ad728f50a381eb1be6ecf015019887fac27e8bf608334fb72caf8d3f654fdcce68c33b0f0f27de499b84e67b8357cd81ef7bba3cdaa9e23a648f43ad2 sha512 /home/projects/icecube/data/exp/IceCube/2019/filtered/PFFilt/1109/7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef.zip [hsi]\n",
-            stderr=b"",
-        ),
-        ObjectLiteral(
-            returncode=0,
-            args=["hsi", "-q", "hashverify", "-A", "/home/projects/icecube/data/exp/IceCube/2019/filtered/PFFilt/1109/7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef.zip"],
-            stdout=b"/home/projects/icecube/data/exp/IceCube/2018/unbiased/PFDST/1230/50145c5c-01e1-4727-a9a1-324e5af09a29.zip: (sha256) OK\n",
-            stderr=b"",
-        ),
-    ]
+async def test_nersc_verifier_verify_bundles_in_hpss_hashverify_bad_result(hashverify: str, config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that _verify_bundles_in_hpss reports a bundle when hashverify output is not '(sha512) OK'."""
+    run_mock = mocker.patch("lta.hsi.run_command", new_callable=AsyncMock)
+    run_mock.return_value = ObjectLiteral(
+        returncode=0,
+        args=["/usr/bin/hsi", "-P", "in", "/tmp/lta-hsi-xyz.cmd"],
+        stdout=HASHLIST_OK + f"{HPSS_PATH}: {hashverify}\n".encode("utf-8"),
+        stderr=b"",
+    )
     p = NerscVerifier(config, logging.getLogger())
-    with pytest.raises(InvalidChecksumException) as excinfo:
-        p._verify_bundle_in_hpss(bundle)
-    assert str(excinfo.value).startswith("Checksum mismatch between creation and destination:")
-    assert run_mock.call_count == 2
+    outcomes = await p._verify_bundles_in_hpss([BUNDLE])
+    error = outcomes["7ec8a8f9-fae3-4f25-ae54-c1f66014f5ef"]
+    assert isinstance(error, InvalidChecksumException)
+    assert str(error).startswith("Checksum mismatch between creation and destination:")
+
+
+@pytest.mark.asyncio
+async def test_nersc_verifier_verify_bundles_in_hpss_not_attempted(config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that _verify_bundles_in_hpss leaves out a bundle that HSI did not report on."""
+    run_mock = mocker.patch("lta.hsi.run_command", new_callable=AsyncMock)
+    run_mock.return_value = ObjectLiteral(
+        returncode=0,
+        args=["/usr/bin/hsi", "-P", "in", "/tmp/lta-hsi-xyz.cmd"],
+        stdout=b"",
+        stderr=b"",
+    )
+    p = NerscVerifier(config, logging.getLogger())
+    assert await p._verify_bundles_in_hpss([BUNDLE]) == {}
+
+
+def put_bundles(tmp_path: Path, count: int) -> List[BundleType]:
+    """Put bundles into the fake HPSS, and return them as the LTA DB would."""
+    bundles: List[BundleType] = []
+    for i in range(count):
+        bundle_file = tmp_path / f"bundle-{i}.zip"
+        bundle_file.write_bytes(f"contents of bundle {i}".encode("utf-8"))
+        hpss_path = f"/path/to/hpss/data/exp/IceCube/2019/filtered/PFFilt/1109/bundle-{i}.zip"
+        run([FAKE_HSI_PATH, f"mkdir -p {os.path.dirname(hpss_path)}; put -c on -H sha512 {bundle_file} : {hpss_path}"], check=True)
+        bundles.append({
+            "uuid": f"bundle-{i}",
+            "type": "Bundle",
+            "status": "verifying",
+            "path": "/data/exp/IceCube/2019/filtered/PFFilt/1109",
+            "bundle_path": str(bundle_file),
+            "checksum": {"sha512": sha512sum(str(bundle_file))},
+        })
+    return bundles
+
+
+@pytest.mark.asyncio
+async def test_nersc_verifier_fake_hsi(config: TestConfig, fake_hsi: Path, tmp_path: Path, mocker: MockerFixture) -> None:
+    """Test that a batch of bundles is verified with a single session of the fake hsi executable."""
+    config["MAX_COUNT"] = "5"
+    mocker.patch("lta.hpss_avail.HpssAvailMonitor.is_available", new_callable=AsyncMock).return_value = True
+    bundles = put_bundles(tmp_path, 3)
+    # the tape copy of bundle-2 has gone bad
+    (fake_hsi / "path/to/hpss/data/exp/IceCube/2019/filtered/PFFilt/1109/bundle-2.zip").write_bytes(b"bit rot")
+    (tmp_path / "fake_hsi.log").unlink()
+
+    lta_rc_mock = AsyncMock()
+    lta_rc_mock.request = AsyncMock()
+    lta_rc_mock.request.side_effect = [{"bundle": b} for b in bundles] + [{"bundle": None}, {}, {}, {}]
+    p = NerscVerifier(config, logging.getLogger())
+    assert await p._do_work_claim(lta_rc_mock, MagicMock())
+    lta_rc_mock.request.assert_has_calls([
+        call("PATCH", "/Bundles/bundle-0", mocker.ANY),
+        call("PATCH", "/Bundles/bundle-1", mocker.ANY),
+        call("PATCH", "/Bundles/bundle-2", mocker.ANY),
+    ])
+    patches = [c.args[2] for c in lta_rc_mock.request.call_args_list if c.args[0] == "PATCH"]
+    assert [x["status"] for x in patches] == ["completed", "completed", "quarantined"]
+    # all three bundles were listed with one login to HPSS, and re-read from their tape with another
+    assert len((tmp_path / "fake_hsi.log").read_text().splitlines()) == 2
+
+
+@pytest.mark.asyncio
+async def test_nersc_verifier_verify_bundles_in_hpss_tape_order(config: TestConfig, fake_hsi: Path, tmp_path: Path,
+                                                                mocker: MockerFixture, monkeypatch: MonkeyPatch) -> None:
+    """Test that _verify_bundles_in_hpss re-reads the bundles on each tape volume in tape order."""
+    monkeypatch.setenv("FAKE_HSI_TAPE_CAPACITY", "2")
+    bundles = put_bundles(tmp_path, 4)
+    hashverify_spy = mocker.spy(NerscVerifier, "_hashverify_bundles_in_hpss")
+    p = NerscVerifier(config, logging.getLogger())
+    outcomes = await p._verify_bundles_in_hpss(list(reversed(bundles)))
+    assert outcomes == {f"bundle-{i}": None for i in range(4)}
+    volumes = [[bundle["uuid"] for bundle in c.args[1]] for c in hashverify_spy.call_args_list]
+    assert sorted(volumes) == [["bundle-0", "bundle-1"], ["bundle-2", "bundle-3"]]
+
+
+@pytest.mark.asyncio
+async def test_nersc_verifier_verify_bundles_in_hpss_concurrency(config: TestConfig, fake_hsi: Path, tmp_path: Path,
+                                                                 mocker: MockerFixture, monkeypatch: MonkeyPatch) -> None:
+    """Test that _verify_bundles_in_hpss bounds the number of hashverify sessions, and reports each bundle when it is done."""
+    config["HASHVERIFY_CONCURRENCY"] = "2"
+    monkeypatch.setenv("FAKE_HSI_TAPE_CAPACITY", "1")
+    bundles = put_bundles(tmp_path, 5)
+    running = 0
+    max_running = 0
+    events: List[str] = []
+
+    async def hashverify(self: NerscVerifier, volume: List[BundleType]) -> Dict[str, Optional[Exception]]:
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        # the first volume takes a long time to read
+        await asyncio.sleep(0.2 if volume[0]["uuid"] == "bundle-0" else 0.01)
+        running -= 1
+        events.append(f"done {volume[0]['uuid']}")
+        return {bundle["uuid"]: None for bundle in volume}
+
+    async def on_outcome(bundle: BundleType, error: Optional[Exception]) -> None:
+        events.append(f"report {bundle['uuid']}")
+
+    mocker.patch("lta.nersc_verifier.NerscVerifier._hashverify_bundles_in_hpss", hashverify)
+    p = NerscVerifier(config, logging.getLogger())
+    outcomes = await p._verify_bundles_in_hpss(bundles, on_outcome)
+    assert outcomes == {f"bundle-{i}": None for i in range(5)}
+    assert max_running == 2
+    # bundle-1 was reported while bundle-0 was still being read
+    assert events.index("report bundle-1") < events.index("done bundle-0")
+    assert events[-1] == "report bundle-0"
@@ -16,6 +16,7 @@ from pytest_mock import MockerFixture
 from tornado.web import HTTPError
 
 from lta.rate_limiter import main_sync, RateLimiter
+from lta.utils import now
 
 TestConfig = Dict[str, str]
 
@@ -35,6 +36,8 @@ def config() -> TestConfig:
         "LTA_REST_URL": "localhost:12347",
         "OUTPUT_PATH": "/path/to/icecube/replicator/inbox",
         "OUTPUT_QUOTA": "12094627905536",  # 11 TiB
+        "OUTPUT_RECONCILE_SECONDS": "300",
+        "ADMISSION_WINDOW_SECONDS": "86400",
         "OUTPUT_STATUS": "staged",
         "PROMETHEUS_METRICS_PORT": "8080",
         "RUN_ONCE_AND_DIE": "False",
@@ -57,6 +60,9 @@ def test_constructor_config(config: TestConfig, mocker: MockerFixture) -> None:
     assert p.lta_rest_url == "localhost:12347"
     assert p.output_path == "/path/to/icecube/replicator/inbox"
     assert p.output_quota == 12094627905536
+    assert p.output_reconcile_seconds == 300
+    assert p.admission_window_seconds == 86400
+    assert p.output_ledger is None
     assert p.output_status == "staged"
     assert not p.run_once_and_die
     assert p.source_site == "WIPAC"
@@ -88,6 +94,8 @@ async def test_rate_limiter_logs_configuration(mocker: MockerFixture) -> None:
         "LTA_REST_URL": "logme-http://RmMNHdPhHpH2ZxfaFAC9d2jiIbf5pZiHDqy43rFLQiM.com/",
         "OUTPUT_PATH": "/path/to/icecube/replicator/inbox",
         "OUTPUT_QUOTA": "12094627905536",  # 11 TiB
+        "OUTPUT_RECONCILE_SECONDS": "300",
+        "ADMISSION_WINDOW_SECONDS": "86400",
         "OUTPUT_STATUS": "staged",
         "PROMETHEUS_METRICS_PORT": "8080",
         "RUN_ONCE_AND_DIE": "False",
@@ -111,6 +119,8 @@ async def test_rate_limiter_logs_configuration(mocker: MockerFixture) -> None:
         call('LTA_REST_URL = logme-http://RmMNHdPhHpH2ZxfaFAC9d2jiIbf5pZiHDqy43rFLQiM.com/'),
         call('OUTPUT_PATH = /path/to/icecube/replicator/inbox'),
         call('OUTPUT_QUOTA = 12094627905536'),
+        call('OUTPUT_RECONCILE_SECONDS = 300'),
+        call('ADMISSION_WINDOW_SECONDS = 86400'),
         call('OUTPUT_STATUS = staged'),
         call('PROMETHEUS_METRICS_PORT = 8080'),
         call('RUN_ONCE_AND_DIE = False'),
@@ -218,8 +228,9 @@ async def test_rate_limiter_do_work_claim_yes_result(config: TestConfig, mocker:
         "bundle": {"one": 1, "uuid": "abc123", "type": "Bundle"}
     }
     sb_mock = mocker.patch("lta.rate_limiter.RateLimiter._stage_bundle", new_callable=AsyncMock)
+    sb_mock.return_value = True
     p = RateLimiter(config, logging.getLogger())
-    assert not await p._do_work_claim(lta_rc_mock, MagicMock())
+    assert await p._do_work_claim(lta_rc_mock, MagicMock())
     lta_rc_mock.request.assert_called_with("POST", '/Bundles/actions/pop?source=WIPAC&dest=NERSC&status=created', {'claimant': f'{p.name}-{p.instance_uuid}'})
     sb_mock.assert_called_with(mocker.ANY, {"one": 1, "uuid": "abc123", "type": "Bundle"})
 
@@ -256,7 +267,7 @@ async def test_rate_limiter_stage_bundle(config: TestConfig, mocker: MockerFixtu
     """Test that _stage_bundle attempts to stage a Bundle."""
     lta_rc_mock = mocker.patch("rest_tools.client.RestClient", new_callable=AsyncMock)
     move_mock = mocker.patch("shutil.move", new_callable=MagicMock)
-    gfas_mock = mocker.patch("lta.lta_cmd._get_files_and_size", new_callable=MagicMock)
+    gfas_mock = mocker.patch("lta.cmd.common._get_files_and_size", new_callable=MagicMock)
     gfas_mock.return_value = ([], 0)
     p = RateLimiter(config, logging.getLogger())
     await p._stage_bundle(lta_rc_mock, {
@@ -315,3 +326,279 @@ def test_get_files_and_size_with_ignore_bad_files(config: TestConfig, mocker: Mo
     ]
     p = RateLimiter(config, logging.getLogger())
     assert p._get_files_and_size("/path/to/destination/directory") == (BUNDLES_IN_DESTINATION_DIRECTORY, 123_456_789)
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_stage_bundle_uses_ledger(config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that _stage_bundle measures the output directory once and then trusts the ledger."""
+    lta_rc_mock = mocker.patch("rest_tools.client.RestClient", new_callable=AsyncMock)
+    move_mock = mocker.patch("shutil.move", new_callable=MagicMock)
+    gfas_mock = mocker.patch("lta.rate_limiter.RateLimiter._get_files_and_size", new_callable=MagicMock)
+    gfas_mock.return_value = (["/path/to/one/file.zip"], 1_000)
+    p = RateLimiter(config, logging.getLogger())
+    await p._stage_bundle(lta_rc_mock, {
+        "uuid": "c4b345e4-2395-4f9e-b0eb-9cc1c9cdf003",
+        "bundle_path": "/icecube/datawarehouse/path/to/c4b345e4-2395-4f9e-b0eb-9cc1c9cdf003.zip",
+        "size": 2_000,
+    })
+    await p._stage_bundle(lta_rc_mock, {
+        "uuid": "f3e0b5a4-6a7c-4b47-9c2d-5c3a1b6b9d01",
+        "bundle_path": "/icecube/datawarehouse/path/to/f3e0b5a4-6a7c-4b47-9c2d-5c3a1b6b9d01.zip",
+        "size": 3_000,
+    })
+    gfas_mock.assert_called_once_with("/path/to/icecube/replicator/inbox")
+    assert move_mock.call_count == 2
+    assert p.output_ledger == 6_000
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_stage_bundle_ledger_over_quota(config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that _stage_bundle unclaims a Bundle when the ledger says the output directory is full."""
+    config["OUTPUT_QUOTA"] = "5000"
+    lta_rc_mock = mocker.patch("rest_tools.client.RestClient", new_callable=AsyncMock)
+    move_mock = mocker.patch("shutil.move", new_callable=MagicMock)
+    gfas_mock = mocker.patch("lta.rate_limiter.RateLimiter._get_files_and_size", new_callable=MagicMock)
+    gfas_mock.return_value = ([], 0)
+    ub_mock = mocker.patch("lta.rate_limiter.RateLimiter._unclaim_bundle", new_callable=AsyncMock)
+    p = RateLimiter(config, logging.getLogger())
+    first_bundle = {
+        "uuid": "c4b345e4-2395-4f9e-b0eb-9cc1c9cdf003",
+        "bundle_path": "/icecube/datawarehouse/path/to/c4b345e4-2395-4f9e-b0eb-9cc1c9cdf003.zip",
+        "size": 4_000,
+    }
+    second_bundle = {
+        "uuid": "f3e0b5a4-6a7c-4b47-9c2d-5c3a1b6b9d01",
+        "bundle_path": "/icecube/datawarehouse/path/to/f3e0b5a4-6a7c-4b47-9c2d-5c3a1b6b9d01.zip",
+        "size": 4_000,
+    }
+    assert await p._stage_bundle(lta_rc_mock, first_bundle)
+    assert not await p._stage_bundle(lta_rc_mock, second_bundle)
+    move_mock.assert_called_once()
+    ub_mock.assert_called_with(lta_rc_mock, second_bundle)
+
+
+def test_get_output_size_reconciles_stale_ledger(config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that a stale ledger is reconciled with the output directory and the drift is recorded."""
+    config["OUTPUT_RECONCILE_SECONDS"] = "60"
+    mono_mock = mocker.patch("time.monotonic", new_callable=MagicMock)
+    gfas_mock = mocker.patch("lta.rate_limiter.RateLimiter._get_files_and_size", new_callable=MagicMock)
+    gfas_mock.side_effect = [
+        ([], 1_000),
+        ([], 250),
+    ]
+    p = RateLimiter(config, logging.getLogger())
+    p.prom_output_ledger_drift = MagicMock()
+    mono_mock.return_value = 1_000.0
+    assert p._get_output_size() == 1_000
+    p._add_to_output_ledger(500)
+    # still fresh; the ledger is trusted
+    mono_mock.return_value = 1_030.0
+    assert p._get_output_size() == 1_500
+    # stale; downstream deleted some files
+    mono_mock.return_value = 1_061.0
+    assert p._get_output_size() == 250
+    assert gfas_mock.call_count == 2
+    p.prom_output_ledger_drift.set.assert_called_with(1_250)
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_do_work_claim_fills_quota(config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that _do_work_claim fills the remaining quota when the next Bundle in line does not fit."""
+    config["OUTPUT_QUOTA"] = "10000"
+    big_bundle = {
+        "uuid": "c4b345e4-2395-4f9e-b0eb-9cc1c9cdf003",
+        "type": "Bundle",
+        "status": "created",
+        "bundle_path": "/icecube/datawarehouse/path/to/c4b345e4-2395-4f9e-b0eb-9cc1c9cdf003.zip",
+        "create_timestamp": now(),
+        "size": 9_000,
+    }
+    small_bundle1 = {
+        "uuid": "f3e0b5a4-6a7c-4b47-9c2d-5c3a1b6b9d01",
+        "type": "Bundle",
+        "status": "created",
+        "bundle_path": "/icecube/datawarehouse/path/to/f3e0b5a4-6a7c-4b47-9c2d-5c3a1b6b9d01.zip",
+        "size": 2_000,
+    }
+    small_bundle2 = {
+        "uuid": "0e1d9c6a-7f43-4c1b-8a37-3e6f0b2d5c44",
+        "type": "Bundle",
+        "status": "created",
+        "bundle_path": "/icecube/datawarehouse/path/to/0e1d9c6a-7f43-4c1b-8a37-3e6f0b2d5c44.zip",
+        "size": 1_000,
+    }
+    lta_rc_mock = mocker.patch("rest_tools.client.RestClient", new_callable=AsyncMock)
+    lta_rc_mock.request.side_effect = [
+        {"bundle": big_bundle},     # pop
+        {},                         # PATCH unclaim big_bundle
+        {"bundle": small_bundle1},  # pop max_size=4000
+        {},                         # PATCH small_bundle1
+        {"bundle": small_bundle2},  # pop max_size=2000
+        {},                         # PATCH small_bundle2
+        {"bundle": None},           # pop max_size=1000
+    ]
+    move_mock = mocker.patch("shutil.move", new_callable=MagicMock)
+    gfas_mock = mocker.patch("lta.rate_limiter.RateLimiter._get_files_and_size", new_callable=MagicMock)
+    gfas_mock.return_value = ([], 6_000)
+    prom_tracker = MagicMock()
+    p = RateLimiter(config, logging.getLogger())
+    assert not await p._do_work_claim(lta_rc_mock, prom_tracker)
+    pop_url = '/Bundles/actions/pop?source=WIPAC&dest=NERSC&status=created'
+    claimant = {'claimant': f'{p.name}-{p.instance_uuid}'}
+    lta_rc_mock.request.assert_has_calls([
+        call("POST", pop_url, claimant),
+        call("PATCH", f"/Bundles/{big_bundle['uuid']}", {"claimed": False, "update_timestamp": mocker.ANY}),
+        call("POST", f"{pop_url}&max_size=4000", claimant),
+        call("PATCH", f"/Bundles/{small_bundle1['uuid']}", mocker.ANY),
+        call("POST", f"{pop_url}&max_size=2000", claimant),
+        call("PATCH", f"/Bundles/{small_bundle2['uuid']}", mocker.ANY),
+        call("POST", f"{pop_url}&max_size=1000", claimant),
+    ])
+    assert move_mock.call_count == 2
+    assert p.output_ledger == 9_000
+    prom_tracker.record_success.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_do_work_claim_measures_output_for_each_fill(config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that _do_work_claim sees Bundles that other replicas staged into the output directory."""
+    config["OUTPUT_QUOTA"] = "10000"
+    big_bundle = {
+        "uuid": "c4b345e4-2395-4f9e-b0eb-9cc1c9cdf003",
+        "type": "Bundle",
+        "status": "created",
+        "bundle_path": "/icecube/datawarehouse/path/to/c4b345e4-2395-4f9e-b0eb-9cc1c9cdf003.zip",
+        "size": 9_000,
+    }
+    lta_rc_mock = mocker.patch("rest_tools.client.RestClient", new_callable=AsyncMock)
+    lta_rc_mock.request.side_effect = [
+        {"bundle": big_bundle},  # pop
+        {},                      # PATCH unclaim big_bundle
+        {"bundle": None},        # pop max_size=2000
+        {"bundle": None},        # pop, next work cycle
+    ]
+    mocker.patch("shutil.move", new_callable=MagicMock)
+    gfas_mock = mocker.patch("lta.rate_limiter.RateLimiter._get_files_and_size", new_callable=MagicMock)
+    # another replica stages 2000 bytes, then downstream deletes 5000 bytes
+    gfas_mock.side_effect = [([], 6_000), ([], 8_000), ([], 3_000)]
+    p = RateLimiter(config, logging.getLogger())
+    assert not await p._do_work_claim(lta_rc_mock, MagicMock())
+    pop_url = '/Bundles/actions/pop?source=WIPAC&dest=NERSC&status=created'
+    claimant = {'claimant': f'{p.name}-{p.instance_uuid}'}
+    lta_rc_mock.request.assert_called_with("POST", f"{pop_url}&max_size=2000", claimant)
+    assert p.output_ledger == 8_000
+    # the next work cycle measures the output directory again
+    assert not await p._do_work_claim(lta_rc_mock, MagicMock())
+    assert p._get_output_size() == 3_000
+    assert gfas_mock.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_do_work_claim_holds_quota_for_old_bundle(config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that _do_work_claim holds the quota for a Bundle that has waited past the admission window."""
+    config["OUTPUT_QUOTA"] = "10000"
+    old_bundle = {
+        "uuid": "c4b345e4-2395-4f9e-b0eb-9cc1c9cdf003",
+        "type": "Bundle",
+        "status": "created",
+        "bundle_path": "/icecube/datawarehouse/path/to/c4b345e4-2395-4f9e-b0eb-9cc1c9cdf003.zip",
+        "create_timestamp": "2020-01-01T00:00:00",
+        "status_timestamp": "2020-01-02T00:00:00",
+        "size": 9_000,
+    }
+    lta_rc_mock = mocker.patch("rest_tools.client.RestClient", new_callable=AsyncMock)
+    lta_rc_mock.request.side_effect = [
+        {"bundle": old_bundle},  # pop
+        {},                      # PATCH unclaim old_bundle
+    ]
+    move_mock = mocker.patch("shutil.move", new_callable=MagicMock)
+    gfas_mock = mocker.patch("lta.rate_limiter.RateLimiter._get_files_and_size", new_callable=MagicMock)
+    gfas_mock.return_value = ([], 6_000)
+    prom_tracker = MagicMock()
+    p = RateLimiter(config, logging.getLogger())
+    assert not await p._do_work_claim(lta_rc_mock, prom_tracker)
+    assert lta_rc_mock.request.call_count == 2
+    move_mock.assert_not_called()
+    prom_tracker.record_success.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_do_work_claim_holds_quota_for_old_bundle_without_status_timestamp(config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that _do_work_claim falls back on the older timestamps of a Bundle without a 'status_timestamp'."""
+    config["OUTPUT_QUOTA"] = "10000"
+    old_bundle = {
+        "uuid": "c4b345e4-2395-4f9e-b0eb-9cc1c9cdf003",
+        "type": "Bundle",
+        "status": "created",
+        "bundle_path": "/icecube/datawarehouse/path/to/c4b345e4-2395-4f9e-b0eb-9cc1c9cdf003.zip",
+        "create_timestamp": "2020-01-01T00:00:00",
+        "update_timestamp": "2020-01-02T00:00:00",
+        "size": 9_000,
+    }
+    lta_rc_mock = mocker.patch("rest_tools.client.RestClient", new_callable=AsyncMock)
+    lta_rc_mock.request.side_effect = [
+        {"bundle": old_bundle},  # pop
+        {},                      # PATCH unclaim old_bundle
+    ]
+    move_mock = mocker.patch("shutil.move", new_callable=MagicMock)
+    gfas_mock = mocker.patch("lta.rate_limiter.RateLimiter._get_files_and_size", new_callable=MagicMock)
+    gfas_mock.return_value = ([], 6_000)
+    prom_tracker = MagicMock()
+    p = RateLimiter(config, logging.getLogger())
+    assert p._is_past_admission_window(old_bundle)
+    del old_bundle["update_timestamp"]
+    assert p._is_past_admission_window(old_bundle)
+    assert not await p._do_work_claim(lta_rc_mock, prom_tracker)
+    assert lta_rc_mock.request.call_count == 2
+    move_mock.assert_not_called()
+    prom_tracker.record_success.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_do_work_claim_window_starts_at_status(config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that _do_work_claim measures the admission window from when the Bundle entered its status."""
+    config["OUTPUT_QUOTA"] = "10000"
+    bundle = {
+        "uuid": "c4b345e4-2395-4f9e-b0eb-9cc1c9cdf003",
+        "type": "Bundle",
+        "status": "created",
+        "bundle_path": "/icecube/datawarehouse/path/to/c4b345e4-2395-4f9e-b0eb-9cc1c9cdf003.zip",
+        "create_timestamp": "2020-01-01T00:00:00",
+        "status_timestamp": now(),
+        "size": 9_000,
+    }
+    lta_rc_mock = mocker.patch("rest_tools.client.RestClient", new_callable=AsyncMock)
+    lta_rc_mock.request.side_effect = [
+        {"bundle": bundle},  # pop
+        {},                  # PATCH unclaim bundle
+        {"bundle": None},    # pop max_size=4000
+    ]
+    move_mock = mocker.patch("shutil.move", new_callable=MagicMock)
+    gfas_mock = mocker.patch("lta.rate_limiter.RateLimiter._get_files_and_size", new_callable=MagicMock)
+    gfas_mock.return_value = ([], 6_000)
+    prom_tracker = MagicMock()
+    p = RateLimiter(config, logging.getLogger())
+    assert not await p._do_work_claim(lta_rc_mock, prom_tracker)
+    assert lta_rc_mock.request.call_count == 3
+    move_mock.assert_not_called()
+    # nothing was staged, so nothing succeeded
+    prom_tracker.record_success.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_fill_output_quota_quarantines(config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that _fill_output_quota quarantines a Bundle that fails to stage."""
+    config["OUTPUT_QUOTA"] = "10000"
+    small_bundle = {"uuid": "f3e0b5a4-6a7c-4b47-9c2d-5c3a1b6b9d01", "type": "Bundle", "size": 2_000}
+    lta_rc_mock = mocker.patch("rest_tools.client.RestClient", new_callable=AsyncMock)
+    lta_rc_mock.request.return_value = {"bundle": small_bundle}
+    gfas_mock = mocker.patch("lta.rate_limiter.RateLimiter._get_files_and_size", new_callable=MagicMock)
+    gfas_mock.return_value = ([], 0)
+    sb_mock = mocker.patch("lta.rate_limiter.RateLimiter._stage_bundle", new_callable=AsyncMock)
+    exc = NicheException("bundle went missing")
+    sb_mock.side_effect = exc
+    qn_mock = mocker.patch("lta.rate_limiter.quarantine_now", new_callable=AsyncMock)
+    p = RateLimiter(config, logging.getLogger())
+    with pytest.raises(NicheException):
+        await p._fill_output_quota(lta_rc_mock)
+    qn_mock.assert_called_with(lta_rc_mock, small_bundle, exc, p.name, p.instance_uuid, logging.getLogger())
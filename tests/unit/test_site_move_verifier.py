@@ -4,10 +4,10 @@ import logging
 
 # fmt:off
 
-from lta.utils import InvalidChecksumException
+from lta.utils import CommandTimeoutException, InvalidChecksumException
 
 
-from typing import Dict
+from typing import Any, Dict
 from unittest.mock import AsyncMock, call, MagicMock
 
 import pytest
@@ -15,7 +15,7 @@ from pytest import MonkeyPatch
 from pytest_mock import MockerFixture
 from tornado.web import HTTPError
 
-from lta.site_move_verifier import as_nonempty_columns, discard_empty, MYQUOTA_ARGS, parse_myquota
+from lta.site_move_verifier import as_nonempty_columns, discard_empty, MYQUOTA_ARGS, MYQUOTA_TIMEOUT_SECONDS, parse_myquota
 from lta.site_move_verifier import main_sync, SiteMoveVerifier
 from .utils import ObjectLiteral
 
@@ -26,6 +26,7 @@ TestConfig = Dict[str, str]
 def config() -> TestConfig:
     """Supply a stock SiteMoveVerifier component configuration."""
     return {
+        "CHECKSUM_SOURCES": "local",
         "CLIENT_ID": "long-term-archive",
         "CLIENT_SECRET": "hunter2",  # http://bash.org/?244321
         "COMPONENT_NAME": "testing-site_move_verifier",
@@ -103,9 +104,10 @@ def test_constructor_config(config: TestConfig, mocker: MockerFixture) -> None:
     assert p.logger == logging.getLogger()
 
 
-def test_do_status(config: TestConfig, mocker: MockerFixture) -> None:
+@pytest.mark.asyncio
+async def test_do_status(config: TestConfig, mocker: MockerFixture) -> None:
     """Verify that the SiteMoveVerifier has additional state to offer."""
-    run_mock = mocker.patch("lta.site_move_verifier.run", new_callable=MagicMock)
+    run_mock = mocker.patch("lta.site_move_verifier.run_command", new_callable=AsyncMock)
     run_mock.return_value = ObjectLiteral(
         returncode=0,
         args=MYQUOTA_ARGS,
@@ -113,6 +115,9 @@ def test_do_status(config: TestConfig, mocker: MockerFixture) -> None:
         stderr="",
     )
     p = SiteMoveVerifier(config, logging.getLogger())
+    assert p._do_status() == {"quota": []}
+    await p._refresh_quota()
+    run_mock.assert_called_with(MYQUOTA_ARGS, mocker.ANY, timeout=MYQUOTA_TIMEOUT_SECONDS)
     assert p._do_status() == {
         "quota": [
             {
@@ -137,9 +142,10 @@ def test_do_status(config: TestConfig, mocker: MockerFixture) -> None:
     }
 
 
-def test_do_status_myquota_fails(config: TestConfig, mocker: MockerFixture) -> None:
+@pytest.mark.asyncio
+async def test_do_status_myquota_fails(config: TestConfig, mocker: MockerFixture) -> None:
     """Verify that the SiteMoveVerifier has no additional state to offer."""
-    run_mock = mocker.patch("lta.site_move_verifier.run", new_callable=MagicMock)
+    run_mock = mocker.patch("lta.site_move_verifier.run_command", new_callable=AsyncMock)
     run_mock.return_value = ObjectLiteral(
         returncode=1,
         args=MYQUOTA_ARGS,
@@ -147,14 +153,65 @@ def test_do_status_myquota_fails(config: TestConfig, mocker: MockerFixture) -> N
         stderr="nersc file systems burned down; again",
     )
     p = SiteMoveVerifier(config, logging.getLogger())
+    await p._refresh_quota()
     assert p._do_status() == {"quota": []}
 
 
+@pytest.mark.asyncio
+@pytest.mark.parametrize("error", [
+    FileNotFoundError(2, "No such file or directory"),
+    CommandTimeoutException(MYQUOTA_ARGS, 60, logging.getLogger()),
+])
+async def test_do_status_myquota_does_not_finish(error: Exception, config: TestConfig, mocker: MockerFixture) -> None:
+    """Verify that the SiteMoveVerifier keeps working if myquota is missing or hangs."""
+    run_mock = mocker.patch("lta.site_move_verifier.run_command", new_callable=AsyncMock)
+    run_mock.side_effect = error
+    p = SiteMoveVerifier(config, logging.getLogger())
+    await p._refresh_quota()
+    assert p._do_status() == {"quota": []}
+
+
+@pytest.mark.asyncio
+async def test_do_status_myquota_unparseable(config: TestConfig, mocker: MockerFixture) -> None:
+    """Verify that the SiteMoveVerifier keeps the last quota it understood if myquota output can't be parsed."""
+    run_mock = mocker.patch("lta.site_move_verifier.run_command", new_callable=AsyncMock)
+    run_mock.return_value = ObjectLiteral(
+        returncode=0,
+        args=MYQUOTA_ARGS,
+        stdout=b"FILESYSTEM   SPACE_USED   SPACE_QUOTA\nhome         1.90GiB      40.00GiB\n",
+        stderr="",
+    )
+    p = SiteMoveVerifier(config, logging.getLogger())
+    await p._refresh_quota()
+    quota = p._do_status()["quota"]
+    assert quota == [{"FILESYSTEM": "home", "SPACE_USED": "1.90GiB", "SPACE_QUOTA": "40.00GiB"}]
+    run_mock.return_value = ObjectLiteral(
+        returncode=0,
+        args=MYQUOTA_ARGS,
+        stdout=b"FILESYSTEM   SPACE_USED   SPACE_QUOTA\nhome\n",
+        stderr="",
+    )
+    await p._refresh_quota()
+    assert p._do_status() == {"quota": quota}
+
+
+@pytest.mark.asyncio
+async def test_site_move_verifier_run_refreshes_quota(config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that the SiteMoveVerifier checks disk usage at the start of each work cycle."""
+    rq_mock = mocker.patch("lta.site_move_verifier.SiteMoveVerifier._refresh_quota", new_callable=AsyncMock)
+    p = SiteMoveVerifier(config, logging.getLogger())
+    p._do_work = AsyncMock()  # type: ignore[method-assign]
+    await p.run()
+    rq_mock.assert_called()
+    p._do_work.assert_called()
+
+
 @pytest.mark.asyncio
 async def test_site_move_verifier_logs_configuration(mocker: MockerFixture) -> None:
     """Test to make sure the SiteMoveVerifier logs its configuration."""
     logger_mock = mocker.MagicMock()
     site_move_verifier_config = {
+        "CHECKSUM_SOURCES": "transfer,local",
         "CLIENT_ID": "long-term-archive",
         "CLIENT_SECRET": "hunter2",  # http://bash.org/?244321
         "COMPONENT_NAME": "logme-testing-site_move_verifier",
@@ -177,6 +234,7 @@ async def test_site_move_verifier_logs_configuration(mocker: MockerFixture) -> N
     SiteMoveVerifier(site_move_verifier_config, logger_mock)
     EXPECTED_LOGGER_CALLS = [
         call("site_move_verifier 'logme-testing-site_move_verifier' is configured:"),
+        call('CHECKSUM_SOURCES = transfer,local'),
         call('CLIENT_ID = long-term-archive'),
         call('CLIENT_SECRET = [秘密]'),
         call('COMPONENT_NAME = logme-testing-site_move_verifier'),
@@ -373,4 +431,122 @@ async def test_site_move_verifier_verify_bundle_good_checksum(config: TestConfig
         "reason": "",
         "update_timestamp": mocker.ANY,
         "claimed": False,
+        "dest_checksum_source": "local",
+    })
+
+
+def test_constructor_unknown_checksum_source(config: TestConfig) -> None:
+    """Test that the SiteMoveVerifier rejects a checksum source it does not know."""
+    config["CHECKSUM_SOURCES"] = "transfer,carrier-pigeon"
+    with pytest.raises(ValueError, match="carrier-pigeon"):
+        SiteMoveVerifier(config, logging.getLogger())
+
+
+def test_constructor_checksum_sources_local_fallback(config: TestConfig) -> None:
+    """Test that the SiteMoveVerifier always falls back on a local checksum."""
+    config["CHECKSUM_SOURCES"] = "transfer"
+    p = SiteMoveVerifier(config, logging.getLogger())
+    assert p.checksum_sources == ["transfer", "local"]
+
+
+@pytest.mark.asyncio
+async def test_site_move_verifier_verify_bundle_transfer_checksum(config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that _verify_bundle trusts the checksum reported by the transfer service."""
+    config["CHECKSUM_SOURCES"] = "transfer,local"
+    lta_rc_mock = mocker.patch("rest_tools.client.RestClient", new_callable=AsyncMock)
+    hash_mock = mocker.patch("lta.site_move_verifier.sha512sum")
+    bundle_obj = {
+        "uuid": "8286d3ba-fb1b-4923-876d-935bdf7fc99e",
+        "checksum": {
+            "sha512": "12345",
+        },
+        "transfer_checksum": {
+            "sha512": "12345",
+            "service": "desy-webdav",
+        },
+    }
+    p = SiteMoveVerifier(config, logging.getLogger())
+    await p._verify_bundle(lta_rc_mock, bundle_obj, "/path/to/rse/8286d3ba-fb1b-4923-876d-935bdf7fc99e.zip")
+    hash_mock.assert_not_called()
+    lta_rc_mock.request.assert_called_with("PATCH", '/Bundles/8286d3ba-fb1b-4923-876d-935bdf7fc99e', {
+        "status": "taping",
+        "reason": "",
+        "update_timestamp": mocker.ANY,
+        "claimed": False,
+        "dest_checksum_source": "transfer",
+    })
+
+
+@pytest.mark.asyncio
+async def test_site_move_verifier_verify_bundle_transfer_checksum_missing(config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that _verify_bundle computes the checksum locally if the transfer service did not report one."""
+    config["CHECKSUM_SOURCES"] = "transfer,local"
+    lta_rc_mock = mocker.patch("rest_tools.client.RestClient", new_callable=AsyncMock)
+    hash_mock = mocker.patch("lta.site_move_verifier.sha512sum")
+    hash_mock.return_value = "12345"
+    bundle_obj = {
+        "uuid": "8286d3ba-fb1b-4923-876d-935bdf7fc99e",
+        "checksum": {
+            "sha512": "12345",
+        },
+    }
+    p = SiteMoveVerifier(config, logging.getLogger())
+    await p._verify_bundle(lta_rc_mock, bundle_obj, "/path/to/rse/8286d3ba-fb1b-4923-876d-935bdf7fc99e.zip")
+    hash_mock.assert_called_with("/path/to/rse/8286d3ba-fb1b-4923-876d-935bdf7fc99e.zip")
+    lta_rc_mock.request.assert_called_with("PATCH", '/Bundles/8286d3ba-fb1b-4923-876d-935bdf7fc99e', {
+        "status": "taping",
+        "reason": "",
+        "update_timestamp": mocker.ANY,
+        "claimed": False,
+        "dest_checksum_source": "local",
     })
+
+
+@pytest.mark.asyncio
+async def test_site_move_verifier_verify_bundle_globus_checksum(config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that _verify_bundle trusts only a checksum that Globus verified, if so configured."""
+    config["CHECKSUM_SOURCES"] = "globus,local"
+    lta_rc_mock = mocker.patch("rest_tools.client.RestClient", new_callable=AsyncMock)
+    hash_mock = mocker.patch("lta.site_move_verifier.sha512sum")
+    hash_mock.return_value = "12345"
+    bundle_obj: Dict[str, Any] = {
+        "uuid": "8286d3ba-fb1b-4923-876d-935bdf7fc99e",
+        "checksum": {
+            "sha512": "12345",
+        },
+        "transfer_checksum": {
+            "sha512": "12345",
+            "service": "globus",
+        },
+    }
+    p = SiteMoveVerifier(config, logging.getLogger())
+    await p._verify_bundle(lta_rc_mock, bundle_obj, "/path/to/rse/8286d3ba-fb1b-4923-876d-935bdf7fc99e.zip")
+    hash_mock.assert_not_called()
+    assert lta_rc_mock.request.call_args.args[2]["dest_checksum_source"] == "globus"
+
+    # a checksum from another transfer service is not trusted as a Globus checksum
+    bundle_obj["transfer_checksum"]["service"] = "desy-webdav"
+    await p._verify_bundle(lta_rc_mock, bundle_obj, "/path/to/rse/8286d3ba-fb1b-4923-876d-935bdf7fc99e.zip")
+    hash_mock.assert_called_once()
+    assert lta_rc_mock.request.call_args.args[2]["dest_checksum_source"] == "local"
+
+
+@pytest.mark.asyncio
+async def test_site_move_verifier_verify_bundle_transfer_checksum_bad(config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that _verify_bundle rejects a bad checksum reported by the transfer service."""
+    config["CHECKSUM_SOURCES"] = "transfer"
+    lta_rc_mock = mocker.patch("rest_tools.client.RestClient", new_callable=AsyncMock)
+    bundle_obj = {
+        "uuid": "8286d3ba-fb1b-4923-876d-935bdf7fc99e",
+        "checksum": {
+            "sha512": "12345",
+        },
+        "transfer_checksum": {
+            "sha512": "54321",
+            "service": "desy-webdav",
+        },
+    }
+    p = SiteMoveVerifier(config, logging.getLogger())
+    with pytest.raises(InvalidChecksumException):
+        await p._verify_bundle(lta_rc_mock, bundle_obj, "/path/to/rse/8286d3ba-fb1b-4923-876d-935bdf7fc99e.zip")
+    lta_rc_mock.request.assert_not_called()
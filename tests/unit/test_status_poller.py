@@ -0,0 +1,78 @@
+# test_status_poller.py
+"""Unit tests for lta/rest_server_utils/status_poller.py."""
+
+from typing import Any
+from unittest.mock import AsyncMock, MagicMock
+
+from lta.rest_server_utils.status_poller import make_jobs, StatusCounts, update_status_counts
+from lta.rest_server_utils.utils import PROMETHEUS_QUARANTINE_GAUGE, PROMETHEUS_STATUS_GAUGE
+
+
+def _gauge_value(gauge: Any, **labels: str) -> float:
+    """Read the value of the gauge with the provided labels."""
+    for metric in gauge.collect():
+        for sample in metric.samples:
+            if sample.labels == labels:
+                return float(sample.value)
+    raise KeyError(labels)
+
+
+def _mongo_db(facets: dict[str, dict[str, list[dict[str, Any]]]]) -> MagicMock:
+    """Create a database whose collections answer aggregate() with the provided $facet document."""
+    collections = {}
+    for name, facet in facets.items():
+        cursor = MagicMock()
+        cursor.next = AsyncMock(return_value=facet)
+        collection = MagicMock()
+        collection.aggregate = AsyncMock(return_value=cursor)
+        collections[name] = collection
+    mongo_db = MagicMock()
+    mongo_db.__getitem__.side_effect = collections.__getitem__
+    return mongo_db
+
+
+async def test_update_status_counts() -> None:
+    """Test that update_status_counts counts each collection in one $facet aggregation."""
+    jobs = make_jobs()
+    status_counts = StatusCounts()
+    mongo_db = _mongo_db({
+        "Bundles": {
+            "status": [{"_id": "created", "count": 3}, {"_id": "quarantined", "count": 2}],
+            "original_status": [{"_id": "taping", "count": 1}, {"_id": "<missing>", "count": 1}],
+        },
+        "TransferRequests": {
+            "status": [{"_id": "processing", "count": 5}],
+            "original_status": [],
+        },
+    })
+    await update_status_counts(mongo_db, jobs, status_counts)
+
+    # one aggregation per collection, with a facet for each gauge
+    for name in ["Bundles", "TransferRequests"]:
+        mongo_db[name].aggregate.assert_called_once()
+        pipeline = mongo_db[name].aggregate.call_args.args[0]
+        assert [list(stage) for stage in pipeline] == [["$match"], ["$facet"]]
+        assert set(pipeline[1]["$facet"]) == {"status", "original_status"}
+    assert status_counts.timestamp is not None
+    assert status_counts.counts == {
+        "Bundles": {
+            "status": {"created": 3, "quarantined": 2},
+            "original_status": {"taping": 1, "<missing>": 1},
+        },
+        "TransferRequests": {
+            "status": {"processing": 5},
+            "original_status": {},
+        },
+    }
+    assert _gauge_value(PROMETHEUS_STATUS_GAUGE, collection="Bundles", status="created") == 3
+    assert _gauge_value(PROMETHEUS_QUARANTINE_GAUGE, collection="Bundles", original_status="taping") == 1
+
+    # a status that disappears is reset to zero
+    mongo_db = _mongo_db({
+        "Bundles": {"status": [{"_id": "created", "count": 4}], "original_status": []},
+        "TransferRequests": {"status": [{"_id": "processing", "count": 5}], "original_status": []},
+    })
+    await update_status_counts(mongo_db, jobs, status_counts)
+    assert status_counts.counts["Bundles"] == {"status": {"created": 4}, "original_status": {}}
+    assert _gauge_value(PROMETHEUS_STATUS_GAUGE, collection="Bundles", status="quarantined") == 0
+    assert _gauge_value(PROMETHEUS_QUARANTINE_GAUGE, collection="Bundles", original_status="taping") == 0
@@ -234,25 +234,23 @@ async def test_transfer_request_finisher_update_transfer_request_no(config: Test
         "request": "a8758a77-2a66-46e6-b43d-b4c74d3078a6",
         "status": "deleted",
     }
-    transferring_bundle = {
-        "uuid": "90a664cc-e3f9-4421-973f-7bc2bc7407d0",
-        "request": "a8758a77-2a66-46e6-b43d-b4c74d3078a6",
-        "status": "transferring",
-    }
     lta_rc_mock = mocker.patch("rest_tools.client.RestClient", new_callable=AsyncMock)
     lta_rc_mock.request.side_effect = [
         {
-            "results": [
-                "8286d3ba-fb1b-4923-876d-935bdf7fc99e",
-                "90a664cc-e3f9-4421-973f-7bc2bc7407d0",
-            ],
+            "completed": False,
+            "counts": {"deleted": 1, "transferring": 1},
+            "waiting": 1,
+            "count": 0,
         },
-        deleted_bundle,
-        transferring_bundle,
-        deleted_bundle,
+        {},
     ]
     p = TransferRequestFinisher(config, logging.getLogger())
     await p._update_transfer_request(lta_rc_mock, deleted_bundle)
+    assert lta_rc_mock.request.call_count == 2
+    lta_rc_mock.request.assert_any_call("POST", '/TransferRequests/a8758a77-2a66-46e6-b43d-b4c74d3078a6/actions/try_complete', {
+        "claimant": f"{p.name}-{p.instance_uuid}",
+        "bundle_status": "finished",
+    })
     lta_rc_mock.request.assert_called_with("PATCH", '/Bundles/8286d3ba-fb1b-4923-876d-935bdf7fc99e', {
         'claimed': False,
         'update_timestamp': mocker.ANY,
@@ -268,37 +266,20 @@ async def test_transfer_request_finisher_update_transfer_request_yes(config: Tes
         "request": "a8758a77-2a66-46e6-b43d-b4c74d3078a6",
         "status": "deleted",
     }
-    finished_bundle = {
-        "uuid": "90a664cc-e3f9-4421-973f-7bc2bc7407d0",
-        "request": "a8758a77-2a66-46e6-b43d-b4c74d3078a6",
-        "status": "finished",
-    }
-    transfer_request = {
-        "uuid": "a8758a77-2a66-46e6-b43d-b4c74d3078a6",
-    }
     lta_rc_mock = mocker.patch("rest_tools.client.RestClient", new_callable=AsyncMock)
     lta_rc_mock.request.side_effect = [
         {
-            "results": [
-                "8286d3ba-fb1b-4923-876d-935bdf7fc99e",
-                "90a664cc-e3f9-4421-973f-7bc2bc7407d0",
-            ],
+            "completed": True,
+            "counts": {"deleted": 1, "finished": 1},
+            "waiting": 0,
+            "count": 2,
         },
-        deleted_bundle,
-        finished_bundle,
-        transfer_request,
-        deleted_bundle,
-        finished_bundle,
     ]
     p = TransferRequestFinisher(config, logging.getLogger())
     await p._update_transfer_request(lta_rc_mock, deleted_bundle)
-    lta_rc_mock.request.assert_called_with("PATCH", '/Bundles/90a664cc-e3f9-4421-973f-7bc2bc7407d0', {
-        "claimant": mocker.ANY,
-        "claimed": False,
-        "claim_timestamp": mocker.ANY,
-        "status": "finished",
-        "reason": "",
-        "update_timestamp": mocker.ANY,
+    lta_rc_mock.request.assert_called_once_with("POST", '/TransferRequests/a8758a77-2a66-46e6-b43d-b4c74d3078a6/actions/try_complete', {
+        "claimant": f"{p.name}-{p.instance_uuid}",
+        "bundle_status": "finished",
     })
 
 @pytest.mark.asyncio
@@ -5,10 +5,16 @@
 
 import asyncio
 from asyncio import Task
+import base64
+import hashlib
+import io
+import json
+import logging
 import os
-from pathlib import Path
+from pathlib import Path, PurePosixPath
 from tempfile import NamedTemporaryFile
-from unittest.mock import AsyncMock, MagicMock
+from typing import Any, AsyncIterator, Awaitable, Callable, Union
+from unittest.mock import AsyncMock, call, MagicMock
 
 import pycurl
 import pytest
@@ -17,20 +23,60 @@ from tornado.httpclient import HTTPError
 
 from lta.transfer.sync import (
     _as_task,
+    BandwidthLimiter,
     bind_setup_curl,
     _decode_if_necessary,
     convert_checksum_from_dcache,
     sha512sum,
     connection_semaphore,
     DirObject,
+    get_bandwidth_limiter,
+    get_remote_dir_cache,
+    make_curl_share,
+    HashingReader,
     ParallelAsync,
+    PROMETHEUS_AGGREGATE_THROUGHPUT,
+    PROMETHEUS_DIR_CACHE_LOOKUPS_TOTAL,
+    PROMETHEUS_TREE_JOBS_QUEUED,
+    PROMETHEUS_TREE_JOBS_TOTAL,
+    PROMETHEUS_UPLOAD_BYTES_TOTAL,
+    PROMETHEUS_UPLOAD_THROUGHPUT,
+    RemoteDirCache,
     Sync,
+    TreeWorkQueue,
 )
-from .utils import ObjectLiteral
+from .fake_webdav import FakeWebDav
+from .utils import NicheException, ObjectLiteral
 
 TestConfig = dict[str, str]
 
 
+def streaming_fetch(body: str, chunk_size: int = 64) -> Callable[[Any], Awaitable[ObjectLiteral]]:
+    """Make a side_effect for http_client.fetch that streams the body in chunks, like tornado does."""
+    async def fetch(req: Any) -> ObjectLiteral:
+        data = body.encode("utf-8")
+        for i in range(0, len(data), chunk_size):
+            req.streaming_callback(data[i:i + chunk_size])
+        return ObjectLiteral(body=b"")
+    return fetch
+
+
+def listings(*results: Union[dict[str, Any], Exception]) -> Callable[[str], AsyncIterator[dict[str, Any]]]:
+    """Make a side_effect for Sync.iter_children that streams each of the directory listings in turn."""
+    remaining = list(results)
+
+    def iter_children(path_str: str) -> AsyncIterator[dict[str, Any]]:
+        result = remaining.pop(0)
+
+        async def stream() -> AsyncIterator[dict[str, Any]]:
+            if isinstance(result, Exception):
+                raise result
+            for name, child in result.items():
+                yield {"name": name, **child}
+        return stream()
+    return iter_children
+
+
 @pytest.fixture
 def config() -> TestConfig:
     """Supply a stock DesyMirrorReplicator component configuration."""
@@ -81,6 +127,22 @@ def test_bind_setup_curl() -> None:
     curl_mock.setopt.assert_called_with(pycurl.VERBOSE, True)
 
 
+def test_bind_setup_curl_share() -> None:
+    """Test that bind_setup_curl can share DNS lookups and TLS sessions among curl handles."""
+    share = make_curl_share()
+    setup_curl = bind_setup_curl({"LOG_LEVEL": "INFO"}, share)
+    c = MagicMock()
+    setup_curl(c)
+    c.setopt.assert_any_call(pycurl.SHARE, share)
+
+
+def make_jwt(exp: float) -> str:
+    """Make an (unsigned) JWT that expires at the provided time."""
+    def b64(data: dict[str, object]) -> str:
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+    return f'{b64({"alg": "none"})}.{b64({"exp": exp})}.'
+
+
 def test_decode_if_necessary() -> None:
     """Test that _decode_if_necessary decodes if necessary."""
     assert _decode_if_necessary(None) is None
@@ -107,6 +169,194 @@ def test_sha512sum_tempfile() -> None:
     os.remove(temp.name)
 
 
+def test_hashing_reader_rewind() -> None:
+    """Test that HashingReader starts the hash over when curl seeks back."""
+    data = os.urandom(100000)
+    reader = HashingReader(io.BytesIO(data), len(data))
+    assert reader.read(30000) == data[:30000]
+    assert reader.hexdigest() is None
+    # rewind to the start, and to the middle
+    assert reader.seek(0, os.SEEK_SET) == pycurl.SEEKFUNC_OK
+    assert reader.read(60000) == data[:60000]
+    assert reader.seek(10000, os.SEEK_SET) == pycurl.SEEKFUNC_OK
+    assert reader.position == 10000
+    while reader.read(16384):
+        pass
+    assert reader.hexdigest() == hashlib.sha512(data).hexdigest()
+    # can't seek past the end of the file
+    assert reader.seek(len(data) + 1, os.SEEK_SET) == pycurl.SEEKFUNC_FAIL
+
+
+def dir_cache_lookups(result: str) -> float:
+    """Return the number of mkdir_p directory cache lookups with the provided result."""
+    return sum(sample.value
+               for metric in PROMETHEUS_DIR_CACHE_LOOKUPS_TOTAL.collect()
+               for sample in metric.samples
+               if sample.name.endswith("_total") and sample.labels["result"] == result)
+
+
+def histogram_count(histogram: Any) -> float:
+    """Return the number of observations made by the provided histogram."""
+    return sum(sample.value
+               for metric in histogram.collect()
+               for sample in metric.samples
+               if sample.name.endswith("_count"))
+
+
+def upload_bytes() -> float:
+    """Return the number of bytes handed to curl for upload."""
+    return sum(sample.value
+               for metric in PROMETHEUS_UPLOAD_BYTES_TOTAL.collect()
+               for sample in metric.samples
+               if sample.name.endswith("_total"))
+
+
+def test_bandwidth_limiter(mocker: MockerFixture) -> None:
+    """Test that BandwidthLimiter lets bytes through no faster than its rate, and can be changed on the fly."""
+    windows = histogram_count(PROMETHEUS_AGGREGATE_THROUGHPUT)
+    uploaded = upload_bytes()
+    monotonic_mock = mocker.patch("lta.transfer.sync.time.monotonic", return_value=1000.0)
+    limiter = BandwidthLimiter("https://desy.de", 1_000_000)
+    # the bucket starts empty
+    assert limiter.grant(2_000_000) == 0
+    assert limiter.delay(2_000_000) == pytest.approx(0.065536)
+    # and fills at the rate, but only to a second's worth
+    monotonic_mock.return_value = 1010.0
+    assert limiter.grant(2_000_000) == 1_000_000
+    assert limiter.grant(2_000_000) == 0
+    monotonic_mock.return_value = 1010.5
+    assert limiter.grant(100) == 100
+    assert limiter.grant(2_000_000) == 499_900
+    # a slower rate keeps no more than its own burst
+    monotonic_mock.return_value = 1020.0
+    limiter.set_rate(50_000)
+    assert limiter.capacity == 65536
+    assert limiter.grant(2_000_000) == 65536
+    # no limit at all
+    limiter.set_rate(0)
+    assert limiter.grant(2_000_000) == 2_000_000
+    assert limiter.delay(2_000_000) == 0.0
+    # throughput is measured in windows
+    limiter.record(1_000_000)
+    monotonic_mock.return_value = 1022.0
+    limiter.record(5)
+    assert histogram_count(PROMETHEUS_AGGREGATE_THROUGHPUT) - windows == 1
+    assert upload_bytes() - uploaded == 1_000_005
+
+
+def test_get_bandwidth_limiter() -> None:
+    """Test that get_bandwidth_limiter() shares one limiter per WebDAV host."""
+    a = get_bandwidth_limiter("https://desy.de")
+    assert get_bandwidth_limiter("https://desy.de") is a
+    assert get_bandwidth_limiter("https://example.com") is not a
+    assert a.rate == 0
+
+
+def tree_jobs(operation: str, outcome: str) -> float:
+    """Return the number of tree jobs of the provided operation that finished with the provided outcome."""
+    return sum(sample.value
+               for metric in PROMETHEUS_TREE_JOBS_TOTAL.collect()
+               for sample in metric.samples
+               if sample.name.endswith("_total")
+               and sample.labels["operation"] == operation
+               and sample.labels["outcome"] == outcome)
+
+
+def tree_jobs_queued(operation: str) -> float:
+    """Return the number of tree jobs of the provided operation that are waiting for a worker."""
+    return sum(sample.value
+               for metric in PROMETHEUS_TREE_JOBS_QUEUED.collect()
+               for sample in metric.samples
+               if sample.labels["operation"] == operation)
+
+
+@pytest.mark.asyncio
+async def test_tree_work_queue_breadth_first() -> None:
+    """Test that TreeWorkQueue runs jobs (and the jobs they add) breadth-first, with a fixed pool of workers."""
+    work = TreeWorkQueue("test_bfs", 3)
+    seen: list[str] = []
+    busy = 0
+    most_busy = 0
+
+    async def visit(node: str) -> None:
+        nonlocal busy, most_busy
+        busy += 1
+        most_busy = max(most_busy, busy)
+        await asyncio.sleep(0)
+        seen.append(node)
+        if len(node) < 4:
+            for c in "ab":
+                work.put("visit", lambda n=node + c: visit(n))  # type: ignore[misc]
+        busy -= 1
+
+    work.put("visit", lambda: visit("r"))
+    await work.run()
+
+    assert len(seen) == 15
+    assert [len(n) for n in seen] == sorted(len(n) for n in seen)
+    assert most_busy == 3
+    assert tree_jobs("test_bfs", "success") == 15
+    assert tree_jobs_queued("test_bfs") == 0
+
+
+@pytest.mark.asyncio
+async def test_tree_work_queue_error() -> None:
+    """Test that TreeWorkQueue stops doing work after a job fails, and raises the error."""
+    work = TreeWorkQueue("test_error", 1)
+    done: list[int] = []
+
+    async def job(i: int) -> None:
+        if i == 2:
+            raise NicheException("Nope")
+        done.append(i)
+
+    for i in range(5):
+        work.put("job", lambda i=i: job(i))  # type: ignore[misc]
+    with pytest.raises(NicheException):
+        await work.run()
+
+    assert done == [0, 1]
+    assert tree_jobs("test_error", "success") == 2
+    assert tree_jobs("test_error", "failure") == 1
+    assert tree_jobs("test_error", "skipped") == 2
+    assert tree_jobs_queued("test_error") == 0
+
+
+def test_remote_dir_cache(mocker: MockerFixture) -> None:
+    """Test that RemoteDirCache remembers directories (and their parents) until they expire or are discarded."""
+    monotonic_mock = mocker.patch("lta.transfer.sync.time.monotonic", return_value=1000.0)
+    cache = RemoteDirCache(60)
+    cache.add(Path("/archive/2024/PFRaw/0101"))
+    cache.add(Path("/archive/2024/PFRaw/0102"))
+    assert Path("/archive/2024/PFRaw/0101") in cache
+    assert Path("/archive/2024") in cache
+    assert Path("/archive/2024/PFRaw/0103") not in cache
+    # forgetting a directory forgets everything below it
+    cache.discard(Path("/archive/2024/PFRaw/0101"))
+    assert Path("/archive/2024/PFRaw/0101") not in cache
+    assert Path("/archive/2024/PFRaw/0102") in cache
+    cache.discard(Path("/archive/2024"))
+    assert Path("/archive/2024/PFRaw/0102") not in cache
+    assert Path("/archive") in cache
+    # directories are forgotten when they expire
+    monotonic_mock.return_value = 1061.0
+    assert Path("/archive") not in cache
+    # a TTL of 0 disables the cache
+    cache.ttl_seconds = 0
+    cache.add(Path("/archive"))
+    assert Path("/archive") not in cache
+
+
+def test_get_remote_dir_cache() -> None:
+    """Test that Sync objects talking to the same WebDAV host share a directory cache."""
+    a = get_remote_dir_cache("https://globe-door.ifh.de:2880", 600)
+    b = get_remote_dir_cache("https://globe-door.ifh.de:2880", 60)
+    c = get_remote_dir_cache("https://other-door.ifh.de:2880", 600)
+    assert a is b
+    assert a is not c
+    assert a.ttl_seconds == 60
+
+
 @pytest.mark.asyncio
 async def test_connection_semaphore_limits_concurrency() -> None:
     """Test that the connection_semaphore decorator limits concurrency of async class methods."""
@@ -308,15 +558,17 @@ async def test_sync_get_children(config: TestConfig, mocker: MockerFixture) -> N
     """
     rc_mock = MagicMock()
     rc_mock.access_token = "Ash nazg durbatulûk, ash nazg gimbatul, ash nazg thrakatulûk, agh burzum-ishi krimpatul"
-    ret_mock = MagicMock()
-    ret_mock.body = bytes(XML_RESPONSE.strip(), "utf-8")
     hc_mock = AsyncMock()
-    hc_mock.fetch.return_value = ret_mock
+    hc_mock.fetch.side_effect = streaming_fetch(XML_RESPONSE.strip())
     sync = Sync(config)
     sync.rc = rc_mock
     sync.http_client = hc_mock
 
-    await sync.get_children("/fake/path/does/not/really/exist")
+    sync.config["DEST_BASE_PATH"] = "/"
+    children = await sync.get_children("/base")
+    assert list(children) == ["file1.txt", "dir2", "file2.txt"]
+    assert children["dir2"]["type"] == DirObject.Directory
+    assert children["file2.txt"]["type"] == DirObject.Directory  # too few props to say otherwise
 
     hc_mock.fetch.assert_called_with(mocker.ANY)
     rc_mock._get_token.assert_called()
@@ -350,10 +602,8 @@ async def test_sync_get_children_whole_lotta_props(config: TestConfig, mocker: M
     """
     rc_mock = MagicMock()
     rc_mock.access_token = "Ash nazg durbatulûk, ash nazg gimbatul, ash nazg thrakatulûk, agh burzum-ishi krimpatul"
-    ret_mock = MagicMock()
-    ret_mock.body = bytes(XML_RESPONSE.strip(), "utf-8")
     hc_mock = AsyncMock()
-    hc_mock.fetch.return_value = ret_mock
+    hc_mock.fetch.side_effect = streaming_fetch(XML_RESPONSE.strip())
     sync = Sync(config)
     sync.rc = rc_mock
     sync.http_client = hc_mock
@@ -375,6 +625,195 @@ async def test_sync_get_children_whole_lotta_props(config: TestConfig, mocker: M
     rc_mock._get_token.assert_called()
 
 
+def propfind_response(names: list[str]) -> str:
+    """Make the PROPFIND response that lists the provided files in /base."""
+    responses = "".join(f"""
+        <d:response>
+            <d:href>/base/{name}</d:href>
+            <d:propstat><d:prop><d:iscollection>FALSE</d:iscollection></d:prop></d:propstat>
+        </d:response>""" for name in names)
+    return f"""<?xml version="1.0" encoding="utf-8"?>
+        <d:multistatus xmlns:d="DAV:">
+        <d:response><d:href>/base/</d:href></d:response>{responses}
+        </d:multistatus>"""
+
+
+@pytest.mark.asyncio
+async def test_sync_iter_children_yields_as_response_arrives(config: TestConfig) -> None:
+    """Test that Sync.iter_children() yields the first children before the rest of the response arrives."""
+    first_child_seen = asyncio.Event()
+    data = propfind_response([f"file{i}.txt" for i in range(100)]).encode("utf-8")
+
+    async def fetch(req: Any) -> ObjectLiteral:
+        # a stalled server can't hang the listing forever
+        assert req.request_timeout == 600
+        req.streaming_callback(data[:1000])
+        # the rest of the response doesn't show up until somebody has seen a child
+        await asyncio.wait_for(first_child_seen.wait(), 5)
+        req.streaming_callback(data[1000:])
+        return ObjectLiteral(body=b"")
+
+    rc_mock = MagicMock()
+    rc_mock.access_token = "speak-friend-and-enter"
+    hc_mock = AsyncMock()
+    hc_mock.fetch.side_effect = fetch
+    sync = Sync(config)
+    sync.rc = rc_mock
+    sync.http_client = hc_mock
+    sync.config["DEST_BASE_PATH"] = "/"
+
+    names = []
+    async for child in sync.iter_children("/base"):
+        names.append(child["name"])
+        first_child_seen.set()
+    assert names == [f"file{i}.txt" for i in range(100)]
+
+
+@pytest.mark.asyncio
+async def test_sync_iter_children_stop_early(config: TestConfig) -> None:
+    """Test that a caller can stop consuming Sync.iter_children() early, and the connection is given back."""
+    rc_mock = MagicMock()
+    rc_mock.access_token = "speak-friend-and-enter"
+    hc_mock = AsyncMock()
+    hc_mock.fetch.side_effect = streaming_fetch(propfind_response([f"file{i}.txt" for i in range(100)]))
+    sync = Sync(config)
+    sync.rc = rc_mock
+    sync.http_client = hc_mock
+    sync.config["DEST_BASE_PATH"] = "/"
+
+    found = await sync._find_child(Path("/base/file3.txt"))
+    assert found is not None and found["name"] == "file3.txt"
+    assert await sync._find_child(Path("/base/file100.txt")) is None
+    await asyncio.sleep(0)
+    assert sync._semaphore._value == int(config["MAX_PARALLEL"])
+
+
+@pytest.mark.asyncio
+async def test_sync_get_children_webdav(config: TestConfig, fake_webdav: FakeWebDav) -> None:
+    """Test that Sync.get_children() can handle a large directory at DESY."""
+    config["DEST_URL"] = fake_webdav.url
+    config["LOG_LEVEL"] = "INFO"
+    base = config["DEST_BASE_PATH"]
+    fake_webdav.mkdir_p(f"{base}/big/sub")
+    for i in range(5000):
+        fake_webdav.add_file(f"{base}/big/file{i:05}.txt", b"x" * (i % 7))
+    rc_mock = MagicMock()
+    rc_mock.access_token = "speak-friend-and-enter"
+    sync = Sync(config)
+    sync.rc = rc_mock
+    try:
+        children = await sync.get_children("/big")
+    finally:
+        sync.close()
+    assert len(children) == 5001
+    assert children["sub"]["type"] == DirObject.Directory
+    assert children["file00012.txt"] == {
+        "name": "file00012.txt",
+        "type": DirObject.File,
+        "size": 5,
+        "checksums": {"sha-512": hashlib.sha512(b"xxxxx").hexdigest()},
+        "tape": False,
+    }
+
+
+@pytest.mark.asyncio
+async def test_sync_rmtree_webdav(config: TestConfig, fake_webdav: FakeWebDav) -> None:
+    """Test that Sync.rmtree() removes a whole tree at DESY, and leaves its neighbors alone."""
+    config["DEST_URL"] = fake_webdav.url
+    config["LOG_LEVEL"] = "INFO"
+    base = config["DEST_BASE_PATH"]
+    for d in ["tree", "tree/a", "tree/a/b", "tree/c", "neighbor"]:
+        fake_webdav.mkdir_p(f"{base}/{d}")
+        for i in range(20):
+            fake_webdav.add_file(f"{base}/{d}/file{i}.txt", b"")
+    rc_mock = MagicMock()
+    rc_mock.access_token = "speak-friend-and-enter"
+    sync = Sync(config)
+    sync.rc = rc_mock
+    try:
+        await sync.rmtree(Path("/tree"))
+        await sync.rmtree(Path("/tree"))  # already gone
+    finally:
+        sync.close()
+    assert sorted(str(f.relative_to(base)) for f in fake_webdav.files) == sorted(f"neighbor/file{i}.txt" for i in range(20))
+    assert PurePosixPath(f"{base}/tree") not in fake_webdav.dirs
+    assert fake_webdav.requests["DELETE"] == 84
+
+
+@pytest.mark.asyncio
+async def test_sync_rmtree_100k_entries(config: TestConfig, caplog: pytest.LogCaptureFixture) -> None:
+    """Test that Sync.rmtree() removes a tree with 100k entries breadth-first, without exceeding MAX_PARALLEL."""
+    # logging 100k RMFILE lines would take longer than removing the files
+    caplog.set_level(logging.WARNING)
+    config["LOG_LEVEL"] = "INFO"
+    config["MAX_PARALLEL"] = "2"
+    base = config["DEST_BASE_PATH"]
+    dav = FakeWebDav()
+    for i in range(10):
+        for j in range(10):
+            fake_dir = f"{base}/big/d{i}/d{j}"
+            dav.mkdir_p(fake_dir)
+            for k in range(1000):
+                dav.add_file(f"{fake_dir}/f{k}")
+    dav.mkdir_p(f"{base}/neighbor")
+    assert len(dav.files) == 100_000
+    rc_mock = MagicMock()
+    rc_mock.access_token = "speak-friend-and-enter"
+    sync = Sync(config)
+    sync.rc = rc_mock
+    sync.close()
+    client = dav.client()
+    sync.http_client = client  # type: ignore[assignment]
+
+    await asyncio.wait_for(sync.rmtree(Path("/big")), 300)
+
+    assert not dav.files
+    assert dav.dirs == {PurePosixPath(f"{base}/neighbor"), PurePosixPath(base), *PurePosixPath(base).parents}
+    assert dav.requests["DELETE"] == 100_000 + 111
+    assert client.max_in_flight == 2
+    # breadth-first: the parent directory, then /big, then the d{i}, then the d{i}/d{j}
+    depths = [len(p.parts) for p in dav.listed]
+    assert depths == sorted(depths)
+    assert len(dav.listed) == 1 + 111
+
+
+@pytest.mark.asyncio
+async def test_sync_sync_dir_webdav(config: TestConfig, fake_webdav: FakeWebDav, tmp_path: Path) -> None:
+    """Test that Sync.sync_dir() and Sync.put_path() bring DESY up to date, even with a single connection."""
+    config["DEST_URL"] = fake_webdav.url
+    config["LOG_LEVEL"] = "INFO"
+    config["MAX_PARALLEL"] = "1"
+    base = config["DEST_BASE_PATH"]
+    for d in ["a", "a/b", "c"]:
+        (tmp_path / d).mkdir(parents=True, exist_ok=True)
+        for i in range(3):
+            (tmp_path / d / f"file{i}.txt").write_bytes(b"x" * i)
+    remote = f"{base}{tmp_path}"
+    fake_webdav.mkdir_p(f"{remote}/a")
+    fake_webdav.add_file(f"{remote}/a/file1.txt", b"y")  # up to date, by size
+    fake_webdav.add_file(f"{remote}/a/file2.txt", b"y")  # stale
+    fake_webdav.add_file(f"{remote}/a/_upload_file0.txt", b"y")  # failed upload
+    fake_webdav.mkdir_p(f"{remote}/c/file0.txt")  # should be a file
+    fake_webdav.mkdir_p(f"{base}/x")
+    rc_mock = MagicMock()
+    rc_mock.access_token = "speak-friend-and-enter"
+    sync = Sync(config)
+    sync.rc = rc_mock
+    try:
+        await asyncio.wait_for(sync.sync_dir(tmp_path), 30)
+        await asyncio.wait_for(sync.put_path(str(tmp_path / "a/file2.txt"), "/x/y/z.txt"), 30)
+    finally:
+        sync.close()
+
+    assert {str(f.relative_to(remote)): data for f, data in fake_webdav.files.items() if f.is_relative_to(remote)} == {
+        f"{d}/file{i}.txt": b"y" if (d, i) == ("a", 1) else b"x" * i
+        for d in ["a", "a/b", "c"]
+        for i in range(3)
+    }
+    assert fake_webdav.files[PurePosixPath(f"{base}/x/y/z.txt")] == b"xx"
+    assert fake_webdav.requests["PUT"] == 9
+
+
 @pytest.mark.asyncio
 async def test_sync_get_file(config: TestConfig, mocker: MockerFixture) -> None:
     """Test that the Sync.get_file() method would download a file."""
@@ -413,8 +852,8 @@ async def test_sync_rmtree_does_not_exist(config: TestConfig, mocker: MockerFixt
     sync = Sync(config)
     sync.rc = rc_mock
     sync.http_client = hc_mock
-    gc_mock = mocker.patch("lta.transfer.sync.Sync.get_children")
-    gc_mock.return_value = {}
+    gc_mock = mocker.patch("lta.transfer.sync.Sync.iter_children")
+    gc_mock.side_effect = listings({})
 
     await sync.rmtree(Path("/fake/path/does/not/zomg/a/tree"))
 
@@ -431,12 +870,12 @@ async def test_sync_rmtree_delete_files(config: TestConfig, mocker: MockerFixtur
     sync = Sync(config)
     sync.rc = rc_mock
     sync.http_client = hc_mock
-    gc_mock = mocker.patch("lta.transfer.sync.Sync.get_children")
-    gc_mock.return_value = {
+    gc_mock = mocker.patch("lta.transfer.sync.Sync.iter_children")
+    gc_mock.side_effect = listings({
         "file.txt": {
             "type": DirObject.File
         }
-    }
+    })
     rm_mock = mocker.patch("lta.transfer.sync.Sync.rmfile")
 
     await sync.rmtree(Path("/fake/path/to/actually/a/file.txt"))
@@ -455,8 +894,8 @@ async def test_sync_rmtree_recurse_directory(config: TestConfig, mocker: MockerF
     sync = Sync(config)
     sync.rc = rc_mock
     sync.http_client = hc_mock
-    gc_mock = mocker.patch("lta.transfer.sync.Sync.get_children")
-    gc_mock.side_effect = [
+    gc_mock = mocker.patch("lta.transfer.sync.Sync.iter_children")
+    gc_mock.side_effect = listings(
         {
             "dir": {
                 "type": DirObject.Directory,
@@ -472,15 +911,19 @@ async def test_sync_rmtree_recurse_directory(config: TestConfig, mocker: MockerF
                 "type": DirObject.Directory,
             }
         },
+        {},
         Exception("Nope"),
-    ]
+    )
     rm_mock = mocker.patch("lta.transfer.sync.Sync.rmfile")
-    tg_mock = mocker.patch("asyncio.TaskGroup.create_task")
 
     await sync.rmtree(Path("/fake/path/to/a/dir"))
 
-    tg_mock.assert_called()
-    rm_mock.assert_called()
+    # files first, then the directories, deepest first
+    assert rm_mock.call_args_list == [
+        call("/fake/path/to/a/dir/a.txt", 600),
+        call("/fake/path/to/a/dir/dir_b", 600),
+        call("/fake/path/to/a/dir", 600),
+    ]
     hc_mock.fetch.assert_not_called()
     rc_mock._get_token.assert_not_called()
 
@@ -625,7 +1068,8 @@ async def test_sync_sync_dir_empty(config: TestConfig, mocker: MockerFixture) ->
     sync.rc = rc_mock
     sync.http_client = hc_mock
 
-    gc_mock = mocker.patch("lta.transfer.sync.Sync.get_children")
+    gc_mock = mocker.patch("lta.transfer.sync.Sync.iter_children")
+    gc_mock.side_effect = listings({})
     glc_mock = mocker.patch("lta.transfer.sync.Sync.get_local_children")
 
     await sync.sync_dir(Path("/fake/path/to/sync"))
@@ -647,8 +1091,8 @@ async def test_sync_sync_dir_remove_failed_uploads(config: TestConfig, mocker: M
     sync.rc = rc_mock
     sync.http_client = hc_mock
 
-    gc_mock = mocker.patch("lta.transfer.sync.Sync.get_children")
-    gc_mock.side_effect = [
+    gc_mock = mocker.patch("lta.transfer.sync.Sync.iter_children")
+    gc_mock.side_effect = listings(
         {
             "sync": {
                 "name": "sync",
@@ -662,15 +1106,13 @@ async def test_sync_sync_dir_remove_failed_uploads(config: TestConfig, mocker: M
                 "size": 12345,
             }
         },
-    ]
+    )
     glc_mock = mocker.patch("lta.transfer.sync.Sync.get_local_children")
-    tg_mock = mocker.patch("asyncio.TaskGroup.create_task")
     rmf_mock = mocker.patch("lta.transfer.sync.Sync.rmfile")
 
     await sync.sync_dir(Path("/fake/path/to/sync"))
 
-    rmf_mock.assert_called()
-    tg_mock.assert_called()
+    rmf_mock.assert_called_with("/fake/path/to/sync/_upload_SomeFile.txt")
     gc_mock.assert_called()
     glc_mock.assert_called()
 
@@ -678,6 +1120,55 @@ async def test_sync_sync_dir_remove_failed_uploads(config: TestConfig, mocker: M
     rc_mock._get_token.assert_not_called()
 
 
+@pytest.mark.asyncio
+async def test_sync_sync_dir_remove_failed_uploads_before_uploading(config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that Sync.sync_dir() deletes failed uploads before it uploads files of the same name."""
+    config["MAX_PARALLEL"] = "4"
+    sync = Sync(config)
+    sync.rc = MagicMock()
+    sync.http_client = AsyncMock()
+    events = []
+
+    async def rmfile(path: str) -> None:
+        await asyncio.sleep(0.01)
+        events.append(("rmfile", path))
+
+    async def put_file(path: str) -> None:
+        events.append(("put_file", path))
+
+    mocker.patch("lta.transfer.sync.Sync.iter_children", side_effect=listings(
+        {
+            "sync": {
+                "name": "sync",
+                "type": DirObject.Directory,
+            }
+        },
+        {
+            "_upload_SomeFile.txt": {
+                "name": "_upload_SomeFile.txt",
+                "type": DirObject.File,
+                "size": 12345,
+            }
+        },
+    ))
+    mocker.patch("lta.transfer.sync.Sync.get_local_children", return_value={
+        "SomeFile.txt": {
+            "name": "SomeFile.txt",
+            "type": DirObject.File,
+            "size": 12345,
+        }
+    })
+    mocker.patch("lta.transfer.sync.Sync.rmfile", side_effect=rmfile)
+    mocker.patch("lta.transfer.sync.Sync.put_file", side_effect=put_file)
+
+    await sync.sync_dir(Path("/fake/path/to/sync"))
+
+    assert events == [
+        ("rmfile", "/fake/path/to/sync/_upload_SomeFile.txt"),
+        ("put_file", "/fake/path/to/sync/SomeFile.txt"),
+    ]
+
+
 @pytest.mark.asyncio
 async def test_sync_sync_dir_fix_directory_to_file(config: TestConfig, mocker: MockerFixture) -> None:
     """Test that the Sync.sync_dir() will fix a remote directory by replacement with a local file."""
@@ -685,8 +1176,8 @@ async def test_sync_sync_dir_fix_directory_to_file(config: TestConfig, mocker: M
     rc_mock.access_token = "Ash nazg durbatulûk, ash nazg gimbatul, ash nazg thrakatulûk, agh burzum-ishi krimpatul"
     hc_mock = AsyncMock()
 
-    gc_mock = mocker.patch("lta.transfer.sync.Sync.get_children")
-    gc_mock.side_effect = [
+    gc_mock = mocker.patch("lta.transfer.sync.Sync.iter_children")
+    gc_mock.side_effect = listings(
         {
             "sync": {
                 "name": "sync",
@@ -700,7 +1191,7 @@ async def test_sync_sync_dir_fix_directory_to_file(config: TestConfig, mocker: M
             }
         },
         Exception("Nope"),
-    ]
+    )
     glc_mock = mocker.patch("lta.transfer.sync.Sync.get_local_children")
     glc_mock.side_effect = [
         {
@@ -740,8 +1231,8 @@ async def test_sync_sync_dir_verify_existing_file(config: TestConfig, mocker: Mo
     rc_mock.access_token = "Ash nazg durbatulûk, ash nazg gimbatul, ash nazg thrakatulûk, agh burzum-ishi krimpatul"
     hc_mock = AsyncMock()
 
-    gc_mock = mocker.patch("lta.transfer.sync.Sync.get_children")
-    gc_mock.side_effect = [
+    gc_mock = mocker.patch("lta.transfer.sync.Sync.iter_children")
+    gc_mock.side_effect = listings(
         {
             "sync": {
                 "name": "sync",
@@ -756,7 +1247,7 @@ async def test_sync_sync_dir_verify_existing_file(config: TestConfig, mocker: Mo
             }
         },
         Exception("Nope"),
-    ]
+    )
     glc_mock = mocker.patch("lta.transfer.sync.Sync.get_local_children")
     glc_mock.side_effect = [
         {
@@ -796,8 +1287,8 @@ async def test_sync_sync_dir_will_sync_missing_dir(config: TestConfig, mocker: M
     rc_mock.access_token = "Ash nazg durbatulûk, ash nazg gimbatul, ash nazg thrakatulûk, agh burzum-ishi krimpatul"
     hc_mock = AsyncMock()
 
-    gc_mock = mocker.patch("lta.transfer.sync.Sync.get_children")
-    gc_mock.side_effect = [
+    gc_mock = mocker.patch("lta.transfer.sync.Sync.iter_children")
+    gc_mock.side_effect = listings(
         {
             "sync": {
                 "name": "sync",
@@ -810,8 +1301,9 @@ async def test_sync_sync_dir_will_sync_missing_dir(config: TestConfig, mocker: M
                 "type": DirObject.Directory,
             }
         },
+        {},
         Exception("Nope"),
-    ]
+    )
     glc_mock = mocker.patch("lta.transfer.sync.Sync.get_local_children")
     glc_mock.side_effect = [
         {
@@ -824,8 +1316,11 @@ async def test_sync_sync_dir_will_sync_missing_dir(config: TestConfig, mocker: M
                 "type": DirObject.Directory,
             }
         },
+        {},
+        {},
         Exception("Nope"),
     ]
+    md_mock = mocker.patch("lta.transfer.sync.Sync.mkdir")
     pf_mock = mocker.patch("lta.transfer.sync.Sync.put_file")
     rf_mock = mocker.patch("lta.transfer.sync.Sync.rmfile")
     rt_mock = mocker.patch("lta.transfer.sync.Sync.rmtree")
@@ -835,14 +1330,12 @@ async def test_sync_sync_dir_will_sync_missing_dir(config: TestConfig, mocker: M
     sync.rc = rc_mock
     sync.http_client = hc_mock
 
-    # what's that in the unit test?
-    # it's a bird!
-    # it's a plane!
-    # no, it's Recursive Mock Man!
-    real_sync_dir = sync.sync_dir
-    with mocker.patch.object(sync, "sync_dir"):
-        await real_sync_dir(Path("/fake/path/to/sync"))
+    await sync.sync_dir(Path("/fake/path/to/sync"))
 
+    # the directory that exists is listed, the one that doesn't is created
+    md_mock.assert_called_once_with("/fake/path/to/sync/sync_me_plz")
+    assert gc_mock.call_count == 3
+    assert glc_mock.call_count == 3
     stat_mock.assert_not_called()
     rt_mock.assert_not_called()
     rf_mock.assert_not_called()
@@ -1012,12 +1505,197 @@ async def test_sync_put_file_src_dest_readback_checksum_move(config: TestConfig,
     )
 
     with NamedTemporaryFile(mode="rb", delete=True) as temp:
-        await sync.put_file_src_dest(temp.name, "/fake/temp/files/go/here/temp.txt")
+        checksum = await sync.put_file_src_dest(temp.name, "/fake/temp/files/go/here/temp.txt")
 
+    assert checksum == hashlib.sha512(b"").hexdigest()
     hc_mock.fetch.assert_called_with(mocker.ANY)
     rc_mock._get_token.assert_called()
 
 
+@pytest.mark.asyncio
+async def test_sync_put_file_src_dest_hash_while_uploading(config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that the Sync.put_file_src_dest() method hashes the file as curl reads it, and doesn't read it again."""
+    rc_mock = MagicMock()
+    rc_mock.access_token = "Ash nazg durbatulûk, ash nazg gimbatul, ash nazg thrakatulûk, agh burzum-ishi krimpatul"
+    hc_mock = AsyncMock()
+    sync = Sync(config)
+    sync.rc = rc_mock
+    sync.http_client = hc_mock
+    sha512sum_mock = mocker.patch("lta.transfer.sync.sha512sum")
+
+    data = os.urandom(300000)
+    digest = hashlib.sha512(data).digest()
+    curl_options: dict[int, Any] = {}
+
+    async def fake_fetch(req: object) -> ObjectLiteral:
+        if getattr(req, "method") != "PUT":
+            return ObjectLiteral(headers={})
+        curl_mock = MagicMock()
+        curl_mock.setopt.side_effect = curl_options.__setitem__
+        getattr(req, "prepare_curl_callback")(curl_mock)
+        read = curl_options[pycurl.READFUNCTION]
+        seek = curl_options[pycurl.SEEKFUNCTION]
+        # curl sends part of the file, rewinds for a retry, then sends all of it
+        read(65536)
+        assert seek(0, os.SEEK_SET) == pycurl.SEEKFUNC_OK
+        while read(65536):
+            pass
+        return ObjectLiteral(headers={"Digest": "sha-512=" + base64.b64encode(digest).decode()})
+
+    hc_mock.fetch.side_effect = fake_fetch
+
+    with NamedTemporaryFile(mode="wb", delete=True) as temp:
+        temp.write(data)
+        temp.flush()
+        checksum = await sync.put_file_src_dest(temp.name, "/fake/temp/files/go/here/temp.txt")
+
+    assert checksum == digest.hex()
+    sha512sum_mock.assert_not_called()
+    assert curl_options[pycurl.UPLOAD_BUFFERSIZE] == 1024 * 1024 * 2
+    assert hc_mock.fetch.call_count == 2  # PUT + MOVE
+
+
+@pytest.mark.asyncio
+async def test_sync_mkdir_p_dir_cache_webdav(config: TestConfig, fake_webdav: FakeWebDav, tmp_path: Path) -> None:
+    """Test that Sync.mkdir_p() skips the WAN round trips for directories it knows exist, until DESY says otherwise."""
+    config["DEST_URL"] = fake_webdav.url
+    config["LOG_LEVEL"] = "INFO"
+    fake_webdav.mkdir_p(f"{config['DEST_BASE_PATH']}/data/exp/IceCube")
+    rc_mock = MagicMock()
+    rc_mock.access_token = "speak-friend-and-enter"
+    bundle = tmp_path / "bundle.zip"
+    bundle.write_bytes(os.urandom(1024))
+    hits, misses = dir_cache_lookups("hit"), dir_cache_lookups("miss")
+
+    def make_sync() -> Sync:
+        sync = Sync(config)
+        sync.rc = rc_mock
+        return sync
+
+    # the first bundle has to walk up the tree and create the directories
+    await make_sync().put_path(str(bundle), "/data/exp/IceCube/2024/PFRaw/0101/a.zip")
+    assert fake_webdav.requests["PROPFIND"] == 4
+    assert fake_webdav.requests["MKCOL"] == 3
+    assert (dir_cache_lookups("hit"), dir_cache_lookups("miss")) == (hits, misses + 1)
+
+    # the next bundle into the same directory goes straight to the upload
+    fake_webdav.requests.clear()
+    await make_sync().put_path(str(bundle), "/data/exp/IceCube/2024/PFRaw/0101/b.zip")
+    assert fake_webdav.requests["PROPFIND"] == 0
+    assert fake_webdav.requests["MKCOL"] == 0
+    assert (dir_cache_lookups("hit"), dir_cache_lookups("miss")) == (hits + 1, misses + 1)
+
+    # a bundle into a new directory stops walking at the first directory it knows
+    fake_webdav.requests.clear()
+    await make_sync().put_path(str(bundle), "/data/exp/IceCube/2024/PFRaw/0102/c.zip")
+    assert fake_webdav.requests["PROPFIND"] == 1
+    assert fake_webdav.requests["MKCOL"] == 1
+
+    # if somebody removes the directory behind our back, the upload fails and we forget it
+    fake_webdav.rmtree(f"{config['DEST_BASE_PATH']}/data/exp/IceCube/2024")
+    with pytest.raises(HTTPError):
+        await make_sync().put_path(str(bundle), "/data/exp/IceCube/2024/PFRaw/0101/d.zip")
+    await make_sync().put_path(str(bundle), "/data/exp/IceCube/2024/PFRaw/0101/d.zip")
+    assert Path(f"{config['DEST_BASE_PATH']}/data/exp/IceCube/2024/PFRaw/0101/d.zip") in fake_webdav.files
+    assert len(fake_webdav.files) == 1
+
+
+@pytest.mark.asyncio
+async def test_sync_access_token_cached(config: TestConfig, mocker: MockerFixture) -> None:
+    """Test that Sync only gets a new access token when the current one is about to expire."""
+    time_mock = mocker.patch("lta.transfer.sync.time.time", return_value=1_000_000.0)
+    rc_mock = MagicMock()
+    tokens = iter([make_jwt(1_000_600.0), make_jwt(1_001_200.0)])
+
+    def get_token() -> None:
+        if rc_mock.access_token is None:
+            rc_mock.access_token = next(tokens)
+
+    rc_mock.access_token = None
+    rc_mock._get_token.side_effect = get_token
+    hc_mock = AsyncMock()
+    sync = Sync(config)
+    sync.rc = rc_mock
+    sync.http_client = hc_mock
+
+    # the first token is used until shortly before it expires
+    for i in range(10):
+        await sync.rmfile(f"/data/exp/IceCube/2024/PFRaw/0101/{i}.zip")
+    assert rc_mock._get_token.call_count == 1
+    first = hc_mock.fetch.call_args.args[0].headers["Authorization"]
+    time_mock.return_value = 1_000_600.0 - 30
+    await sync.rmfile("/data/exp/IceCube/2024/PFRaw/0101/last.zip")
+    assert rc_mock._get_token.call_count == 2
+    second = hc_mock.fetch.call_args.args[0].headers["Authorization"]
+    assert first != second
+    assert second == f"bearer {make_jwt(1_001_200.0)}"
+
+
+@pytest.mark.asyncio
+async def test_sync_put_path_bandwidth_limit_webdav(config: TestConfig, fake_webdav: FakeWebDav, tmp_path: Path) -> None:
+    """Test that concurrent uploads share the bandwidth limit, and that the limit can be changed while they run."""
+    config["DEST_URL"] = fake_webdav.url
+    config["LOG_LEVEL"] = "INFO"
+    config["MAX_SEND_BYTES_PER_SECOND"] = str(512 * 1024)
+    fake_webdav.mkdir_p(f"{config['DEST_BASE_PATH']}/data/exp/IceCube/2024/PFRaw/0101")
+    rc_mock = MagicMock()
+    rc_mock.access_token = "speak-friend-and-enter"
+    bundles = []
+    for i in range(3):
+        bundles.append(tmp_path / f"bundle{i}.zip")
+        bundles[i].write_bytes(os.urandom(256 * 1024))
+    uploaded = upload_bytes()
+    uploads = histogram_count(PROMETHEUS_UPLOAD_THROUGHPUT)
+    sync = Sync(config)
+    sync.rc = rc_mock
+    loop = asyncio.get_running_loop()
+    try:
+        # two uploads of 256 KiB at 512 KiB/s together take about a second
+        start = loop.time()
+        await asyncio.gather(*[
+            sync.put_path(str(bundles[i]), f"/data/exp/IceCube/2024/PFRaw/0101/{i}.zip") for i in range(2)
+        ])
+        assert 0.8 < loop.time() - start < 5
+        # at 16 KiB/s this one would take 16 seconds, but we lift the limit
+        sync.bandwidth.set_rate(16 * 1024)
+        start = loop.time()
+        upload = asyncio.create_task(sync.put_path(str(bundles[2]), "/data/exp/IceCube/2024/PFRaw/0101/2.zip"))
+        await asyncio.sleep(0.5)
+        assert not upload.done()
+        sync.bandwidth.set_rate(0)
+        await upload
+        assert loop.time() - start < 2
+    finally:
+        sync.close()
+    for i in range(3):
+        assert fake_webdav.files[PurePosixPath(f"{config['DEST_BASE_PATH']}/data/exp/IceCube/2024/PFRaw/0101/{i}.zip")] == bundles[i].read_bytes()
+    assert upload_bytes() - uploaded == 3 * 256 * 1024
+    assert histogram_count(PROMETHEUS_UPLOAD_THROUGHPUT) - uploads == 3
+
+
+@pytest.mark.asyncio
+async def test_sync_reuses_connections_webdav(config: TestConfig, fake_webdav: FakeWebDav, tmp_path: Path) -> None:
+    """Test that a Sync keeps its connection to DESY open from one upload to the next."""
+    config["DEST_URL"] = fake_webdav.url
+    config["LOG_LEVEL"] = "INFO"
+    fake_webdav.mkdir_p(f"{config['DEST_BASE_PATH']}/data/exp/IceCube/2024/PFRaw/0101")
+    rc_mock = MagicMock()
+    rc_mock.access_token = "speak-friend-and-enter"
+    bundle = tmp_path / "bundle.zip"
+    bundle.write_bytes(os.urandom(1024))
+    sync = Sync(config)
+    sync.rc = rc_mock
+    try:
+        for i in range(5):
+            await sync.put_path(str(bundle), f"/data/exp/IceCube/2024/PFRaw/0101/{i}.zip")
+    finally:
+        sync.close()
+    assert len(fake_webdav.files) == 5
+    assert sum(fake_webdav.requests.values()) >= 10
+    assert len(fake_webdav.connections) == 1
+    rc_mock._get_token.assert_called_once()
+
+
 @pytest.mark.asyncio
 async def test_sync_put_path(config: TestConfig, mocker: MockerFixture) -> None:
     """Test that the Sync.put_puth() method will upload a file to the remote."""
@@ -2,8 +2,12 @@
 
 # fmt:off
 
+from pathlib import Path
 from typing import Any
 
+# a fake hsi executable that simulates HPSS in the directory $FAKE_HSI_ROOT
+FAKE_HSI_PATH = str(Path(__file__).parent / "fake_hsi")
+
 
 class ObjectLiteral:
     """